@@ -25,8 +25,8 @@ from rich.style import Style
 from rich.table import Table
 from rich.text import Text
 
-BOOKMARKS_URL = "https://www.bordercore.com/api/bookmarks/?ordering=-created"
-TODOS_URL = "https://www.bordercore.com/api/todos/?priority=1"
+BOOKMARKS_URL = "https://www.bordercore.com/api/bookmarks/?ordering=-created&fields=name"
+TODOS_URL = "https://www.bordercore.com/api/todos/?priority=1&fields=name"
 STATS_URL = "https://www.bordercore.com/api/site/stats"
 
 
@@ -50,6 +50,10 @@ class Dashboard():
         self.layout = Layout()
         self.session = session
 
+        # The ETag of the last response from each URL, sent with the next
+        #  request so that unchanged data isn't downloaded and redrawn
+        self.etags: dict[str, str] = {}
+
         # Divide the "screen" in to three parts
         self.layout.split(
             Layout(name="header", size=3),
@@ -74,22 +78,29 @@ class Dashboard():
 
         self.layout["bookmarks"].update(Panel("Recent bookmarks", title="Bookmarks"))
 
-    def _get(self, url: str) -> dict[str, Any]:
-        """Make an authenticated GET request to the API.
+    def _get(self, url: str) -> dict[str, Any] | None:
+        """Make an authenticated, conditional GET request to the API.
 
         Args:
             url: The full API endpoint to query.
 
         Returns:
-            The parsed JSON response as a dictionary.
+            The parsed JSON response as a dictionary, or None if it
+            hasn't changed since the last request.
 
         Raises:
-            Exception: If the response has a non-200 status code.
+            Exception: If the response has a non-200 or 304 status code.
         """
         headers = {"Authorization": f"Token {self.drf_token}"}
+        if url in self.etags:
+            headers["If-None-Match"] = self.etags[url]
         response: Response = self.session.get(url, headers=headers)
+        if response.status_code == 304:
+            return None
         if response.status_code != 200:
             raise Exception(f"API error ({url}): status={response.status_code}")
+        if "ETag" in response.headers:
+            self.etags[url] = response.headers["ETag"]
         return response.json()
 
     def update_status(self, status: str, error: bool = False) -> None:
@@ -118,6 +129,8 @@ class Dashboard():
             Exception: If the API request fails.
         """
         info = self._get(BOOKMARKS_URL)
+        if info is None:
+            return
         colors = cycle(
             [
                 Color.from_triplet(parse_rgb_hex("11ff00")),
@@ -140,6 +153,8 @@ class Dashboard():
             Exception: If the API request fails.
         """
         info = self._get(TODOS_URL)
+        if info is None:
+            return
         colors = cycle(
             [
                 Color.from_rgb(0, 136, 255),
@@ -162,6 +177,8 @@ class Dashboard():
             Exception: If the API request fails.
         """
         info = self._get(STATS_URL)
+        if info is None:
+            return
         colors = cycle(
             [
                 Color.from_rgb(168, 0, 146),
@@ -1,142 +1,59 @@
 import argparse
-import datetime
 import os
-import pickle
-import re
-from os import makedirs
-from pathlib import Path
 
 import boto3
 
 import django
 from django.conf import settings
 
-bucket_name = settings.AWS_STORAGE_BUCKET_NAME
-
 os.environ["DJANGO_SETTINGS_MODULE"] = "config.settings.dev"
 django.setup()
 
-from blob.models import ILLEGAL_FILENAMES  # isort:skip
-
-BLOB_DIR = "/home/media"
-PICKLE_FILE = "/tmp/uuids_from_filesystem.pkl"
-MAX_FILES_TO_DELETE = 5
-
-s3_resource = boto3.resource("s3")
-s3_client = boto3.client("s3")
-
-
-def get_blobs_from_s3():
-    s3_uuids = {}
-
-    paginator = s3_resource.meta.client.get_paginator("list_objects_v2")
-    page_iterator = paginator.paginate(Bucket=bucket_name)
-
-    for page in page_iterator:
-        for key in page["Contents"]:
-            m = re.search(r"^blobs/(.*?)/(.+)", str(key["Key"]))
-            if m:
-                uuid = m.group(1)
-                filename = m.group(2)
-                if filename not in ILLEGAL_FILENAMES:
-                    s3_uuids[uuid] = filename
-
-    return s3_uuids
-
-
-def get_blobs_from_filesystem():
-
-    filesystem_uuids = {}
-
-    for x in Path(f"{BLOB_DIR}/blobs").rglob("*"):
-        if x.is_file() and x.name not in ILLEGAL_FILENAMES:
-            uuid = x.parent.name
-            filesystem_uuids[uuid] = x.name
-
-    # a_file = open(PICKLE_FILE, "wb")
-    # pickle.dump(filesystem_uuids, a_file)
-    # a_file.close()
+from blob.sync import BLOB_DIR, MANIFEST_PATH, BlobSync, get_keys_to_download  # isort:skip
 
-    return filesystem_uuids
-
-
-def get_filesystems_blobs_from_cache():
-    """
-    Use a cache while debugging.
-    """
-    a_file = open(PICKLE_FILE, "rb")
-    output = pickle.load(a_file)
-    return output
-
-
-def copy_blob_to_wumpus(uuid, filename):
-
-    makedirs(f"{BLOB_DIR}/blobs/{uuid}", exist_ok=True)
-
-    key = f"blobs/{uuid}/{filename}"
-    file_path = f"{BLOB_DIR}/blobs/{uuid}/{filename}"
-
-    s3_client.download_file(bucket_name, key, file_path)
-
-    # Modify the file's mtime to match what's stored in S3 metadata
-    obj = s3_resource.Object(bucket_name=bucket_name, key=key)
-    try:
-        s3_modified = int(obj.metadata.get("file-modified", None))
-        atime = os.stat(file_path).st_atime
-        mtime = datetime.datetime.fromtimestamp(s3_modified)
-        os.utime(file_path, times=(atime, mtime.timestamp()))
-    except TypeError:
-        print("  Warning: file-modified metadata not found in S3")
-
-
-def delete_blobs_from_wumpus(uuids):
-
-    for uuid, filename in uuids.items():
-
-        dir = f"{BLOB_DIR}/blobs/{uuid}"
-        file_path = Path(f"{dir}/{filename}")
-        print(f"Deleting file: {file_path}")
-        file_path.unlink()
+bucket_name = settings.AWS_STORAGE_BUCKET_NAME
 
-        # If the directory is now empty, delete it.
-        # It won't be empty if the blob was renamed.
-        path = Path(dir)
-        has_next = next(path.iterdir(), None)
-        if has_next is None:
-            print(f"Deleting dir: {path}")
-            path.rmdir()
+MAX_FILES_TO_DELETE = 5
 
 
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description="")
     parser.add_argument("-n", "--dry-run", help="Dry run. Don't modify anything.", action="store_true")
+    parser.add_argument("--manifest", help="The file in which the state of synced blobs is stored", default=MANIFEST_PATH)
+    parser.add_argument("--concurrency", help="The number of concurrent downloads", type=int, default=10)
+    parser.add_argument("--max-bandwidth", help="The maximum bandwidth to use, in bytes per second", type=int)
     args = parser.parse_args()
 
     dry_run = args.dry_run
 
-    filesystem_uuids = get_blobs_from_filesystem()
-    # filesystem_uuids = get_filesystems_blobs_from_cache()
+    sync = BlobSync(
+        boto3.client("s3"),
+        bucket_name,
+        blob_dir=BLOB_DIR,
+        manifest_path=args.manifest,
+        max_concurrency=args.concurrency,
+        max_bandwidth=args.max_bandwidth,
+        report=print
+    )
 
-    s3_uuids = get_blobs_from_s3()
+    s3_manifest, filesystem_manifest = sync.get_manifests()
 
-    # Find blobs in S3 but not on the filesystem
-    for uuid, filename in s3_uuids.items():
-        if uuid not in filesystem_uuids or filesystem_uuids[uuid] != filename:
-            print(f"File found in S3 but not the filesystem: {uuid}/{filename}")
-            if not dry_run:
-                copy_blob_to_wumpus(uuid, filename)
+    # Find blobs in S3 but not on the filesystem, or which have changed
+    keys_to_download = get_keys_to_download(s3_manifest, filesystem_manifest, sync.synced)
+    for key in keys_to_download:
+        print(f"File found in S3 but not the filesystem: {key}")
 
-    files_to_delete = {}
+    if not dry_run:
+        sync.download(keys_to_download, s3_manifest)
 
     # Find blobs on the filesystem but not in S3
-    for uuid, filename in filesystem_uuids.items():
-        if uuid not in s3_uuids or s3_uuids[uuid] != filename:
-            print(f"File found on the filesystem but not in S3: {uuid}/{filename}")
-            files_to_delete[uuid] = filename
+    keys_to_delete = [key for key in filesystem_manifest if key not in s3_manifest]
+    for key in keys_to_delete:
+        print(f"File found on the filesystem but not in S3: {key}")
 
     # Safe guard against mass deletion
-    if len(files_to_delete) > MAX_FILES_TO_DELETE:
-        print(f"Error: too many files to delete ({len(files_to_delete)})")
+    if len(keys_to_delete) > MAX_FILES_TO_DELETE:
+        print(f"Error: too many files to delete ({len(keys_to_delete)})")
     elif not dry_run:
-        delete_blobs_from_wumpus(files_to_delete)
+        sync.delete_local(keys_to_delete)
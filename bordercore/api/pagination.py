@@ -0,0 +1,14 @@
+from rest_framework.pagination import CursorPagination
+
+
+class ExportCursorPagination(CursorPagination):
+    """
+    Cursor pagination for bulk exports. Unlike limit/offset pagination,
+    the cost of fetching a page doesn't grow with its depth, and rows
+    added or deleted between requests don't cause any to be skipped
+    or repeated. The ordering can be overridden with the "ordering"
+    query parameter, in which case it should be unique and unchanging.
+    """
+    ordering = "-id"
+    page_size_query_param = "limit"
+    max_page_size = 1000
@@ -15,7 +15,26 @@ from tag.models import Tag, TagAlias
 from todo.models import Todo
 
 
-class AlbumSerializer(serializers.ModelSerializer):
+class ModelSerializer(serializers.ModelSerializer):
+
+    # Override __init__ so that we can parse an optional "fields" searcharg
+    #  to specify which fields should be returned, overriding the default set
+    def __init__(self, *args, **kwargs):
+
+        super().__init__(*args, **kwargs)
+
+        if "request" in self.context:
+            fields = self.context["request"].query_params.get("fields")
+            if fields:
+                fields = fields.split(",")
+                # Drop any fields that are not specified in the `fields` argument.
+                allowed = set(fields)
+                existing = set(self.fields.keys())
+                for field_name in existing - allowed:
+                    self.fields.pop(field_name)
+
+
+class AlbumSerializer(ModelSerializer):
     class Meta:
         model = Album
         fields = ["artist", "compilation", "note", "original_release_year",
@@ -45,13 +64,13 @@ class BlobTagsField(serializers.RelatedField):
         return data
 
 
-class BlobUserSerializer(serializers.ModelSerializer):
+class BlobUserSerializer(ModelSerializer):
     class Meta:
         model = User
         fields = ["id"]
 
 
-class BlobSerializer(serializers.ModelSerializer):
+class BlobSerializer(ModelSerializer):
 
     user = BlobUserSerializer(read_only=True, default=serializers.CurrentUserDefault())
     uuid = serializers.UUIDField()
@@ -66,24 +85,8 @@ class BlobSerializer(serializers.ModelSerializer):
                   "is_note", "metadata", "modified", "name",
                   "note", "sha1sum", "tags", "user", "uuid"]
 
-    # Override __init__ so that we can parse an optional "fields" searcharg
-    #  to specify which fields should be returned, overriding the default set
-    def __init__(self, *args, **kwargs):
-
-        super(BlobSerializer, self).__init__(*args, **kwargs)
-
-        if "request" in self.context:
-            fields = self.context["request"].query_params.get("fields")
-            if fields:
-                fields = fields.split(",")
-                # Drop any fields that are not specified in the `fields` argument.
-                allowed = set(fields)
-                existing = set(self.fields.keys())
-                for field_name in existing - allowed:
-                    self.fields.pop(field_name)
-
 
-class BlobSha1sumSerializer(serializers.ModelSerializer):
+class BlobSha1sumSerializer(ModelSerializer):
 
     file = BlobFileField(read_only=True)
     metadata = BlobMetaDataField(many=True, read_only=True)
@@ -96,7 +99,7 @@ class BlobSha1sumSerializer(serializers.ModelSerializer):
                   "name", "note", "sha1sum", "tags", "user", "uuid"]
 
 
-class BookmarkSerializer(serializers.ModelSerializer):
+class BookmarkSerializer(ModelSerializer):
 
     user = serializers.HiddenField(default=serializers.CurrentUserDefault())
 
@@ -106,13 +109,13 @@ class BookmarkSerializer(serializers.ModelSerializer):
                   "last_response_code", "note", "name", "url", "user", "uuid"]
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(ModelSerializer):
     class Meta:
         model = Tag
         fields = ["id", "is_meta", "name", "url", "user"]
 
 
-class CollectionSerializer(serializers.ModelSerializer):
+class CollectionSerializer(ModelSerializer):
     tags = TagSerializer(many=True, required=False)
 
     class Meta:
@@ -120,13 +123,13 @@ class CollectionSerializer(serializers.ModelSerializer):
         fields = ["description", "is_favorite", "name", "tags"]
 
 
-class FeedSerializer(serializers.ModelSerializer):
+class FeedSerializer(ModelSerializer):
     class Meta:
         model = Feed
         fields = ["homepage", "last_check", "last_response_code", "name", "url"]
 
 
-class FeedItemSerializer(serializers.ModelSerializer):
+class FeedItemSerializer(ModelSerializer):
     feed = FeedSerializer()
 
     class Meta:
@@ -134,13 +137,13 @@ class FeedItemSerializer(serializers.ModelSerializer):
         fields = ["feed", "title", "url"]
 
 
-class MetaDataSerializer(serializers.ModelSerializer):
+class MetaDataSerializer(ModelSerializer):
     class Meta:
         model = MetaData
         fields = ["name", "value", "blob", "user"]
 
 
-class NodeSerializer(serializers.ModelSerializer):
+class NodeSerializer(ModelSerializer):
     user = serializers.HiddenField(default=serializers.CurrentUserDefault())
 
     class Meta:
@@ -148,20 +151,20 @@ class NodeSerializer(serializers.ModelSerializer):
         fields = ["name", "user"]
 
 
-class QuestionSerializer(serializers.ModelSerializer):
+class QuestionSerializer(ModelSerializer):
     class Meta:
         model = Question
         fields = ["answer", "interval", "last_reviewed",
                   "question", "tags", "times_failed", "user"]
 
 
-class QuoteSerializer(serializers.ModelSerializer):
+class QuoteSerializer(ModelSerializer):
     class Meta:
         model = Quote
         fields = ["quote", "source", "user"]
 
 
-class SongSerializer(serializers.ModelSerializer):
+class SongSerializer(ModelSerializer):
     class Meta:
         model = Song
         fields = ["album", "artist", "last_time_played", "length", "note",
@@ -169,25 +172,25 @@ class SongSerializer(serializers.ModelSerializer):
                   "times_played", "title", "track", "uuid", "year"]
 
 
-class SongSourceSerializer(serializers.ModelSerializer):
+class SongSourceSerializer(ModelSerializer):
     class Meta:
         model = SongSource
         fields = ["description", "name"]
 
 
-class PlaylistSerializer(serializers.ModelSerializer):
+class PlaylistSerializer(ModelSerializer):
     class Meta:
         model = Playlist
         fields = ["uuid", "name", "note", "size", "parameters", "type"]
 
 
-class PlaylistItemSerializer(serializers.ModelSerializer):
+class PlaylistItemSerializer(ModelSerializer):
     class Meta:
         model = PlaylistItem
         fields = ["uuid", "playlist", "song"]
 
 
-class TagAliasSerializer(serializers.ModelSerializer):
+class TagAliasSerializer(ModelSerializer):
     tag = TagSerializer()
 
     class Meta:
@@ -195,7 +198,7 @@ class TagAliasSerializer(serializers.ModelSerializer):
         fields = ["uuid", "name", "tag", "user"]
 
 
-class TodoSerializer(serializers.ModelSerializer):
+class TodoSerializer(ModelSerializer):
     user = serializers.HiddenField(default=serializers.CurrentUserDefault())
     tags = BlobTagsField(queryset=Tag.objects.all(), many=True)
     due_date = serializers.DateTimeField(required=False, input_formats=["%Y-%m-%d"])
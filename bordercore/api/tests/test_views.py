@@ -9,6 +9,7 @@ from blob.tests.factories import BlobFactory
 from bookmark.tests.factories import BookmarkFactory
 from collection.tests.factories import CollectionFactory
 from drill.tests.factories import QuestionFactory
+from music.models import Song
 from music.tests.factories import PlaylistFactory, SongFactory
 from tag.tests.factories import TagFactory
 from todo.tests.factories import TodoFactory
@@ -61,6 +62,66 @@ def test_blob_viewset(auto_login_user, blob_image_factory):
     assert resp.status_code == 404
 
 
+def test_blob_viewset_batch(auto_login_user, blob_image_factory, blob_text_factory):
+
+    # Quiet spurious output
+    settings.NPLUSONE_WHITELIST = [
+        {
+            "label": "unused_eager_load",
+            "model": "blob.Blob"
+        }
+    ]
+
+    _, client = auto_login_user()
+
+    uuids = [str(blob_image_factory[0].uuid), str(blob_text_factory[0].uuid)]
+
+    url = urls.reverse("blob-list")
+    resp = client.get(url, {"uuid__in": ",".join(uuids), "fields": "uuid,name"})
+    assert resp.status_code == 200
+    results = resp.json()["results"]
+    assert set(x["uuid"] for x in results) == set(uuids)
+    assert all(set(x.keys()) == {"uuid", "name"} for x in results)
+
+    resp = client.get(url, {"uuid__in": "not-a-uuid"})
+    assert resp.status_code == 400
+
+
+def test_viewset_cursor_pagination(auto_login_user, song):
+
+    _, client = auto_login_user()
+
+    url = urls.reverse("song-list")
+    resp = client.get(url, {"pagination": "cursor", "limit": 2})
+    assert resp.status_code == 200
+    payload = resp.json()
+    assert len(payload["results"]) == 2
+    assert "cursor=" in payload["next"]
+
+    resp = client.get(payload["next"])
+    assert resp.status_code == 200
+    assert len(resp.json()["results"]) == 1
+    assert resp.json()["next"] is None
+
+
+def test_viewset_conditional_get(auto_login_user, song):
+
+    _, client = auto_login_user()
+
+    url = urls.reverse("song-list")
+    resp = client.get(url)
+    assert resp.status_code == 200
+    etag = resp.headers["ETag"]
+
+    resp = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert resp.status_code == 304
+
+    Song.objects.filter(uuid=song[0].uuid).update(title=faker.text(max_nb_chars=32))
+
+    resp = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert resp.status_code == 200
+
+
 def test_sha1sum_viewset(auto_login_user, blob_image_factory):
 
     _, client = auto_login_user()
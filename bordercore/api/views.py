@@ -1,21 +1,27 @@
+import uuid
+
 from feed.models import Feed, FeedItem
 from rest_framework import status, viewsets
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
 from django.contrib import messages
+from django.utils.decorators import method_decorator
 
 from accounts.models import UserFeed
 from blob.models import Blob
 from bookmark.models import Bookmark
 from collection.models import Collection
 from drill.models import Question
+from lib.decorators import conditional_get
 from music.models import Album, Playlist, PlaylistItem, Song, SongSource
 from node.models import Node
 from quote.models import Quote
 from tag.models import Tag, TagAlias
 from todo.models import Todo
 
+from .pagination import ExportCursorPagination
 from .serializers import (AlbumSerializer, BlobSerializer,
                           BlobSha1sumSerializer, BookmarkSerializer,
                           CollectionSerializer, FeedItemSerializer,
@@ -26,7 +32,51 @@ from .serializers import (AlbumSerializer, BlobSerializer,
                           TagSerializer, TodoSerializer)
 
 
-class AlbumViewSet(viewsets.ModelViewSet):
+class ConditionalGetMixin():
+    """
+    Add an ETag to GET responses so that clients can skip unchanged payloads.
+    """
+
+    @method_decorator(conditional_get)
+    def dispatch(self, request, *args, **kwargs):
+        return super().dispatch(request, *args, **kwargs)
+
+
+class ExportPaginationMixin():
+    """
+    Use cursor pagination rather than the default limit/offset pagination
+    if the request includes a cursor or asks for it with "pagination=cursor".
+    """
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator"):
+            query_params = self.request.query_params
+            if "cursor" in query_params or query_params.get("pagination") == "cursor":
+                self._paginator = ExportCursorPagination()
+        return super().paginator
+
+
+class ModelViewSet(ConditionalGetMixin, ExportPaginationMixin, viewsets.ModelViewSet):
+    pass
+
+
+def get_uuid_list(request):
+    """
+    Parse the optional "uuid__in" query parameter, a comma-separated
+    list of uuids used to fetch a batch of objects in one request.
+    """
+    uuid_list = request.query_params.get("uuid__in")
+    if uuid_list is None:
+        return None
+
+    try:
+        return [uuid.UUID(x) for x in uuid_list.split(",") if x]
+    except ValueError:
+        raise ValidationError({"uuid__in": "Must be a comma-separated list of uuids"})
+
+
+class AlbumViewSet(ModelViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = AlbumSerializer
     lookup_field = "uuid"
@@ -46,7 +96,25 @@ class AlbumViewSet(viewsets.ModelViewSet):
         messages.add_message(self.request, messages.INFO, "Album successfully deleted")
 
 
-class BlobViewSet(viewsets.ModelViewSet):
+def get_blob_queryset(user):
+    """
+    Prefetch each blob's metadata and tags, which are included in its
+    serialized form, to avoid querying for them once per blob.
+    """
+    if user.username == "service_user":
+        queryset = Blob.objects.all()
+    else:
+        queryset = Blob.objects.filter(user=user)
+
+    return queryset.select_related(
+        "user"
+    ).prefetch_related(
+        "metadata",
+        "tags"
+    )
+
+
+class BlobViewSet(ModelViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = BlobSerializer
     lookup_field = "uuid"
@@ -55,14 +123,13 @@ class BlobViewSet(viewsets.ModelViewSet):
         """
         Only the owner of the blob or the service user has access
         """
-        if self.request.user.username == "service_user":
-            return Blob.objects.all()
-        return Blob.objects.filter(
-            user=self.request.user
-        ).prefetch_related(
-            "metadata",
-            "tags"
-        )
+        queryset = get_blob_queryset(self.request.user)
+
+        uuid_list = get_uuid_list(self.request)
+        if uuid_list is not None:
+            queryset = queryset.filter(uuid__in=uuid_list)
+
+        return queryset
 
     def create(self, request, *args, **kwargs):
         """
@@ -90,7 +157,7 @@ class BlobViewSet(viewsets.ModelViewSet):
         instance.index_blob()
 
 
-class BlobSha1sumViewSet(viewsets.ModelViewSet):
+class BlobSha1sumViewSet(ModelViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = BlobSha1sumSerializer
     lookup_field = "sha1sum"
@@ -99,22 +166,14 @@ class BlobSha1sumViewSet(viewsets.ModelViewSet):
         """
         Only the owner of the blob or the service user has access
         """
-        if self.request.user.username == "service_user":
-            return Blob.objects.all()
-
-        return Blob.objects.filter(
-            user=self.request.user
-        ).prefetch_related(
-            "metadata",
-            "tags"
-        )
+        return get_blob_queryset(self.request.user)
 
     def perform_create(self, serializer):
         instance = serializer.save()
         instance.index_blob()
 
 
-class BookmarkViewSet(viewsets.ModelViewSet):
+class BookmarkViewSet(ModelViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = BookmarkSerializer
     lookup_field = "uuid"
@@ -133,7 +192,7 @@ class BookmarkViewSet(viewsets.ModelViewSet):
         instance.index_bookmark()
 
 
-class CollectionViewSet(viewsets.ModelViewSet):
+class CollectionViewSet(ModelViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = CollectionSerializer
     lookup_field = "uuid"
@@ -161,7 +220,7 @@ class CollectionViewSet(viewsets.ModelViewSet):
         return response
 
 
-class FeedViewSet(viewsets.ModelViewSet):
+class FeedViewSet(ModelViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = FeedSerializer
     lookup_field = "uuid"
@@ -201,7 +260,7 @@ class FeedViewSet(viewsets.ModelViewSet):
         instance.delete()
 
 
-class FeedItemViewSet(viewsets.ModelViewSet):
+class FeedItemViewSet(ModelViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = FeedItemSerializer
     queryset = FeedItem.objects.filter()
@@ -210,7 +269,7 @@ class FeedItemViewSet(viewsets.ModelViewSet):
         return FeedItem.objects.all().select_related("feed")
 
 
-class NodeViewSet(viewsets.ModelViewSet):
+class NodeViewSet(ModelViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = NodeSerializer
     lookup_field = "uuid"
@@ -219,7 +278,7 @@ class NodeViewSet(viewsets.ModelViewSet):
         return Node.objects.filter(user=self.request.user)
 
 
-class QuestionViewSet(viewsets.ModelViewSet):
+class QuestionViewSet(ModelViewSet):
     """
     Questions for drilled spaced repetition
     """
@@ -235,7 +294,7 @@ class QuestionViewSet(viewsets.ModelViewSet):
         )
 
 
-class QuoteViewSet(viewsets.ModelViewSet):
+class QuoteViewSet(ModelViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = QuoteSerializer
     lookup_field = "uuid"
@@ -244,7 +303,7 @@ class QuoteViewSet(viewsets.ModelViewSet):
         return Quote.objects.filter(user=self.request.user)
 
 
-class SongViewSet(viewsets.ModelViewSet):
+class SongViewSet(ModelViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = SongSerializer
     lookup_field = "uuid"
@@ -257,7 +316,7 @@ class SongViewSet(viewsets.ModelViewSet):
         )
 
 
-class SongSourceViewSet(viewsets.ModelViewSet):
+class SongSourceViewSet(ModelViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = SongSourceSerializer
 
@@ -265,7 +324,7 @@ class SongSourceViewSet(viewsets.ModelViewSet):
         return SongSource.objects.all()
 
 
-class PlaylistViewSet(viewsets.ModelViewSet):
+class PlaylistViewSet(ModelViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = PlaylistSerializer
     lookup_field = "uuid"
@@ -274,7 +333,7 @@ class PlaylistViewSet(viewsets.ModelViewSet):
         return Playlist.objects.filter(user=self.request.user)
 
 
-class PlaylistItemViewSet(viewsets.ModelViewSet):
+class PlaylistItemViewSet(ModelViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = PlaylistItemSerializer
     lookup_field = "uuid"
@@ -283,7 +342,7 @@ class PlaylistItemViewSet(viewsets.ModelViewSet):
         return PlaylistItem.objects.filter(playlist__user=self.request.user)
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(ModelViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = TagSerializer
 
@@ -291,7 +350,7 @@ class TagViewSet(viewsets.ModelViewSet):
         return Tag.objects.filter(user=self.request.user)
 
 
-class TagNameViewSet(viewsets.ModelViewSet):
+class TagNameViewSet(ModelViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = TagSerializer
     lookup_field = "name"
@@ -300,7 +359,7 @@ class TagNameViewSet(viewsets.ModelViewSet):
         return Tag.objects.filter(user=self.request.user)
 
 
-class TagAliasViewSet(viewsets.ModelViewSet):
+class TagAliasViewSet(ModelViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = TagAliasSerializer
     lookup_field = "uuid"
@@ -313,7 +372,7 @@ class TagAliasViewSet(viewsets.ModelViewSet):
         )
 
 
-class TodoViewSet(viewsets.ModelViewSet):
+class TodoViewSet(ModelViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = TodoSerializer
     lookup_field = "uuid"
@@ -9,6 +9,7 @@ TAG=latest
 build() {
 
     cp ../../lib/util.py ./lib/
+    cp ../../lib/thumbnails.py ./lib/
 
     docker build -t $LAMBDA:$TAG .
 
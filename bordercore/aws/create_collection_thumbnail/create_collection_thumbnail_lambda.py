@@ -1,55 +1,89 @@
+import hashlib
+import io
 import json
 import logging
 import os
-import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
 import boto3
 import requests
+from botocore.exceptions import ClientError
 
+from lib.thumbnails import create_collection_cover
 from lib.util import is_image, is_pdf
 
 logging.getLogger().setLevel(logging.INFO)
 log = logging.getLogger(__name__)
 
-EFS_DIR = os.environ.get("EFS_DIR", "/tmp")
 DRF_TOKEN = os.environ.get("DRF_TOKEN")
 S3_BUCKET_NAME = "bordercore-blobs"
 
+# Small covers are a few KB. Anything much larger than this isn't one,
+#  and isn't worth downloading just to shrink it to a tile.
+MAX_COVER_BYTES = 1024 * 1024
+
+MAX_WORKERS = 4
+
 s3_client = boto3.client("s3")
 
 
-def download_images_from_collection(collection_uuid):
+def get_images_from_collection(collection_uuid):
 
     headers = {"Authorization": f"Token {DRF_TOKEN}"}
     r = requests.get(f"https://www.bordercore.com/api/collections/images/{collection_uuid}/", headers=headers)
     if r.status_code != 200:
         raise Exception(f"Error: status code: {r.status_code}")
 
-    object_list = r.json()
-    log.info(object_list)
+    # Only images and pdfs have covers
+    return [
+        x
+        for x in r.json()
+        if is_image(x["filename"]) or is_pdf(x["filename"])
+    ]
 
-    filenames = []
 
-    for object in object_list:
+def get_images_hash(object_list):
+    """
+    Return a hash identifying the set of images a cover is composed from.
+    """
+    return hashlib.sha1(
+        json.dumps([[x["uuid"], x["filename"]] for x in object_list]).encode("utf-8")
+    ).hexdigest()
 
-        if is_pdf(object["filename"]):
-            # For pdfs, download the cover image
-            s3_key = "cover-large.jpg"
-        elif is_image(object["filename"]):
-            # For images, download the image itself
-            s3_key = object["filename"]
-        else:
-            # If it's any other type, skip
-            continue
 
-        # Prepend the object's uuid to insure uniqueness
-        filename = f"{object['uuid']}-{s3_key}"
-        filenames.append(filename)
+def get_current_images_hash(key):
+    """
+    Return the hash of the images the existing cover, if any, was composed from.
+    """
+    try:
+        response = s3_client.head_object(Bucket=S3_BUCKET_NAME, Key=key)
+    except ClientError:
+        return None
+    return response["Metadata"].get("images-hash")
+
+
+def download_cover(object):
+    """
+    Download a blob's small cover into memory, returning None if it
+    doesn't exist or is too large to be one.
+    """
+
+    try:
+        response = s3_client.get_object(
+            Bucket=S3_BUCKET_NAME,
+            Key=f"blobs/{object['uuid']}/cover.jpg",
+            Range=f"bytes=0-{MAX_COVER_BYTES - 1}"
+        )
+    except ClientError as e:
+        log.warning(f"Can't download cover for {object['uuid']}: {e}")
+        return None
 
-        file_path = f"{EFS_DIR}/collections/{filename}"
-        s3_client.download_file(S3_BUCKET_NAME, f"blobs/{object['uuid']}/{s3_key}", file_path)
+    # The size of the whole object is after the slash, eg "bytes 0-4095/4096"
+    if int(response["ContentRange"].split("/")[-1]) > MAX_COVER_BYTES:
+        log.warning(f"Cover for {object['uuid']} is too large, skipping")
+        return None
 
-    return filenames
+    return io.BytesIO(response["Body"].read())
 
 
 def handler(event, context):
@@ -64,36 +98,40 @@ def handler(event, context):
 
             log.info(f"Creating cover image for collection_uuid: {collection_uuid}")
 
-            thumbnail_filename = f"{collection_uuid}.jpg"
-
-            object_list = download_images_from_collection(collection_uuid)
-
-            if object_list:
-                result = subprocess.run(
-                    [
-                        "sh",
-                        "create-cover.sh",
-                        collection_uuid,
-                        *object_list
-                    ],
-                    capture_output=True
-                )
-
-                log.info(f"create-cover.sh result: {result}")
-
-                # Upload the resulting thumbnail back to S3
-                s3_client.upload_file(
-                    f"{EFS_DIR}/collections/{thumbnail_filename}",
-                    S3_BUCKET_NAME,
-                    f"collections/{thumbnail_filename}",
-                    ExtraArgs={"ContentType": "image/jpeg"}
-                )
-
-                # Delete the sample images once done
-                for object in object_list:
-                    os.remove(f"{EFS_DIR}/collections/{object}")
-
-                os.remove(f"{EFS_DIR}/collections/{thumbnail_filename}")
+            key = f"collections/{collection_uuid}.jpg"
+
+            object_list = get_images_from_collection(collection_uuid)
+            if not object_list:
+                continue
+
+            # Adding an older image or one which isn't an image at all
+            #  leaves the cover unchanged, so there's nothing to do
+            images_hash = get_images_hash(object_list)
+            if images_hash == get_current_images_hash(key):
+                log.info("Images unchanged, skipping")
+                continue
+
+            # Rather than the originals, use the blobs' small covers,
+            #  downloading them all at once
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                covers = [x for x in executor.map(download_cover, object_list) if x is not None]
+
+            if not covers:
+                continue
+
+            cover = io.BytesIO()
+            create_collection_cover(covers, cover)
+            cover.seek(0)
+
+            s3_client.upload_fileobj(
+                cover,
+                S3_BUCKET_NAME,
+                key,
+                ExtraArgs={
+                    "ContentType": "image/jpeg",
+                    "Metadata": {"images-hash": images_hash}
+                }
+            )
 
         log.info("Lambda finished")
 
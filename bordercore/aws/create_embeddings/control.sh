@@ -11,6 +11,10 @@ export DOCKER_BUILDKIT=1
 
 build() {
 
+    mkdir -p ./lib
+    cp ../../lib/embeddings.py ./lib/
+    cp ../../lib/util.py ./lib/
+
     docker build -t $LAMBDA:$TAG .
 
     docker rmi $IMAGE_REPO
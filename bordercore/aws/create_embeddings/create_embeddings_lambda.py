@@ -4,7 +4,8 @@ import os
 
 import requests
 
-from lib.embeddings import len_safe_get_embedding
+from lib.embeddings import get_embedding_fields, len_safe_get_embedding
+from lib.util import INDEX_GROUP_DOCUMENTS, get_content_hash, get_index_alias
 
 logging.getLogger().setLevel(logging.INFO)
 log = logging.getLogger(__name__)
@@ -13,19 +14,21 @@ DRF_TOKEN = os.environ.get("DRF_TOKEN")
 ELASTICSEARCH_ENDPOINT = os.environ.get("ELASTICSEARCH_ENDPOINT", "localhost")
 ELASTICSEARCH_INDEX = os.environ.get("ELASTICSEARCH_INDEX", "bordercore")
 
+# Embeddings are only stored for blobs, which live in the documents index
+ELASTICSEARCH_DOCUMENTS_INDEX = get_index_alias(ELASTICSEARCH_INDEX, group=INDEX_GROUP_DOCUMENTS)
 
-def store_in_elasticsearch(uuid, embeddings):
+SESSION = None
 
-    url = f"http://{ELASTICSEARCH_ENDPOINT}:9200/{ELASTICSEARCH_INDEX}/_update/{uuid}"
+
+def store_in_elasticsearch(uuid, fields, content_hash):
+
+    url = f"http://{ELASTICSEARCH_ENDPOINT}:9200/{ELASTICSEARCH_DOCUMENTS_INDEX}/_update/{uuid}"
     headers = {"Content-Type": "application/json"}
 
     data = {
-        "script": {
-            "source": "ctx._source.embeddings_vector = params.value",
-            "lang": "painless",
-            "params": {
-                "value": embeddings
-            }
+        "doc": {
+            **fields,
+            "embeddings_hash": content_hash
         }
     }
 
@@ -37,32 +40,150 @@ def store_in_elasticsearch(uuid, embeddings):
         print(f"{uuid} Data stored successfully.")
 
 
-def get_blob_text(uuid):
+def store_all_in_elasticsearch(docs):
+    """
+    Store the embeddings for many blobs with one bulk request.
+    """
+
+    url = f"http://{ELASTICSEARCH_ENDPOINT}:9200/{ELASTICSEARCH_DOCUMENTS_INDEX}/_bulk"
+    headers = {"Content-Type": "application/x-ndjson"}
+
+    lines = []
+    for uuid, (fields, content_hash) in docs.items():
+        lines.append(json.dumps({"update": {"_id": uuid}}))
+        lines.append(json.dumps({"doc": {**fields, "embeddings_hash": content_hash}}))
+
+    response = requests.post(url, headers=headers, data="\n".join(lines) + "\n")
+
+    if response.status_code != 200 or response.json()["errors"]:
+        print(f"Failed to store data. Response from Elasticsearch: {response.content}")
+    else:
+        print(f"Data stored successfully for {len(docs)} blobs.")
+
+
+def get_stored_hashes(uuids):
+    """
+    Return the hash of the content each blob's stored embeddings were
+    created from, keyed on uuid, or None if it has none.
+    """
+
+    url = f"http://{ELASTICSEARCH_ENDPOINT}:9200/{ELASTICSEARCH_DOCUMENTS_INDEX}/_mget"
+    headers = {"Content-Type": "application/json"}
+
+    response = requests.post(
+        url,
+        headers=headers,
+        params={"_source_includes": "embeddings_hash"},
+        data=json.dumps({"ids": list(uuids)})
+    )
+
+    if response.status_code != 200:
+        print(f"Failed to fetch embeddings hashes. Response from Elasticsearch: {response.content}")
+        return {}
+
+    return {
+        doc["_id"]: doc.get("_source", {}).get("embeddings_hash")
+        for doc in response.json()["docs"]
+    }
+
 
-    headers = {"Authorization": f"Token {DRF_TOKEN}"}
-    session = requests.Session()
-    session.trust_env = False
+def get_changed_blobs(blobs):
+    """
+    Return just those blobs, given as a dict keyed on uuid, whose content
+    has changed since their embeddings were created, each along with its
+    content hash. Duplicate or late invocations are then nearly free.
+    """
 
-    r = session.get(f"https://www.bordercore.com/api/blobs/{uuid}/", headers=headers)
+    stored_hashes = get_stored_hashes(blobs.keys())
+    changed = {}
+    for uuid, blob in blobs.items():
+        if not blob["content"]:
+            continue
+        content_hash = get_content_hash(blob["content"])
+        if content_hash != stored_hashes.get(uuid):
+            changed[uuid] = (blob, content_hash)
+    return changed
+
+
+def get_session():
+
+    global SESSION
+
+    if SESSION is None:
+        SESSION = requests.Session()
+        SESSION.trust_env = False
+        SESSION.headers["Authorization"] = f"Token {DRF_TOKEN}"
+
+    return SESSION
+
+
+def get_blob(uuid):
+
+    # Only the blob's content is needed, and whether it's a note, so ask for just that
+    r = get_session().get(f"https://www.bordercore.com/api/blobs/{uuid}/", params={"fields": "content,is_note"})
+
+    if r.status_code != 200:
+        raise Exception(f"Error when accessing Bordercore REST API: status code={r.status_code}")
+
+    return r.json()
+
+
+def get_blobs(uuids):
+    """
+    Fetch the content of a batch of blobs with one request,
+    returning a dict keyed on uuid.
+    """
+
+    r = get_session().get(
+        "https://www.bordercore.com/api/blobs/",
+        params={
+            "uuid__in": ",".join(uuids),
+            "fields": "uuid,content,is_note",
+            "limit": len(uuids)
+        }
+    )
 
     if r.status_code != 200:
         raise Exception(f"Error when accessing Bordercore REST API: status code={r.status_code}")
 
-    return r.json()["content"]
+    return {
+        blob["uuid"]: blob
+        for blob in r.json()["results"]
+    }
 
 
 def handler(event, context):
 
     try:
-        if "uuid" in event:
-            uuid = event["uuid"]
+        if "uuid" in event or "uuids" in event:
+            if "uuid" in event:
+                log.info(f"Creating embeddings for uuid={event['uuid']}")
+                blobs = {event["uuid"]: get_blob(uuid=event["uuid"])}
+            else:
+                log.info(f"Creating embeddings for {len(event['uuids'])} blobs")
+                blobs = get_blobs(event["uuids"])
+
+            changed = get_changed_blobs(blobs)
+
+            # Embed all the blobs together, many per API request.
+            #  Notes are split into chunks, each with its own embeddings.
+            fields = get_embedding_fields(
+                [blob["content"] for blob, _ in changed.values()],
+                [blob["is_note"] for blob, _ in changed.values()]
+            )
+            docs = {
+                uuid: (blob_fields, content_hash)
+                for (uuid, (_, content_hash)), blob_fields in zip(changed.items(), fields)
+                if blob_fields is not None
+            }
 
-            log.info(f"Creating embeddings for uuid={uuid}")
-            blob_text = get_blob_text(uuid=uuid)
-            embeddings = len_safe_get_embedding(blob_text)
+            log.info(f"Embeddings computed for {len(docs)} blobs, skipped for {len(blobs) - len(docs)}")
 
-            if embeddings is not None:
-                store_in_elasticsearch(uuid, embeddings)
+            if len(docs) == 1:
+                uuid, (blob_fields, content_hash) = next(iter(docs.items()))
+                store_in_elasticsearch(uuid, blob_fields, content_hash)
+            elif docs:
+                store_all_in_elasticsearch(docs)
         elif "text" in event:
             return json.dumps(len_safe_get_embedding(event["text"]))
 
@@ -26,6 +26,12 @@ be created here:
 
 /tmp/covers/<uuid>-cover.jpg
 
+Videos are not downloaded. Instead, ffmpeg reads a presigned S3 url
+and only fetches the byte ranges it needs to extract a single frame.
+
+If the THUMBNAIL_FORMATS environment variable lists more formats
+than "jpg", eg "jpg,webp", a cover is created in each format as well.
+
 Its width and height dimensions are calculated and stored as S3 metadata.
 
 All cover images are then uploaded to S3 in the same directory
@@ -35,7 +41,6 @@ For bookmarks, only a small cover image is created, since the Chromda lambda
 generates the large version based on the bookmark's webpage.
 """
 
-import glob
 import json
 import logging
 import os
@@ -44,9 +49,10 @@ from pathlib import PurePath
 from urllib.parse import unquote_plus
 
 import boto3
-from PIL import Image
 
-from lib.thumbnails import create_thumbnail
+from lib.thumbnails import (create_thumbnail, create_thumbnail_from_video,
+                            get_cover_upload_args)
+from lib.util import is_video
 
 logging.getLogger().setLevel(logging.INFO)
 log = logging.getLogger(__name__)
@@ -57,6 +63,10 @@ s3_resource = boto3.resource("s3")
 EFS_DIR = os.environ.get("EFS_DIR", "/tmp")
 BLOBS_DIR = f"{EFS_DIR}/blobs"
 COVERS_DIR = f"{EFS_DIR}/covers"
+THUMBNAIL_FORMATS = tuple(os.environ.get("THUMBNAIL_FORMATS", "jpg").split(","))
+
+# How long the presigned url used to stream videos to ffmpeg is valid, in seconds
+PRESIGNED_URL_EXPIRATION = 300
 
 
 def is_cover_image(bucket, key):
@@ -110,6 +120,9 @@ def handler(event, context):
 
             is_bookmark = key.startswith("bookmarks/")
 
+            # Bookmarks have a single, fixed cover filename, so only one format is created
+            formats = ("jpg",) if is_bookmark else THUMBNAIL_FORMATS
+
             # Look for an optional page number (for pdfs)
             page_number = sns_record["s3"]["object"].get("page_number", 1)
 
@@ -135,29 +148,31 @@ def handler(event, context):
             except FileExistsError:
                 pass
 
-            download_path = f"{BLOBS_DIR}/{uuid}-{filename}"
-
-            s3_client.download_file(bucket, key, download_path)
-            create_thumbnail(download_path, f"{COVERS_DIR}/{uuid}", page_number)
+            if is_video(filename):
+                url = s3_client.generate_presigned_url(
+                    "get_object",
+                    Params={"Bucket": bucket, "Key": key},
+                    ExpiresIn=PRESIGNED_URL_EXPIRATION
+                )
+                covers = create_thumbnail_from_video(url, f"{COVERS_DIR}/{uuid}", formats=formats)
+            else:
+                download_path = f"{BLOBS_DIR}/{uuid}-{filename}"
+                s3_client.download_file(bucket, key, download_path)
+                covers = create_thumbnail(download_path, f"{COVERS_DIR}/{uuid}", page_number, formats=formats)
+                os.remove(download_path)
 
             # Upload all cover images created (large or small) to S3
-            for cover in glob.glob(f"{COVERS_DIR}/{uuid}-cover*"):
-                width, height = Image.open(cover).size
+            for cover in covers:
                 cover_filename = get_cover_filename(cover, uuid, is_bookmark)
                 log.info(f"coverfile: {cover_filename}")
                 s3_client.upload_file(
                     cover,
                     bucket,
                     f"{path}/{cover_filename}",
-                    ExtraArgs={"Metadata": {"image-width": str(width),
-                                            "image-height": str(height),
-                                            "cover-image": "Yes"},
-                               "ContentType": "image/jpeg"}
+                    ExtraArgs=get_cover_upload_args(cover)
                 )
                 os.remove(cover)
 
-            os.remove(download_path)
-
     except Exception as e:
         import traceback
         log.info(traceback.print_exc())
@@ -9,6 +9,7 @@ TAG=latest
 build() {
 
     cp ../../lib/util.py ./lib/
+    cp ../../lib/time_utils.py ./lib/
     cp ../../blob/elasticsearch_indexer.py ./lib/
 
     ./download-ffmpeg.sh
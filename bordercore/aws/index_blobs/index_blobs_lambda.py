@@ -60,16 +60,10 @@ def handler(event, context):
                     raise Exception(f"No uuid found in SNS event: {record['Sns']['Message']}")
                 log.info(f"Lambda triggered by Django, uuid: {uuid}")
 
+            # This also invokes the CreateEmbeddings lambda, but only
+            #  if the blob's content has changed
             index_blob_es(uuid=uuid, file_changed=file_changed, new_blob=new_blob)
 
-            if uuid:
-                client = boto3.client("lambda")
-                client.invoke(
-                    FunctionName="arn:aws:lambda:us-east-1:192218769908:function:CreateEmbeddings",
-                    InvocationType="Event",
-                    Payload=json.dumps({"uuid": uuid})
-                )
-
         log.info("Lambda finished")
 
     except Exception as e:
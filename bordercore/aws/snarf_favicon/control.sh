@@ -8,6 +8,10 @@ TAG=latest
 
 build() {
 
+    mkdir -p ./lib
+    cp ../../lib/util.py ./lib/
+    cp ../../lib/favicons.py ./lib/
+
     docker build -t $LAMBDA:$TAG .
 
     docker rmi $IMAGE_REPO
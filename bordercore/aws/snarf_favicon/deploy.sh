@@ -14,4 +14,5 @@ $SAM deploy \
      --template-file $TEMPLATE_FILE \
      --stack-name SnarfFaviconStack \
      --capabilities CAPABILITY_IAM \
-     --image-repository $IMAGE_REPO
+     --image-repository $IMAGE_REPO \
+     --parameter-overrides ParameterKey=DRFTokenParameter,ParameterValue=${DRF_TOKEN}
@@ -1,72 +1,92 @@
 import logging
 import os
-import re
 
 import boto3
-import botocore
 import requests
 
+from lib.favicons import (STATUS_FOUND, STATUS_UNCHANGED, fetch_favicons,
+                          store_favicon)
+from lib.util import get_domain
+
 logging.getLogger().setLevel(logging.INFO)
 log = logging.getLogger(__name__)
 
 bucket_name = os.environ.get("BUCKET_NAME")
-favicon_key = "django/img/favicons"
+DRF_TOKEN = os.environ.get("DRF_TOKEN")
 
-s3_resource = boto3.resource("s3")
+s3_client = boto3.client("s3")
 
-MAX_AGE = 2592000
+SESSION = None
 
 
-def get_domain(url):
+def get_session():
 
-    p = re.compile(r"https?://(.*?)/")
-    m = p.match(url)
+    global SESSION
 
-    if m:
-        domain = m.group(1)
-        parts = domain.split(".")
-        # We want the domain part of the hostname (eg npr.org instead of www.npr.org)
-        if len(parts) == 3:
-            domain = ".".join(parts[1:])
-    else:
-        raise Exception(f"Can't parse domain from url: {url}")
+    if SESSION is None:
+        SESSION = requests.Session()
+        SESSION.headers["Authorization"] = f"Token {DRF_TOKEN}"
 
-    return domain
+    return SESSION
 
 
-def handler(event, context):
+def record_result(domain, status, etag=""):
+    """
+    Record the result in the favicon registry, so that domains without
+    favicons aren't fetched again for every new bookmark.
+    """
 
-    try:
+    r = get_session().put(
+        f"https://www.bordercore.com/api/favicons/{domain}/",
+        json={"status": status, "etag": etag}
+    )
+
+    if r.status_code != 200:
+        log.error(f"Error recording favicon for {domain}: status code={r.status_code}")
 
-        url = event["url"]
-        parse_domain = event.get("parse_domain", True)
 
-        logging.info(f"Snarfing favicon for {url}")
+def get_domains(event):
+    """
+    Return the domains to fetch favicons for, with the etag of each
+    one's current favicon, if any. A single domain or url, or a list
+    of domains, can be given.
+    """
 
-        if parse_domain:
-            domain = get_domain(url)
-        else:
-            domain = url
+    if "domains" in event:
+        return {x["domain"]: x.get("etag", "") for x in event["domains"]}
 
-        try:
+    if "domain" in event:
+        return {event["domain"]: event.get("etag", "")}
 
-            # Check to see if the favicon already exists
-            s3_resource.Object(bucket_name, f"{favicon_key}/{domain}.ico").load()
+    url = event["url"]
+    domain = get_domain(url) if event.get("parse_domain", True) else url
+    if not domain:
+        raise Exception(f"Can't parse domain from url: {url}")
+    return {domain: ""}
+
+
+def handler(event, context):
+
+    try:
 
-        except botocore.exceptions.ClientError:
+        domains = get_domains(event)
 
-            # Favicon does not exist. Attempt to snarf it.
-            logging.info(f"Uploading new favicon to S3: {domain}")
+        logging.info(f"Snarfing favicons for {', '.join(domains)}")
 
-            r = requests.get(f"http://{domain}/favicon.ico")
-            if r.status_code != 200:
-                raise Exception(f"Error: status code for {domain} was {r.status_code}")
+        for result in fetch_favicons(list(domains), etags=domains):
 
-            if len(r.content) == 0:
-                raise Exception(f"favicon image size is zero for {domain}")
+            domain = result["domain"]
 
-            object = s3_resource.Object(bucket_name, f"{favicon_key}/{domain}.ico")
-            object.put(Body=r.content, ACL="public-read", CacheControl=f"max-age={MAX_AGE}")
+            if result["status"] == STATUS_UNCHANGED:
+                log.info(f"Favicon unchanged: {domain}")
+                record_result(domain, STATUS_FOUND, domains[domain])
+            elif result["status"] == STATUS_FOUND:
+                log.info(f"Uploading new favicon to S3: {domain}")
+                store_favicon(s3_client, bucket_name, result)
+                record_result(domain, STATUS_FOUND, result["etag"])
+            else:
+                log.info(f"No favicon found: {domain}")
+                record_result(domain, result["status"])
 
         log.info("Lambda finished")
 
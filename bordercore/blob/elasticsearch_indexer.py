@@ -14,9 +14,10 @@ import boto3
 import elasticsearch_dsl
 import magic
 import requests
+from elasticsearch import NotFoundError
 from elasticsearch_dsl import DateRange
 from elasticsearch_dsl import Document as Document_ES
-from elasticsearch_dsl import Integer, Long, Range, Text
+from elasticsearch_dsl import Integer, Keyword, Long, Range, Text
 
 try:
     import fitz
@@ -24,15 +25,23 @@ except ModuleNotFoundError:
     # Don't worry if this module doesn't exist in production
     pass
 
-from lib.util import get_elasticsearch_connection, is_pdf, is_video
+from lib.time_utils import get_display_date, get_epoch
+from lib.util import (INDEX_GROUP_DOCUMENTS, get_content_hash,
+                      get_elasticsearch_connection, get_index_alias, is_pdf,
+                      is_video)
 
 ELASTICSEARCH_INDEX = os.environ.get("ELASTICSEARCH_INDEX", "bordercore")
 
+# Blobs are written to, and fetched from, the index for heavy documents
+ELASTICSEARCH_DOCUMENTS_INDEX = get_index_alias(ELASTICSEARCH_INDEX, group=INDEX_GROUP_DOCUMENTS)
+
 S3_KEY_PREFIX = "blobs"
 S3_BUCKET_NAME = "bordercore-blobs"
 
 DRF_TOKEN = os.environ.get("DRF_TOKEN")
 
+SESSION = None
+
 FILE_TYPES_TO_INGEST = [
     "azw3",
     "chm",
@@ -42,9 +51,17 @@ FILE_TYPES_TO_INGEST = [
     "txt"
 ]
 
+# The fields holding a blob's embeddings, and the hash of the content they were created from
+EMBEDDINGS_FIELDS = ["embeddings_hash", "embeddings_vector", "chunks"]
+
 logging.getLogger().setLevel(logging.INFO)
 log = logging.getLogger(__name__)
 
+# Counts of blobs indexed whose embeddings were requested, or skipped
+#  since their content hadn't changed. These persist across invocations
+#  of a warm lambda.
+embeddings_stats = {"requested": 0, "skipped": 0}
+
 
 def elasticsearch_merge(data, new_data, raise_on_conflict=False):
     """
@@ -95,11 +112,13 @@ class ESBlob(Document_ES):
     url = Text()
     importance = Integer()
     date_unixtime = Long()
+    date_display = Keyword(index=False)
     created_date = Text()
     last_modified = Text()
+    last_modified_epoch = Long()
 
     class Index:
-        name = ELASTICSEARCH_INDEX
+        name = ELASTICSEARCH_DOCUMENTS_INDEX
 
 
 def get_doctype(blob, metadata):
@@ -117,29 +136,23 @@ def is_ingestible_file(filename):
     return extension in FILE_TYPES_TO_INGEST
 
 
-def get_blob_info(**kwargs):
-
-    if "sha1sum" in kwargs:
-        prefix = "sha1sums"
-        param = kwargs["sha1sum"]
-    elif "uuid" in kwargs:
-        prefix = "blobs"
-        param = kwargs["uuid"]
-    else:
-        raise ValueError("Must pass in uuid or sha1sum")
+def get_session():
+    """
+    Return a requests session for the Bordercore REST API, shared
+    between calls so that its connections are reused.
+    """
+    global SESSION
 
-    headers = {"Authorization": f"Token {DRF_TOKEN}"}
+    if SESSION is None:
+        SESSION = requests.Session()
+        # Ignore .netrc files. Useful for local debugging.
+        SESSION.trust_env = False
+        SESSION.headers["Authorization"] = f"Token {DRF_TOKEN}"
 
-    session = requests.Session()
+    return SESSION
 
-    # Ignore .netrc files. Useful for local debugging.
-    session.trust_env = False
-    r = session.get(f"https://www.bordercore.com/api/{prefix}/{param}/", headers=headers)
 
-    if r.status_code != 200:
-        raise Exception(f"Error when accessing Bordercore REST API: status code={r.status_code}, prefix={prefix}, param={param}")
-
-    info = r.json()
+def parse_blob_info(info):
 
     # Extract the blob's metadata and store it separately, since it will
     #  be indexed in its own Elasticsearch field
@@ -162,6 +175,63 @@ def get_blob_info(**kwargs):
     }
 
 
+def get_blob_info(**kwargs):
+
+    if "sha1sum" in kwargs:
+        prefix = "sha1sums"
+        param = kwargs["sha1sum"]
+    elif "uuid" in kwargs:
+        prefix = "blobs"
+        param = kwargs["uuid"]
+    else:
+        raise ValueError("Must pass in uuid or sha1sum")
+
+    r = get_session().get(f"https://www.bordercore.com/api/{prefix}/{param}/")
+
+    if r.status_code != 200:
+        raise Exception(f"Error when accessing Bordercore REST API: status code={r.status_code}, prefix={prefix}, param={param}")
+
+    return parse_blob_info(r.json())
+
+
+def get_blob_infos(uuids):
+    """
+    Fetch a batch of blobs with one request, returning a dict keyed on uuid.
+    Any uuids which aren't found are omitted.
+    """
+
+    r = get_session().get(
+        "https://www.bordercore.com/api/blobs/",
+        params={
+            "uuid__in": ",".join(str(x) for x in uuids),
+            "limit": len(uuids)
+        }
+    )
+
+    if r.status_code != 200:
+        raise Exception(f"Error when accessing Bordercore REST API: status code={r.status_code}")
+
+    return {
+        info["uuid"]: parse_blob_info(info)
+        for info in r.json()["results"]
+    }
+
+
+def update_blob_content_type(uuid, content_type):
+    """
+    Store the blob's content type in the database so that it can be read
+    without querying Elasticsearch.
+    """
+
+    r = get_session().put(
+        f"https://www.bordercore.com/api/blobs/{uuid}/content_type/",
+        json={"content_type": content_type}
+    )
+
+    if r.status_code != 200:
+        log.warning("Error storing content type for uuid=%s: status code=%s", uuid, r.status_code)
+
+
 def get_blob_contents_from_s3(blob):
 
     blob_contents = BytesIO()
@@ -250,7 +320,33 @@ def delete_metadata(es, uuid):
         }
     }
 
-    es.update_by_query(body=q, index=ELASTICSEARCH_INDEX)
+    es.update_by_query(body=q, index=ELASTICSEARCH_DOCUMENTS_INDEX)
+
+
+def get_stored_embeddings(uuid):
+    """
+    Return a blob's embeddings fields as currently stored in Elasticsearch,
+    along with the hash of the content they were created from.
+    """
+    try:
+        doc = ESBlob.get(id=uuid, _source_includes=EMBEDDINGS_FIELDS)
+    except NotFoundError:
+        return {}
+    return doc.to_dict()
+
+
+def needs_embeddings(blob_info, stored=None):
+    """
+    A blob's embeddings only need to be created if its content has
+    changed since they were last created.
+    """
+    if not blob_info.get("content"):
+        return False
+
+    if stored is None:
+        stored = get_stored_embeddings(blob_info["uuid"])
+
+    return stored.get("embeddings_hash") != get_content_hash(blob_info["content"])
 
 
 def create_embeddings(uuid):
@@ -268,7 +364,8 @@ def index_blob(**kwargs):
     if kwargs.get("create_connection", True):
         es = get_elasticsearch_connection()
 
-    blob_info = get_blob_info(**kwargs)
+    # The blob's info can be passed in if it's already been fetched, eg in a batch
+    blob_info = kwargs.get("blob_info") or get_blob_info(**kwargs)
 
     extra_fields = kwargs.get("extra_fields", {})
 
@@ -290,8 +387,10 @@ def index_blob(**kwargs):
         "note": blob_info["note"],
         "importance": blob_info["importance"],
         "date_unixtime": get_unixtime_from_string(blob_info["date"]),
+        "date_display": get_display_date(blob_info["date"]),
         "created_date": blob_info["created"],
         "last_modified": blob_info["modified"],
+        "last_modified_epoch": get_epoch(blob_info["modified"]),
         "metadata": blob_info["metadata"],
         **extra_fields,
     }
@@ -311,6 +410,15 @@ def index_blob(**kwargs):
 
     if blob_info["sha1sum"] and file_changed:
 
+        # Re-indexing the file replaces the document, including any embeddings.
+        #  If the blob's content hasn't changed, carry them over to the new one.
+        stored = get_stored_embeddings(blob_info["uuid"])
+        embeddings_needed = needs_embeddings(blob_info, stored)
+        if blob_info["content"] and not embeddings_needed:
+            for field in EMBEDDINGS_FIELDS:
+                if field in stored:
+                    setattr(article, field, stored[field])
+
         log.info("ingesting the blob")
         # Even if this is not an ingestible file, we need to download the blob
         #  in order to determine the content type
@@ -329,6 +437,11 @@ def index_blob(**kwargs):
 
         article.content_type = magic.from_file(filename, mime=True)
 
+        try:
+            update_blob_content_type(blob_info["uuid"], article.content_type)
+        except requests.RequestException as e:
+            log.error("Exception storing content type: %s", e)
+
         if is_video(blob_info["file"]):
             try:
                 article.duration = get_duration(filename)
@@ -354,6 +467,9 @@ def index_blob(**kwargs):
         article.save(**pipeline_args)
 
     else:
+        # Check before the document is updated, which doesn't touch its embeddings
+        embeddings_needed = needs_embeddings(blob_info)
+
         if not kwargs.get("new_blob", True):
             # For existing blobs, remove any existing metadata first before updating,
             #  in case the user is deleting some of it.
@@ -364,5 +480,16 @@ def index_blob(**kwargs):
 
         article.update(doc_as_upsert=True, **fields)
 
-    if "content" in blob_info:
+    # This is the only place embeddings are requested when a blob is indexed
+    if embeddings_needed:
         create_embeddings(blob_info["uuid"])
+        embeddings_stats["requested"] += 1
+    elif blob_info["content"]:
+        embeddings_stats["skipped"] += 1
+
+    log.info(
+        "Embeddings %s; %d requested, %d skipped",
+        "requested" if embeddings_needed else "not needed",
+        embeddings_stats["requested"],
+        embeddings_stats["skipped"]
+    )
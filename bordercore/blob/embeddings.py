@@ -0,0 +1,169 @@
+"""
+Create embeddings for blobs in bulk.
+
+Blobs needing embeddings are found with a single point in time query and
+paged through with search_after. For each page, any blob whose contents
+haven't changed since its embeddings were created, as recorded by a hash
+stored alongside them, is skipped. The rest are embedded together, many
+per API request, and their vectors are written with one bulk request.
+Notes are also split into chunks, each with its own embedding, so that
+the chatbot can retrieve just their relevant parts. Notes embedded before
+chunking was added have no chunks, so are embedded again however old
+their hash.
+"""
+
+import logging
+import time
+
+from elasticsearch import helpers
+
+from lib.backfill import Checkpoint, RateLimiter, scan_missing
+from lib.embeddings import (EMBEDDING_MAX_WORKERS, get_embedding_backend,
+                            get_embedding_fields)
+from lib.util import get_content_hash
+
+log = logging.getLogger(f"bordercore.{__name__}")
+
+DOCTYPES = ["blob", "book", "document", "note"]
+PAGE_SIZE = 100
+
+
+def get_query(all_blobs=False):
+    """
+    Return a query for blobs with contents but no embeddings or, if
+    all_blobs is True, for every blob with contents.
+    """
+
+    query = {
+        "bool": {
+            "filter": [
+                {"terms": {"doctype": DOCTYPES}},
+                {"exists": {"field": "contents"}}
+            ]
+        }
+    }
+
+    if not all_blobs:
+        query["bool"]["must_not"] = [
+            {"exists": {"field": "embeddings_vector"}}
+        ]
+
+    return query
+
+
+def needs_chunks(hit):
+    return hit["_source"].get("doctype") == "note" and not hit["_source"].get("chunks")
+
+
+def run_embeddings(
+        es,
+        index,
+        backend=None,
+        all_blobs=False,
+        max_workers=EMBEDDING_MAX_WORKERS,
+        page_size=PAGE_SIZE,
+        checkpoint_path=None,
+        rate=None,
+        limit=None,
+        dry_run=False,
+        report=log.info
+):
+    """
+    Create embeddings for every blob which needs them. Returns a dict of
+    counts: blobs found, embedded, skipped (their contents are unchanged)
+    and failed, along with the elapsed time. In a dry run, blobs needing
+    embeddings are reported but none are created.
+    """
+
+    if backend is None:
+        backend = get_embedding_backend()
+
+    checkpoint = Checkpoint(checkpoint_path, "embeddings_vector")
+    search_after = checkpoint.load()
+    if search_after:
+        report(f"Resuming after {search_after}")
+
+    rate_limiter = RateLimiter(rate)
+    stats = {"found": 0, "embedded": 0, "skipped": 0, "failed": 0}
+    start = time.monotonic()
+
+    for hits in scan_missing(
+            es,
+            index,
+            get_query(all_blobs),
+            ["uuid", "contents", "doctype", "embeddings_hash", "chunks.tokens"],
+            search_after,
+            page_size
+    ):
+
+        if limit is not None:
+            hits = hits[:limit - stats["found"]]
+
+        stats["found"] += len(hits)
+        rate_limiter.wait(len(hits))
+
+        changed = []
+        for hit in hits:
+            content_hash = get_content_hash(hit["_source"]["contents"])
+            if content_hash == hit["_source"].get("embeddings_hash") and not needs_chunks(hit):
+                stats["skipped"] += 1
+            else:
+                changed.append((hit, content_hash))
+
+        if dry_run:
+            for hit, _ in changed:
+                report(f"{hit['_id']} needs embeddings")
+            stats["embedded"] += len(changed)
+        elif changed:
+            try:
+                embeddings = get_embedding_fields(
+                    [hit["_source"]["contents"] for hit, _ in changed],
+                    [hit["_source"].get("doctype") == "note" for hit, _ in changed],
+                    backend=backend,
+                    max_workers=max_workers
+                )
+            except Exception as e:
+                stats["failed"] += len(changed)
+                report(f"Error creating embeddings: {type(e).__name__}: {e}")
+                embeddings = []
+
+            actions = [
+                {
+                    "_op_type": "update",
+                    "_index": hit["_index"],
+                    "_id": hit["_id"],
+                    "doc": {
+                        **fields,
+                        "embeddings_hash": content_hash
+                    }
+                }
+                for (hit, content_hash), fields in zip(changed, embeddings)
+                if fields is not None
+            ]
+            stats["skipped"] += len(embeddings) - len(actions)
+
+            if actions:
+                embedded, errors = helpers.bulk(es, actions, raise_on_error=False)
+                stats["embedded"] += embedded
+                stats["failed"] += len(errors)
+                for error in errors:
+                    report(f"Bulk update error: {error}")
+
+        if not dry_run:
+            checkpoint.save(hits[-1]["sort"])
+
+        elapsed = time.monotonic() - start
+        report(
+            f"{stats['found']} found, {stats['embedded']} embedded, "
+            f"{stats['skipped']} skipped, {stats['failed']} failed, "
+            f"{stats['found'] / max(elapsed, 1e-9):.1f} blobs/s"
+        )
+
+        if limit is not None and stats["found"] >= limit:
+            break
+
+    if not dry_run and (limit is None or stats["found"] < limit):
+        checkpoint.clear()
+
+    stats["elapsed"] = time.monotonic() - start
+    return stats
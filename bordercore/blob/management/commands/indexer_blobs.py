@@ -7,7 +7,7 @@ from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.db.transaction import atomic
 
-from blob.elasticsearch_indexer import index_blob
+from blob.elasticsearch_indexer import get_blob_infos, index_blob
 from lib.util import get_elasticsearch_connection
 
 from blob.models import Blob  # isort:skip
@@ -117,8 +117,6 @@ class Command(BaseCommand):
                                   .only("uuid", "name") \
                                   .values()
 
-        blobs_indexed = 0
-
         if force:
             missing_blobs = blobs_in_db
         else:
@@ -126,12 +124,20 @@ class Command(BaseCommand):
             missing_blobs = [x for x in blobs_in_db if str(x["uuid"]) not in blobs_in_es]
             self.stdout.write(f"Found {len(missing_blobs)} missing blobs...")
 
-        for blob in missing_blobs:
-            self.stdout.write(f"{blob['uuid']} {blob['name']}")
-            index_blob(uuid=blob["uuid"], create_connection=create_connection)
-            blobs_indexed = blobs_indexed + 1
-            if blobs_indexed == limit:
-                return
+        missing_blobs = list(missing_blobs)[:limit]
+
+        # Fetch each batch of blobs from the REST API with one request
+        for i in range(0, len(missing_blobs), self.BATCH_SIZE):
+            batch = missing_blobs[i:i + self.BATCH_SIZE]
+            blob_infos = get_blob_infos([blob["uuid"] for blob in batch])
+
+            for blob in batch:
+                self.stdout.write(f"{blob['uuid']} {blob['name']}")
+                index_blob(
+                    uuid=blob["uuid"],
+                    blob_info=blob_infos.get(str(blob["uuid"])),
+                    create_connection=create_connection
+                )
 
     @atomic
     def handle(self, *args, uuid, force, create_connection, limit, verbose, **kwargs):
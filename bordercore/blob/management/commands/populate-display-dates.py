@@ -0,0 +1,46 @@
+# Store each document's display date and last modified epoch in Elasticsearch,
+#  so that search results don't need to parse dates at query time
+
+from lib.backfill import Backfill, BackfillCommand
+from lib.time_utils import get_date_from_pattern, get_epoch
+
+
+class DateDisplayBackfill(Backfill):
+
+    field = "date_display"
+    source = ["uuid", "date"]
+
+    def get_filter(self):
+        return [{"exists": {"field": "date"}}]
+
+    def compute(self, source):
+        return get_date_from_pattern(source.get("date"))
+
+
+class LastModifiedEpochBackfill(Backfill):
+
+    field = "last_modified_epoch"
+    source = ["uuid", "last_modified"]
+
+    def get_filter(self):
+        return [{"exists": {"field": "last_modified"}}]
+
+    def compute(self, source):
+        return get_epoch(source.get("last_modified"))
+
+
+class Command(BackfillCommand):
+    help = "Store each document's display date and last modified epoch in Elasticsearch"
+
+    backfill_classes = [DateDisplayBackfill, LastModifiedEpochBackfill]
+
+    def handle(self, *args, checkpoint, **options):
+
+        for backfill_class in self.backfill_classes:
+            self.stdout.write(f"Populating {backfill_class.field}")
+            self.backfill_class = backfill_class
+            super().handle(
+                *args,
+                checkpoint=f"{checkpoint}.{backfill_class.field}" if checkpoint else None,
+                **options
+            )
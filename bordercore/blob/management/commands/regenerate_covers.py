@@ -0,0 +1,174 @@
+# Regenerate the cover images for many blobs at once, using a pool of
+#  processes. Each worker downloads its blob from S3 (or streams it, for
+#  videos), creates every cover size and format in one pass, then uploads them.
+
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import PurePath
+
+import boto3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from blob.models import Blob
+from lib.thumbnails import (DEFAULT_FORMATS, IMAGE_FORMATS, create_thumbnail,
+                            create_thumbnail_from_video, get_cover_upload_args)
+from lib.util import is_image, is_pdf, is_video
+
+# Each worker process creates its own S3 client, since they can't be shared
+#  across processes
+s3_client = None
+
+
+def init_worker():
+    global s3_client
+    s3_client = boto3.client("s3")
+
+
+def regenerate_cover(bucket_name, key, formats, page_number=1, dry_run=False):
+    """
+    Create and upload the covers for the blob stored at the S3 key. PDF
+    covers are created from the given page, as chosen by the user.
+    Returns the number of bytes downloaded and the number of covers created.
+    """
+
+    filename = PurePath(key).name
+    prefix = str(PurePath(key).parent)
+    bytes_read = 0
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+
+        outdir = f"{tmpdir}/blob"
+
+        if is_video(filename):
+            url = s3_client.generate_presigned_url(
+                "get_object",
+                Params={"Bucket": bucket_name, "Key": key},
+                ExpiresIn=300
+            )
+            covers = create_thumbnail_from_video(url, outdir, formats=formats)
+        else:
+            download_path = f"{tmpdir}/{filename}"
+            s3_client.download_file(bucket_name, key, download_path)
+            bytes_read = os.path.getsize(download_path)
+            covers = create_thumbnail(download_path, outdir, page_number, formats=formats)
+
+        if not covers:
+            raise ValueError("No covers created")
+
+        if not dry_run:
+            for cover in covers:
+                cover_filename = PurePath(cover).name.removeprefix("blob-")
+                s3_client.upload_file(
+                    cover,
+                    bucket_name,
+                    f"{prefix}/{cover_filename}",
+                    ExtraArgs=get_cover_upload_args(cover)
+                )
+
+    return bytes_read, len(covers)
+
+
+class Command(BaseCommand):
+    help = "Regenerate cover images for blobs in parallel"
+
+    bucket_name = settings.AWS_STORAGE_BUCKET_NAME
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--uuid",
+            help="The uuid of a blob to process. Can be given more than once. Defaults to all blobs.",
+            action="append",
+            default=[]
+        )
+        parser.add_argument(
+            "--limit",
+            help="The maximum number of blobs to process",
+            type=int
+        )
+        parser.add_argument(
+            "--workers",
+            help="The number of worker processes",
+            default=os.cpu_count(),
+            type=int
+        )
+        parser.add_argument(
+            "--format",
+            help="An image format to create covers in. Can be given more than once.",
+            action="append",
+            choices=IMAGE_FORMATS.keys(),
+            dest="formats"
+        )
+        parser.add_argument(
+            "--dry-run",
+            help="Dry run. Create covers but don't upload them",
+            action="store_true"
+        )
+
+    def handle(self, *args, uuid, limit, workers, formats, dry_run, **kwargs):
+
+        formats = tuple(formats or DEFAULT_FORMATS)
+
+        keys = self.get_keys(uuid, limit)
+        self.stdout.write(f"Regenerating covers for {len(keys)} blobs using {workers} workers")
+
+        count = 0
+        failed = 0
+        total_bytes = 0
+        total_covers = 0
+        start = time.perf_counter()
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+
+            futures = {
+                executor.submit(regenerate_cover, self.bucket_name, key, formats, page_number, dry_run): key
+                for key, page_number in keys
+            }
+
+            for future in as_completed(futures):
+                count += 1
+                try:
+                    bytes_read, covers = future.result()
+                    total_bytes += bytes_read
+                    total_covers += covers
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"{futures[future]} Error: {e}")
+
+                if count % 100 == 0:
+                    self.report(count, failed, total_bytes, time.perf_counter() - start)
+
+        elapsed = time.perf_counter() - start
+        self.report(count, failed, total_bytes, elapsed)
+        self.stdout.write(f"Created {total_covers} covers in {elapsed:.1f}s")
+
+    def get_keys(self, uuids, limit):
+        """
+        Return the S3 key of each blob with a cover, along with the PDF page
+        its cover is created from.
+        """
+
+        blobs = Blob.objects.filter(~Q(file=""))
+        if uuids:
+            blobs = blobs.filter(uuid__in=uuids)
+
+        keys = [
+            (Blob.get_s3_key(blob_uuid, file), (data or {}).get("pdf_page_number", 1))
+            for blob_uuid, file, data in blobs.values_list("uuid", "file", "data").iterator()
+            if is_image(file) or is_pdf(file) or is_video(file)
+        ]
+
+        return keys[:limit]
+
+    def report(self, count, failed, total_bytes, elapsed):
+
+        elapsed = max(elapsed, 1e-9)
+        self.stdout.write(
+            f"{count} blobs, {failed} failed, "
+            f"{count / elapsed:.1f} blobs/s, "
+            f"{total_bytes / elapsed / 1024 / 1024:.1f} MB/s downloaded"
+        )
@@ -1,59 +1,71 @@
-# Iterate through all S3 blobs, downloading any to the local filesystem which don't exist
-
-import os
-import re
-from os import makedirs
+# Download any S3 blobs which are missing from the local filesystem or have changed
 
 import boto3
 
 from django.conf import settings
 from django.core.management.base import BaseCommand
-from django.db.transaction import atomic
 
-from blob.models import ILLEGAL_FILENAMES  # isort:skip
+from blob.sync import BLOB_DIR, MANIFEST_PATH, BlobSync, get_keys_to_download
 
 
 class Command(BaseCommand):
     help = "Sync all S3 blobs to the filesystem"
 
-    BLOB_DIR = "/home/media"
     bucket_name = settings.AWS_STORAGE_BUCKET_NAME
 
     def add_arguments(self, parser):
+        parser.add_argument(
+            "--blob-dir",
+            help="The directory containing the blobs",
+            default=BLOB_DIR
+        )
+        parser.add_argument(
+            "--manifest",
+            help="The file in which the state of synced blobs is stored between runs",
+            default=MANIFEST_PATH
+        )
+        parser.add_argument(
+            "--concurrency",
+            help="The number of concurrent transfers",
+            default=10,
+            type=int
+        )
+        parser.add_argument(
+            "--max-bandwidth",
+            help="The maximum bandwidth to use, in bytes per second",
+            type=int
+        )
         parser.add_argument(
             "--dry-run",
             help="Dry run. Take no action",
             action="store_true"
         )
 
-    @atomic
-    def handle(self, *args, dry_run, **kwargs):
-
-        s3_resource = boto3.resource("s3")
-
-        paginator = s3_resource.meta.client.get_paginator("list_objects_v2")
-        page_iterator = paginator.paginate(Bucket=self.bucket_name)
+    def handle(self, *args, blob_dir, manifest, concurrency, max_bandwidth, dry_run, **kwargs):
 
-        for page in page_iterator:
-
-            for key in page["Contents"]:
-                m = re.search(r"^(blobs/\w{2}/\w{40})/(.+)", str(key["Key"]))
+        sync = BlobSync(
+            boto3.client("s3"),
+            self.bucket_name,
+            blob_dir=blob_dir,
+            manifest_path=manifest,
+            max_concurrency=concurrency,
+            max_bandwidth=max_bandwidth,
+            report=self.stdout.write
+        )
 
-                if m:
-                    file_path = f"{self.BLOB_DIR}/{key['Key']}"
-                    dirs = m.group(1)
-                    filename = m.group(2)
+        s3_manifest, filesystem_manifest = sync.get_manifests()
+        keys = get_keys_to_download(s3_manifest, filesystem_manifest, sync.synced)
 
-                    # First check if it already exists
-                    if not os.path.isfile(file_path) and filename not in ILLEGAL_FILENAMES:
-                        self.stdout.write(f"Syncing {key['Key']}")
+        self.stdout.write(f"{len(keys)} blobs to download")
 
-                        if not dry_run:
-                            makedirs(f"{self.BLOB_DIR}/{dirs}", exist_ok=True)
-                            s3_resource.meta.client.download_file(self.bucket_name, key["Key"], file_path)
+        if dry_run:
+            for key in keys:
+                self.stdout.write(f"Syncing {key}")
+            return
 
-                            # Set the "modified" timestamp
-                            obj = s3_resource.Object(bucket_name=self.bucket_name, key=key["Key"])
-                            s3_modified = int(obj.metadata["file-modified"])
+        sync.download(keys, s3_manifest)
 
-                            os.utime(file_path, (s3_modified, s3_modified))
+        self.stdout.write(
+            f"Downloaded {sync.stats['transferred']} blobs ({sync.stats['bytes']} bytes), "
+            f"{sync.stats['failed']} failed"
+        )
@@ -1,14 +1,13 @@
-import os
+# Upload any blobs on the filesystem which are missing from S3 or are newer than the copy there
 
 import boto3
-from botocore.errorfactory import ClientError
 
 from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.db.models import Q
-from django.db.transaction import atomic
 
-from blob.models import Blob, set_s3_metadata_file_modified
+from blob.models import Blob
+from blob.sync import BLOB_DIR, MANIFEST_PATH, BlobSync, get_keys_to_upload
 
 
 class Command(BaseCommand):
@@ -17,6 +16,27 @@ class Command(BaseCommand):
     bucket_name = settings.AWS_STORAGE_BUCKET_NAME
 
     def add_arguments(self, parser):
+        parser.add_argument(
+            "--blob-dir",
+            help="The directory containing the blobs",
+            default=BLOB_DIR
+        )
+        parser.add_argument(
+            "--manifest",
+            help="The file in which the state of synced blobs is stored between runs",
+            default=MANIFEST_PATH
+        )
+        parser.add_argument(
+            "--concurrency",
+            help="The number of concurrent transfers",
+            default=10,
+            type=int
+        )
+        parser.add_argument(
+            "--max-bandwidth",
+            help="The maximum bandwidth to use, in bytes per second",
+            type=int
+        )
         parser.add_argument(
             "--dry-run",
             help="Dry run. Take no action",
@@ -28,27 +48,45 @@ class Command(BaseCommand):
             action="store_true"
         )
 
-    @atomic
-    def handle(self, *args, dry_run, verbose, **kwargs):
+    def handle(self, *args, blob_dir, manifest, concurrency, max_bandwidth, dry_run, verbose, **kwargs):
+
+        sync = BlobSync(
+            boto3.client("s3"),
+            self.bucket_name,
+            blob_dir=blob_dir,
+            manifest_path=manifest,
+            max_concurrency=concurrency,
+            max_bandwidth=max_bandwidth,
+            report=self.stdout.write
+        )
+
+        s3_manifest, filesystem_manifest = sync.get_manifests()
 
-        s3_client = boto3.client("s3")
+        # Only sync files which belong to blobs
+        blob_keys = {
+            Blob.get_s3_key(uuid, file)
+            for uuid, file in Blob.objects.filter(~Q(file="")).values_list("uuid", "file")
+        }
+        filesystem_manifest = {
+            key: value
+            for key, value in filesystem_manifest.items()
+            if key in blob_keys
+        }
 
-        for blob in Blob.objects.filter(~Q(file="")).order_by("?"):
+        keys = get_keys_to_upload(filesystem_manifest, s3_manifest, sync.synced, sync.get_remote_mtime)
 
-            key = blob.s3_key
+        if verbose:
+            self.stdout.write(f"{len(filesystem_manifest)} blobs on the filesystem, {len(s3_manifest)} in S3")
+        self.stdout.write(f"{len(keys)} blobs to upload")
 
-            try:
-                s3_client.head_object(Bucket=self.bucket_name, Key=key)
-                if verbose:
-                    self.stdout.write("{blob.uuid} Blob already exists in S3")
-            except ClientError:
-                self.stdout.write(f"{blob.uuid} Syncing to S3")
+        if dry_run:
+            for key in keys:
+                self.stdout.write(f"{key} Syncing to S3")
+            return
 
-                if not dry_run:
-                    file_path = f"/home/media/{key}"
-                    s3_client.upload_file(file_path, self.bucket_name, key)
+        sync.upload(keys, filesystem_manifest)
 
-                    # Set the file modification header
-                    info = os.stat(file_path)
-                    blob.file_modified = info[8]
-                    set_s3_metadata_file_modified(None, blob)
+        self.stdout.write(
+            f"Uploaded {sync.stats['transferred']} blobs ({sync.stats['bytes']} bytes), "
+            f"{sync.stats['failed']} failed"
+        )
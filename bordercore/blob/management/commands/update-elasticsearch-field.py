@@ -6,7 +6,8 @@ from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.db.transaction import atomic
 
-from lib.util import get_elasticsearch_connection
+from lib.util import (INDEX_GROUP_DOCUMENTS, get_elasticsearch_connection,
+                      get_index_alias)
 
 es = get_elasticsearch_connection(host=settings.ELASTICSEARCH_ENDPOINT)
 
@@ -43,7 +44,7 @@ class Command(BaseCommand):
             self.stderr.write("Error: The blob already has that field value set.")
             sys.exit(1)
 
-        self.set_content_type(uuid, field, value)
+        self.set_value(uuid, field, value)
 
     def get_current_value(self, uuid, field):
 
@@ -60,18 +61,12 @@ class Command(BaseCommand):
 
         return self.es.search(index=settings.ELASTICSEARCH_INDEX, body=search_object)["hits"]["hits"][0]["_source"][field]
 
-    def set_content_type(self, uuid, field, value):
+    def set_value(self, uuid, field, value):
 
-        request_body = {
-            "query": {
-                "term": {
-                    "uuid": uuid
-                }
-            },
-            "script": {
-                "source": f"ctx._source.{field}='{value}'",
-                "lang": "painless"
-            }
-        }
-
-        return self.es.update_by_query(index=settings.ELASTICSEARCH_INDEX, body=request_body)
+        # Use a partial update rather than a scripted update_by_query,
+        #  which avoids interpolating the value into a script
+        return self.es.update(
+            index=get_index_alias(settings.ELASTICSEARCH_INDEX, group=INDEX_GROUP_DOCUMENTS),
+            id=uuid,
+            body={"doc": {field: value}}
+        )
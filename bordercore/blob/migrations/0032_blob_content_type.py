@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blob", "0031_alter_blob_bc_objects"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="blob",
+            name="content_type",
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_user(apps, schema_editor):
+
+    RecentlyViewedBlob = apps.get_model("blob", "RecentlyViewedBlob")
+
+    for recently_viewed in RecentlyViewedBlob.objects.select_related("blob", "node"):
+        owner = recently_viewed.blob or recently_viewed.node
+        recently_viewed.user_id = owner.user_id
+        recently_viewed.save(update_fields=["user"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("node", "0010_alter_nodetodo_unique_together_and_more"),
+        ("blob", "0032_blob_content_type"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recentlyviewedblob",
+            name="user",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.RunPython(populate_user, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="recentlyviewedblob",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="recentlyviewedblob",
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name="recentlyviewedblob",
+            constraint=models.UniqueConstraint(
+                fields=("user", "blob", "node"),
+                name="recentlyviewedblob_unique_object",
+                nulls_distinct=False,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recentlyviewedblob",
+            index=models.Index(
+                fields=["user", "-modified"],
+                name="recentlyviewedblob_user_idx",
+            ),
+        ),
+    ]
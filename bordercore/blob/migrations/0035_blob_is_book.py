@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-19 22:15
+
+from django.db import migrations, models
+
+
+def populate_is_book(apps, schema_editor):
+
+    Blob = apps.get_model("blob", "Blob")
+
+    Blob.objects.filter(metadata__name="is_book").update(is_book=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blob", "0034_relationsummary"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="blob",
+            name="is_book",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(populate_is_book, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="blob",
+            index=models.Index(
+                condition=models.Q(("is_book", True)),
+                fields=["user", "-modified"],
+                name="blob_book_user_idx",
+            ),
+        ),
+    ]
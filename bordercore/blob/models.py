@@ -3,6 +3,7 @@ import hashlib
 import io
 import json
 import logging
+import mimetypes
 import re
 import uuid
 from collections import defaultdict
@@ -20,15 +21,18 @@ from django.apps import apps
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
-from django.db.models import Count, JSONField, Model, Q
-from django.db.models.signals import pre_delete
+from django.db.models import Count, JSONField, Model, Q, Subquery
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
 from django.dispatch import receiver
 from django.forms import ValidationError
 from django.urls import reverse
 
 from bookmark.models import Bookmark
-from collection.models import CollectionObject
+from collection.models import Collection, CollectionObject
+from lib.jobs import enqueue
 from lib.mixins import SortOrderMixin, TimeStampedModel
 from lib.time_utils import get_date_from_pattern
 from lib.util import (get_elasticsearch_connection, is_audio, is_image, is_pdf,
@@ -87,8 +91,11 @@ class Blob(TimeStampedModel):
     date = models.TextField(null=True)
     importance = models.IntegerField(default=1)
     is_note = models.BooleanField(default=False)
+    # Denormalized from the "is_book" metadata, kept in sync by a signal receiver
+    is_book = models.BooleanField(default=False)
     is_indexed = models.BooleanField(default=True)
     math_support = models.BooleanField(default=False)
+    content_type = models.CharField(max_length=100, blank=True, null=True)
     data = JSONField(null=True, blank=True)
     bc_objects = models.ManyToManyField("blob.BCObject", through="blob.BlobToObject", through_fields=("node", "bc_object"))
 
@@ -96,6 +103,13 @@ class Blob(TimeStampedModel):
         unique_together = (
             ("sha1sum", "user")
         )
+        indexes = [
+            models.Index(
+                fields=("user", "-modified"),
+                condition=Q(is_book=True),
+                name="blob_book_user_idx"
+            )
+        ]
 
     def __str__(self):
         return self.name or ""
@@ -127,6 +141,18 @@ class Blob(TimeStampedModel):
 
         return switcher.get(argument, "")
 
+    def get_content_type_humanized(self):
+        """
+        Return the blob's humanized content type. This is stored locally by
+        the indexer; for blobs that haven't been re-indexed since, fall back
+        to guessing based on the filename.
+        """
+        content_type = self.content_type
+        if not content_type and self.file:
+            content_type, _ = mimetypes.guess_type(str(self.file))
+
+        return Blob.get_content_type(content_type)
+
     @staticmethod
     def get_duration_humanized(duration):
         duration = str(datetime.timedelta(seconds=int(duration)))
@@ -171,7 +197,7 @@ class Blob(TimeStampedModel):
     def doctype(self):
         if self.is_note is True:
             return "note"
-        if "is_book" in [x.name for x in self.metadata.all()]:
+        if self.is_book:
             return "book"
         if is_image(self.file):
             return "image"
@@ -224,7 +250,7 @@ class Blob(TimeStampedModel):
         query = {
             "query": {
                 "bool": {
-                    "must": [
+                    "filter": [
                         {
                             "term": {
                                 "uuid": self.uuid
@@ -472,14 +498,19 @@ class Blob(TimeStampedModel):
 
         QuestionToObject = apps.get_model("drill", "QuestionToObject")
 
-        blob_to_objects = BlobToObject.objects.filter(Q(blob__uuid=uuid) | Q(bookmark__uuid=uuid)).select_related("node")
-        question_to_objects = QuestionToObject.objects.filter(Q(blob__uuid=uuid) | Q(bookmark__uuid=uuid)).select_related("node")
+        blob_to_objects = BlobToObject.objects.filter(
+            Q(blob__uuid=uuid) | Q(bookmark__uuid=uuid)
+        ).select_related("node").prefetch_related("node__tags")
+        question_to_objects = QuestionToObject.objects.filter(
+            Q(blob__uuid=uuid) | Q(bookmark__uuid=uuid)
+        ).select_related("node").prefetch_related("node__tags")
 
         if blob_to_objects:
             back_references.extend(
                 [
                     {
                         "type": "blob",
+                        "uuid": str(x.node.uuid),
                         "name": x.node.name,
                         "cover_url": x.node.get_cover_url(),
                         "tags": [tag.name for tag in x.node.tags.all()],
@@ -493,6 +524,7 @@ class Blob(TimeStampedModel):
                 [
                     {
                         "type": "question",
+                        "uuid": str(x.node.uuid),
                         "question": x.node.question,
                         "tags": [tag.name for tag in x.node.tags.all()],
                         "url": reverse("drill:detail", args=[x.node.uuid]),
@@ -507,19 +539,13 @@ class Blob(TimeStampedModel):
 
         Node = apps.get_model("node", "Node")
 
-        node_list = []
-
-        for node in Node.objects.filter(user=self.user):
-            if str(self.uuid) in [
-                    val["uuid"]
-                    for sublist in node.layout
-                    for val in sublist
-                    if "uuid" in val
-                    and val["type"] in ["collection", "note"]
-            ]:
-                node_list.append(node)
-
-        return node_list
+        return list(
+            Node.objects.filter(
+                Q(layout__contains=[[{"type": "note", "uuid": str(self.uuid)}]])
+                | Q(layout__contains=[[{"type": "collection", "uuid": str(self.uuid)}]]),
+                user=self.user
+            )
+        )
 
     def is_image(self):
         return is_image(self.file)
@@ -537,28 +563,7 @@ class Blob(TimeStampedModel):
         return self in self.user.userprofile.pinned_notes.all()
 
     def get_collections(self):
-        collection_list = []
-
-        for x in CollectionObject.objects.filter(
-                blob=self,
-                collection__user=self.user
-        ).annotate(
-            num_objects=Count("collection__collectionobject")
-        ).prefetch_related(
-            "collection"
-        ):
-            collection_list.append(
-                {
-                    "name": x.collection.name,
-                    "uuid": x.collection.uuid,
-                    "url": x.collection.get_absolute_url(),
-                    "num_objects": x.num_objects,
-                    "cover_url": x.collection.cover_url,
-                    "note": x.note
-                }
-            )
-
-        return collection_list
+        return get_collection_list(self)
 
     def get_date(self):
         return get_date_from_pattern({"gte": self.date})
@@ -572,7 +577,6 @@ class Blob(TimeStampedModel):
     def get_cover_url_static(blob_uuid, filename, size="large"):
 
         prefix = settings.COVER_URL + f"blobs/{blob_uuid}"
-        s3_key = Blob.get_s3_key(blob_uuid, quote_plus(filename))
 
         if size != "large":
             url = f"{prefix}/cover.jpg"
@@ -580,7 +584,7 @@ class Blob(TimeStampedModel):
             # Is the blob itself an image?
             if is_image(filename):
                 # For the large version, use the image itself
-                url = f"{settings.MEDIA_URL}{s3_key}"
+                url = f"{settings.MEDIA_URL}{Blob.get_s3_key(blob_uuid, quote_plus(filename))}"
             else:
                 url = f"{prefix}/cover-{size}.jpg"
 
@@ -737,27 +741,7 @@ class Blob(TimeStampedModel):
         triggered once it's written to S3 to do the indexing
         """
 
-        client = boto3.client("sns")
-
-        message = {
-            "Records": [
-                {
-                    "s3": {
-                        "bucket": {
-                            "name": settings.AWS_STORAGE_BUCKET_NAME
-                        },
-                        "uuid": str(self.uuid),
-                        "file_changed": file_changed,
-                        "new_blob": new_blob
-                    }
-                }
-            ]
-        }
-
-        client.publish(
-            TopicArn=settings.INDEX_BLOB_TOPIC_ARN,
-            Message=json.dumps(message),
-        )
+        enqueue("index_blob", self.uuid, file_changed=file_changed, new_blob=new_blob)
 
     def tree(self):
         return defaultdict(self.tree)
@@ -899,40 +883,75 @@ class MetaData(TimeStampedModel):
 
 
 class RecentlyViewedBlob(TimeStampedModel):
+    """
+    A per-user ring buffer of recently viewed blobs and nodes. Each view is
+    written with a single upsert, after which the buffer is trimmed to
+    MAX_SIZE. Repeated views are debounced through the cache.
+    """
     uuid = models.UUIDField(default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
     blob = models.ForeignKey(Blob, null=True, on_delete=models.CASCADE)
     node = models.ForeignKey("node.Node", null=True, on_delete=models.CASCADE)
 
     MAX_SIZE = 20
 
+    # Repeated views of the same object within this window aren't recorded
+    DEBOUNCE_SECONDS = 60
+
     def __str__(self):
         return self.blob.name or self.node.name or ""
 
     class Meta:
-        unique_together = (
-            ("blob", "node")
-        )
+        constraints = [
+            models.UniqueConstraint(
+                fields=("user", "blob", "node"),
+                nulls_distinct=False,
+                name="recentlyviewedblob_unique_object"
+            )
+        ]
+        indexes = [
+            models.Index(fields=("user", "-modified"), name="recentlyviewedblob_user_idx")
+        ]
 
     @staticmethod
     def add(user, blob=None, node=None):
+        """
+        Record a view. Views of objects already in the user's list only
+        have their timestamp bumped, moving them to the top.
+        """
 
-        # Delete any previous rows containing this object to avoid duplicates
-        RecentlyViewedBlob.objects.filter(blob=blob, node=None).delete()
-        RecentlyViewedBlob.objects.filter(node=node, blob=None).delete()
+        viewed_object = blob or node
+        if not cache.add(f"recently_viewed_{user.id}_{viewed_object.uuid}", True, RecentlyViewedBlob.DEBOUNCE_SECONDS):
+            return
 
-        RecentlyViewedBlob.objects.create(blob=blob, node=node)
+        RecentlyViewedBlob.objects.bulk_create(
+            [RecentlyViewedBlob(user=user, blob=blob, node=node)],
+            update_conflicts=True,
+            unique_fields=["user", "blob", "node"],
+            update_fields=["modified"]
+        )
 
-        # Insure that only MAX_SIZE blobs exist per user
-        objects = RecentlyViewedBlob.objects.filter(
-            Q(blob__user=user) | Q(node__user=user)
-        ).only(
-            "id"
+        RecentlyViewedBlob.trim(user.id)
+
+    @staticmethod
+    def trim(user_id):
+        """
+        Insure that only MAX_SIZE objects exist per user
+        """
+
+        newest = RecentlyViewedBlob.objects.filter(
+            user_id=user_id
         ).order_by(
-            "-created"
-        )[RecentlyViewedBlob.MAX_SIZE:]
+            "-modified"
+        ).values(
+            "id"
+        )[:RecentlyViewedBlob.MAX_SIZE]
 
-        if objects:
-            RecentlyViewedBlob.objects.filter(id__in=[x.id for x in objects]).delete()
+        RecentlyViewedBlob.objects.filter(
+            user_id=user_id
+        ).exclude(
+            id__in=Subquery(newest)
+        ).delete()
 
 
 class BlobToObject(SortOrderMixin):
@@ -978,6 +997,159 @@ class BlobTemplate(TimeStampedModel):
         return self.name
 
 
+class RelationSummary(models.Model):
+    """
+    A denormalized summary of the objects related to a blob or bookmark:
+    the collections containing it, the blobs and questions referring to it,
+    and the nodes containing it. Detail pages read this one row rather than
+    running the queries needed to find them. Signal receivers delete any
+    summaries affected by a change, and they're rebuilt when next read.
+    """
+    uuid = models.UUIDField(unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    collections = JSONField(default=list, encoder=DjangoJSONEncoder)
+    back_references = JSONField(default=list, encoder=DjangoJSONEncoder)
+    nodes = JSONField(default=list, encoder=DjangoJSONEncoder)
+
+    def __str__(self):
+        return str(self.uuid)
+
+    @staticmethod
+    def get(obj):
+        """
+        Return the summary for a blob or bookmark, building it if needed.
+        """
+
+        summary = RelationSummary.objects.filter(uuid=obj.uuid).first()
+        if summary:
+            return summary
+
+        if isinstance(obj, Blob):
+            nodes = [
+                {
+                    "name": x.name,
+                    "url": reverse("node:detail", kwargs={"uuid": x.uuid}),
+                    "uuid": x.uuid
+                }
+                for x in obj.get_nodes()
+            ]
+        else:
+            nodes = obj.related_nodes()
+
+        summary, _ = RelationSummary.objects.update_or_create(
+            uuid=obj.uuid,
+            defaults={
+                "user": obj.user,
+                "collections": get_collection_list(obj),
+                "back_references": Blob.back_references(obj.uuid),
+                "nodes": nodes
+            }
+        )
+        return summary
+
+    @staticmethod
+    def invalidate(uuids=(), collections=(), references=(), nodes=()):
+        """
+        Delete the summaries of the given blobs and bookmarks, along with
+        those including any of the given collections, referring objects
+        or nodes.
+        """
+
+        query = Q(uuid__in=[x for x in uuids if x])
+        for collection_uuid in collections:
+            query |= Q(collections__contains=[{"uuid": str(collection_uuid)}])
+        for reference_uuid in references:
+            query |= Q(back_references__contains=[{"uuid": str(reference_uuid)}])
+        for node_uuid in nodes:
+            query |= Q(nodes__contains=[{"uuid": str(node_uuid)}])
+
+        RelationSummary.objects.filter(query).delete()
+
+
+def get_collection_list(obj):
+    """
+    Return the collections containing a blob or bookmark, each
+    with a count of the objects in it.
+    """
+
+    return [
+        {
+            "name": x.collection.name,
+            "uuid": x.collection.uuid,
+            "url": x.collection.get_absolute_url(),
+            "num_objects": x.num_objects,
+            "cover_url": x.collection.cover_url,
+            "note": x.note
+        }
+        for x in CollectionObject.objects.filter(
+            **{obj._meta.model_name: obj},
+            collection__user=obj.user
+        ).annotate(
+            num_objects=Count("collection__collectionobject")
+        ).select_related(
+            "collection"
+        )
+    ]
+
+
 @receiver(pre_delete, sender=BlobToObject)
 def remove_relationship(sender, instance, **kwargs):
     instance.handle_delete()
+
+
+@receiver([post_save, post_delete], sender=BlobToObject)
+def blob_to_object_changed(sender, instance, **kwargs):
+    RelationSummary.invalidate(
+        uuids=[
+            instance.blob.uuid if instance.blob_id else None,
+            instance.bookmark.uuid if instance.bookmark_id else None
+        ]
+    )
+
+
+@receiver([post_save, post_delete], sender=CollectionObject)
+def collection_object_changed(sender, instance, **kwargs):
+    # The collection's object count has changed, so the summaries of
+    #  every object in it are affected, not just this one's.
+    RelationSummary.invalidate(
+        uuids=[
+            instance.blob.uuid if instance.blob_id else None,
+            instance.bookmark.uuid if instance.bookmark_id else None
+        ],
+        collections=[instance.collection.uuid] if instance.collection_id else []
+    )
+
+
+@receiver([post_save, post_delete], sender=Collection)
+def collection_changed(sender, instance, **kwargs):
+    RelationSummary.invalidate(collections=[instance.uuid])
+
+
+@receiver(post_save, sender=Blob)
+def blob_changed(sender, instance, **kwargs):
+    RelationSummary.invalidate(references=[instance.uuid])
+
+
+@receiver(post_delete, sender=Blob)
+@receiver(post_delete, sender=Bookmark)
+def object_deleted(sender, instance, **kwargs):
+    RelationSummary.invalidate(uuids=[instance.uuid], references=[instance.uuid])
+
+
+@receiver(m2m_changed, sender=Blob.tags.through)
+def blob_tags_changed(sender, instance, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear") and isinstance(instance, Blob):
+        RelationSummary.invalidate(references=[instance.uuid])
+
+
+@receiver([post_save, post_delete], sender=MetaData)
+def metadata_changed(sender, instance, signal, **kwargs):
+    if instance.name != "is_book":
+        return
+
+    is_book = signal is post_save
+    Blob.objects.filter(pk=instance.blob_id).update(is_book=is_book)
+
+    # Keep any instance the caller is holding in sync, too
+    if MetaData.blob.is_cached(instance):
+        instance.blob.is_book = is_book
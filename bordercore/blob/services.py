@@ -1,9 +1,9 @@
 import datetime
 import hashlib
-import itertools
 import json
 import os
 import re
+import time
 import urllib.request
 from collections import defaultdict
 from pathlib import Path
@@ -11,10 +11,8 @@ from urllib.parse import urlparse
 
 import humanize
 import instaloader
-import openai
 import requests
 from instaloader import Post
-from openai import OpenAI
 
 from django.conf import settings
 from django.contrib.auth.models import User
@@ -28,8 +26,15 @@ from django.utils import timezone
 from blob.models import Blob, MetaData, RecentlyViewedBlob
 from drill.models import Question
 from fitness.models import Exercise
+from lib.chat import (CHAT_CONTEXT_TOKENS, CHAT_MODEL, count_tokens,
+                      get_chat_backend, timed_stream, truncate_tokens)
 from lib.util import get_elasticsearch_connection, is_image, is_pdf, is_video
-from search.services import semantic_search
+from search.services import get_relevant_chunks, semantic_search
+
+BOOKSHELF_PAGE_SIZE = 24
+
+# The most tags listed on the bookshelf
+BOOKSHELF_TAG_COUNT = 50
 
 
 def get_recent_blobs(user, limit=10, skip_content=False):
@@ -148,15 +153,15 @@ def get_recently_viewed(user):
     """
 
     objects = RecentlyViewedBlob.objects.filter(
-        Q(blob__user=user) | Q(node__user=user)
+        user=user
     ).order_by(
-        "-created"
+        "-modified"
     ).select_related(
         "blob",
         "node"
     ).prefetch_related(
         "blob__metadata"
-    )
+    )[:RecentlyViewedBlob.MAX_SIZE]
 
     object_list = []
     for x in objects:
@@ -184,14 +189,21 @@ def get_recently_viewed(user):
     return object_list
 
 
-def get_books(user, tag=None, search=None):
+def get_books(user, tag=None, search=None, page=1):
+    """
+    Return a page of the user's books, most recently modified first,
+    optionally filtered by tag or a search term. The first page also
+    includes aggregations with the user's book count and tag counts,
+    computed in the same query. Since the tag and search filters are
+    applied as a post_filter, these always cover all the user's books.
+    """
 
     es = get_elasticsearch_connection(host=settings.ELASTICSEARCH_ENDPOINT)
 
     search_object = {
         "query": {
             "bool": {
-                "must": [
+                "filter": [
                     {
                         "term": {
                             "user_id": user.id
@@ -208,8 +220,8 @@ def get_books(user, tag=None, search=None):
         "sort": [
             {"last_modified": {"order": "desc"}}
         ],
-        "from": 0,
-        "size": 10,
+        "from": (page - 1) * BOOKSHELF_PAGE_SIZE,
+        "size": BOOKSHELF_PAGE_SIZE,
         "_source": [
             "date",
             "date_unixtime",
@@ -223,18 +235,34 @@ def get_books(user, tag=None, search=None):
         ]
     }
 
+    if page == 1:
+        search_object["aggs"] = {
+            "Book Count": {
+                "value_count": {
+                    "field": "uuid"
+                }
+            },
+            "Tag Filter": {
+                "terms": {
+                    "field": "tags.keyword",
+                    "size": BOOKSHELF_TAG_COUNT
+                }
+            }
+        }
+
+    post_filter = []
+
     if tag:
-        search_object["query"]["bool"]["must"].append(
+        post_filter.append(
             {
                 "term": {
                     "tags.keyword": tag
                 }
             }
         )
-        search_object["size"] = 1000
 
     if search:
-        search_object["query"]["bool"]["must"].append(
+        post_filter.append(
             {
                 "multi_match": {
                     "query": search,
@@ -247,7 +275,13 @@ def get_books(user, tag=None, search=None):
                 }
             }
         )
-        search_object["size"] = 1000
+
+    if post_filter:
+        search_object["post_filter"] = {
+            "bool": {
+                "filter": post_filter
+            }
+        }
 
     return es.search(index=settings.ELASTICSEARCH_INDEX, body=search_object)
 
@@ -567,15 +601,53 @@ def import_newyorktimes(user, url):
     return blob
 
 
-def chatbot(request, args):
+def get_best_note(request, prompt):
+    """
+    Return the note most relevant to a prompt as a single chunk, truncated
+    to fit the token budget, for when no chunks are found, eg since notes
+    embedded before chunking was added have none until populate-embeddings
+    is run with --all.
+    """
+
+    results = semantic_search(request, prompt)
+    if not results or not results["hits"]["hits"]:
+        return []
+
+    note = results["hits"]["hits"][0]["_source"]
+    return [
+        {
+            "text": truncate_tokens(note.get("contents", "")),
+            "name": note.get("name"),
+            "uuid": note["uuid"],
+        }
+    ]
+
+
+def chatbot(request, args, backend=None):
+    """
+    Stream a chatbot's response. Rather than including whole notes in the
+    prompt, which for large ones can overflow the model's context, only
+    their chunks most relevant to the question are included, up to a
+    token budget. The time to the first token is logged.
+    """
+
+    start = time.monotonic()
+
+    if backend is None:
+        backend = get_chat_backend()
 
-    openai.api_key = os.environ.get("OPENAI_API_KEY")
-    model = "gpt-4.1"
     messages = None
-    added_values = []
+    sources = []
 
     if "blob_uuid" in args:
-        blob_content = Blob.objects.get(uuid=args["blob_uuid"]).content
+        blob = Blob.objects.get(uuid=args["blob_uuid"], user=request.user)
+        blob_content = blob.content or ""
+        if count_tokens(blob_content) > CHAT_CONTEXT_TOKENS:
+            chunks = get_relevant_chunks(request.user, args["content"], blob_uuid=blob.uuid)
+            if chunks:
+                blob_content = "\n\n...\n\n".join(x["text"] for x in chunks)
+            else:
+                blob_content = truncate_tokens(blob_content)
         messages = [
             {
                 "role": "user",
@@ -602,8 +674,8 @@ def chatbot(request, args):
     elif args["mode"] == "notes":
         chat_history = json.loads(args["chat_history"])
         prompt = chat_history[-1]['content']
-        results = semantic_search(request, prompt)["hits"]["hits"][0]["_source"]
-        text = results["contents"]
+        chunks = get_relevant_chunks(request.user, prompt) or get_best_note(request, prompt)
+        text = "\n\n".join(x["text"] for x in chunks)
         messages = [
             {
                 "role": "user",
@@ -611,29 +683,19 @@ def chatbot(request, args):
             }
         ]
 
-        added_values.append(
-            {
-                "choices": [
-                    {
-                        "delta": {
-                            "content": f"\n\n\nSource: [{results['name'] or 'No title'}]({reverse('blob:detail', kwargs={'uuid': results['uuid']})})"
-                        }
-                    }
-                ]
-            }
-        )
+        for chunk in chunks:
+            source = f"[{chunk['name'] or 'No title'}]({reverse('blob:detail', kwargs={'uuid': chunk['uuid']})})"
+            if source not in sources:
+                sources.append(source)
     else:
         chat_history = json.loads(args["chat_history"])
         messages = [{k: v for k, v in d.items() if k != "id"} for d in chat_history]
 
-    client = OpenAI()
-
-    response = client.chat.completions.create(
-        model=model,
-        messages=messages,
-        stream=True
+    yield from timed_stream(
+        backend.stream(messages, model=CHAT_MODEL),
+        label=f"chatbot {args.get('mode', '')}".strip(),
+        start=start
     )
 
-    for chunk in itertools.chain(response, added_values):
-        if chunk.choices[0].delta.content:
-            yield chunk.choices[0].delta.content
+    if sources:
+        yield f"\n\n\n{'Source' if len(sources) == 1 else 'Sources'}: {', '.join(sources)}"
@@ -0,0 +1,306 @@
+"""
+Sync blobs between S3 and a local filesystem.
+
+Rather than checking each blob individually, a manifest of each side is
+built once, from a bucket listing and a walk of the filesystem, and the
+two are diffed in memory. Only the difference is transferred, concurrently,
+using boto3's TransferManager.
+
+The state of every blob after it's synced is persisted in a manifest file.
+Since S3 listings don't include user metadata, this is where a blob's
+"file-modified" time is remembered between runs, and it lets changes
+on either side since the last sync be detected without a request per blob.
+"""
+
+import json
+import logging
+import mimetypes
+import os
+import threading
+from pathlib import PurePath
+
+from boto3.s3.transfer import TransferConfig, create_transfer_manager
+from botocore.exceptions import ClientError
+from s3transfer.subscribers import BaseSubscriber
+
+from blob.models import ILLEGAL_FILENAMES
+
+log = logging.getLogger(f"bordercore.{__name__}")
+
+S3_PREFIX = "blobs/"
+BLOB_DIR = "/home/media"
+MANIFEST_PATH = f"{BLOB_DIR}/.blob-sync-manifest.json"
+
+
+def is_blob_key(key):
+    return PurePath(key).name not in ILLEGAL_FILENAMES
+
+
+def get_s3_manifest(s3_client, bucket_name, prefix=S3_PREFIX):
+    """
+    Return a dict of every blob in S3, keyed on its S3 key.
+    """
+
+    manifest = {}
+
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            if is_blob_key(obj["Key"]):
+                manifest[obj["Key"]] = {
+                    "size": obj["Size"],
+                    "etag": obj["ETag"].strip('"')
+                }
+
+    return manifest
+
+
+def get_filesystem_manifest(blob_dir=BLOB_DIR, prefix=S3_PREFIX):
+    """
+    Return a dict of every blob on the filesystem, keyed on its S3 key.
+    """
+
+    manifest = {}
+    dirs = [f"{blob_dir}/{prefix.rstrip('/')}"]
+
+    while dirs:
+        try:
+            entries = os.scandir(dirs.pop())
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.path)
+                elif entry.is_file(follow_symlinks=False) and entry.name not in ILLEGAL_FILENAMES:
+                    info = entry.stat()
+                    manifest[os.path.relpath(entry.path, blob_dir)] = {
+                        "size": info.st_size,
+                        "mtime": int(info.st_mtime)
+                    }
+
+    return manifest
+
+
+def load_manifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_manifest(path, manifest):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+def get_keys_to_download(s3_manifest, filesystem_manifest, synced):
+    """
+    A blob needs downloading if it's missing from the filesystem, if the
+    sizes differ, or if it's changed in S3 since it was last synced.
+    """
+
+    keys = []
+
+    for key, remote in s3_manifest.items():
+        local = filesystem_manifest.get(key)
+        if local is None \
+           or local["size"] != remote["size"] \
+           or (key in synced and synced[key].get("etag") not in (None, remote["etag"])):
+            keys.append(key)
+
+    return keys
+
+
+def get_keys_to_upload(filesystem_manifest, s3_manifest, synced, get_remote_mtime):
+    """
+    A blob needs uploading if it's missing from S3, or if it's been modified
+    on the filesystem more recently than the copy in S3. A local change is
+    one made since the blob was last synced or, for blobs never synced, a
+    difference in size. The copy in S3 is only known to be older if it's
+    unchanged since the last sync, otherwise its "file-modified" time is
+    fetched with get_remote_mtime(), which returns None if it's missing.
+    Blobs which can't be shown to be newer locally are never uploaded.
+    """
+
+    keys = []
+
+    for key, local in filesystem_manifest.items():
+        remote = s3_manifest.get(key)
+        if remote is None:
+            keys.append(key)
+            continue
+
+        state = synced.get(key)
+        if state is None:
+            changed = local["size"] != remote["size"]
+        else:
+            changed = state.get("mtime") is not None and local["mtime"] > state["mtime"]
+        if not changed:
+            continue
+
+        if state is not None and state.get("etag") == remote["etag"]:
+            keys.append(key)
+        else:
+            remote_mtime = get_remote_mtime(key)
+            if remote_mtime is not None and local["mtime"] > remote_mtime:
+                keys.append(key)
+
+    return keys
+
+
+class SyncSubscriber(BaseSubscriber):
+    """
+    Called by the TransferManager when a transfer finishes.
+    """
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def on_done(self, future, **kwargs):
+        try:
+            future.result()
+        except Exception as e:
+            self.callback(future.meta.call_args, e)
+        else:
+            self.callback(future.meta.call_args, None)
+
+
+class BlobSync:
+
+    def __init__(
+            self,
+            s3_client,
+            bucket_name,
+            blob_dir=BLOB_DIR,
+            manifest_path=MANIFEST_PATH,
+            max_concurrency=10,
+            max_bandwidth=None,
+            report=log.info
+    ):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.blob_dir = blob_dir
+        self.manifest_path = manifest_path
+        self.report = report
+        self.config = TransferConfig(max_concurrency=max_concurrency, max_bandwidth=max_bandwidth)
+        self.synced = load_manifest(manifest_path) if manifest_path else {}
+        self.lock = threading.Lock()
+        self.stats = {"transferred": 0, "bytes": 0, "failed": 0}
+
+    def get_manifests(self):
+        return (
+            get_s3_manifest(self.s3_client, self.bucket_name),
+            get_filesystem_manifest(self.blob_dir)
+        )
+
+    def get_remote_mtime(self, key):
+        """
+        Return a blob's "file-modified" time from its S3 metadata
+        """
+
+        response = self.s3_client.head_object(Bucket=self.bucket_name, Key=key)
+        try:
+            return int(response["Metadata"]["file-modified"])
+        except (KeyError, ValueError):
+            return None
+
+    def record(self, key, entry, error):
+        with self.lock:
+            if error:
+                self.stats["failed"] += 1
+                self.report(f"{key} Error: {error}")
+            else:
+                self.stats["transferred"] += 1
+                self.stats["bytes"] += entry["size"]
+                self.synced[key] = entry
+
+    def download(self, keys, s3_manifest):
+
+        def on_done(call_args, error):
+            key = call_args.key
+            entry = {**s3_manifest[key], "mtime": None}
+            if not error:
+                # The file's modification time is stored as S3 user metadata,
+                #  which isn't included in the listing
+                try:
+                    response = self.s3_client.head_object(Bucket=self.bucket_name, Key=key)
+                    entry["mtime"] = int(response["Metadata"]["file-modified"])
+                    os.utime(call_args.fileobj, (entry["mtime"], entry["mtime"]))
+                except (KeyError, ValueError):
+                    self.report(f"{key} Warning: file-modified metadata not found in S3")
+            self.record(key, entry, error)
+
+        with create_transfer_manager(self.s3_client, self.config) as manager:
+            for key in keys:
+                self.report(f"Downloading {key}")
+                file_path = f"{self.blob_dir}/{key}"
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                manager.download(
+                    self.bucket_name,
+                    key,
+                    file_path,
+                    subscribers=[SyncSubscriber(on_done)]
+                )
+
+        self.save()
+
+    def upload(self, keys, filesystem_manifest):
+
+        def on_done(call_args, error):
+            key = call_args.key
+            entry = {**filesystem_manifest[key], "etag": None}
+            if not error:
+                # The upload's etag isn't returned by the TransferManager, but
+                #  is needed to detect later changes in S3
+                try:
+                    response = self.s3_client.head_object(Bucket=self.bucket_name, Key=key)
+                    entry["etag"] = response["ETag"].strip('"')
+                except ClientError as e:
+                    self.report(f"{key} Warning: etag not found in S3: {e}")
+            self.record(key, entry, error)
+
+        with create_transfer_manager(self.s3_client, self.config) as manager:
+            for key in keys:
+                self.report(f"Uploading {key}")
+                extra_args = {
+                    "Metadata": {
+                        "file-modified": str(filesystem_manifest[key]["mtime"])
+                    }
+                }
+                content_type, _ = mimetypes.guess_type(key)
+                if content_type:
+                    extra_args["ContentType"] = content_type
+                manager.upload(
+                    f"{self.blob_dir}/{key}",
+                    self.bucket_name,
+                    key,
+                    extra_args=extra_args,
+                    subscribers=[SyncSubscriber(on_done)]
+                )
+
+        self.save()
+
+    def delete_local(self, keys):
+
+        for key in keys:
+            file_path = f"{self.blob_dir}/{key}"
+            self.report(f"Deleting file: {file_path}")
+            os.remove(file_path)
+            self.synced.pop(key, None)
+
+            # If the directory is now empty, delete it.
+            # It won't be empty if the blob was renamed.
+            dir_path = os.path.dirname(file_path)
+            if not os.listdir(dir_path):
+                self.report(f"Deleting dir: {dir_path}")
+                os.rmdir(dir_path)
+
+        self.save()
+
+    def save(self):
+        if self.manifest_path:
+            save_manifest(self.manifest_path, self.synced)
@@ -6,7 +6,8 @@ from api.serializers import BlobSerializer, BlobSha1sumSerializer
 from blob.elasticsearch_indexer import (get_blob_info, get_doctype,
                                         get_num_pages, get_range_from_date,
                                         get_unixtime_from_string,
-                                        is_ingestible_file)
+                                        is_ingestible_file, needs_embeddings)
+from lib.util import get_content_hash
 
 
 def test_is_ingestible_file():
@@ -82,3 +83,13 @@ def test_get_range_from_date():
 def test_get_num_pages(blob_pdf_factory):
 
     assert get_num_pages(blob_pdf_factory[0].file.read()) == 2
+
+
+def test_needs_embeddings():
+
+    blob_info = {"uuid": "uuid", "content": "Some content"}
+
+    assert needs_embeddings(blob_info, {}) is True
+    assert needs_embeddings(blob_info, {"embeddings_hash": get_content_hash("Old content")}) is True
+    assert needs_embeddings(blob_info, {"embeddings_hash": get_content_hash("Some content")}) is False
+    assert needs_embeddings({"uuid": "uuid", "content": ""}, {}) is False
@@ -0,0 +1,86 @@
+from unittest.mock import MagicMock, patch
+
+import django
+
+django.setup()
+
+from blob.embeddings import run_embeddings  # isort:skip
+from lib.embeddings import FakeEmbeddingBackend  # isort:skip
+from lib.util import get_content_hash  # isort:skip
+
+
+def get_hit(uuid, contents, embeddings_hash=None, doctype="blob"):
+    source = {"uuid": uuid, "contents": contents, "doctype": doctype}
+    if embeddings_hash:
+        source["embeddings_hash"] = embeddings_hash
+    return {
+        "_index": "bordercore",
+        "_id": uuid,
+        "_source": source,
+        "sort": [uuid]
+    }
+
+
+@patch("blob.embeddings.helpers.bulk")
+def test_run_embeddings(mock_bulk):
+
+    mock_bulk.side_effect = lambda es, actions, **kwargs: (len(actions), [])
+
+    es = MagicMock()
+    es.open_point_in_time.return_value = {"id": "pit"}
+    es.search.side_effect = [
+        {
+            "pit_id": "pit",
+            "hits": {
+                "hits": [
+                    get_hit("a", "foo"),
+                    get_hit("b", "bar", get_content_hash("bar")),
+                    get_hit("c", "baz", get_content_hash("old baz")),
+                    get_hit("d", "qux", get_content_hash("qux"), doctype="note"),
+                ]
+            }
+        },
+        {"pit_id": "pit", "hits": {"hits": []}},
+    ]
+
+    backend = MagicMock(wraps=FakeEmbeddingBackend())
+
+    stats = run_embeddings(es, "bordercore", backend=backend, all_blobs=True, report=lambda x: None)
+
+    assert stats["found"] == 4
+    assert stats["embedded"] == 3
+    assert stats["skipped"] == 1
+    assert stats["failed"] == 0
+
+    # Blobs whose contents haven't changed aren't embedded, unless
+    #  they're notes without chunks. The rest are embedded together,
+    #  with one request for notes' chunks and one for other blobs.
+    assert backend.embed.call_count == 2
+
+    actions = mock_bulk.call_args.args[1]
+    assert [x["_id"] for x in actions] == ["a", "c", "d"]
+    assert actions[2]["doc"]["chunks"]
+    assert actions[1]["doc"]["embeddings_hash"] == get_content_hash("baz")
+    assert len(actions[1]["doc"]["embeddings_vector"]) == 1536
+
+
+@patch("blob.embeddings.helpers.bulk")
+def test_run_embeddings_dry_run(mock_bulk):
+
+    es = MagicMock()
+    es.open_point_in_time.return_value = {"id": "pit"}
+    es.search.side_effect = [
+        {"pit_id": "pit", "hits": {"hits": [get_hit("a", "foo"), get_hit("b", "bar")]}},
+        {"pit_id": "pit", "hits": {"hits": []}},
+    ]
+
+    backend = MagicMock(wraps=FakeEmbeddingBackend())
+
+    stats = run_embeddings(es, "bordercore", backend=backend, dry_run=True, report=lambda x: None)
+
+    assert stats["embedded"] == 2
+    assert es.search.call_args_list[0].kwargs["body"]["query"]["bool"]["must_not"] == [
+        {"exists": {"field": "embeddings_vector"}}
+    ]
+    backend.embed.assert_not_called()
+    mock_bulk.assert_not_called()
@@ -10,13 +10,16 @@ from faker import Factory as FakerFactory
 
 import django
 from django.conf import settings
+from django.core.cache import cache
 from django.db import IntegrityError
+from django.test import override_settings
 
 from collection.models import Collection
 
 django.setup()
 
-from blob.models import Blob, BlobToObject, RecentlyViewedBlob  # isort:skip
+from blob.models import (Blob, BlobToObject, RecentlyViewedBlob,  # isort:skip
+                         RelationSummary)
 from blob.tests.factories import BlobFactory
 from drill.tests.factories import QuestionFactory
 from node.tests.factories import NodeFactory
@@ -124,6 +127,17 @@ def test_get_content_type():
     assert Blob.get_content_type("text/css") == ""
 
 
+def test_get_content_type_humanized():
+
+    blob = Blob(file="image.jpg")
+
+    # Without a stored content type, fall back to guessing by filename
+    assert blob.get_content_type_humanized() == "Image"
+
+    blob.content_type = "video/mp4"
+    assert blob.get_content_type_humanized() == "Video"
+
+
 def test_get_parent_dir(blob_image_factory):
     parent_dir = blob_image_factory[0].get_parent_dir()
     assert parent_dir == f"blobs/{blob_image_factory[0].uuid}"
@@ -202,6 +216,27 @@ def test_get_collections(collection, blob_pdf_factory):
     assert "To Display" in [x["name"] for x in blob_pdf_factory[0].get_collections()]
 
 
+def test_relation_summary(collection, blob_pdf_factory, blob_image_factory):
+
+    blob = blob_pdf_factory[0]
+
+    summary = RelationSummary.get(blob)
+    assert sorted(x["name"] for x in summary.collections) == sorted(x["name"] for x in blob.get_collections())
+    assert RelationSummary.get(blob).pk == summary.pk
+
+    # Adding an object to one of the blob's collections changes its
+    #  count, so the summary is rebuilt
+    collection[1].add_object(blob_image_factory[0])
+    assert not RelationSummary.objects.filter(uuid=blob.uuid).exists()
+    assert [
+        x["num_objects"] for x in RelationSummary.get(blob).collections if x["name"] == "To Display"
+    ] == [2]
+
+    # So is adding a back reference
+    BlobToObject.objects.create(node=blob_image_factory[0], blob=blob)
+    assert [x["uuid"] for x in RelationSummary.get(blob).back_references] == [str(blob_image_factory[0].uuid)]
+
+
 def test_get_linked_blobs(blob_pdf_factory):
     assert len(blob_pdf_factory[0].get_collections()) == 0
 
@@ -367,9 +402,9 @@ def test_recently_viewed_blob_add(auto_login_user):
     node_1 = NodeFactory.create(user=user)
 
     RecentlyViewedBlob.add(user=user, blob=blob_1)
-
     assert RecentlyViewedBlob.objects.all().count() == 1
     assert RecentlyViewedBlob.objects.all().first().blob == blob_1
+    assert RecentlyViewedBlob.objects.all().first().user == user
 
     RecentlyViewedBlob.add(user=user, blob=blob_2)
     assert RecentlyViewedBlob.objects.all().count() == 2
@@ -384,3 +419,38 @@ def test_recently_viewed_blob_add(auto_login_user):
     # Dupe check
     RecentlyViewedBlob.add(user=user, node=node_1)
     assert RecentlyViewedBlob.objects.all().count() == 3
+
+    # Viewing an object again moves it to the top
+    RecentlyViewedBlob.add(user=user, blob=blob_1)
+    assert RecentlyViewedBlob.objects.filter(user=user).order_by("-modified").first().blob == blob_1
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+def test_recently_viewed_blob_add_debounce(auto_login_user):
+
+    user, _ = auto_login_user()
+
+    blob_1 = BlobFactory.create(user=user)
+    blob_2 = BlobFactory.create(user=user)
+
+    RecentlyViewedBlob.add(user=user, blob=blob_1)
+    RecentlyViewedBlob.add(user=user, blob=blob_2)
+
+    # Viewing an object again within the debounce window isn't recorded
+    RecentlyViewedBlob.add(user=user, blob=blob_1)
+    assert RecentlyViewedBlob.objects.filter(user=user).order_by("-modified").first().blob == blob_2
+
+    # Once the window has passed, it's moved to the top
+    cache.delete(f"recently_viewed_{user.id}_{blob_1.uuid}")
+    RecentlyViewedBlob.add(user=user, blob=blob_1)
+    assert RecentlyViewedBlob.objects.filter(user=user).order_by("-modified").first().blob == blob_1
+
+
+def test_recently_viewed_blob_trim(auto_login_user):
+
+    user, _ = auto_login_user()
+
+    for _ in range(RecentlyViewedBlob.MAX_SIZE + 2):
+        RecentlyViewedBlob.add(user=user, blob=BlobFactory.create(user=user))
+
+    assert RecentlyViewedBlob.objects.filter(user=user).count() == RecentlyViewedBlob.MAX_SIZE
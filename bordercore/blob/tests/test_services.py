@@ -9,10 +9,11 @@ from faker import Factory as FakerFactory
 from instaloader.instaloader import Instaloader
 
 from blob.models import Blob
-from blob.services import (get_authors, get_blob_naturalsize, get_recent_blobs,
-                           get_recent_media, import_artstation,
-                           import_instagram, import_newyorktimes, parse_date,
-                           parse_shortcode)
+from blob.services import (chatbot, get_authors, get_blob_naturalsize,
+                           get_recent_blobs, get_recent_media,
+                           import_artstation, import_instagram,
+                           import_newyorktimes, parse_date, parse_shortcode)
+from lib.chat import FakeChatBackend
 
 faker = FakerFactory.create()
 
@@ -282,3 +283,42 @@ def test_parse_date():
     assert parse_date("2021-08-15 23:40:56") == "2021-08-15"
     assert parse_date("2021-11-15T15:56:23.875-06:00") == "2021-11-15"
     assert parse_date("January 1, 2022") == "January 1, 2022"
+
+
+@patch("blob.services.semantic_search")
+@patch("blob.services.get_relevant_chunks")
+def test_chatbot(mock_get_relevant_chunks, mock_semantic_search, auto_login_user):
+
+    user, _ = auto_login_user()
+    request = Mock(user=user)
+
+    # Chat history is passed to the model as is
+    args = {
+        "mode": "chat",
+        "chat_history": '[{"id": 1, "role": "user", "content": "Hello there"}]'
+    }
+    assert "".join(chatbot(request, args, backend=FakeChatBackend())) == "You said: Hello there"
+
+    # In notes mode, the most relevant chunks are included in the
+    #  prompt and their notes are cited
+    mock_get_relevant_chunks.return_value = [
+        {"text": "Some relevant text", "tokens": 3, "score": 2, "name": "Note", "uuid": str(uuid.uuid4())},
+    ]
+    args = {
+        "mode": "notes",
+        "chat_history": '[{"id": 1, "role": "user", "content": "A question"}]'
+    }
+    response = "".join(chatbot(request, args, backend=FakeChatBackend()))
+    assert "Some relevant text" in response
+    assert "Source: [Note]" in response
+    mock_get_relevant_chunks.assert_called_once_with(user, "A question")
+    mock_semantic_search.assert_not_called()
+
+    # Notes without chunks fall back to the single most relevant note
+    mock_get_relevant_chunks.return_value = []
+    mock_semantic_search.return_value = {
+        "hits": {"hits": [{"_source": {"contents": "The whole note", "name": "Old Note", "uuid": str(uuid.uuid4())}}]}
+    }
+    response = "".join(chatbot(request, args, backend=FakeChatBackend()))
+    assert "The whole note" in response
+    assert "Source: [Old Note]" in response
@@ -0,0 +1,160 @@
+import os
+from contextlib import contextmanager
+from unittest.mock import MagicMock, patch
+
+import django
+
+django.setup()
+
+from blob.sync import (BlobSync, get_filesystem_manifest,  # isort:skip
+                       get_keys_to_download, get_keys_to_upload,
+                       get_s3_manifest, load_manifest, save_manifest)
+
+
+def test_get_s3_manifest():
+
+    s3_client = MagicMock()
+    s3_client.get_paginator.return_value.paginate.return_value = [
+        {
+            "Contents": [
+                {"Key": "blobs/abc/foo.pdf", "Size": 10, "ETag": '"etag1"'},
+                {"Key": "blobs/abc/cover.jpg", "Size": 5, "ETag": '"etag2"'},
+            ]
+        },
+        {}
+    ]
+
+    assert get_s3_manifest(s3_client, "bucket") == {
+        "blobs/abc/foo.pdf": {"size": 10, "etag": "etag1"}
+    }
+
+
+def test_get_filesystem_manifest(tmp_path):
+
+    os.makedirs(tmp_path / "blobs" / "abc")
+    (tmp_path / "blobs" / "abc" / "foo.pdf").write_bytes(b"1234")
+    (tmp_path / "blobs" / "abc" / "cover.jpg").write_bytes(b"12")
+    os.utime(tmp_path / "blobs" / "abc" / "foo.pdf", (1000, 1000))
+
+    assert get_filesystem_manifest(str(tmp_path)) == {
+        "blobs/abc/foo.pdf": {"size": 4, "mtime": 1000}
+    }
+
+
+def test_get_keys_to_download():
+
+    s3_manifest = {
+        "blobs/a/missing.pdf": {"size": 1, "etag": "1"},
+        "blobs/b/resized.pdf": {"size": 2, "etag": "2"},
+        "blobs/c/changed.pdf": {"size": 3, "etag": "new"},
+        "blobs/d/unchanged.pdf": {"size": 4, "etag": "4"},
+    }
+    filesystem_manifest = {
+        "blobs/b/resized.pdf": {"size": 20, "mtime": 1},
+        "blobs/c/changed.pdf": {"size": 3, "mtime": 1},
+        "blobs/d/unchanged.pdf": {"size": 4, "mtime": 1},
+    }
+    synced = {
+        "blobs/c/changed.pdf": {"size": 3, "etag": "old", "mtime": 1},
+        "blobs/d/unchanged.pdf": {"size": 4, "etag": "4", "mtime": 1},
+    }
+
+    assert get_keys_to_download(s3_manifest, filesystem_manifest, synced) == [
+        "blobs/a/missing.pdf",
+        "blobs/b/resized.pdf",
+        "blobs/c/changed.pdf",
+    ]
+
+
+def test_get_keys_to_upload():
+
+    filesystem_manifest = {
+        "blobs/a/missing.pdf": {"size": 1, "mtime": 1},
+        "blobs/b/changed.pdf": {"size": 2, "mtime": 200},
+        "blobs/c/unchanged.pdf": {"size": 3, "mtime": 300},
+        "blobs/d/resized.pdf": {"size": 40, "mtime": 400},
+        "blobs/e/unsynced.pdf": {"size": 50, "mtime": 500},
+    }
+    s3_manifest = {
+        "blobs/b/changed.pdf": {"size": 2, "etag": "2"},
+        "blobs/c/unchanged.pdf": {"size": 3, "etag": "3"},
+        "blobs/d/resized.pdf": {"size": 4, "etag": "4"},
+        "blobs/e/unsynced.pdf": {"size": 5, "etag": "5"},
+    }
+    synced = {
+        "blobs/b/changed.pdf": {"size": 2, "etag": "2", "mtime": 100},
+        "blobs/c/unchanged.pdf": {"size": 3, "etag": "3", "mtime": 300},
+        "blobs/d/resized.pdf": {"size": 4, "etag": "4", "mtime": 400},
+    }
+    remote_mtimes = {"blobs/e/unsynced.pdf": 450}
+
+    assert get_keys_to_upload(filesystem_manifest, s3_manifest, synced, remote_mtimes.get) == [
+        "blobs/a/missing.pdf",
+        "blobs/b/changed.pdf",
+        "blobs/e/unsynced.pdf",
+    ]
+
+
+def test_get_keys_to_upload_s3_newer():
+
+    filesystem_manifest = {
+        "blobs/a/stale.pdf": {"size": 1, "mtime": 200},
+        "blobs/b/unsynced.pdf": {"size": 2, "mtime": 200},
+        "blobs/c/no_metadata.pdf": {"size": 3, "mtime": 200},
+    }
+    s3_manifest = {
+        "blobs/a/stale.pdf": {"size": 10, "etag": "new"},
+        "blobs/b/unsynced.pdf": {"size": 20, "etag": "2"},
+        "blobs/c/no_metadata.pdf": {"size": 30, "etag": "3"},
+    }
+    synced = {
+        # Changed locally since the last sync, but S3 has been changed too
+        "blobs/a/stale.pdf": {"size": 1, "etag": "old", "mtime": 100},
+    }
+    remote_mtimes = {
+        "blobs/a/stale.pdf": 300,
+        "blobs/b/unsynced.pdf": 300,
+    }
+
+    assert get_keys_to_upload(filesystem_manifest, s3_manifest, synced, remote_mtimes.get) == []
+
+
+def test_manifest_persistence(tmp_path):
+
+    path = str(tmp_path / "manifest.json")
+    assert load_manifest(path) == {}
+
+    manifest = {"blobs/a/foo.pdf": {"size": 1, "etag": "1", "mtime": 2}}
+    save_manifest(path, manifest)
+    assert load_manifest(path) == manifest
+
+
+@contextmanager
+def fake_transfer_manager(s3_client, config):
+    """
+    A TransferManager whose uploads finish at once, successfully
+    """
+
+    def upload(fileobj, bucket, key, extra_args=None, subscribers=None):
+        future = MagicMock()
+        future.meta.call_args.key = key
+        for subscriber in subscribers:
+            subscriber.on_done(future)
+
+    manager = MagicMock()
+    manager.upload.side_effect = upload
+    yield manager
+
+
+@patch("blob.sync.create_transfer_manager", fake_transfer_manager)
+def test_upload_records_etag():
+
+    s3_client = MagicMock()
+    s3_client.head_object.return_value = {"ETag": '"etag1"', "Metadata": {"file-modified": "2"}}
+
+    sync = BlobSync(s3_client, "bucket", blob_dir="/tmp", manifest_path=None, report=lambda x: None)
+    sync.upload(["blobs/a/foo.pdf"], {"blobs/a/foo.pdf": {"size": 1, "mtime": 2}})
+
+    # The etag is recorded, so that later changes in S3 are detected
+    assert sync.synced == {"blobs/a/foo.pdf": {"size": 1, "mtime": 2, "etag": "etag1"}}
+    assert sync.stats["transferred"] == 1
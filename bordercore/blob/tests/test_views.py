@@ -19,12 +19,12 @@ from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.db.models import signals
 
-from blob.models import Blob, BlobTemplate, BlobToObject, MetaData
+from blob.models import Blob, BlobTemplate, BlobToObject
+from blob.services import BOOKSHELF_PAGE_SIZE
 from blob.tests.factories import BlobFactory
 from blob.views import handle_linked_collection, handle_metadata
 from collection.models import Collection
 from collection.tests.factories import CollectionFactory
-from tag.tests.factories import TagFactory
 
 try:
     from bs4 import BeautifulSoup
@@ -316,6 +316,13 @@ def test_handle_metadata(auto_login_user, blob_text_factory, blob_image_factory)
     assert "Author" in [x.name for x in metadata]
     assert fake_name in [x.value for x in metadata]
     assert "is_book" in [x.name for x in metadata]
+    assert Blob.objects.get(pk=blob_image_factory[0].pk).is_book is True
+
+    request_mock.POST = {}
+
+    handle_metadata(blob_image_factory[0], request_mock)
+
+    assert Blob.objects.get(pk=blob_image_factory[0].pk).is_book is False
 
 
 def test_handle_linked_collection(monkeypatch_collection, auto_login_user, blob_image_factory):
@@ -599,17 +606,28 @@ def test_bookshelf_list(mock_get_es, auto_login_user):
                 },
             ]
         },
-        "aggregations": {"Doctype Filter": {"buckets": []}}
+        "aggregations": {
+            "Book Count": {"value": 1},
+            "Tag Filter": {"buckets": [{"key": "django", "doc_count": 1}]}
+        }
     }
     mock_get_es.return_value = mock_es
 
-    book = BlobFactory.create(user=user)
-    _ = MetaData.objects.create(blob=book, user=user, name="is_book", value="true")
-    tag = TagFactory(user=user)
-    book.tags.add(tag)
-
     url = urls.reverse("blob:bookshelf")
     resp = client.get(url)
 
     assert resp.status_code == 200
     assert resp.context["total_count"] == 1
+    assert resp.context["tag_list"] == [{"name": "django", "count": 1}]
+    assert resp.context["has_more"] is False
+
+    url = urls.reverse("blob:bookshelf_page")
+    resp = client.get(f"{url}?tag=django&page=2")
+
+    assert resp.status_code == 200
+    assert resp.json()["has_more"] is False
+
+    search_object = mock_es.search.call_args.kwargs["body"]
+    assert search_object["from"] == BOOKSHELF_PAGE_SIZE
+    assert search_object["post_filter"]["bool"]["filter"] == [{"term": {"tags.keyword": "django"}}]
+    assert "aggs" not in search_object
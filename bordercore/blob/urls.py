@@ -100,4 +100,9 @@ urlpatterns = [
         view=views.BookshelfListView.as_view(),
         name="bookshelf"
     ),
+    path(
+        route="bookshelf/page",
+        view=views.get_bookshelf_page,
+        name="bookshelf_page"
+    ),
 ]
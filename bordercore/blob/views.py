@@ -3,11 +3,14 @@ import json
 import logging
 from typing import Dict, Type
 
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+
 from django.apps import apps
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.db.models import Count, Model, Q
+from django.db.models import Model, Q
 from django.http import (HttpRequest, HttpResponseRedirect, JsonResponse,
                          StreamingHttpResponse)
 from django.shortcuts import render
@@ -20,8 +23,8 @@ from django.views.generic.list import ListView
 
 from blob.forms import BlobForm
 from blob.models import (Blob, BlobTemplate, BlobToObject, MetaData,
-                         RecentlyViewedBlob)
-from blob.services import chatbot, get_books, import_blob
+                         RecentlyViewedBlob, RelationSummary)
+from blob.services import BOOKSHELF_PAGE_SIZE, chatbot, get_books, import_blob
 from collection.models import Collection, CollectionObject
 from lib.mixins import FormRequestMixin
 from lib.time_utils import parse_date_from_string
@@ -207,9 +210,10 @@ class BlobDetailView(DetailView):
             if int(datetime.datetime.now().strftime("%s")) - int(self.object.created.strftime("%s")) > 60:
                 messages.add_message(self.request, messages.ERROR, "Blob not found in Elasticsearch")
 
-        context["back_references"] = Blob.back_references(self.object.uuid)
-        context["collection_list"] = self.object.get_collections()
-        context["node_list"] = self.object.get_nodes()
+        relations = RelationSummary.get(self.object)
+        context["back_references"] = relations.back_references
+        context["collection_list"] = relations.collections
+        context["node_list"] = relations.nodes
         context["title"] = self.object
 
         context["show_metadata"] = "content_type" in context \
@@ -242,7 +246,7 @@ class BlobUpdateView(FormRequestMixin, UpdateView, FormValidMixin):
             context["cover_url"] = self.object.get_cover_url()
 
         context["metadata"] = list(self.object.metadata.exclude(name="is_book").values())
-        context["is_book"] = self.object.metadata.filter(name="is_book").exists()
+        context["is_book"] = self.object.is_book
         context["collections_other"] = Collection.objects.filter(
             Q(user=self.request.user)
             & ~Q(collectionobject__blob__uuid=self.object.uuid)
@@ -575,6 +579,27 @@ def update_page_number(request):
     return JsonResponse(response)
 
 
+@api_view(["PUT"])
+@permission_classes([IsAuthenticated])
+def update_content_type(request, blob_uuid):
+    """
+    Store a blob's content type, as determined by the indexer, so that
+    it can be read without consulting Elasticsearch. Only the owner of
+    the blob or the service user has access.
+    """
+
+    blobs = Blob.objects.filter(uuid=blob_uuid)
+    if request.user.username != "service_user":
+        blobs = blobs.filter(user=request.user)
+
+    # Use update() rather than save() to avoid re-indexing the blob
+    updated = blobs.update(content_type=request.data.get("content_type"))
+    if not updated:
+        return JsonResponse({"status": "Error", "message": "Blob not found"}, status=404)
+
+    return JsonResponse({"status": "OK"})
+
+
 @login_required
 def get_template(request):
 
@@ -606,52 +631,80 @@ def chat(request):
     return StreamingHttpResponse(content_iterator, content_type="text/plain")
 
 
+def get_bookshelf_books(results):
+    return [
+        {
+            "cover_url": Blob.get_cover_url_static(src["uuid"], src["filename"], size="small"),
+            "date": src["date"],
+            "name": src["name"],
+            "tags": src["tags"],
+            "url": reverse("blob:detail", kwargs={"uuid": src["uuid"]}),
+            "uuid": src["uuid"]
+        }
+        for hit in results["hits"]["hits"]
+        for src in [hit["_source"]]
+    ]
+
+
+def bookshelf_has_more(results, page):
+    return page * BOOKSHELF_PAGE_SIZE < results["hits"]["total"]["value"]
+
+
 @method_decorator(login_required, name="dispatch")
 class BookshelfListView(ListView):
+    """
+    Show the first page of the user's books, along with their tag counts.
+    Subsequent pages are loaded on demand by get_bookshelf_page().
+    """
+
     template_name = "blob/bookshelf.html"
 
     def get_queryset(self):
-        book_list = get_books(
+        self.results = get_books(
             self.request.user,
             self.request.GET.get("tag", None),
             self.request.GET.get("search", None)
         )
 
-        self.tag_list = [
-            {
-                "name": hit["tags__name"],
-                "count": hit["tag_count"]
-            }
-            for hit in
-            Blob.objects.filter(
-                metadata__name="is_book"
-            ).values(
-                "tags__name"
-            ).annotate(
-                tag_count=Count("tags__name")
-            ).order_by(
-                "-tag_count"
-            )
-        ]
-
-        return [
-            {
-                "cover_url": Blob.get_cover_url_static(src["uuid"], src["filename"], size="small"),
-                "date": src["date"],
-                "name": src["name"],
-                "tags": src["tags"],
-                "url": reverse("blob:detail", kwargs={"uuid": src["uuid"]}),
-                "uuid": src["uuid"]
-            }
-            for hit in book_list["hits"]["hits"]
-            for src in [hit["_source"]]
-        ]
+        return get_bookshelf_books(self.results)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        aggregations = self.results["aggregations"]
         return {
             **context,
-            "tag_list": self.tag_list,
-            "total_count": Blob.objects.filter(user=self.request.user, metadata__name="is_book").count(),
+            "tag_list": [
+                {
+                    "name": bucket["key"],
+                    "count": bucket["doc_count"]
+                }
+                for bucket in aggregations["Tag Filter"]["buckets"]
+            ],
+            "total_count": aggregations["Book Count"]["value"],
+            "has_more": bookshelf_has_more(self.results, 1),
             "title": "Bookshelf"
         }
+
+
+@login_required
+def get_bookshelf_page(request):
+    """
+    Get a subsequent page of books for the bookshelf
+    """
+
+    page_number = int(request.GET.get("page", 2))
+
+    results = get_books(
+        request.user,
+        request.GET.get("tag", None),
+        request.GET.get("search", None),
+        page=page_number
+    )
+
+    return JsonResponse(
+        {
+            "status": "OK",
+            "books": get_bookshelf_books(results),
+            "has_more": bookshelf_has_more(results, page_number)
+        }
+    )
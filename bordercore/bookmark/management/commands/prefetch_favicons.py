@@ -0,0 +1,73 @@
+# Fetch the favicons for every bookmarked domain which needs one, many at
+#  a time, recording the results in the favicon registry. Domains known
+#  not to have a favicon are skipped until they're due to be checked again.
+
+import boto3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from bookmark.models import Bookmark, Favicon
+from lib.favicons import (FAVICON_MAX_WORKERS, STATUS_FOUND, STATUS_UNCHANGED,
+                          fetch_favicons, store_favicon)
+from lib.util import get_domain
+
+BATCH_SIZE = 100
+
+
+class Command(BaseCommand):
+    help = "Prefetch favicons for bookmarked domains"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=FAVICON_MAX_WORKERS,
+            help="The number of favicons to fetch at once"
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            help="Fetch favicons for at most this many domains"
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report the domains whose favicons would be fetched"
+        )
+
+    def handle(self, *args, workers, limit, dry_run, **kwargs):
+
+        domains = {
+            get_domain(url)
+            for url in Bookmark.objects.values_list("url", flat=True).distinct()
+        }
+        domains = Favicon.get_due(x for x in domains if x)[:limit]
+
+        self.stdout.write(f"{len(domains)} domains need favicons")
+        if dry_run:
+            for domain in domains:
+                self.stdout.write(domain)
+            return
+
+        s3_client = boto3.client("s3")
+        counts = {"found": 0, "unchanged": 0, "missing": 0}
+
+        for i in range(0, len(domains), BATCH_SIZE):
+            batch = domains[i:i + BATCH_SIZE]
+            etags = dict(Favicon.objects.filter(domain__in=batch).values_list("domain", "etag"))
+
+            for result in fetch_favicons(batch, etags=etags, max_workers=workers):
+                domain = result["domain"]
+                if result["status"] == STATUS_FOUND:
+                    store_favicon(s3_client, settings.AWS_STORAGE_BUCKET_NAME, result)
+                    Favicon.record(domain, STATUS_FOUND, result["etag"])
+                elif result["status"] == STATUS_UNCHANGED:
+                    Favicon.record(domain, STATUS_FOUND, etags[domain])
+                else:
+                    Favicon.record(domain, Favicon.STATUS_MISSING)
+                counts[result["status"]] += 1
+
+            self.stdout.write(
+                f"{counts['found']} found, {counts['unchanged']} unchanged, {counts['missing']} missing"
+            )
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookmark", "0010_bookmark_data"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Favicon",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("domain", models.TextField(unique=True)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("found", "Found"),
+                            ("missing", "Missing"),
+                        ],
+                        default="pending",
+                        max_length=10,
+                    ),
+                ),
+                ("etag", models.TextField(blank=True, default="")),
+                (
+                    "last_checked",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+            ],
+        ),
+    ]
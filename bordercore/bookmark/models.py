@@ -2,6 +2,7 @@ import json
 import logging
 import re
 import uuid
+from datetime import timedelta
 
 import boto3
 import isodate
@@ -13,11 +14,14 @@ from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.cache import cache
 from django.db import models
-from django.db.models import JSONField
+from django.db.models import JSONField, Q
 from django.db.models.signals import m2m_changed
+from django.utils import timezone
 
+from lib.jobs import enqueue
 from lib.mixins import TimeStampedModel
 from lib.time_utils import convert_seconds
+from lib.util import favicon_url, get_domain, get_index_alias
 from search.services import delete_document, index_document
 from tag.models import Tag, TagBookmark
 
@@ -208,7 +212,7 @@ class Bookmark(TimeStampedModel):
         """
 
         return {
-            "_index": settings.ELASTICSEARCH_INDEX,
+            "_index": get_index_alias(settings.ELASTICSEARCH_INDEX, "bookmark"),
             "_id": self.uuid,
             "_source": {
                 "bordercore_id": self.id,
@@ -221,6 +225,8 @@ class Bookmark(TimeStampedModel):
                 "doctype": "bookmark",
                 "date": {"gte": self.created.strftime("%Y-%m-%d %H:%M:%S"), "lte": self.created.strftime("%Y-%m-%d %H:%M:%S")},
                 "date_unixtime": self.created.strftime("%s"),
+                "date_display": self.created.strftime("%B %d, %Y"),
+                "last_modified_epoch": int(self.modified.timestamp()),
                 "user_id": self.user.id,
                 "uuid": self.uuid,
                 **settings.ELASTICSEARCH_EXTRA_FIELDS
@@ -228,43 +234,17 @@ class Bookmark(TimeStampedModel):
         }
 
     def snarf_favicon(self):
-
-        client = boto3.client("lambda")
-
-        payload = {
-            "url": self.url,
-            "parse_domain": True
-        }
-
-        client.invoke(
-            ClientContext="MyApp",
-            FunctionName="SnarfFavicon",
-            InvocationType="Event",
-            LogType="Tail",
-            Payload=json.dumps(payload)
-        )
+        domain = get_domain(self.url)
+        favicon = Favicon.claim_fetch(domain) if domain else None
+        if favicon:
+            enqueue("snarf_favicon", domain, etag=favicon.etag)
 
     def get_favicon_url(self, size=32):
         return Bookmark.get_favicon_url_static(self.url, size)
 
     @staticmethod
     def get_favicon_url_static(url, size=32):
-
-        if not url:
-            return ""
-
-        p = re.compile("https?://([^/]*)")
-
-        m = p.match(url)
-
-        if m:
-            domain = m.group(1)
-            parts = domain.split(".")
-            # We want the domain part of the hostname (eg npr.org instead of www.npr.org)
-            if len(parts) == 3:
-                domain = ".".join(parts[1:])
-            return f"<img src=\"https://www.bordercore.com/favicons/{domain}.ico\" width=\"{size}\" height=\"{size}\" />"
-        return ""
+        return favicon_url(url, size)
 
     def related_nodes(self):
         """
@@ -273,14 +253,11 @@ class Bookmark(TimeStampedModel):
 
         Node = apps.get_model("node", "Node")
 
-        found_nodes = set()
+        query = Q()
+        for collection_uuid in self.collectionobject_set.values_list("collection__uuid", flat=True):
+            query |= Q(layout__contains=[[{"uuid": str(collection_uuid)}]])
 
-        for so in self.collectionobject_set.all().select_related("collection"):
-            for node in Node.objects.filter(user=self.user):
-                for col in node.layout:
-                    found = [x for x in col if "uuid" in x and x["uuid"] == str(so.collection.uuid)]
-                    if found:
-                        found_nodes.add(node)
+        found_nodes = Node.objects.filter(query, user=self.user) if query else []
 
         return [
             {
@@ -293,6 +270,96 @@ class Bookmark(TimeStampedModel):
         ]
 
 
+class Favicon(models.Model):
+    """
+    The registry of favicons fetched for each domain, including those found
+    not to have one, so that domains aren't fetched again for every new
+    bookmark. Missing favicons are looked for again after a while, in case
+    the domain has since added one.
+    """
+
+    STATUS_PENDING = "pending"
+    STATUS_FOUND = "found"
+    STATUS_MISSING = "missing"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_FOUND, "Found"),
+        (STATUS_MISSING, "Missing"),
+    ]
+
+    # How long to wait before looking for a favicon again, by status.
+    #  A pending fetch is retried if no result is reported.
+    RECHECK_AFTER = {
+        STATUS_PENDING: timedelta(days=1),
+        STATUS_FOUND: timedelta(days=90),
+        STATUS_MISSING: timedelta(days=30),
+    }
+
+    domain = models.TextField(unique=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    etag = models.TextField(blank=True, default="")
+    last_checked = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.domain}: {self.status}"
+
+    @property
+    def is_due(self):
+        return timezone.now() - self.last_checked > Favicon.RECHECK_AFTER[self.status]
+
+    @staticmethod
+    def claim_fetch(domain):
+        """
+        If a domain's favicon should be fetched, record the fetch as pending,
+        so that concurrent requests don't fetch it too, and return its entry.
+        Otherwise return None.
+        """
+
+        favicon, created = Favicon.objects.get_or_create(domain=domain)
+        if created:
+            return favicon
+
+        if not favicon.is_due:
+            return None
+
+        # Only one request can claim the fetch
+        claimed = Favicon.objects.filter(
+            id=favicon.id,
+            last_checked=favicon.last_checked
+        ).update(
+            status=Favicon.STATUS_PENDING,
+            last_checked=timezone.now()
+        )
+        return favicon if claimed else None
+
+    @staticmethod
+    def get_due(domains):
+        """
+        Return those domains whose favicons should be fetched: those never
+        fetched and those whose last fetch is due to be checked again.
+        """
+
+        domains = set(domains)
+        known = {x.domain: x for x in Favicon.objects.filter(domain__in=domains)}
+        return sorted(
+            domain
+            for domain in domains
+            if domain not in known or known[domain].is_due
+        )
+
+    @staticmethod
+    def record(domain, status, etag=""):
+        """
+        Record the result of fetching a domain's favicon. A favicon which
+        hasn't changed since it was last fetched is still found.
+        """
+
+        defaults = {"status": status, "last_checked": timezone.now()}
+        if status == Favicon.STATUS_FOUND:
+            defaults["etag"] = etag
+        Favicon.objects.update_or_create(domain=domain, defaults=defaults)
+
+
 def tags_changed(sender, **kwargs):
 
     if kwargs["action"] == "post_add":
@@ -1,6 +1,10 @@
+from datetime import timedelta
+
 import pytest
 
-from bookmark.models import Bookmark
+from django.utils import timezone
+
+from bookmark.models import Bookmark, Favicon
 from bookmark.tests.factories import BookmarkFactory
 
 pytestmark = pytest.mark.django_db
@@ -52,6 +56,30 @@ def test_get_favicon_url(monkeypatch_bookmark):
     assert url == ""
 
 
+def test_favicon_claim_fetch():
+
+    # The first request for a domain claims its fetch
+    favicon = Favicon.claim_fetch("bordercore.com")
+    assert favicon.status == Favicon.STATUS_PENDING
+    assert Favicon.claim_fetch("bordercore.com") is None
+
+    # Domains without favicons aren't fetched again until they're due
+    Favicon.record("bordercore.com", Favicon.STATUS_MISSING)
+    assert Favicon.claim_fetch("bordercore.com") is None
+    assert Favicon.get_due(["bordercore.com", "npr.org"]) == ["npr.org"]
+
+    Favicon.objects.filter(domain="bordercore.com").update(
+        last_checked=timezone.now() - Favicon.RECHECK_AFTER[Favicon.STATUS_MISSING] - timedelta(days=1)
+    )
+    assert Favicon.get_due(["bordercore.com"]) == ["bordercore.com"]
+    assert Favicon.claim_fetch("bordercore.com") is not None
+
+    Favicon.record("bordercore.com", Favicon.STATUS_FOUND, "etag")
+    favicon = Favicon.objects.get(domain="bordercore.com")
+    assert favicon.status == Favicon.STATUS_FOUND
+    assert favicon.etag == "etag"
+
+
 def test_related_nodes(monkeypatch_bookmark, node):
 
     bookmark = BookmarkFactory(user=node.user)
@@ -5,6 +5,8 @@ from urllib.parse import unquote
 
 import lxml.html as lh
 import pytz
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
 
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
@@ -21,9 +23,9 @@ from django.views.generic import CreateView, DeleteView, ListView, UpdateView
 from django.views.generic.edit import ModelFormMixin
 
 from accounts.models import UserTag
-from blob.models import Blob
+from blob.models import RelationSummary
 from bookmark.forms import BookmarkForm
-from bookmark.models import Bookmark
+from bookmark.models import Bookmark, Favicon
 from lib.mixins import FormRequestMixin
 from lib.util import get_pagination_range, parse_title_from_url
 from tag.models import Tag, TagBookmark
@@ -88,8 +90,9 @@ class BookmarkUpdateView(FormRequestMixin, UpdateView, FormValidMixin):
         context = super().get_context_data(**kwargs)
         context["action"] = "Update"
         context["tags"] = [x.name for x in self.object.tags.all()]
-        context["back_references"] = Blob.back_references(self.object.uuid)
-        context["related_nodes"] = self.object.related_nodes()
+        relations = RelationSummary.get(self.object)
+        context["back_references"] = relations.back_references
+        context["related_nodes"] = relations.nodes
 
         return context
 
@@ -552,3 +555,23 @@ def remove_tag(request):
         }
 
     return JsonResponse(response)
+
+
+@api_view(["PUT"])
+@permission_classes([IsAuthenticated])
+def update_favicon(request, domain):
+    """
+    Record the result of fetching a domain's favicon, as reported by the
+    favicon lambda. Only the service user has access.
+    """
+
+    if request.user.username != "service_user":
+        return JsonResponse({"status": "Error", "message": "Permission denied"}, status=403)
+
+    status = request.data.get("status")
+    if status not in (Favicon.STATUS_FOUND, Favicon.STATUS_MISSING):
+        return JsonResponse({"status": "Error", "message": f"Invalid status: {status}"}, status=400)
+
+    Favicon.record(domain, status, request.data.get("etag", ""))
+
+    return JsonResponse({"status": "OK"})
@@ -1,8 +1,8 @@
 from __future__ import unicode_literals
 
 import datetime
-import json
 import logging
+import random
 import re
 import uuid
 
@@ -18,6 +18,7 @@ from django.dispatch import receiver
 from django.urls import reverse
 
 from lib.exceptions import DuplicateObjectError
+from lib.jobs import enqueue
 from lib.mixins import SortOrderMixin, TimeStampedModel
 from tag.models import Tag
 
@@ -95,40 +96,65 @@ class Collection(TimeStampedModel):
     def get_tags(self):
         return ", ".join([tag.name for tag in self.tags.all()])
 
-    def get_blob(self, position, direction, randomize=False, tag_name=None):
+    def get_blob(self, position, direction, randomize=False, tag_name=None, prefetch=0):
+        """
+        Return the blob at the position adjacent to `position` in the
+        given direction, wrapping around at either end. Navigation uses
+        a COUNT plus an OFFSET lookup rather than loading the whole
+        collection, and the blob's content type is read from the database
+        rather than Elasticsearch. If `prefetch` is non-zero, information
+        about the following blobs is included so that the caller can
+        advance through a slideshow without another round trip.
+        """
 
         so = CollectionObject.objects.filter(
-            collection=self
+            collection=self,
+            blob__isnull=False
         ).select_related(
             "blob"
-        ).select_related(
-            "blob__user"
         )
 
         if tag_name:
             so = so.filter(blob__tags__name=tag_name)
 
-        count = len(so)
+        count = so.count()
+        if count == 0:
+            return {}
 
         if randomize:
-            blob = so.order_by("?")[0]
-        else:
-            if direction == "next":
-                position = 0 if position == count - 1 else position + 1
-            elif direction == "previous":
-                position = count - 1 if position == 0 else position - 1
-            blob = so[position]
-
-        content_type = None
-        try:
-            content_type = blob.blob.get_elasticsearch_info()["content_type"]
-        except Exception:
-            log.warning("Can't get content type for uuid=%s", blob.blob.uuid)
+            position = random.randrange(count)
+        elif direction == "next":
+            position = 0 if position >= count - 1 else position + 1
+        elif direction == "previous":
+            position = count - 1 if position <= 0 else position - 1
+
+        # Fetch the current blob plus the next `prefetch` blobs in one query,
+        #  wrapping around to the start of the collection if necessary.
+        prefetch = 0 if randomize else min(prefetch, count - 1)
+        object_list = list(so[position:position + prefetch + 1])
+        if len(object_list) < prefetch + 1:
+            object_list.extend(so[:prefetch + 1 - len(object_list)])
+
+        blob_list = [
+            {
+                **Collection.get_slideshow_info(x.blob),
+                "index": (position + i) % count
+            }
+            for i, x in enumerate(object_list)
+        ]
 
         return {
-            "url": f"{settings.MEDIA_URL}blobs/{blob.blob.get_url()}",
-            "content_type": content_type,
-            "index": position
+            **blob_list[0],
+            "count": count,
+            "upcoming": blob_list[1:]
+        }
+
+    @staticmethod
+    def get_slideshow_info(blob):
+
+        return {
+            "url": f"{settings.MEDIA_URL}blobs/{blob.get_url()}",
+            "content_type": blob.get_content_type_humanized()
         }
 
     def get_object_list(self, request=None, limit=BLOB_COUNT_PER_PAGE, page_number=1, random_order=False):
@@ -191,26 +217,9 @@ class Collection(TimeStampedModel):
 
     def create_collection_thumbnail(self):
 
-        # Generate a fresh cover image for the collection
-        client = boto3.client("sns")
-
-        message = {
-            "Records": [
-                {
-                    "s3": {
-                        "bucket": {
-                            "name": settings.AWS_STORAGE_BUCKET_NAME,
-                        },
-                        "collection_uuid": str(self.uuid)
-                    }
-                }
-            ]
-        }
-
-        client.publish(
-            TopicArn=settings.CREATE_COLLECTION_THUMBNAIL_TOPIC_ARN,
-            Message=json.dumps(message),
-        )
+        # Generate a fresh cover image for the collection. Requests are
+        #  debounced, so adding many blobs at once creates just one.
+        enqueue("create_collection_thumbnail", self.uuid)
 
 
 class CollectionObject(SortOrderMixin):
@@ -44,6 +44,16 @@ def test_get_blob(collection):
 
     next_blob = collection[0].get_blob(-1, "next")
     assert next_blob["index"] == 0
+    assert next_blob["count"] == 2
+    assert next_blob["upcoming"] == []
+
+    # Navigation wraps around at either end
+    previous_blob = collection[0].get_blob(0, "previous")
+    assert previous_blob["index"] == 1
+
+    next_blob = collection[0].get_blob(0, "next", prefetch=5)
+    assert next_blob["index"] == 1
+    assert [x["index"] for x in next_blob["upcoming"]] == [0]
 
 
 def test_get_object_list(collection, blob_image_factory, blob_pdf_factory):
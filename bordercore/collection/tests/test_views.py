@@ -90,6 +90,13 @@ def test_get_blob(auto_login_user, collection):
 
     assert resp.status_code == 200
 
+    # Negative prefetch counts are ignored
+    resp = client.get(f"{url}?position=1&prefetch=-3")
+    assert resp.status_code == 200
+
+    resp = client.get(f"{url}?position=1&prefetch=foo")
+    assert resp.status_code == 400
+
 
 def test_create_collection(auto_login_user, collection):
 
@@ -27,6 +27,9 @@ from lib.mixins import FormRequestMixin
 from lib.util import parse_title_from_url
 from tag.models import Tag
 
+# The maximum number of upcoming blobs returned with each slideshow request
+MAX_SLIDESHOW_PREFETCH = 20
+
 
 @method_decorator(login_required, name="dispatch")
 class CollectionListView(FormRequestMixin, FormMixin, ListView):
@@ -176,8 +179,13 @@ def get_blob(request, collection_uuid):
     blob_position = int(request.GET.get("position", 0))
     tag_name = request.GET.get("tag", None)
     randomize = request.GET.get("randomize", "") == "true"
+    try:
+        prefetch = int(request.GET.get("prefetch", 0))
+    except ValueError:
+        return JsonResponse({"status": "ERROR", "message": "Prefetch must be an integer"}, status=400)
+    prefetch = max(0, min(prefetch, MAX_SLIDESHOW_PREFETCH))
 
-    return JsonResponse(collection.get_blob(blob_position, direction, randomize, tag_name))
+    return JsonResponse(collection.get_blob(blob_position, direction, randomize, tag_name, prefetch))
 
 
 @api_view(["GET"])
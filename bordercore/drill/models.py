@@ -5,15 +5,17 @@ from django.conf import settings
 from django.contrib.auth.models import User
 from django.db import models
 from django.db.models import F, Max, Q
-from django.db.models.signals import pre_delete
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
 from django.dispatch import receiver
 from django.template.defaultfilters import pluralize
 from django.urls import reverse
 from django.utils import timezone
 
-from blob.models import Blob
+from blob.models import Blob, RelationSummary
 from bookmark.models import Bookmark
 from lib.mixins import SortOrderMixin, TimeStampedModel
+from lib.util import get_index_alias
 from search.services import delete_document, index_document
 from tag.models import Tag
 
@@ -21,6 +23,9 @@ from .managers import DrillManager
 
 INTERVALS_DEFAULT = [1, 2, 3, 5, 8, 13, 21, 30]
 
+# The number of questions added to a study session's queue at a time
+STUDY_SESSION_BATCH_SIZE = 50
+
 
 class Question(TimeStampedModel):
     """
@@ -228,7 +233,7 @@ class Question(TimeStampedModel):
         Return a representation of the drill question suitable for indexing in Elasticsearch
         """
         doc = {
-            "_index": settings.ELASTICSEARCH_INDEX,
+            "_index": get_index_alias(settings.ELASTICSEARCH_INDEX, "drill"),
             "_id": self.uuid,
             "_source": {
                 "uuid": self.uuid,
@@ -241,6 +246,8 @@ class Question(TimeStampedModel):
                 "doctype": "drill",
                 "date": {"gte": self.created.strftime("%Y-%m-%d %H:%M:%S"), "lte": self.created.strftime("%Y-%m-%d %H:%M:%S")},
                 "date_unixtime": self.created.strftime("%s"),
+                "date_display": self.created.strftime("%B %d, %Y"),
+                "last_modified_epoch": int(self.modified.timestamp()),
                 "user_id": self.user.id,
                 **settings.ELASTICSEARCH_EXTRA_FIELDS
             }
@@ -252,10 +259,13 @@ class Question(TimeStampedModel):
         return doc
 
     @staticmethod
-    def start_study_session(user, session, study_type, filter="review", params=None):
+    def get_study_questions(user, study_type, filter="review", params=None):
+        """
+        Return the questions to be studied in a study session of the
+        given type, such as a tag's questions or favorites.
+        """
 
         params = params or {}
-        questions = []
 
         questions = Question.objects.filter(
             user=user,
@@ -263,11 +273,11 @@ class Question(TimeStampedModel):
         )
 
         if study_type == "favorites":
-            questions = Question.objects.filter(
+            questions = questions.filter(
                 is_favorite=True
             )
         elif study_type == "recent":
-            questions = Question.objects.filter(
+            questions = questions.filter(
                 created__gte=timezone.now() - timedelta(days=int(params["interval"]))
             )
         elif study_type == "tag":
@@ -276,7 +286,7 @@ class Question(TimeStampedModel):
                     tags__name=tag
                 )
         elif study_type == "keyword":
-            questions = Question.objects.filter(
+            questions = questions.filter(
                 Q(question__icontains=params["keyword"])
                 | Q(answer__icontains=params["keyword"]),
             )
@@ -288,30 +298,7 @@ class Question(TimeStampedModel):
             )
 
         drill_tags_muted = user.userprofile.drill_tags_muted.all()
-        questions = questions.exclude(tags__in=drill_tags_muted)
-
-        questions = questions.order_by("?").values("uuid")
-
-        if study_type == "random":
-            count = int(params["count"])
-            questions = questions[:count]
-
-        if questions:
-            session["drill_study_session"] = {
-                "type": study_type,
-                "current": str(questions[0]["uuid"]),
-                "list": [str(x["uuid"]) for x in questions],
-                "tag": params.get("tags", None),
-                "search_term": params
-            }
-            return session["drill_study_session"]["current"]
-        return None
-
-    @staticmethod
-    def get_study_session_progress(session):
-        if "drill_study_session" in session:
-            return session["drill_study_session"]["list"].index(session["drill_study_session"]["current"])
-        return 0
+        return questions.exclude(tags__in=drill_tags_muted)
 
     @staticmethod
     def get_tag_progress(user, tag):
@@ -351,6 +338,137 @@ class Question(TimeStampedModel):
         }
 
 
+class StudySession(TimeStampedModel):
+    """
+    A user's study session. Rather than every question being chosen up front,
+    the session's queue is filled in random batches as it's worked through,
+    with a cursor pointing to the current question. A user has at most one
+    session, which can be resumed from any device.
+    """
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="drill_study_session")
+    study_type = models.TextField()
+    filter = models.TextField(default="review")
+    params = models.JSONField(default=dict)
+    current = models.ForeignKey("drill.Question", null=True, on_delete=models.SET_NULL, related_name="+")
+    position = models.PositiveIntegerField(default=0)
+    completed = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user}: {self.study_type}"
+
+    @property
+    def tag(self):
+        return self.params.get("tags")
+
+    @property
+    def keyword(self):
+        return self.params.get("keyword")
+
+    @staticmethod
+    def start(user, study_type, filter="review", params=None):
+        """
+        Start a study session, replacing any the user already has. Return
+        the session, or None if there are no questions to study.
+        """
+
+        params = params or {}
+
+        total = Question.get_study_questions(user, study_type, filter, params).count()
+        if study_type == "random":
+            total = min(total, int(params["count"]))
+
+        StudySession.objects.filter(user=user).delete()
+
+        if total == 0:
+            return None
+
+        session = StudySession.objects.create(
+            user=user,
+            study_type=study_type,
+            filter=filter,
+            params=params,
+            total=total
+        )
+
+        entry = session.get_next_entry(-1)
+        session.current = entry.question
+        session.position = entry.position
+        session.save()
+
+        return session
+
+    def fill_queue(self):
+        """
+        Add the next random batch of questions to the queue, skipping any
+        already in it. Return the number of questions added.
+        """
+
+        last_position = self.queue.aggregate(last_position=Max("position"))["last_position"]
+        next_position = 0 if last_position is None else last_position + 1
+
+        questions = Question.get_study_questions(
+            self.user,
+            self.study_type,
+            self.filter,
+            self.params
+        ).exclude(
+            id__in=self.queue.values("question_id")
+        ).order_by("?").values_list("id", flat=True)[:min(STUDY_SESSION_BATCH_SIZE, self.total - next_position)]
+
+        entries = StudySessionQuestion.objects.bulk_create(
+            StudySessionQuestion(session=self, question_id=question_id, position=next_position + i)
+            for i, question_id in enumerate(questions)
+        )
+
+        return len(entries)
+
+    def get_next_entry(self, position):
+        """
+        Return the queue entry after the given position, filling
+        the queue if needed, or None if there are no more.
+        """
+
+        entry = self.queue.filter(position__gt=position).select_related("question").first()
+        if entry is None and self.fill_queue():
+            entry = self.queue.filter(position__gt=position).select_related("question").first()
+        return entry
+
+    def advance(self):
+        """
+        Move on to the next question, returning it, or end the
+        session and return None if there are none left.
+        """
+
+        self.completed += 1
+        entry = self.get_next_entry(self.position) if self.completed < self.total else None
+
+        if entry is None:
+            self.delete()
+            return None
+
+        self.current = entry.question
+        self.position = entry.position
+        self.save()
+
+        return entry.question
+
+
+class StudySessionQuestion(models.Model):
+    """
+    A question in a study session's queue
+    """
+
+    session = models.ForeignKey(StudySession, on_delete=models.CASCADE, related_name="queue")
+    question = models.ForeignKey("drill.Question", on_delete=models.CASCADE)
+    position = models.PositiveIntegerField()
+
+    class Meta:
+        ordering = ("position",)
+        unique_together = ("session", "position")
+
+
 class QuestionResponse(models.Model):
 
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
@@ -393,3 +511,24 @@ class BCObject(TimeStampedModel):
 @receiver(pre_delete, sender=QuestionToObject)
 def remove_relationship(sender, instance, **kwargs):
     instance.handle_delete()
+
+
+@receiver([post_save, post_delete], sender=QuestionToObject)
+def question_to_object_changed(sender, instance, **kwargs):
+    RelationSummary.invalidate(
+        uuids=[
+            instance.blob.uuid if instance.blob_id else None,
+            instance.bookmark.uuid if instance.bookmark_id else None
+        ]
+    )
+
+
+@receiver([post_save, post_delete], sender=Question)
+def question_changed(sender, instance, **kwargs):
+    RelationSummary.invalidate(references=[instance.uuid])
+
+
+@receiver(m2m_changed, sender=Question.tags.through)
+def question_tags_changed(sender, instance, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear") and isinstance(instance, Question):
+        RelationSummary.invalidate(references=[instance.uuid])
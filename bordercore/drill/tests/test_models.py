@@ -10,7 +10,7 @@ from blob.tests.factories import BlobFactory
 
 from .factories import QuestionFactory
 
-from drill.models import Question, QuestionToObject  # isort:skip
+from drill.models import Question, QuestionToObject, StudySession  # isort:skip
 
 pytestmark = pytest.mark.django_db
 
@@ -153,35 +153,68 @@ def test_add_related_object(auto_login_user, question):
     assert response == {"status": "Error", "message": "That object is already related"}
 
 
+def test_get_study_questions(question, tag):
+
+    user = question[0].user
+
+    questions = Question.get_study_questions(user, "favorites", "review")
+    assert {x.uuid for x in questions} == {question[2].uuid, question[3].uuid}
+
+    questions = Question.get_study_questions(user, "tag", "review", {"tags": tag[0].name})
+    assert [x.uuid for x in questions] == [question[0].uuid]
+
+    questions = Question.get_study_questions(user, "keyword", "review", {"keyword": question[0].question.split(" ")[0]})
+    assert question[0].uuid in [x.uuid for x in questions]
+
+
 def test_start_study_session(question, tag):
 
-    session = {}
-
-    current = Question.start_study_session(question[0].user, session, "favorites", "review")
-    assert current in [str(question[2].uuid), str(question[3].uuid)]
-    assert len(session["drill_study_session"]["list"]) == 2
-
-    current = Question.start_study_session(question[0].user, session, "tag", "review", {"tags": tag[0].name})
-    assert current in [str(x.uuid) for x in question]
-    assert len(session["drill_study_session"]["list"]) == 1
-    assert session["drill_study_session"]["tag"] == tag[0].name
-
-    current = Question.start_study_session(question[0].user, session, "learning", "review")
-    assert current in [str(x.uuid) for x in question]
-    assert len(session["drill_study_session"]["list"]) == 4
-
-    current = Question.start_study_session(question[0].user, session, "random", "review", {"count": 3})
-    assert current in [str(x.uuid) for x in question]
-    assert len(session["drill_study_session"]["list"]) == 3
-
-    first_word_of_question = question[0].question.split(" ")[0]
-    current = Question.start_study_session(question[0].user, session, "search", "review", {"keyword": first_word_of_question})
-    assert current in [str(x.uuid) for x in question]
-    assert len(session["drill_study_session"]["list"]) > 1
-    first_word_of_answer = question[0].question.split(" ")[0]
-    current = Question.start_study_session(question[0].user, session, "search", "review", {"keyword": first_word_of_answer})
-    assert current in [str(x.uuid) for x in question]
-    assert len(session["drill_study_session"]["list"]) > 1
+    user = question[0].user
+
+    session = StudySession.start(user, "favorites", "review")
+    assert session.current.uuid in [question[2].uuid, question[3].uuid]
+    assert session.total == 2
+
+    session = StudySession.start(user, "tag", "review", {"tags": tag[0].name})
+    assert session.current.uuid == question[0].uuid
+    assert session.total == 1
+    assert session.tag == tag[0].name
+
+    # Starting a session replaces the previous one
+    assert StudySession.objects.filter(user=user).count() == 1
+
+    session = StudySession.start(user, "learning", "review")
+    assert session.current.uuid in [x.uuid for x in question]
+    assert session.total == 4
+
+    session = StudySession.start(user, "random", "review", {"count": 3})
+    assert session.current.uuid in [x.uuid for x in question]
+    assert session.total == 3
+
+    assert StudySession.start(user, "keyword", "review", {"keyword": "No such keyword"}) is None
+    assert not StudySession.objects.filter(user=user).exists()
+
+
+def test_study_session_advance(monkeypatch, question):
+
+    # Fill the queue two questions at a time
+    monkeypatch.setattr("drill.models.STUDY_SESSION_BATCH_SIZE", 2)
+
+    session = StudySession.start(question[0].user, "learning", "review")
+    assert session.queue.count() == 2
+
+    studied = [session.current.uuid]
+    for completed in range(1, 4):
+        next_question = session.advance()
+        assert session.completed == completed
+        studied.append(next_question.uuid)
+
+    # Every question is studied once
+    assert sorted(studied) == sorted(x.uuid for x in question)
+    assert session.queue.count() == 4
+
+    assert session.advance() is None
+    assert not StudySession.objects.filter(user=question[0].user).exists()
 
 
 def test_get_tag_progress(question, tag):
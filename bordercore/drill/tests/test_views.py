@@ -7,7 +7,8 @@ import responses
 
 from django import urls
 
-from drill.models import Question, QuestionToObject
+from drill.models import (Question, QuestionToObject, StudySession,
+                          StudySessionQuestion)
 from drill.tests.factories import QuestionFactory
 from drill.views import handle_related_objects
 
@@ -131,18 +132,28 @@ def test_drill_start_study_session(auto_login_user, question):
     assert resp.status_code == 302
 
 
-def test_drill_study(auto_login_user, question):
+def create_study_session(user, questions, position=0):
 
-    _, client = auto_login_user()
+    session = StudySession.objects.create(
+        user=user,
+        study_type="random",
+        current=questions[position],
+        position=position,
+        completed=position,
+        total=len(questions)
+    )
+    StudySessionQuestion.objects.bulk_create(
+        StudySessionQuestion(session=session, question=x, position=i)
+        for i, x in enumerate(questions)
+    )
+    return session
 
-    session = client.session
 
-    session["drill_study_session"] = {
-        "type": "random",
-        "current": str(question[0].uuid),
-        "list": [str(x.uuid) for x in question]
-    }
-    session.save()
+def test_drill_study(auto_login_user, question):
+
+    user, client = auto_login_user()
+
+    create_study_session(user, question)
 
     url = urls.reverse(
         "drill:study"
@@ -151,48 +162,38 @@ def test_drill_study(auto_login_user, question):
     # Study the second question
     resp = client.get(url)
     assert resp.status_code == 302
-    session = client.session
-    assert session["drill_study_session"]["current"] == str(question[1].uuid)
+    assert StudySession.objects.get(user=user).current == question[1]
 
     # Study the third question
     resp = client.get(url)
     assert resp.status_code == 302
-    session = client.session
-    assert session["drill_study_session"]["current"] == str(question[2].uuid)
+    assert StudySession.objects.get(user=user).current == question[2]
 
     # Study the fourth question
     resp = client.get(url)
     assert resp.status_code == 302
-    session = client.session
-    assert session["drill_study_session"]["current"] == str(question[3].uuid)
+    assert StudySession.objects.get(user=user).current == question[3]
 
     # Verify that the study session is over, since we've exhausted all questions
     resp = client.get(url)
     assert resp.status_code == 302
-    session = client.session
-    assert "drill_study_session" not in session
+    assert not StudySession.objects.filter(user=user).exists()
 
 
 def test_drill_get_current_question(auto_login_user, question):
 
-    _, client = auto_login_user()
-
-    session = client.session
+    user, client = auto_login_user()
 
     # Create a study session of random questions and set
     #  the current question to the second one.
-    session["drill_study_session"] = {
-        "type": "random",
-        "current": str(question[1].uuid),
-        "list": [str(x.uuid) for x in question]
-    }
-    session.save()
+    create_study_session(user, question, position=1)
 
     url = urls.reverse(
         "drill:resume"
     )
     resp = client.get(url)
     assert resp.status_code == 302
+    assert resp.url == urls.reverse("drill:detail", kwargs={"uuid": question[1].uuid})
 
 
 def test_drill_record_response(auto_login_user, question):
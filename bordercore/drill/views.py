@@ -5,6 +5,7 @@ from urllib.parse import unquote
 from django import urls
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
 from django.http import HttpResponseRedirect, JsonResponse
 from django.shortcuts import redirect
 from django.urls import reverse, reverse_lazy
@@ -21,7 +22,7 @@ from lib.mixins import FormRequestMixin
 from lib.util import parse_title_from_url
 from tag.models import Tag
 
-from .models import Question
+from .models import Question, StudySession
 
 
 @method_decorator(login_required, name="dispatch")
@@ -41,7 +42,7 @@ class DrillListView(ListView):
             "random_tag": Question.objects.get_random_tag(self.request.user),
             "favorite_questions_progress": Question.objects.favorite_questions_progress(self.request.user),
             "total_progress": Question.objects.total_tag_progress(self.request.user),
-            "study_session_progress": Question.get_study_session_progress(self.request.session)
+            "study_session": StudySession.objects.filter(user=self.request.user).first()
         }
 
 
@@ -145,7 +146,7 @@ class QuestionDetailView(DetailView):
             "question": self.object,
             "title": "Drill :: Question Detail",
             "tag_list": ", ".join([x.name for x in self.object.tags.all()]),
-            "study_session_progress": Question.get_study_session_progress(self.request.session),
+            "study_session": StudySession.objects.filter(user=self.request.user).first(),
             "last_response": self.object.get_last_response(),
             "intervals": self.object.get_intervals(description_only=True),
             "reverse_question": random.randint(1, 2) == 1 if self.object.is_reversible else False,
@@ -199,31 +200,37 @@ class QuestionUpdateView(FormRequestMixin, UpdateView):
         return reverse("drill:list")
 
 
-@login_required
-def get_next_question(request):
+def advance_study_session(request):
+    """
+    Move the user's study session on to its next question and redirect
+    to it, or back to the drill list if the session is over.
+    """
 
-    if "drill_study_session" in request.session:
-        request.session.modified = True
+    study_session = StudySession.objects.select_for_update().filter(user=request.user).first()
+    if study_session is None:
+        return redirect("drill:list")
 
-        current_index = request.session["drill_study_session"]["list"].index(request.session["drill_study_session"]["current"])
-        if current_index + 1 == len(request.session["drill_study_session"]["list"]):
-            messages.add_message(request, messages.INFO, "Study session over.")
-            request.session.pop("drill_study_session")
-            return redirect("drill:list")
-        next_index = current_index + 1
-        next_question = request.session["drill_study_session"]["list"][next_index]
-        request.session["drill_study_session"]["current"] = next_question
-        return redirect("drill:detail", uuid=next_question)
+    next_question = study_session.advance()
+    if next_question is None:
+        messages.add_message(request, messages.INFO, "Study session over.")
+        return redirect("drill:list")
 
-    return redirect("drill:list")
+    return redirect("drill:detail", uuid=next_question.uuid)
+
+
+@login_required
+def get_next_question(request):
+
+    with transaction.atomic():
+        return advance_study_session(request)
 
 
 @login_required
 def get_current_question(request):
 
-    if "drill_study_session" in request.session:
-        current_question = request.session["drill_study_session"]["current"]
-        return redirect("drill:detail", uuid=current_question)
+    study_session = StudySession.objects.filter(user=request.user).first()
+    if study_session and study_session.current:
+        return redirect("drill:detail", uuid=study_session.current.uuid)
     return redirect("drill:list")
 
 
@@ -232,16 +239,15 @@ def start_study_session(request):
     """
     Start a study session
     """
-    first_question = Question.start_study_session(
+    study_session = StudySession.start(
         request.user,
-        request.session,
         request.GET["study_method"],
         request.GET.get("filter", "review"),
         {k: v for k, v in request.GET.items() if k in ["count", "interval", "keyword", "tags"]}
     )
 
-    if first_question:
-        return redirect("drill:detail", uuid=first_question)
+    if study_session:
+        return redirect("drill:detail", uuid=study_session.current.uuid)
 
     messages.add_message(
         request,
@@ -253,10 +259,12 @@ def start_study_session(request):
 @login_required
 def record_response(request, uuid, response):
 
-    question = Question.objects.get(user=request.user, uuid=uuid)
-    question.record_response(response)
+    # Record the response and move on to the next question together
+    with transaction.atomic():
+        question = Question.objects.get(user=request.user, uuid=uuid)
+        question.record_response(response)
 
-    return get_next_question(request)
+        return advance_study_session(request)
 
 
 @login_required
@@ -4,8 +4,10 @@
  * @param {string} url The url to request.
  * @param {string} callback An optional callback function.
  * @param {string} errorMsg The message to display on error.
+ * @param {string} responseType The type of data in the response.
+ * @param {string} errorCallback An optional function called on error.
  */
-export function doGet(url, callback, errorMsg = "", responseType = "json") {
+export function doGet(url, callback, errorMsg = "", responseType = "json", errorCallback = null) {
     axios.get(url, {responseType: responseType})
         .then((response) => {
             if (response.data.status && response.data.status !== "OK") {
@@ -19,6 +21,9 @@ export function doGet(url, callback, errorMsg = "", responseType = "json") {
                     },
                 );
                 console.log(errorMsg);
+                if (errorCallback) {
+                    errorCallback(response);
+                }
             } else {
                 return callback(response);
             }
@@ -34,6 +39,9 @@ export function doGet(url, callback, errorMsg = "", responseType = "json") {
                 },
             );
             console.error(error);
+            if (errorCallback) {
+                errorCallback(error);
+            }
         });
 }
 
@@ -124,9 +124,11 @@ def get_random_image(request, content_type=None):
             "function_score": {
                 "random_score": {
                 },
+                # Nothing is scored by the query, which only filters
+                "boost_mode": "replace",
                 "query": {
                     "bool": {
-                        "must": [
+                        "filter": [
                             {
                                 "wildcard": {
                                     "content_type": {
@@ -0,0 +1,360 @@
+"""
+A framework for backfilling a field on Elasticsearch documents which
+are missing it.
+
+Subclass Backfill, set the field to populate, and implement compute(),
+which is given each document's source and returns the new field value.
+Then pass an instance to run_backfill(), which
+
+  * finds every document missing the field with a single point in time
+    query, paging through the results with search_after
+  * computes values for each page of documents in a pool of processes
+  * writes the values for each page with one bulk request of partial updates
+  * optionally records its position in a checkpoint file after each page,
+    so that an interrupted run can be resumed where it left off
+  * optionally limits the rate at which documents are processed
+
+Management commands can subclass BackfillCommand, which provides the
+standard options for all of the above plus a dry run.
+"""
+
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from elasticsearch import helpers
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from lib.util import get_elasticsearch_connection
+
+log = logging.getLogger(f"bordercore.{__name__}")
+
+PAGE_SIZE = 500
+PIT_KEEP_ALIVE = "5m"
+
+
+class Backfill:
+    """
+    Populate a field on documents which are missing it. Instances are
+    pickled and sent to worker processes, so should only hold simple state.
+    """
+
+    # The field to populate
+    field = None
+
+    # The fields from each document's source passed to compute()
+    source = ["uuid", "sha1sum", "filename"]
+
+    def get_filter(self):
+        """
+        Return any additional filter clauses limiting which documents
+        are backfilled, eg by doctype or content type.
+        """
+        return []
+
+    def get_query(self):
+        return {
+            "bool": {
+                "filter": self.get_filter(),
+                "must_not": [
+                    {
+                        "exists": {
+                            "field": self.field
+                        }
+                    }
+                ]
+            }
+        }
+
+    def compute(self, source):
+        """
+        Compute the field value for a document. Return None to leave
+        the document unchanged. This is run in a worker process.
+        """
+        raise NotImplementedError
+
+    def __call__(self, source):
+        try:
+            return self.compute(source), None
+        except Exception as e:
+            return None, f"{type(e).__name__}: {e}"
+
+
+class FileBackfill(Backfill):
+    """
+    Populate a field computed from each blob's file on the local filesystem.
+    """
+
+    def __init__(self, blob_dir):
+        self.blob_dir = blob_dir
+
+    def get_path(self, source):
+        return f"{self.blob_dir}/{settings.MEDIA_ROOT}/{source['uuid']}/{source['filename']}"
+
+
+class Checkpoint:
+    """
+    Record the sort value of the last document processed, so that a backfill
+    can resume after it. The checkpoint is removed when the backfill finishes.
+    """
+
+    def __init__(self, path, field):
+        self.path = path
+        self.field = field
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return None
+        with open(self.path) as f:
+            checkpoint = json.load(f)
+        if checkpoint["field"] != self.field:
+            raise ValueError(f"Checkpoint {self.path} is for field '{checkpoint['field']}', not '{self.field}'")
+        return checkpoint["search_after"]
+
+    def save(self, search_after):
+        if not self.path:
+            return
+        # Write to a temporary file first so that an interruption
+        #  never leaves a partially written checkpoint
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"field": self.field, "search_after": search_after}, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class RateLimiter:
+    """
+    Limit the rate at which items are processed, in items per second.
+    """
+
+    def __init__(self, rate=None):
+        self.rate = rate
+        self.start = time.monotonic()
+        self.count = 0
+
+    def wait(self, count=1):
+        self.count += count
+        if not self.rate:
+            return
+        delay = self.start + self.count / self.rate - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def scan_missing(es, index, query, source, search_after=None, page_size=PAGE_SIZE):
+    """
+    Yield pages of documents matching the query using a point in time
+    and search_after, sorted by uuid so that the position of the last
+    document seen is a stable place to resume from.
+    """
+
+    pit_id = es.open_point_in_time(index=index, keep_alive=PIT_KEEP_ALIVE)["id"]
+
+    try:
+        while True:
+            search_object = {
+                "query": query,
+                "pit": {
+                    "id": pit_id,
+                    "keep_alive": PIT_KEEP_ALIVE
+                },
+                "sort": [{"uuid": "asc"}],
+                "size": page_size,
+                "_source": source,
+                "track_total_hits": False
+            }
+            if search_after:
+                search_object["search_after"] = search_after
+
+            results = es.search(body=search_object)
+            pit_id = results["pit_id"]
+            hits = results["hits"]["hits"]
+
+            if not hits:
+                return
+
+            yield hits
+
+            search_after = hits[-1]["sort"]
+    finally:
+        es.close_point_in_time(body={"id": pit_id})
+
+
+def run_backfill(
+        es,
+        index,
+        backfill,
+        workers=None,
+        page_size=PAGE_SIZE,
+        checkpoint_path=None,
+        rate=None,
+        limit=None,
+        dry_run=False,
+        report=log.info
+):
+    """
+    Backfill a field for every document which is missing it. Returns a
+    dict of counts: documents found, updated, skipped (compute() returned
+    None) and failed, along with the elapsed time. In a dry run, values are
+    computed and reported but not written.
+    """
+
+    checkpoint = Checkpoint(checkpoint_path, backfill.field)
+    search_after = checkpoint.load()
+    if search_after:
+        report(f"Resuming after {search_after}")
+
+    rate_limiter = RateLimiter(rate)
+    stats = {"found": 0, "updated": 0, "skipped": 0, "failed": 0}
+    start = time.monotonic()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+
+        for hits in scan_missing(es, index, backfill.get_query(), backfill.source, search_after, page_size):
+
+            if limit is not None:
+                hits = hits[:limit - stats["found"]]
+
+            stats["found"] += len(hits)
+            rate_limiter.wait(len(hits))
+
+            actions = []
+            sources = [hit["_source"] for hit in hits]
+
+            for hit, (value, error) in zip(hits, executor.map(backfill, sources, chunksize=8)):
+                if error:
+                    stats["failed"] += 1
+                    report(f"{hit['_id']} Error: {error}")
+                elif value is None:
+                    stats["skipped"] += 1
+                else:
+                    if dry_run:
+                        report(f"{hit['_id']} {backfill.field}={value}")
+                    actions.append(
+                        {
+                            "_op_type": "update",
+                            "_index": hit["_index"],
+                            "_id": hit["_id"],
+                            "doc": {backfill.field: value}
+                        }
+                    )
+
+            if dry_run:
+                stats["updated"] += len(actions)
+            elif actions:
+                updated, errors = helpers.bulk(es, actions, raise_on_error=False)
+                stats["updated"] += updated
+                stats["failed"] += len(errors)
+                for error in errors:
+                    report(f"Bulk update error: {error}")
+
+            if not dry_run:
+                checkpoint.save(hits[-1]["sort"])
+
+            elapsed = time.monotonic() - start
+            report(
+                f"{stats['found']} found, {stats['updated']} updated, "
+                f"{stats['skipped']} skipped, {stats['failed']} failed, "
+                f"{stats['found'] / max(elapsed, 1e-9):.1f} docs/s"
+            )
+
+            if limit is not None and stats["found"] >= limit:
+                break
+
+    if not dry_run and (limit is None or stats["found"] < limit):
+        checkpoint.clear()
+
+    stats["elapsed"] = time.monotonic() - start
+    return stats
+
+
+class BackfillCommand(BaseCommand):
+    """
+    A management command which runs a backfill. Subclasses either set
+    backfill_class or implement get_backfill() to return the Backfill to run.
+    """
+
+    backfill_class = None
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit",
+            help="The maximum number of documents to process",
+            type=int
+        )
+        parser.add_argument(
+            "--workers",
+            help="The number of worker processes used to compute field values",
+            default=os.cpu_count(),
+            type=int
+        )
+        parser.add_argument(
+            "--page-size",
+            help="The number of documents fetched and updated at a time",
+            default=PAGE_SIZE,
+            type=int
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="A file in which to record progress. If it exists, resume from it.",
+        )
+        parser.add_argument(
+            "--rate",
+            help="The maximum number of documents to process per second",
+            type=float
+        )
+        parser.add_argument(
+            "--dry-run",
+            help="Dry run. Compute and report values but take no action",
+            action="store_true"
+        )
+
+    def get_backfill(self, **options):
+        return self.backfill_class()
+
+    def handle(self, *args, limit, workers, page_size, checkpoint, rate, dry_run, **options):
+
+        es = get_elasticsearch_connection(host=settings.ELASTICSEARCH_ENDPOINT)
+
+        stats = run_backfill(
+            es,
+            settings.ELASTICSEARCH_INDEX,
+            self.get_backfill(**options),
+            workers=workers,
+            page_size=page_size,
+            checkpoint_path=checkpoint,
+            rate=rate,
+            limit=limit,
+            dry_run=dry_run,
+            report=self.stdout.write
+        )
+
+        self.stdout.write(
+            f"{'Would update' if dry_run else 'Updated'} {stats['updated']} of {stats['found']} documents "
+            f"({stats['skipped']} skipped, {stats['failed']} failed) in {stats['elapsed']:.1f}s"
+        )
+
+
+class FileBackfillCommand(BackfillCommand):
+    """
+    A management command which runs a FileBackfill.
+    """
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            "--blob-dir",
+            help="The directory containing the blobs",
+            default="/home/media"
+        )
+
+    def get_backfill(self, blob_dir, **options):
+        return self.backfill_class(blob_dir)
@@ -4,23 +4,55 @@ This module defines the `Calendar` class, which interfaces with the Google
 Calendar API using OAuth2 credentials stored in a `UserProfile`. It retrieves
 a user's calendar events for the next 7 days, parsing and formatting event
 metadata into a simplified list of dictionaries.
+
+Rather than querying the API on every request, each user's upcoming events
+are cached. Once the cache is stale it's refreshed in a background thread
+while the cached events are served, and refreshes are incremental: only
+events changed since the last one are fetched, using the sync token the
+API returns. The authorized API client is built once per user and thread
+and then reused.
+
+`FakeCalendarService` is a local stand-in for the API, which can be used
+by setting the CALENDAR_BACKEND environment variable to "fake".
 """
 
 import logging
+import os
+import threading
+import time
 from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
 from typing import Any, Dict, List, Optional, TypedDict, cast
 
 import dateutil.parser
 import httplib2
 from apiclient.discovery import build
+from apiclient.errors import HttpError
+from dateutil import tz
 from oauth2client.client import OAuth2Credentials
 from rfc3339 import datetimetostr
-from rfc3339 import now as now_rfc3339
+
+from django.core.cache import cache
 
 from accounts.models import UserProfile
 
 logger = logging.getLogger(f"bordercore.{__name__}")
 
+# Events starting within this many days are displayed
+CALENDAR_WINDOW_DAYS = 7
+
+# Events starting within this many days are synced. A full sync is done
+#  whenever the display window reaches past this horizon.
+CALENDAR_SYNC_DAYS = 30
+
+# Cached events older than this are refreshed in the background
+CALENDAR_REFRESH_SECONDS = 5 * 60
+
+CALENDAR_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Authorized API clients, reused by each thread
+_services = threading.local()
+
 
 class EventDict(TypedDict, total=False):
     """Structured representation of a single calendar event.
@@ -47,23 +79,117 @@ class EventDict(TypedDict, total=False):
     end_raw: str
     end_pretty: str
 
+class FakeCalendarService():
+    """A local stand-in for the Google Calendar API.
+
+    Only the ``events().list()`` calls made by `Calendar` are supported,
+    including incremental syncs with sync tokens. Events are added, changed
+    and deleted with `put_event` and `delete_event`, and every request made
+    is recorded in ``requests``.
+    """
+
+    def __init__(self, events: Optional[List[Dict[str, Any]]] = None) -> None:
+        """Initializes the service with an optional list of events.
+
+        Args:
+            events: Events in the API's format, each with an "id".
+        """
+        self.changes: List[Dict[str, Any]] = []
+        self.requests: List[Dict[str, Any]] = []
+        self.oldest_sync_token = 0
+        for event in events or []:
+            self.put_event(event)
+
+    def put_event(self, event: Dict[str, Any]) -> None:
+        """Adds or changes an event."""
+        self.changes.append(event)
+
+    def delete_event(self, event_id: str) -> None:
+        """Deletes an event."""
+        self.changes.append({"id": event_id, "status": "cancelled"})
+
+    def expire_sync_tokens(self) -> None:
+        """Invalidates every sync token issued so far, as the API sometimes does."""
+        self.oldest_sync_token = len(self.changes)
+
+    def events(self) -> "FakeCalendarService":
+        return self
+
+    def list(self, calendarId: str, syncToken: Optional[str] = None, **kwargs: Any) -> Any:
+        self.requests.append({"calendarId": calendarId, "syncToken": syncToken, **kwargs})
+
+        if syncToken is not None and int(syncToken) < self.oldest_sync_token:
+            raise HttpError(httplib2.Response({"status": 410}), b"Sync token is no longer valid")
+
+        changed = {x["id"]: x for x in self.changes[int(syncToken or 0):]}
+        items = [
+            x for x in changed.values()
+            if syncToken is not None or x.get("status") != "cancelled"
+        ]
+        response = {"items": items, "nextSyncToken": str(len(self.changes))}
+
+        return type("FakeRequest", (), {"execute": lambda self: response})()
+
+
+# Shared by every Calendar when the CALENDAR_BACKEND environment variable is
+#  "fake", so that changes made to it are seen by later requests.
+fake_calendar_service = FakeCalendarService([
+    {
+        "id": "fake-event-1",
+        "summary": "Sample event",
+        "start": {"dateTime": datetimetostr(datetime.now(dt_timezone.utc) + timedelta(hours=2))},
+        "end": {"dateTime": datetimetostr(datetime.now(dt_timezone.utc) + timedelta(hours=3))},
+    },
+    {
+        "id": "fake-event-2",
+        "summary": "Sample all-day event",
+        "start": {"date": (datetime.now() + timedelta(days=2)).strftime("%Y-%m-%d")},
+        "end": {"date": (datetime.now() + timedelta(days=3)).strftime("%Y-%m-%d")},
+    },
+])
+
+
+def parse_time(time_info: Dict[str, str]) -> datetime:
+    """Parses an event's start or end time into an aware datetime.
+
+    All-day events have a date rather than a time, which is taken to be
+    midnight local time.
+
+    Args:
+        time_info: Dictionary containing either a "dateTime" or "date" field.
+
+    Returns:
+        The time as an aware datetime.
+    """
+    value = dateutil.parser.parse(time_info.get("dateTime") or time_info["date"])
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=tz.tzlocal())
+    return value
+
+
 class Calendar():
     """Handles Google Calendar access and event retrieval for a user."""
 
     credentials = None
 
-    def __init__(self, user_profile: UserProfile) -> None:
+    def __init__(self, user_profile: UserProfile, service: Any = None) -> None:
         """Initializes the Calendar with the user's Google OAuth2 credentials.
 
         Args:
             user_profile: A UserProfile instance containing Google Calendar auth data.
+            service: An optional API client to use instead of Google's, such
+                as a `FakeCalendarService`.
 
         Raises:
             ValueError: If the argument is not a UserProfile instance.
         """
         if not isinstance(user_profile, UserProfile):
             raise ValueError("Calendar must be passed a UserProfile instance")
+        self.user_id = user_profile.user_id
         self.calendar_email: Optional[str] = user_profile.google_calendar_email
+        if service is None and os.environ.get("CALENDAR_BACKEND") == "fake":
+            service = fake_calendar_service
+        self.service = service
         cal_info = user_profile.google_calendar
         if cal_info:
             self.credentials = OAuth2Credentials(
@@ -79,13 +205,41 @@ class Calendar():
                 cal_info["token_response"],
             )
 
+    @property
+    def cache_key(self) -> str:
+        return f"calendar_events_{self.user_id}"
+
     def has_credentials(self) -> bool:
         """Checks whether valid OAuth2 credentials are present.
 
         Returns:
             True if credentials exist; False otherwise.
         """
-        return bool(self.credentials)
+        return bool(self.credentials or self.service)
+
+    def get_service(self) -> Any:
+        """Returns an authorized API client.
+
+        Building one means authorizing an HTTP client and loading the API's
+        discovery document, so they're kept and reused. httplib2 isn't
+        thread-safe, so each thread has its own.
+
+        Returns:
+            The API client.
+        """
+        if self.service is not None:
+            return self.service
+
+        if not hasattr(_services, "clients"):
+            _services.clients = {}
+
+        credentials = cast(OAuth2Credentials, self.credentials)
+        key = (self.user_id, credentials.refresh_token)
+        if key not in _services.clients:
+            http = credentials.authorize(httplib2.Http())
+            _services.clients[key] = build(serviceName="calendar", version="v3", http=http, cache_discovery=False)
+
+        return _services.clients[key]
 
     def _parse_event_time(self, time_info: Dict[str, str]) -> tuple[str, str]:
         """Parses and formats event start/end times from the Google Calendar event structure.
@@ -103,14 +257,124 @@ class Calendar():
         pretty = dateutil.parser.parse(raw).strftime("%a %I:%M%p")
         return raw, pretty
 
+    def sync(self, state: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Fetches the events changed since the last sync.
+
+        If there was no previous sync, its sync token has expired, or the
+        display window now reaches past the events synced, every event
+        within the sync horizon is fetched instead.
+
+        Args:
+            state: The state returned by the previous sync, if any.
+
+        Returns:
+            The new state: the events, keyed on their ID, the sync token
+            and horizon, and when the sync was done.
+        """
+        now = datetime.now(dt_timezone.utc)
+        window_end = now + timedelta(days=CALENDAR_WINDOW_DAYS)
+        service = self.get_service()
+
+        if state and state["horizon"] >= window_end.timestamp():
+            try:
+                events = dict(state["events"])
+                sync_token = self._list_events(service, events, syncToken=state["sync_token"])
+                horizon = state["horizon"]
+            except HttpError as e:
+                if e.resp.status != 410:
+                    raise
+                logger.info("Calendar sync token expired, doing a full sync.")
+                state = None
+
+        if not state or state["horizon"] < window_end.timestamp():
+            events = {}
+            horizon_time = now + timedelta(days=CALENDAR_SYNC_DAYS)
+            sync_token = self._list_events(
+                service,
+                events,
+                timeMin=datetimetostr(now),
+                timeMax=datetimetostr(horizon_time)
+            )
+            horizon = horizon_time.timestamp()
+
+        # Events which have finished will never be displayed
+        events = {
+            event_id: event
+            for event_id, event in events.items()
+            if parse_time(event["end"]) > now
+        }
+
+        return {
+            "events": events,
+            "sync_token": sync_token,
+            "horizon": horizon,
+            "refreshed": time.time(),
+        }
+
+    def _list_events(self, service: Any, events: Dict[str, Any], **kwargs: Any) -> str:
+        """Lists events, updating ``events`` in place with the results.
+
+        Args:
+            service: The API client.
+            events: Events keyed on their ID.
+            **kwargs: Additional arguments for the API's list request.
+
+        Returns:
+            The sync token for the next incremental sync.
+        """
+        page_token = None
+        while True:
+            response = service.events().list(
+                calendarId=self.calendar_email,
+                singleEvents=True,
+                pageToken=page_token,
+                **kwargs
+            ).execute()
+            for event in response.get("items", []):
+                if event.get("status") == "cancelled":
+                    events.pop(event["id"], None)
+                else:
+                    events[event["id"]] = event
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                return response["nextSyncToken"]
+
+    def refresh(self) -> Dict[str, Any]:
+        """Syncs the user's cached events.
+
+        Returns:
+            The new state of the cache.
+        """
+        state = self.sync(cache.get(self.cache_key))
+        cache.set(self.cache_key, state, CALENDAR_CACHE_TIMEOUT)
+        return state
+
+    def refresh_in_background(self) -> None:
+        """Starts a refresh in a background thread, unless one is already running."""
+        if not cache.add(f"{self.cache_key}_refreshing", True, CALENDAR_REFRESH_SECONDS):
+            return
+
+        def refresh() -> None:
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Error refreshing calendar events")
+            finally:
+                cache.delete(f"{self.cache_key}_refreshing")
+
+        threading.Thread(target=refresh, daemon=True).start()
+
     def get_calendar_info(self) -> List[EventDict]:
         """Fetches upcoming events for the next 7 days from the user's calendar.
 
+        Cached events are returned if there are any, and refreshed in the
+        background if they're stale.
+
         Returns:
             A list of dictionaries, each representing an event with fields like:
             count, summary, description, location, start_raw, start_pretty, end_raw, end_pretty.
         """
-        if not self.credentials:
+        if not self.has_credentials():
             logger.warning("No credentials available for calendar access.")
             return []
 
@@ -118,18 +382,24 @@ class Calendar():
             logger.warning("No Google Calendar email configured for user profile.")
             return []
 
-        http = httplib2.Http()
-        http = self.credentials.authorize(http)
-        service = build(serviceName="calendar", version="v3", http=http, cache_discovery=False)
-        time_max = datetime.now() + timedelta(days=7)
+        state = cache.get(self.cache_key)
+        if state is None:
+            state = self.refresh()
+        elif time.time() - state["refreshed"] > CALENDAR_REFRESH_SECONDS:
+            self.refresh_in_background()
+
+        now = datetime.now(dt_timezone.utc)
+        window_end = now + timedelta(days=CALENDAR_WINDOW_DAYS)
+        upcoming = sorted(
+            (
+                event for event in state["events"].values()
+                if parse_time(event["end"]) > now and parse_time(event["start"]) < window_end
+            ),
+            key=lambda x: parse_time(x["start"])
+        )
 
-        events = service.events().list(calendarId=self.calendar_email,
-                                       orderBy="startTime",
-                                       singleEvents=True,
-                                       timeMin=str(now_rfc3339()).replace(" ", "T"),
-                                       timeMax=datetimetostr(time_max)).execute()
         event_list: List[EventDict] = []
-        for count, e in enumerate(events["items"], start=1):
+        for count, e in enumerate(upcoming, start=1):
             one_event: EventDict = {"count": count}
             for field in ["description", "location", "summary"]:
                 value = e.get(field)
@@ -138,6 +408,5 @@ class Calendar():
             one_event["start_raw"], one_event["start_pretty"] = self._parse_event_time(e["start"])
             one_event["end_raw"], one_event["end_pretty"] = self._parse_event_time(e["end"])
             event_list.append(one_event)
-            count = count + 1
 
         return event_list
@@ -0,0 +1,107 @@
+import logging
+import os
+import time
+
+import tiktoken
+
+from lib.embeddings import EMBEDDING_ENCODING
+
+log = logging.getLogger(f"bordercore.{__name__}")
+
+CHAT_MODEL = "gpt-4.1"
+
+# The most tokens of retrieved text included in a prompt
+CHAT_CONTEXT_TOKENS = 6000
+
+
+class OpenAIChatBackend():
+
+    def __init__(self):
+        # Isolate the import here so that the fake backend
+        #  can be used without requiring this dependency.
+        from openai import OpenAI
+        self.client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+
+    def stream(self, messages, model=CHAT_MODEL):
+        response = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            stream=True
+        )
+        for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+class FakeChatBackend():
+    """
+    Stream a canned response which echoes the last message, word by word.
+    Useful for testing and local development, since no API calls are made.
+    """
+
+    def stream(self, messages, model=CHAT_MODEL):
+        yield "You said:"
+        for word in messages[-1]["content"].split():
+            yield f" {word}"
+
+
+CHAT_BACKENDS = {
+    "fake": FakeChatBackend,
+    "openai": OpenAIChatBackend,
+}
+
+# Backend instances, reused so that their API clients' connections are pooled
+_backends = {}
+
+
+def get_chat_backend(name=None):
+    """
+    Return the named chat backend, or the one set by the
+    CHAT_BACKEND environment variable, defaulting to OpenAI.
+    """
+    name = name or os.environ.get("CHAT_BACKEND", "openai")
+    if name not in _backends:
+        _backends[name] = CHAT_BACKENDS[name]()
+    return _backends[name]
+
+
+def count_tokens(text, encoding_name=EMBEDDING_ENCODING):
+    return len(tiktoken.get_encoding(encoding_name).encode(text))
+
+
+def truncate_tokens(text, max_tokens=CHAT_CONTEXT_TOKENS, encoding_name=EMBEDDING_ENCODING):
+    """
+    Truncate text to at most max_tokens tokens.
+    """
+    encoding = tiktoken.get_encoding(encoding_name)
+    tokens = encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
+def timed_stream(stream, label="chat", start=None):
+    """
+    Yield from a stream of response text, logging the time to the
+    first token and the total time taken. The timer starts when this
+    is called, unless a start time from time.monotonic() is given.
+    """
+
+    if start is None:
+        start = time.monotonic()
+    first_token_time = None
+    token_count = 0
+
+    for text in stream:
+        if first_token_time is None:
+            first_token_time = time.monotonic() - start
+            log.info("%s: first token after %.0fms", label, first_token_time * 1000)
+        token_count += 1
+        yield text
+
+    log.info(
+        "%s: %d chunks in %.0fms",
+        label,
+        token_count,
+        (time.monotonic() - start) * 1000
+    )
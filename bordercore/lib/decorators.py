@@ -9,9 +9,17 @@ from typing import Callable, Concatenate, ParamSpec
 
 from django.http import HttpRequest, JsonResponse
 from django.http.response import HttpResponseBase
+from django.middleware.http import ConditionalGetMiddleware
+from django.utils.decorators import decorator_from_middleware
 
 P = ParamSpec("P")
 
+# Add an ETag, a hash of the response body, to GET responses and return
+#  a 304 Not Modified if it matches the request's If-None-Match header,
+#  so that clients polling for changes can skip unchanged payloads.
+#  The response is still generated, but isn't sent.
+conditional_get = decorator_from_middleware(ConditionalGetMiddleware)
+
 
 def validate_post_data(*required_fields: str) -> Callable[
         [Callable[Concatenate[HttpRequest, P], HttpResponseBase]],
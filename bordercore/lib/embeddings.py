@@ -1,20 +1,83 @@
+import hashlib
 import math
 import os
+import random
+import re
+from concurrent.futures import ThreadPoolExecutor
 from itertools import islice
 
-import openai
 import tiktoken
 
 EMBEDDING_MODEL = "text-embedding-ada-002"
 EMBEDDING_CTX_LENGTH = 8191
 EMBEDDING_ENCODING = "cl100k_base"
+EMBEDDING_DIMS = 1536
 
+# Limits on the size of each embeddings request. Chunks from many
+#  documents are sent together, up to this many inputs or tokens.
+EMBEDDING_BATCH_SIZE = 256
+EMBEDDING_BATCH_TOKENS = 250000
 
-openai.api_key = os.environ.get("OPENAI_API_KEY")
+# The maximum number of embeddings requests in flight at once
+EMBEDDING_MAX_WORKERS = 4
+
+# Notes are split into chunks of about this many tokens, each with its own
+#  embedding, so that only their relevant parts need be retrieved
+CHUNK_TOKENS = 512
+
+
+class OpenAIEmbeddingBackend():
+
+    def __init__(self):
+        # Isolate the import here so that the fake backend
+        #  can be used without requiring this dependency.
+        from openai import OpenAI
+        self.client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+
+    def embed(self, inputs, model=EMBEDDING_MODEL):
+        response = self.client.embeddings.create(input=inputs, model=model)
+        return [x.embedding for x in sorted(response.data, key=lambda x: x.index)]
+
+
+class FakeEmbeddingBackend():
+    """
+    Return a unit vector derived from a hash of each input, so that the same
+    input always has the same embedding. Useful for testing and local
+    development, since no API calls are made.
+    """
+
+    def embed(self, inputs, model=EMBEDDING_MODEL):
+        return [self.get_vector(x) for x in inputs]
+
+    def get_vector(self, value):
+        seed = hashlib.sha1(repr(value).encode("utf-8")).hexdigest()
+        rng = random.Random(seed)
+        return normalize([rng.gauss(0, 1) for _ in range(EMBEDDING_DIMS)])
+
+
+EMBEDDING_BACKENDS = {
+    "fake": FakeEmbeddingBackend,
+    "openai": OpenAIEmbeddingBackend,
+}
+
+
+# Backend instances, reused so that their API clients' connections are pooled
+_backends = {}
+
+
+def get_embedding_backend(name=None):
+    """
+    Return the named embedding backend, or the one set by the
+    EMBEDDING_BACKEND environment variable, defaulting to OpenAI.
+    """
+    name = name or os.environ.get("EMBEDDING_BACKEND", "openai")
+    if name not in _backends:
+        _backends[name] = EMBEDDING_BACKENDS[name]()
+    return _backends[name]
 
 
 def get_embedding(text_or_tokens, model=EMBEDDING_MODEL):
-    return openai.Embedding.create(input=text_or_tokens, model=model)["data"][0]["embedding"]
+    return get_embedding_backend().embed([text_or_tokens], model=model)[0]
 
 
 def batched(iterable, n):
@@ -27,6 +90,24 @@ def batched(iterable, n):
         yield batch
 
 
+def batched_by_tokens(chunks, max_inputs, max_tokens):
+    """
+    Batch (key, tokens) pairs so that no batch has more than
+    max_inputs pairs or max_tokens tokens in total.
+    """
+    batch = []
+    batch_tokens = 0
+    for chunk in chunks:
+        if batch and (len(batch) == max_inputs or batch_tokens + len(chunk[1]) > max_tokens):
+            yield batch
+            batch = []
+            batch_tokens = 0
+        batch.append(chunk)
+        batch_tokens += len(chunk[1])
+    if batch:
+        yield batch
+
+
 def chunked_tokens(text, encoding_name, chunk_length):
     encoding = tiktoken.get_encoding(encoding_name)
     tokens = encoding.encode(text)
@@ -34,6 +115,43 @@ def chunked_tokens(text, encoding_name, chunk_length):
     yield from chunks_iterator
 
 
+def chunk_text(text, max_tokens=CHUNK_TOKENS, encoding_name=EMBEDDING_ENCODING):
+    """
+    Split text into chunks of at most max_tokens tokens, returning a list
+    of (text, token count) pairs. Chunks end at paragraph breaks where
+    possible. Paragraphs too long to fit in one chunk are split wherever
+    the limit falls.
+    """
+    encoding = tiktoken.get_encoding(encoding_name)
+
+    chunks = []
+    paragraphs = []
+    chunk_tokens = 0
+
+    def flush():
+        if paragraphs:
+            chunks.append(("\n\n".join(paragraphs), chunk_tokens))
+            paragraphs.clear()
+
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        tokens = encoding.encode(paragraph)
+        if chunk_tokens + len(tokens) > max_tokens:
+            flush()
+            chunk_tokens = 0
+        if len(tokens) > max_tokens:
+            for batch in batched(tokens, max_tokens):
+                chunks.append((encoding.decode(batch), len(batch)))
+            continue
+        paragraphs.append(paragraph)
+        chunk_tokens += len(tokens)
+
+    flush()
+    return chunks
+
+
 def normalize(vec: list[float]) -> list[float]:
     norm = math.sqrt(sum(x * x for x in vec))
     return [x / norm for x in vec] if norm > 0 else vec
@@ -49,13 +167,110 @@ def weighted_average(vectors: list[list[float]], weights: list[int]) -> list[flo
     return [x / total_weight for x in result]
 
 
+def get_embeddings(
+        texts,
+        model=EMBEDDING_MODEL,
+        max_tokens=EMBEDDING_CTX_LENGTH,
+        encoding_name=EMBEDDING_ENCODING,
+        backend=None,
+        batch_size=EMBEDDING_BATCH_SIZE,
+        batch_tokens=EMBEDDING_BATCH_TOKENS,
+        max_workers=EMBEDDING_MAX_WORKERS
+):
+    """
+    Return an embedding for each text, or None for any which are empty.
+
+    Texts longer than the model's context are split into chunks, whose
+    embeddings are averaged, weighted by their length. Rather than one
+    request per chunk, chunks from all texts are sent together in batches,
+    with up to max_workers requests made concurrently.
+    """
+
+    if backend is None:
+        backend = get_embedding_backend()
+
+    chunks = [
+        (i, chunk)
+        for i, text in enumerate(texts)
+        if text
+        for chunk in chunked_tokens(text, encoding_name=encoding_name, chunk_length=max_tokens)
+    ]
+    batches = list(batched_by_tokens(chunks, batch_size, batch_tokens))
+
+    def embed(batch):
+        return backend.embed([list(tokens) for _, tokens in batch], model=model)
+
+    chunk_embeddings = [[] for _ in texts]
+    chunk_lens = [[] for _ in texts]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for batch, embeddings in zip(batches, executor.map(embed, batches)):
+            for (i, tokens), embedding in zip(batch, embeddings):
+                chunk_embeddings[i].append(embedding)
+                chunk_lens[i].append(len(tokens))
+
+    return [
+        normalize(weighted_average(vectors, weights)) if vectors else None
+        for vectors, weights in zip(chunk_embeddings, chunk_lens)
+    ]
+
+
 def len_safe_get_embedding(text, model=EMBEDDING_MODEL, max_tokens=EMBEDDING_CTX_LENGTH, encoding_name=EMBEDDING_ENCODING):
-    chunk_embeddings = []
-    chunk_lens = []
-    for chunk in chunked_tokens(text, encoding_name=encoding_name, chunk_length=max_tokens):
-        chunk_embeddings.append(get_embedding(chunk, model=model))
-        chunk_lens.append(len(chunk))
-
-    averaged = weighted_average(chunk_embeddings, chunk_lens)
-    normalized = normalize(averaged)
-    return normalized
+    return get_embeddings([text], model=model, max_tokens=max_tokens, encoding_name=encoding_name)[0]
+
+
+def get_chunked_embeddings(texts, max_tokens=CHUNK_TOKENS, **kwargs):
+    """
+    Split each text into chunks and embed them, all in one batch. Return,
+    for each text, its embedding and a list of its chunks, each a dict with
+    its text, token count and embedding. The text's embedding is the average
+    of its chunks', weighted by their length, so it costs nothing extra.
+    Empty texts get (None, []).
+    """
+
+    chunks = [chunk_text(text, max_tokens=max_tokens) if text else [] for text in texts]
+    embeddings = iter(get_embeddings([chunk for x in chunks for chunk, _ in x], **kwargs))
+
+    results = []
+    for text_chunks in chunks:
+        chunk_list = [
+            {"text": chunk, "tokens": tokens, "embeddings_vector": next(embeddings)}
+            for chunk, tokens in text_chunks
+        ]
+        if chunk_list:
+            embedding = normalize(weighted_average(
+                [x["embeddings_vector"] for x in chunk_list],
+                [x["tokens"] for x in chunk_list]
+            ))
+        else:
+            embedding = None
+        results.append((embedding, chunk_list))
+
+    return results
+
+
+def get_embedding_fields(texts, chunked, **kwargs):
+    """
+    Return, for each text, the Elasticsearch fields storing its embeddings,
+    or None if it's empty. Texts for which the corresponding value in
+    chunked is true, such as notes, have their chunks stored too.
+    """
+
+    fields = [None] * len(texts)
+
+    chunked_indexes = [i for i, x in enumerate(chunked) if x]
+    other_indexes = [i for i, x in enumerate(chunked) if not x]
+
+    if chunked_indexes:
+        results = get_chunked_embeddings([texts[i] for i in chunked_indexes], **kwargs)
+        for i, (embedding, chunks) in zip(chunked_indexes, results):
+            if embedding is not None:
+                fields[i] = {"embeddings_vector": embedding, "chunks": chunks}
+
+    if other_indexes:
+        results = get_embeddings([texts[i] for i in other_indexes], **kwargs)
+        for i, embedding in zip(other_indexes, results):
+            if embedding is not None:
+                fields[i] = {"embeddings_vector": embedding}
+
+    return fields
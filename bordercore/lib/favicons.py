@@ -0,0 +1,150 @@
+"""
+Fetch favicons for domains, for both the SnarfFavicon lambda and the
+prefetch_favicons management command.
+
+A domain's favicon is looked for at /favicon.ico first, then wherever the
+<link rel="icon"> tag on its home page points. Conditional requests are
+made with any ETag from the last fetch, so unchanged favicons cost little.
+Many domains can be fetched concurrently, sharing one connection pool.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+
+log = logging.getLogger(__name__)
+
+FAVICON_KEY_PREFIX = "django/img/favicons"
+
+# Favicons are cached by browsers for this many seconds
+FAVICON_MAX_AGE = 2592000
+
+FAVICON_TIMEOUT = 5
+
+# Anything larger than this isn't a favicon worth keeping
+FAVICON_MAX_BYTES = 256 * 1024
+
+FAVICON_MAX_WORKERS = 16
+
+STATUS_FOUND = "found"
+STATUS_MISSING = "missing"
+STATUS_UNCHANGED = "unchanged"
+
+ICON_RELS = {"icon", "shortcut icon", "apple-touch-icon"}
+
+
+def get_icon(session, url, etag=None):
+    """
+    Fetch an icon, returning its status along with its content
+    and the response headers. At most FAVICON_MAX_BYTES are read.
+    """
+
+    headers = {"If-None-Match": etag} if etag else {}
+
+    with session.get(url, headers=headers, timeout=FAVICON_TIMEOUT, stream=True) as r:
+
+        if r.status_code == 304:
+            return STATUS_UNCHANGED, None, r.headers
+
+        content_type = r.headers.get("Content-Type", "image/x-icon")
+        if r.status_code != 200 or not content_type.startswith(("image", "application/octet-stream")):
+            return STATUS_MISSING, None, r.headers
+
+        content = b""
+        for chunk in r.iter_content(chunk_size=8192):
+            content += chunk
+            if len(content) > FAVICON_MAX_BYTES:
+                return STATUS_MISSING, None, r.headers
+
+    if not content:
+        return STATUS_MISSING, None, r.headers
+
+    return STATUS_FOUND, content, r.headers
+
+
+def find_icon_url(session, domain):
+    """
+    Return the url of the icon named by a <link rel="icon"> tag on the
+    domain's home page, or None if there isn't one.
+    """
+
+    # Isolate the import here so that it's only needed when a
+    #  favicon isn't found in the usual place
+    from lxml import html
+
+    r = session.get(f"https://{domain}/", timeout=FAVICON_TIMEOUT)
+    if r.status_code != 200 or not r.content.strip():
+        return None
+
+    doc = html.fromstring(r.content)
+    for link in doc.xpath("//link[@rel and @href]"):
+        if link.get("rel").lower() in ICON_RELS:
+            return urljoin(r.url, link.get("href"))
+
+    return None
+
+
+def fetch_favicon(domain, etag=None, session=None):
+    """
+    Fetch a domain's favicon. Return a dict with the domain and its status,
+    one of found, missing or unchanged (since the fetch which returned the
+    given etag), and, if found, the favicon's content, content type and etag.
+    """
+
+    session = session or requests.Session()
+    result = {"domain": domain, "status": STATUS_MISSING}
+
+    try:
+        status, content, headers = get_icon(session, f"https://{domain}/favicon.ico", etag)
+        if status == STATUS_MISSING:
+            icon_url = find_icon_url(session, domain)
+            if icon_url:
+                status, content, headers = get_icon(session, icon_url, etag)
+    except (requests.RequestException, ValueError) as e:
+        log.info("Error fetching favicon for %s: %s", domain, e)
+        return result
+
+    result["status"] = status
+    if status == STATUS_FOUND:
+        result["content"] = content
+        result["content_type"] = headers.get("Content-Type", "image/x-icon")
+        result["etag"] = headers.get("ETag", "")
+
+    return result
+
+
+def fetch_favicons(domains, etags=None, max_workers=FAVICON_MAX_WORKERS):
+    """
+    Fetch the favicons for many domains concurrently. Return a list
+    of results, as returned by fetch_favicon.
+    """
+
+    etags = etags or {}
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(
+            lambda domain: fetch_favicon(domain, etags.get(domain), session),
+            domains
+        ))
+
+
+def store_favicon(s3_client, bucket_name, result):
+    """
+    Upload a favicon which was found to S3.
+    """
+
+    s3_client.put_object(
+        Bucket=bucket_name,
+        Key=f"{FAVICON_KEY_PREFIX}/{result['domain']}.ico",
+        Body=result["content"],
+        ACL="public-read",
+        CacheControl=f"max-age={FAVICON_MAX_AGE}",
+        ContentType=result["content_type"]
+    )
@@ -0,0 +1,253 @@
+"""
+Manage the layout of indexes behind the Elasticsearch index name.
+
+Documents are split by doctype into groups, each with its own index
+built from an index template, so that heavy documents with attachment
+text don't share shards with the many small objects. The indexes are
+reached through aliases:
+
+  * the index name itself, eg "bordercore", spans every group and is
+    used for searches
+  * "<index>_<group>", eg "bordercore_documents", points at a single
+    index and is used for writes and gets by id
+  * "<index>_user_<id>" is a filtered alias spanning every group but
+    matching only that user's documents
+
+Indexes are named after their group and the time they were created, eg
+"bordercore_objects-20260101120000". migrate() builds new indexes, copies
+the existing documents into them and moves the aliases over, without
+searches ever seeing a missing or half-filled index.
+"""
+
+import json
+import logging
+import time
+from datetime import datetime
+
+from lib.util import (DOCUMENT_DOCTYPES, INDEX_GROUP_DOCUMENTS,
+                      INDEX_GROUP_OBJECTS, INDEX_GROUPS, get_index_alias,
+                      get_user_alias)
+
+log = logging.getLogger(f"bordercore.{__name__}")
+
+# Settings for each group's indexes, on top of those in the mappings file.
+#  Documents are fewer but far larger, so they're spread over more shards
+#  and their stored source is compressed.
+GROUP_SETTINGS = {
+    INDEX_GROUP_DOCUMENTS: {
+        "number_of_shards": 2,
+        "codec": "best_compression",
+    },
+    INDEX_GROUP_OBJECTS: {
+        "number_of_shards": 1,
+    },
+}
+
+# Used while copying documents into a new index, then reset
+BULK_LOAD_SETTINGS = {
+    "refresh_interval": "-1",
+    "number_of_replicas": 0,
+}
+
+# How often to check on a running reindex task, in seconds
+TASK_POLL_INTERVAL = 5
+
+
+def get_group_query(group):
+    """
+    Return the query matching the documents which belong in a group
+    """
+
+    if group == INDEX_GROUP_DOCUMENTS:
+        return {"terms": {"doctype": list(DOCUMENT_DOCTYPES)}}
+    return {"bool": {"must_not": [{"terms": {"doctype": list(DOCUMENT_DOCTYPES)}}]}}
+
+
+def get_index_template(index, group, mappings):
+    """
+    Return the index template for a group's indexes. The mappings are
+    the contents of the mappings file.
+    """
+
+    return {
+        "index_patterns": [f"{get_index_alias(index, group=group)}-*"],
+        "priority": 100,
+        "template": {
+            "settings": {
+                **mappings["settings"],
+                "index": {
+                    **mappings["settings"].get("index", {}),
+                    **GROUP_SETTINGS[group],
+                },
+            },
+            "mappings": mappings["mappings"],
+        },
+    }
+
+
+def put_index_templates(es, index, mappings):
+    for group in INDEX_GROUPS:
+        es.indices.put_index_template(
+            name=get_index_alias(index, group=group),
+            body=get_index_template(index, group, mappings)
+        )
+
+
+def get_alias_indexes(es, alias):
+    """
+    Return the names of the indexes an alias points at
+    """
+
+    if not es.indices.exists_alias(name=alias):
+        return []
+    return sorted(es.indices.get_alias(name=alias))
+
+
+def get_user_alias_actions(index, indexes, user_ids):
+    return [
+        {
+            "add": {
+                "index": new_index,
+                "alias": get_user_alias(index, user_id),
+                "filter": {"term": {"user_id": user_id}},
+            }
+        }
+        for new_index in indexes
+        for user_id in user_ids
+    ]
+
+
+def wait_for_task(es, task_id, report):
+
+    while True:
+        task = es.tasks.get(task_id=task_id)
+        status = task["task"]["status"]
+        if task["completed"]:
+            break
+        report(f"  Copied {status['created']} of {status['total']} documents")
+        time.sleep(TASK_POLL_INTERVAL)
+
+    if "error" in task:
+        raise RuntimeError(f"Reindex failed: {json.dumps(task['error'])}")
+    failures = task.get("response", {}).get("failures")
+    if failures:
+        raise RuntimeError(f"Reindex failed: {json.dumps(failures[:10])}")
+
+    return task["response"]
+
+
+def copy_documents(es, source_indexes, dest_index, group, report):
+    """
+    Copy a group's documents into a new index. Documents already in the
+    new index were written there since the copy started, so are newer
+    and left alone.
+    """
+
+    response = es.reindex(
+        body={
+            "conflicts": "proceed",
+            "source": {
+                "index": source_indexes,
+                "query": get_group_query(group),
+            },
+            "dest": {
+                "index": dest_index,
+                "op_type": "create",
+            },
+        },
+        slices="auto",
+        wait_for_completion=False
+    )
+
+    result = wait_for_task(es, response["task"], report)
+    report(f"  Copied {result['created']} documents, skipped {result['version_conflicts']} newer ones")
+
+
+def migrate(es, index, mappings, user_ids, keep_old=False, report=log.info):
+    """
+    Move every document into a new index for its group, then point the
+    aliases at the new indexes. The index may be a concrete index, as
+    created before documents were split into groups, an alias spanning
+    group indexes, or not exist at all.
+
+    Writes go to the new indexes as soon as they're created, so are never
+    lost, while searches use the old ones until the copy is complete.
+    Partial updates to documents which haven't been copied yet will fail,
+    so run this when few changes are being made.
+
+    The old indexes are deleted once searches have moved over, unless
+    keep_old is set. A concrete index is always deleted, since its name
+    is needed for the alias.
+    """
+
+    if es.indices.exists_alias(name=index):
+        old_indexes = get_alias_indexes(es, index)
+        is_concrete = False
+    elif es.indices.exists(index=index):
+        old_indexes = [index]
+        is_concrete = True
+    else:
+        old_indexes = []
+        is_concrete = False
+
+    put_index_templates(es, index, mappings)
+
+    suffix = datetime.now().strftime("%Y%m%d%H%M%S")
+    new_indexes = {
+        group: f"{get_index_alias(index, group=group)}-{suffix}"
+        for group in INDEX_GROUPS
+    }
+
+    # Create the new indexes and send writes to them
+    actions = []
+    for group, new_index in new_indexes.items():
+        report(f"Creating index {new_index}")
+        es.indices.create(index=new_index, body={"settings": {"index": BULK_LOAD_SETTINGS}})
+        alias = get_index_alias(index, group=group)
+        for old_index in get_alias_indexes(es, alias):
+            actions.append({"remove": {"index": old_index, "alias": alias}})
+        actions.append({"add": {"index": new_index, "alias": alias}})
+    es.indices.update_aliases(body={"actions": actions})
+
+    if old_indexes:
+        for group, new_index in new_indexes.items():
+            report(f"Copying {group} from {', '.join(old_indexes)} to {new_index}")
+            copy_documents(es, old_indexes, new_index, group, report)
+
+    report("Restoring index settings")
+    es.indices.put_settings(
+        index=",".join(new_indexes.values()),
+        body={"index": {name: None for name in BULK_LOAD_SETTINGS}}
+    )
+    es.indices.refresh(index=",".join(new_indexes.values()))
+
+    # Switch searches over to the new indexes in one step
+    actions = []
+    for old_index in old_indexes:
+        if keep_old and not is_concrete:
+            for alias in es.indices.get_alias(index=old_index)[old_index]["aliases"]:
+                actions.append({"remove": {"index": old_index, "alias": alias}})
+        else:
+            actions.append({"remove_index": {"index": old_index}})
+    for new_index in new_indexes.values():
+        actions.append({"add": {"index": new_index, "alias": index}})
+    actions.extend(get_user_alias_actions(index, new_indexes.values(), user_ids))
+
+    report(f"Pointing {index} at {', '.join(new_indexes.values())}")
+    es.indices.update_aliases(body={"actions": actions})
+
+    return new_indexes
+
+
+def update_user_aliases(es, index, user_ids, report=log.info):
+    """
+    Add the filtered alias for each user to the current indexes, eg for
+    users created since the last migration.
+    """
+
+    indexes = get_alias_indexes(es, index)
+    if not indexes:
+        raise ValueError(f"No indexes found for alias {index}. Run a full migration first.")
+
+    report(f"Adding aliases for {len(user_ids)} users to {', '.join(indexes)}")
+    es.indices.update_aliases(body={"actions": get_user_alias_actions(index, indexes, user_ids)})
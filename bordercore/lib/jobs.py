@@ -0,0 +1,456 @@
+"""
+Dispatch side effects handled by SNS topics and Lambda functions, such as
+indexing blobs and creating collection thumbnails.
+
+Rather than being published from the request which caused them, jobs are
+recorded in the Job table. A request for a job whose type and target match
+one still pending is coalesced into it, and each job waits until requests
+for it have stopped for its debounce window, so that adding 50 blobs to a
+collection rebuilds its thumbnail once rather than 50 times. Requests
+aren't wrapped in transactions, so a job is usually committed as soon as
+it's requested; one requested inside an atomic block is dropped if that
+block is rolled back.
+
+Pending jobs are dispatched in batches by the dispatch_jobs management
+command, using clients which are created once and reused. Jobs are claimed
+in one short transaction and sent after it has committed, so that slow
+calls to AWS never hold locks which enqueue() would wait on. Two executor
+backends are provided, chosen by the JOB_BACKEND setting: "aws", which
+publishes to SNS and invokes Lambda functions, and "inprocess", which runs
+any local handler for each job directly, for tests and local development.
+"""
+
+import json
+import logging
+from datetime import timedelta
+from importlib import import_module
+
+import boto3
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Avg, Count, F, Min
+from django.utils import timezone
+
+from lib.models import Job
+
+log = logging.getLogger(f"bordercore.{__name__}")
+
+# SNS accepts at most this many messages per PublishBatch request
+SNS_BATCH_SIZE = 10
+
+# Failed jobs are retried, with backoff, this many times
+MAX_ATTEMPTS = 5
+
+# Jobs sent longer ago than this are deleted
+SENT_JOB_RETENTION = timedelta(days=1)
+
+# A claimed job which hasn't been sent within this time, eg because its
+#  dispatcher died, is claimed again
+JOB_LEASE = timedelta(minutes=5)
+
+
+class JobType():
+    """
+    A kind of job, published to an SNS topic or sent to a Lambda function.
+    Requests for a job are debounced for debounce seconds, but not delayed
+    by more than max_delay seconds in all.
+    """
+
+    def __init__(
+            self,
+            name,
+            get_message,
+            topic_arn_setting=None,
+            function_name=None,
+            debounce=0,
+            max_delay=60,
+            merge=None,
+            local_handler=None
+    ):
+        self.name = name
+        self.get_message = get_message
+        self.topic_arn_setting = topic_arn_setting
+        self.function_name = function_name
+        self.debounce = timedelta(seconds=debounce)
+        self.max_delay = timedelta(seconds=max_delay)
+        self.merge = merge or (lambda old, new: {**old, **new})
+        self.local_handler = local_handler
+
+    def run_locally(self, target, payload):
+        """
+        Run the job's local handler, given as a dotted path, if it has one.
+        """
+        if not self.local_handler:
+            log.info("No local handler for %s job, target=%s", self.name, target)
+            return
+        module_name, function_name = self.local_handler.rsplit(".", 1)
+        getattr(import_module(module_name), function_name)(target, **payload)
+
+
+def get_index_blob_message(target, payload):
+    return {
+        "Records": [
+            {
+                "s3": {
+                    "bucket": {
+                        "name": settings.AWS_STORAGE_BUCKET_NAME
+                    },
+                    "uuid": target,
+                    "file_changed": payload.get("file_changed", True),
+                    "new_blob": payload.get("new_blob", True)
+                }
+            }
+        ]
+    }
+
+
+def merge_index_blob(old, new):
+    # If any of the coalesced requests was for a new blob or a changed file,
+    #  then so is the job
+    return {key: old.get(key, False) or new.get(key, False) for key in ("file_changed", "new_blob")}
+
+
+def get_collection_thumbnail_message(target, payload):
+    return {
+        "Records": [
+            {
+                "s3": {
+                    "bucket": {
+                        "name": settings.AWS_STORAGE_BUCKET_NAME,
+                    },
+                    "collection_uuid": target
+                }
+            }
+        ]
+    }
+
+
+def get_snarf_favicon_message(target, payload):
+    return {
+        "domain": target,
+        "etag": payload.get("etag", "")
+    }
+
+
+def index_blob_locally(target, **payload):
+    # Isolate the import to avoid a circular dependency
+    from blob.elasticsearch_indexer import index_blob
+    index_blob(uuid=target, **payload)
+
+
+JOB_TYPES = {
+    x.name: x
+    for x in [
+        JobType(
+            "index_blob",
+            get_index_blob_message,
+            topic_arn_setting="INDEX_BLOB_TOPIC_ARN",
+            debounce=2,
+            max_delay=30,
+            merge=merge_index_blob,
+            local_handler="lib.jobs.index_blob_locally"
+        ),
+        JobType(
+            "create_collection_thumbnail",
+            get_collection_thumbnail_message,
+            topic_arn_setting="CREATE_COLLECTION_THUMBNAIL_TOPIC_ARN",
+            debounce=30,
+            max_delay=300
+        ),
+        JobType(
+            "snarf_favicon",
+            get_snarf_favicon_message,
+            function_name="SnarfFavicon"
+        ),
+    ]
+}
+
+
+def enqueue(job_type, target, **payload):
+    """
+    Request a job for a target, such as a blob's uuid. If one is already
+    pending, this request is coalesced into it and its debounce window
+    is extended.
+    """
+
+    target = str(target)
+    job_type = JOB_TYPES[job_type]
+    now = timezone.now()
+
+    with transaction.atomic():
+        job = Job.objects.select_for_update().filter(
+            job_type=job_type.name,
+            target=target,
+            status=Job.STATUS_PENDING
+        ).first()
+
+        if job:
+            job.payload = job_type.merge(job.payload, payload)
+            job.run_after = min(now + job_type.debounce, job.created + job_type.max_delay)
+            job.requests = F("requests") + 1
+            job.save(update_fields=["payload", "run_after", "requests"])
+            return
+
+        try:
+            with transaction.atomic():
+                Job.objects.create(
+                    job_type=job_type.name,
+                    target=target,
+                    payload=job_type.merge({}, payload),
+                    run_after=now + job_type.debounce
+                )
+        except IntegrityError:
+            # Another request created the job first, so coalesce into that
+            enqueue(job_type.name, target, **payload)
+
+
+class AWSExecutor():
+    """
+    Publish jobs to SNS, many per request, or invoke Lambda functions
+    asynchronously. Clients are created once and reused.
+    """
+
+    def __init__(self):
+        self.clients = {}
+
+    def get_client(self, service):
+        if service not in self.clients:
+            self.clients[service] = boto3.client(service)
+        return self.clients[service]
+
+    def run(self, job_type, jobs):
+        """
+        Run the jobs, all of the given type. Return a dict of errors
+        for any which failed, keyed on the job's id.
+        """
+
+        if job_type.topic_arn_setting:
+            return self.publish(job_type, jobs)
+        return self.invoke(job_type, jobs)
+
+    def publish(self, job_type, jobs):
+
+        client = self.get_client("sns")
+        errors = {}
+
+        for i in range(0, len(jobs), SNS_BATCH_SIZE):
+            batch = jobs[i:i + SNS_BATCH_SIZE]
+            try:
+                response = client.publish_batch(
+                    TopicArn=getattr(settings, job_type.topic_arn_setting),
+                    PublishBatchRequestEntries=[
+                        {
+                            "Id": str(job.id),
+                            "Message": json.dumps(job_type.get_message(job.target, job.payload))
+                        }
+                        for job in batch
+                    ]
+                )
+            except Exception as e:
+                errors.update({job.id: str(e) for job in batch})
+                continue
+            for failure in response.get("Failed", []):
+                errors[int(failure["Id"])] = failure.get("Message", failure["Code"])
+
+        return errors
+
+    def invoke(self, job_type, jobs):
+
+        client = self.get_client("lambda")
+        errors = {}
+
+        for job in jobs:
+            try:
+                client.invoke(
+                    FunctionName=job_type.function_name,
+                    InvocationType="Event",
+                    Payload=json.dumps(job_type.get_message(job.target, job.payload))
+                )
+            except Exception as e:
+                errors[job.id] = str(e)
+
+        return errors
+
+
+class InProcessExecutor():
+    """
+    Run jobs locally, rather than sending them to AWS. Every job run is
+    recorded in the runs list.
+    """
+
+    def __init__(self):
+        self.runs = []
+
+    def run(self, job_type, jobs):
+
+        errors = {}
+
+        for job in jobs:
+            self.runs.append((job_type.name, job.target, job.payload))
+            try:
+                job_type.run_locally(job.target, job.payload)
+            except Exception as e:
+                errors[job.id] = str(e)
+
+        return errors
+
+
+EXECUTORS = {
+    "aws": AWSExecutor,
+    "inprocess": InProcessExecutor,
+}
+
+# Executor instances, reused so that their clients are too
+_executors = {}
+
+
+def get_executor(name=None):
+    """
+    Return the named executor, or the one set by the JOB_BACKEND setting.
+    """
+    name = name or settings.JOB_BACKEND
+    if name not in _executors:
+        _executors[name] = EXECUTORS[name]()
+    return _executors[name]
+
+
+def claim_jobs(now, limit):
+    """
+    Mark up to limit due jobs as running, leased until JOB_LEASE from now,
+    and return them. Running jobs whose lease has expired are claimed again.
+    """
+
+    with transaction.atomic():
+        # Skip jobs locked by another dispatcher, so that several can run at once
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True).filter(
+                status__in=[Job.STATUS_PENDING, Job.STATUS_RUNNING],
+                run_after__lte=now
+            ).order_by("run_after")[:limit]
+        )
+        Job.objects.filter(id__in=[job.id for job in jobs]).update(
+            status=Job.STATUS_RUNNING,
+            run_after=now + JOB_LEASE
+        )
+
+    return jobs
+
+
+def retry_job(job, job_type, run_after):
+    """
+    Return a failed job to the queue, to be retried at run_after. If it
+    was requested again while running, it's merged into the new job.
+    """
+
+    with transaction.atomic():
+        pending = Job.objects.select_for_update().filter(
+            job_type=job.job_type,
+            target=job.target,
+            status=Job.STATUS_PENDING
+        ).first()
+
+        if pending:
+            pending.payload = job_type.merge(job.payload, pending.payload)
+            pending.requests = F("requests") + job.requests
+            pending.save(update_fields=["payload", "requests"])
+            job.delete()
+            return
+
+        try:
+            with transaction.atomic():
+                Job.objects.filter(id=job.id).update(
+                    status=Job.STATUS_PENDING,
+                    run_after=run_after,
+                    attempts=job.attempts,
+                    error=job.error
+                )
+        except IntegrityError:
+            # The job was requested again since we looked, so merge into that
+            retry_job(job, job_type, run_after)
+
+
+def dispatch_jobs(executor=None, limit=500):
+    """
+    Run every pending job which is due, up to limit, grouped by job type.
+    Failed jobs are retried with exponential backoff, up to MAX_ATTEMPTS
+    times. Return counts of jobs sent and failed.
+    """
+
+    if executor is None:
+        executor = get_executor()
+
+    now = timezone.now()
+    stats = {"sent": 0, "failed": 0}
+
+    by_type = {}
+    for job in claim_jobs(now, limit):
+        by_type.setdefault(job.job_type, []).append(job)
+
+    for job_type, type_jobs in by_type.items():
+        errors = executor.run(JOB_TYPES[job_type], type_jobs)
+
+        sent = [job.id for job in type_jobs if job.id not in errors]
+        Job.objects.filter(id__in=sent).update(
+            status=Job.STATUS_SENT,
+            sent=timezone.now(),
+            attempts=F("attempts") + 1
+        )
+        stats["sent"] += len(sent)
+
+        for job in type_jobs:
+            if job.id not in errors:
+                continue
+            log.error("Error dispatching %s job, target=%s: %s", job.job_type, job.target, errors[job.id])
+            stats["failed"] += 1
+            job.attempts += 1
+            job.error = errors[job.id]
+            if job.attempts >= MAX_ATTEMPTS:
+                Job.objects.filter(id=job.id).update(
+                    status=Job.STATUS_FAILED,
+                    attempts=job.attempts,
+                    error=job.error
+                )
+            else:
+                retry_job(job, JOB_TYPES[job_type], now + timedelta(seconds=2 ** job.attempts))
+
+    Job.objects.filter(status=Job.STATUS_SENT, sent__lt=now - SENT_JOB_RETENTION).delete()
+
+    return stats
+
+
+def get_queue_stats():
+    """
+    Return, for each job type, the number of jobs pending, due and failed,
+    the age in seconds of the oldest pending job, and the mean latency in
+    seconds, from first request to dispatch, of recently sent jobs.
+    """
+
+    now = timezone.now()
+    stats = {
+        name: {"pending": 0, "due": 0, "failed": 0, "oldest_pending": None, "mean_latency": None}
+        for name in JOB_TYPES
+    }
+
+    for row in Job.objects.filter(status=Job.STATUS_PENDING).values("job_type").annotate(
+            pending=Count("id"),
+            oldest=Min("created")
+    ):
+        stats[row["job_type"]]["pending"] = row["pending"]
+        stats[row["job_type"]]["oldest_pending"] = (now - row["oldest"]).total_seconds()
+
+    for row in Job.objects.filter(
+            status=Job.STATUS_PENDING,
+            run_after__lte=now
+    ).values("job_type").annotate(due=Count("id")):
+        stats[row["job_type"]]["due"] = row["due"]
+
+    for row in Job.objects.filter(status=Job.STATUS_FAILED).values("job_type").annotate(failed=Count("id")):
+        stats[row["job_type"]]["failed"] = row["failed"]
+
+    for row in Job.objects.filter(status=Job.STATUS_SENT).values("job_type").annotate(
+            latency=Avg(F("sent") - F("created"))
+    ):
+        stats[row["job_type"]]["mean_latency"] = row["latency"].total_seconds()
+
+    return stats
@@ -0,0 +1,49 @@
+# Dispatch pending jobs, such as indexing blobs, to SNS or Lambda.
+#  Run with --loop as a long-lived worker.
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from lib.jobs import dispatch_jobs, get_queue_stats
+
+
+class Command(BaseCommand):
+    help = "Dispatch pending jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep dispatching jobs as they become due"
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="The number of seconds to wait between dispatches when looping"
+        )
+        parser.add_argument(
+            "--stats",
+            action="store_true",
+            help="Report queue depth and latency for each job type, then exit"
+        )
+
+    def handle(self, *args, loop, interval, stats, **kwargs):
+
+        if stats:
+            for job_type, job_stats in get_queue_stats().items():
+                self.stdout.write(
+                    f"{job_type}: {job_stats['pending']} pending, {job_stats['due']} due, "
+                    f"{job_stats['failed']} failed, oldest pending {job_stats['oldest_pending']}s, "
+                    f"mean latency {job_stats['mean_latency']}s"
+                )
+            return
+
+        while True:
+            result = dispatch_jobs()
+            if result["sent"] or result["failed"]:
+                self.stdout.write(f"{result['sent']} sent, {result['failed']} failed")
+            if not loop:
+                break
+            time.sleep(interval)
@@ -0,0 +1,47 @@
+from django.db import models
+from django.db.models import Q, UniqueConstraint
+
+
+class Job(models.Model):
+    """
+    A side effect, such as indexing a blob, waiting to be dispatched to
+    SNS or Lambda. There's at most one pending job for each job type and
+    target, into which any further requests for it are coalesced.
+    """
+
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_SENT = "sent"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_SENT, "Sent"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    job_type = models.CharField(max_length=50)
+    target = models.TextField()
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    created = models.DateTimeField(auto_now_add=True)
+    run_after = models.DateTimeField()
+    sent = models.DateTimeField(null=True, blank=True)
+    requests = models.IntegerField(default=1)
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=("job_type", "target"),
+                condition=Q(status="pending"),
+                name="job_unique_pending"
+            )
+        ]
+        indexes = [
+            models.Index(fields=("status", "run_after"), name="job_status_run_after_idx")
+        ]
+
+    def __str__(self):
+        return f"{self.job_type}: {self.target}"
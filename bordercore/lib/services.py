@@ -6,8 +6,10 @@ from django.http import JsonResponse
 
 from bookmark.models import Bookmark
 from drill.models import Question
+from lib.decorators import conditional_get
 
 
+@conditional_get
 @api_view(["GET"])
 def site_stats(request):
 
@@ -0,0 +1,116 @@
+# pylint: disable=missing-function-docstring,missing-class-docstring,missing-module-docstring
+
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import django
+
+django.setup()
+
+from lib.backfill import Backfill, Checkpoint, run_backfill  # isort:skip
+
+
+class NameLengthBackfill(Backfill):
+
+    field = "name_length"
+    source = ["uuid", "name"]
+
+    def compute(self, source):
+        if source["name"] == "error":
+            raise ValueError("Bad name")
+        return len(source["name"]) or None
+
+
+def get_hit(uuid, name):
+    return {
+        "_index": "bordercore",
+        "_id": uuid,
+        "_source": {"uuid": uuid, "name": name},
+        "sort": [uuid]
+    }
+
+
+@patch("lib.backfill.helpers.bulk")
+def test_run_backfill(mock_bulk, tmp_path):
+
+    mock_bulk.side_effect = lambda es, actions, **kwargs: (len(actions), [])
+
+    es = MagicMock()
+    es.open_point_in_time.return_value = {"id": "pit"}
+    es.search.side_effect = [
+        {"pit_id": "pit", "hits": {"hits": [get_hit("a", "foo"), get_hit("b", "")]}},
+        {"pit_id": "pit", "hits": {"hits": [get_hit("c", "error"), get_hit("d", "quux")]}},
+        {"pit_id": "pit", "hits": {"hits": []}},
+    ]
+
+    checkpoint_path = tmp_path / "checkpoint.json"
+    checkpoint_path.write_text(json.dumps({"field": "name_length", "search_after": ["0"]}))
+
+    stats = run_backfill(
+        es,
+        "bordercore",
+        NameLengthBackfill(),
+        workers=1,
+        page_size=2,
+        checkpoint_path=str(checkpoint_path),
+        report=lambda x: None
+    )
+
+    assert stats["found"] == 4
+    assert stats["updated"] == 2
+    assert stats["skipped"] == 1
+    assert stats["failed"] == 1
+
+    # The search resumes from the checkpoint, then continues after each page
+    assert es.search.call_args_list[0].kwargs["body"]["search_after"] == ["0"]
+    assert es.search.call_args_list[1].kwargs["body"]["search_after"] == ["b"]
+    assert es.search.call_args_list[0].kwargs["body"]["query"]["bool"]["must_not"] == [
+        {"exists": {"field": "name_length"}}
+    ]
+
+    # One bulk request of partial updates per page
+    assert mock_bulk.call_count == 2
+    assert mock_bulk.call_args_list[0].args[1] == [
+        {"_op_type": "update", "_index": "bordercore", "_id": "a", "doc": {"name_length": 3}}
+    ]
+
+    es.close_point_in_time.assert_called_once_with(body={"id": "pit"})
+
+    # The checkpoint is removed once the backfill finishes
+    assert not checkpoint_path.exists()
+
+
+@patch("lib.backfill.helpers.bulk")
+def test_run_backfill_dry_run(mock_bulk):
+
+    es = MagicMock()
+    es.open_point_in_time.return_value = {"id": "pit"}
+    es.search.side_effect = [
+        {"pit_id": "pit", "hits": {"hits": [get_hit("a", "foo"), get_hit("b", "bar")]}},
+        {"pit_id": "pit", "hits": {"hits": []}},
+    ]
+
+    stats = run_backfill(es, "bordercore", NameLengthBackfill(), workers=1, limit=1, dry_run=True, report=lambda x: None)
+
+    assert stats["found"] == 1
+    assert stats["updated"] == 1
+    mock_bulk.assert_not_called()
+
+
+def test_checkpoint(tmp_path):
+
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.json"), "size")
+    assert checkpoint.load() is None
+
+    checkpoint.save(["abc"])
+    assert checkpoint.load() == ["abc"]
+
+    checkpoint.clear()
+    assert checkpoint.load() is None
+
+    # A checkpoint from a different backfill is rejected
+    Checkpoint(str(tmp_path / "checkpoint.json"), "num_pages").save(["abc"])
+    with pytest.raises(ValueError):
+        checkpoint.load()
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from accounts.tests.factories import UserFactory
+from lib.calendar_events import Calendar, FakeCalendarService
+
+pytestmark = [pytest.mark.django_db]
+
+
+@pytest.fixture
+def locmem_cache(settings):
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+
+
+def get_event(event_id, summary, hours):
+    start = datetime.now(timezone.utc) + timedelta(hours=hours)
+    return {
+        "id": event_id,
+        "summary": summary,
+        "start": {"dateTime": start.isoformat()},
+        "end": {"dateTime": (start + timedelta(hours=1)).isoformat()},
+    }
+
+
+@pytest.fixture
+def calendar():
+    user = UserFactory()
+    user.userprofile.google_calendar_email = "calendar@example.com"
+
+    service = FakeCalendarService([
+        get_event("1", "Later", 48),
+        get_event("2", "Soon", 1),
+        get_event("3", "Next month", 24 * 20),
+        get_event("4", "Finished", -2),
+    ])
+
+    return Calendar(user.userprofile, service=service)
+
+
+def test_get_calendar_info(locmem_cache, calendar):
+
+    events = calendar.get_calendar_info()
+
+    assert [x["summary"] for x in events] == ["Soon", "Later"]
+    assert [x["count"] for x in events] == [1, 2]
+
+    # Fresh cached events are returned without calling the API
+    calendar.service.put_event(get_event("5", "New", 2))
+    assert len(calendar.get_calendar_info()) == 2
+    assert len(calendar.service.requests) == 1
+
+
+def test_calendar_refresh(locmem_cache, calendar):
+
+    state = calendar.refresh()
+    assert calendar.service.requests[-1]["syncToken"] is None
+    assert "timeMin" in calendar.service.requests[-1]
+
+    # Finished events aren't kept
+    assert set(state["events"].keys()) == {"1", "2", "3"}
+
+    # Later refreshes only fetch changes
+    calendar.service.put_event(get_event("5", "New", 2))
+    calendar.service.delete_event("1")
+    state = calendar.refresh()
+    assert calendar.service.requests[-1]["syncToken"] is not None
+    assert "timeMin" not in calendar.service.requests[-1]
+    assert set(state["events"].keys()) == {"2", "3", "5"}
+
+    # An expired sync token results in a full sync
+    calendar.service.expire_sync_tokens()
+    state = calendar.refresh()
+    assert calendar.service.requests[-1]["syncToken"] is None
+    assert set(state["events"].keys()) == {"2", "3", "5"}
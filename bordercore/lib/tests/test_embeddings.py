@@ -1,4 +1,8 @@
-from lib.embeddings import batched
+from unittest.mock import MagicMock
+
+from lib.embeddings import (FakeEmbeddingBackend, batched, batched_by_tokens,
+                            chunk_text, get_chunked_embeddings, get_embeddings,
+                            len_safe_get_embedding)
 
 
 def test_batched():
@@ -34,3 +38,67 @@ def test_batched():
         result = list(batched("ABC", -1))
     except ValueError as e:
         assert str(e) == "n must be at least one"
+
+
+def test_batched_by_tokens():
+
+    chunks = [("a", (1, 2, 3)), ("b", (4,)), ("c", (5, 6)), ("d", (7,))]
+
+    # Limited by the number of inputs
+    assert list(batched_by_tokens(chunks, 2, 100)) == [chunks[:2], chunks[2:]]
+
+    # Limited by the number of tokens
+    assert list(batched_by_tokens(chunks, 100, 4)) == [chunks[:2], chunks[2:]]
+
+    # A chunk larger than the token limit gets a batch of its own
+    assert list(batched_by_tokens(chunks, 100, 2)) == [chunks[:1], chunks[1:2], chunks[2:3], chunks[3:]]
+
+
+def test_get_embeddings():
+
+    backend = MagicMock(wraps=FakeEmbeddingBackend())
+
+    texts = ["the quick brown fox " * 10, "", "jumped over the lazy dog " * 10]
+    embeddings = get_embeddings(texts, max_tokens=16, backend=backend, batch_size=100)
+
+    # Chunks from every text are embedded with a single request
+    assert backend.embed.call_count == 1
+
+    assert embeddings[1] is None
+    for embedding in (embeddings[0], embeddings[2]):
+        assert len(embedding) == 1536
+        assert abs(sum(x * x for x in embedding) - 1) < 1e-6
+
+    # The same text always has the same embedding
+    assert get_embeddings(texts[:1], max_tokens=16, backend=backend)[0] == embeddings[0]
+
+    assert len_safe_get_embedding("") is None
+
+
+def test_chunk_text():
+
+    text = "one two three\n\nfour five\n\n\n" + "six " * 20
+
+    # Short paragraphs are combined, long ones are split
+    chunks = chunk_text(text, max_tokens=8)
+    assert chunks[0] == ("one two three\n\nfour five", 5)
+    assert all(tokens <= 8 for _, tokens in chunks)
+    assert "".join(x for x, _ in chunks[1:]).split() == ["six"] * 20
+
+    assert chunk_text("") == []
+
+
+def test_get_chunked_embeddings():
+
+    backend = MagicMock(wraps=FakeEmbeddingBackend())
+
+    texts = ["the quick brown fox\n\njumped over the lazy dog", ""]
+    results = get_chunked_embeddings(texts, max_tokens=8, backend=backend)
+
+    embedding, chunks = results[0]
+    assert [x["text"] for x in chunks] == ["the quick brown fox", "jumped over the lazy dog"]
+    assert len(embedding) == 1536
+    assert all(len(x["embeddings_vector"]) == 1536 for x in chunks)
+    assert backend.embed.call_count == 1
+
+    assert results[1] == (None, [])
@@ -0,0 +1,133 @@
+# pylint: disable=missing-function-docstring,missing-class-docstring,missing-module-docstring
+
+from unittest.mock import MagicMock
+
+import pytest
+
+import django
+
+django.setup()
+
+from lib.index_layout import (get_index_template, migrate,  # isort:skip
+                              update_user_aliases)
+from lib.util import get_index_alias, get_index_group  # isort:skip
+
+MAPPINGS = {
+    "settings": {"index": {"max_ngram_diff": 8}, "analysis": {}},
+    "mappings": {"properties": {"user_id": {"type": "integer"}}}
+}
+
+
+def get_es(aliases=None, concrete=()):
+    """
+    Return a mock Elasticsearch client with the given aliases, keyed on
+    name, and concrete indexes.
+    """
+
+    aliases = aliases or {}
+
+    es = MagicMock()
+    es.indices.exists_alias.side_effect = lambda name: name in aliases
+    es.indices.exists.side_effect = lambda index: index in concrete
+    es.indices.get_alias.side_effect = lambda name=None, index=None: \
+        {x: {"aliases": {}} for x in aliases[name]} if name \
+        else {index: {"aliases": {k: {} for k, v in aliases.items() if index in v}}}
+    es.reindex.return_value = {"task": "task"}
+    es.tasks.get.return_value = {
+        "completed": True,
+        "task": {"status": {"created": 2, "total": 2}},
+        "response": {"created": 2, "version_conflicts": 0, "failures": []}
+    }
+    return es
+
+
+def get_actions(es, call=-1):
+    return es.indices.update_aliases.call_args_list[call].kwargs["body"]["actions"]
+
+
+def test_get_index_alias():
+
+    assert get_index_group("note") == "documents"
+    assert get_index_group("bookmark") == "objects"
+    assert get_index_alias("bordercore", "book") == "bordercore_documents"
+    assert get_index_alias("bordercore", group="objects") == "bordercore_objects"
+
+
+def test_get_index_template():
+
+    template = get_index_template("bordercore", "documents", MAPPINGS)
+
+    assert template["index_patterns"] == ["bordercore_documents-*"]
+    assert template["template"]["settings"]["index"]["max_ngram_diff"] == 8
+    assert template["template"]["settings"]["index"]["number_of_shards"] == 2
+    assert template["template"]["mappings"] == MAPPINGS["mappings"]
+
+
+def test_migrate_concrete_index():
+
+    es = get_es(concrete=("bordercore",))
+
+    new_indexes = migrate(es, "bordercore", MAPPINGS, [1, 2], report=lambda x: None)
+
+    assert es.indices.put_index_template.call_count == 2
+    assert es.reindex.call_count == 2
+    body = es.reindex.call_args_list[0].kwargs["body"]
+    assert body["source"]["index"] == ["bordercore"]
+    assert body["dest"] == {"index": new_indexes["documents"], "op_type": "create"}
+
+    # Writes are sent to the new indexes before anything is copied
+    assert {"add": {"index": new_indexes["objects"], "alias": "bordercore_objects"}} in get_actions(es, 0)
+
+    actions = get_actions(es)
+    assert actions[0] == {"remove_index": {"index": "bordercore"}}
+    assert {"add": {"index": new_indexes["documents"], "alias": "bordercore"}} in actions
+    assert {
+        "add": {
+            "index": new_indexes["objects"],
+            "alias": "bordercore_user_2",
+            "filter": {"term": {"user_id": 2}}
+        }
+    } in actions
+
+
+def test_migrate_keep_old():
+
+    es = get_es(
+        aliases={
+            "bordercore": ["bordercore_documents-1", "bordercore_objects-1"],
+            "bordercore_documents": ["bordercore_documents-1"],
+            "bordercore_objects": ["bordercore_objects-1"],
+            "bordercore_user_1": ["bordercore_documents-1", "bordercore_objects-1"],
+        }
+    )
+
+    migrate(es, "bordercore", MAPPINGS, [1], keep_old=True, report=lambda x: None)
+
+    assert {"remove": {"index": "bordercore_objects-1", "alias": "bordercore_objects"}} in get_actions(es, 0)
+
+    actions = get_actions(es)
+    assert {"remove": {"index": "bordercore_documents-1", "alias": "bordercore"}} in actions
+    assert {"remove": {"index": "bordercore_documents-1", "alias": "bordercore_user_1"}} in actions
+    assert not [x for x in actions if "remove_index" in x]
+
+
+def test_migrate_new_cluster():
+
+    es = get_es()
+
+    migrate(es, "bordercore", MAPPINGS, [], report=lambda x: None)
+
+    assert es.indices.create.call_count == 2
+    es.reindex.assert_not_called()
+
+
+def test_update_user_aliases():
+
+    es = get_es()
+    with pytest.raises(ValueError):
+        update_user_aliases(es, "bordercore", [1], report=lambda x: None)
+
+    es = get_es(aliases={"bordercore": ["bordercore_documents-1", "bordercore_objects-1"]})
+    update_user_aliases(es, "bordercore", [1], report=lambda x: None)
+
+    assert len(get_actions(es)) == 2
@@ -0,0 +1,144 @@
+from datetime import timedelta
+
+import pytest
+
+from django.utils import timezone
+
+from lib.jobs import (JOB_LEASE, InProcessExecutor, claim_jobs, dispatch_jobs,
+                      enqueue, get_queue_stats)
+from lib.models import Job
+
+pytestmark = [pytest.mark.django_db]
+
+
+def make_due():
+    Job.objects.update(run_after=timezone.now() - timedelta(seconds=1))
+
+
+def test_enqueue():
+
+    enqueue("index_blob", "uuid-1", file_changed=False, new_blob=False)
+    enqueue("index_blob", "uuid-1", file_changed=True, new_blob=False)
+    enqueue("index_blob", "uuid-2", file_changed=False, new_blob=False)
+    enqueue("create_collection_thumbnail", "uuid-1")
+
+    # Requests for the same job type and target are coalesced
+    assert Job.objects.count() == 3
+
+    job = Job.objects.get(job_type="index_blob", target="uuid-1")
+    assert job.requests == 2
+    assert job.payload == {"file_changed": True, "new_blob": False}
+
+    # Each request extends the debounce window...
+    assert job.run_after > timezone.now()
+
+    # ...but not past the job's maximum delay
+    Job.objects.filter(id=job.id).update(created=timezone.now() - timedelta(hours=1))
+    enqueue("index_blob", "uuid-1")
+    job.refresh_from_db()
+    assert job.run_after <= timezone.now()
+
+
+def test_dispatch_jobs(monkeypatch):
+
+    executor = InProcessExecutor()
+    local_runs = []
+    monkeypatch.setattr("lib.jobs.index_blob_locally", lambda target, **payload: local_runs.append(target))
+
+    enqueue("index_blob", "uuid-1", file_changed=False, new_blob=False)
+    enqueue("create_collection_thumbnail", "uuid-2")
+
+    # Jobs aren't dispatched until their debounce window has passed
+    assert dispatch_jobs(executor) == {"sent": 0, "failed": 0}
+
+    make_due()
+    assert dispatch_jobs(executor) == {"sent": 2, "failed": 0}
+    assert sorted(executor.runs) == [
+        ("create_collection_thumbnail", "uuid-2", {}),
+        ("index_blob", "uuid-1", {"file_changed": False, "new_blob": False}),
+    ]
+    assert local_runs == ["uuid-1"]
+    assert Job.objects.filter(status=Job.STATUS_SENT).count() == 2
+
+    # Once a job is sent, a new request creates a new job
+    enqueue("index_blob", "uuid-1")
+    assert Job.objects.filter(status=Job.STATUS_PENDING).count() == 1
+
+
+def test_dispatch_jobs_failed(monkeypatch):
+
+    def fail(target, **payload):
+        raise Exception("Indexing failed")
+
+    monkeypatch.setattr("lib.jobs.index_blob_locally", fail)
+
+    enqueue("index_blob", "uuid-1")
+    make_due()
+    assert dispatch_jobs(InProcessExecutor()) == {"sent": 0, "failed": 1}
+
+    # Failed jobs stay pending, to be retried after a backoff
+    job = Job.objects.get()
+    assert job.status == Job.STATUS_PENDING
+    assert job.attempts == 1
+    assert job.error == "Indexing failed"
+    assert job.run_after > timezone.now()
+
+
+def test_claim_jobs():
+
+    enqueue("index_blob", "uuid-1", file_changed=False, new_blob=False)
+    make_due()
+
+    # Claimed jobs are leased, so aren't claimed by another dispatcher...
+    now = timezone.now()
+    assert len(claim_jobs(now, 10)) == 1
+    assert Job.objects.get().status == Job.STATUS_RUNNING
+    assert claim_jobs(now, 10) == []
+
+    # ...unless their lease expires before they're sent
+    assert len(claim_jobs(now + JOB_LEASE, 10)) == 1
+
+    # A request for a running job creates a new one, since the running
+    #  job may already have been sent
+    enqueue("index_blob", "uuid-1", file_changed=True, new_blob=False)
+    assert Job.objects.filter(status=Job.STATUS_PENDING).count() == 1
+
+
+def test_dispatch_jobs_failed_requested_again(monkeypatch):
+
+    def fail(target, **payload):
+        enqueue("index_blob", target, file_changed=False, new_blob=False)
+        raise Exception("Indexing failed")
+
+    monkeypatch.setattr("lib.jobs.index_blob_locally", fail)
+
+    enqueue("index_blob", "uuid-1", file_changed=True, new_blob=False)
+    make_due()
+    assert dispatch_jobs(InProcessExecutor()) == {"sent": 0, "failed": 1}
+
+    # The failed job is merged into the one requested while it was running
+    job = Job.objects.get()
+    assert job.status == Job.STATUS_PENDING
+    assert job.requests == 2
+    assert job.payload == {"file_changed": True, "new_blob": False}
+
+
+def test_get_queue_stats():
+
+    enqueue("index_blob", "uuid-1")
+    enqueue("index_blob", "uuid-2")
+    enqueue("snarf_favicon", "https://www.bordercore.com")
+
+    stats = get_queue_stats()
+    assert stats["index_blob"]["pending"] == 2
+    assert stats["index_blob"]["due"] == 0
+    assert stats["index_blob"]["oldest_pending"] >= 0
+    assert stats["snarf_favicon"]["due"] == 1
+    assert stats["create_collection_thumbnail"]["pending"] == 0
+
+    make_due()
+    dispatch_jobs(InProcessExecutor())
+
+    stats = get_queue_stats()
+    assert stats["index_blob"]["pending"] == 0
+    assert stats["index_blob"]["mean_latency"] >= 0
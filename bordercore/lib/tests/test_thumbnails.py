@@ -0,0 +1,69 @@
+# pylint: disable=missing-function-docstring,missing-class-docstring,missing-module-docstring
+
+from PIL import Image
+
+from lib.thumbnails import (create_collection_cover, create_thumbnail,
+                            get_cover_upload_args)
+
+
+def test_create_thumbnail_from_image(tmp_path):
+
+    infile = tmp_path / "image.jpg"
+    Image.new("RGB", (2000, 1000), "red").save(infile, "JPEG")
+
+    covers = create_thumbnail(str(infile), f"{tmp_path}/uuid", formats=("jpg", "webp"))
+
+    assert covers == [f"{tmp_path}/uuid-cover.jpg", f"{tmp_path}/uuid-cover.webp"]
+
+    for cover in covers:
+        with Image.open(cover) as im:
+            assert im.size == (128, 64)
+
+    args = get_cover_upload_args(covers[1])
+    assert args["ContentType"] == "image/webp"
+    assert args["Metadata"] == {"image-width": "128", "image-height": "64", "cover-image": "Yes"}
+
+
+def test_create_thumbnail_from_image_multiple_sizes(tmp_path):
+
+    infile = tmp_path / "image.png"
+    Image.new("P", (1000, 1000)).save(infile, "PNG")
+
+    covers = create_thumbnail(
+        str(infile),
+        f"{tmp_path}/uuid",
+        sizes={"cover-large": (512, 512), "cover": (128, 128)}
+    )
+
+    with Image.open(covers[0]) as im:
+        assert im.size == (512, 512)
+    with Image.open(covers[1]) as im:
+        assert im.size == (128, 128)
+
+
+def test_create_collection_cover(tmp_path):
+
+    images = []
+    for i, color in enumerate(["red", "green", "blue", "white"]):
+        infile = tmp_path / f"cover-{i}.jpg"
+        Image.new("RGB", (128, 96), color).save(infile, "JPEG")
+        images.append(str(infile))
+
+    outfile = tmp_path / "collection.jpg"
+    create_collection_cover(images, outfile)
+
+    with Image.open(outfile) as im:
+        assert im.size == (300, 300)
+        # Images are tiled two by two
+        r, g, b = im.getpixel((75, 75))
+        assert r > 200 and g < 50 and b < 50
+        r, g, b = im.getpixel((225, 225))
+        assert r > 200 and g > 200 and b > 200
+
+    # A single image fills the cover by itself
+    create_collection_cover(images[2:3], outfile)
+
+    with Image.open(outfile) as im:
+        assert im.size == (300, 300)
+        r, g, b = im.getpixel((150, 150))
+        assert r < 50 and g < 50 and b > 200
@@ -5,7 +5,8 @@ import pytest
 import pytz
 
 from lib.time_utils import (cleanup, convert_seconds, get_date_from_pattern,
-                            get_javascript_date, get_relative_date,
+                            get_display_date, get_epoch, get_javascript_date,
+                            get_relative_date, get_relative_dates,
                             parse_date_from_string)
 
 
@@ -37,6 +38,46 @@ def test_get_relative_date():
         assert get_relative_date("2017-03-13T08:00:00-0400") == "3 years ago"
 
 
+def test_get_relative_dates():
+
+    timezone = pytz.timezone("US/Eastern")
+    now = timezone.localize(datetime.datetime(2020, 4, 28, 8, 0, 0))
+
+    dates = [
+        "2020-04-28T09:00:00-0400",
+        "2020-04-28T07:59:30-0400",
+        "2020-04-28T07:00:00-0400",
+        "2020-04-27T08:00:00-0400",
+        "2020-04-13T08:00:00-0400",
+        "2017-03-13T08:00:00-0400",
+    ]
+    epochs = [int(datetime.datetime.strptime(x, "%Y-%m-%dT%H:%M:%S%z").timestamp()) for x in dates]
+
+    assert get_relative_dates(epochs + [None], now=now) == [
+        "",
+        "30 seconds ago",
+        "an hour ago",
+        "Yesterday",
+        "2 weeks ago",
+        "3 years ago",
+        "",
+    ]
+
+
+def test_get_epoch():
+
+    assert get_epoch("2020-04-28T08:00:00.123456-04:00") == 1588075200
+    assert get_epoch("2020-04-28T12:00:00Z") == 1588075200
+    assert get_epoch(None) is None
+
+
+def test_get_display_date():
+
+    assert get_display_date("1999-01-01 10:00:00") == "January 01, 1999"
+    assert get_display_date("[1999-01 TO 1999-03]") == "1999-01 to 1999-03"
+    assert get_display_date(None) is None
+
+
 def test_convert_seconds():
 
     assert convert_seconds(339) == "5:39"
@@ -4,9 +4,10 @@ import pytest
 
 import django
 
-from lib.util import (get_missing_blob_ids, get_missing_bookmark_ids,
-                      get_pagination_range, is_audio, is_image, is_pdf,
-                      is_video, remove_non_ascii_characters, truncate)
+from lib.util import (get_domain, get_missing_blob_ids,
+                      get_missing_bookmark_ids, get_pagination_range, is_audio,
+                      is_image, is_pdf, is_video, remove_non_ascii_characters,
+                      truncate)
 
 django.setup()
 
@@ -156,6 +157,16 @@ def test_get_missing_bookmark_ids(auto_login_user, monkeypatch):
     assert get_missing_bookmark_ids(expected, found) == ["d2edec1c-493a-4d9c-877b-21900e848187"]
 
 
+def test_get_domain():
+
+    assert get_domain("https://www.npr.org/sections/news/") == "npr.org"
+    assert get_domain("http://bordercore.com") == "bordercore.com"
+    assert get_domain("https://WWW.Bordercore.com:8000/path?q=1") == "bordercore.com"
+    assert get_domain("https://a.b.example.co.uk/") == "a.b.example.co.uk"
+    assert get_domain("bordercore.com/path") is None
+    assert get_domain("") is None
+
+
 def test_truncate():
 
     string = "foobar"
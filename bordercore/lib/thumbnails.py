@@ -1,5 +1,7 @@
+import io
 import logging
 import subprocess
+from pathlib import PurePath
 
 from PIL import Image
 
@@ -9,86 +11,230 @@ logging.getLogger().setLevel(logging.INFO)
 log = logging.getLogger(__name__)
 log.setLevel(logging.DEBUG)
 
+FFMPEG_PATH = "/usr/local/bin/ffmpeg"
 
-def create_thumbnail(infile, outdir, page_number=1):
+# The covers created for each file, mapped to the box each is resized to fit.
+#  A box of None means the image isn't resized. Sizes should be listed from
+#  largest to smallest, since each one is resized from the previous one.
+COVER_SIZES = {
+    "cover-large": None,
+    "cover": (128, 128)
+}
+
+# Images serve as their own large cover, so only the small one is created
+IMAGE_COVER_SIZES = {
+    "cover": COVER_SIZES["cover"]
+}
+
+DEFAULT_FORMATS = ("jpg",)
+
+# Pdf pages rendered for the large cover use this resolution
+PDF_DPI = 150
+
+IMAGE_FORMATS = {
+    "jpg": "JPEG",
+    "png": "PNG",
+    "webp": "WEBP"
+}
+
+# Collection covers are a montage of up to four images, each fit in a
+#  tile of this size with a border, with the result resized to fit a box
+COLLECTION_COVER_TILE = (120, 120)
+COLLECTION_COVER_BORDER = 1
+COLLECTION_COVER_SIZE = (300, 300)
+
+CONTENT_TYPES = {
+    "jpg": "image/jpeg",
+    "png": "image/png",
+    "webp": "image/webp"
+}
+
+
+def create_thumbnail(infile, outdir, page_number=1, sizes=None, formats=DEFAULT_FORMATS):
+    """
+    Create cover images for a file, returning the list of files created.
+    """
 
     if is_image(infile):
-        create_thumbnail_from_image(infile, outdir)
+        return create_thumbnail_from_image(infile, outdir, sizes or IMAGE_COVER_SIZES, formats)
     elif is_pdf(infile):
-        create_thumbnail_from_pdf(infile, outdir, page_number)
+        return create_thumbnail_from_pdf(infile, outdir, page_number, sizes or COVER_SIZES, formats)
     elif is_video(infile):
-        create_thumbnail_from_video(infile, outdir)
+        return create_thumbnail_from_video(infile, outdir, sizes or COVER_SIZES, formats)
     else:
         log.warning("Can't create thumbnail from this type of file")
+        return []
 
 
-def create_thumbnail_from_image(infile, outdir):
+def save_covers(im, outdir, sizes, formats=DEFAULT_FORMATS):
+    """
+    Save an image in every requested size and format from a single decoded
+    copy. Each size is resized from the one before it, so the cost of each
+    resize is proportional to the previous size rather than to the original.
+    """
 
-    size = 128, 128
+    im = im.convert("RGB")
+    covers = []
+
+    for name, box in sizes.items():
+        if box is not None:
+            im.thumbnail(box, reducing_gap=2.0)
+        for extension in formats:
+            filename = f"{outdir}-{name}.{extension}"
+            im.save(filename, IMAGE_FORMATS[extension])
+            covers.append(filename)
+
+    return covers
+
+
+def get_max_box(sizes):
+    """
+    Return the largest box among the requested sizes, or None if any
+    size calls for the original resolution.
+    """
+
+    boxes = list(sizes.values())
+    if None in boxes:
+        return None
+    return max(boxes, key=lambda x: x[0] * x[1])
+
+
+def create_thumbnail_from_image(infile, outdir, sizes=IMAGE_COVER_SIZES, formats=DEFAULT_FORMATS):
 
     try:
-        # Convert images to RGB mode to avoid "cannot write mode P as JPEG" errors for PNGs
-        im = Image.open(infile).convert("RGB")
-        im.thumbnail(size)
-        im.save(f"{outdir}-cover.jpg")
+        im = Image.open(infile)
+
+        # For JPEGs, let the decoder downscale by up to 8x while decoding
+        #  rather than decoding every pixel of the original
+        box = get_max_box(sizes)
+        if box is not None:
+            im.draft("RGB", box)
+
+        return save_covers(im, outdir, sizes, formats)
     except IOError as err:
         log.error("Cannot create thumbnail; error=%s", err)
+        return []
 
 
-def create_thumbnail_from_pdf(infile, outdir, page_number=1):
+def get_pdf_page_image(infile, page_number=1, box=None):
+    """
+    Render a pdf page as an image. If a box is given, render it at the
+    resolution which fits that box rather than at full resolution.
+    """
 
     # Put the import here so that AWS lambdas that use other functions in this
     # module don't need to install the PyMuPDF package, which provides fitz
     import fitz
 
-    page_number = page_number - 1
-    cover_large = f"{outdir}-cover-large.jpg"
-
     doc = fitz.open(infile)
-    page = doc.load_page(page_number)
-    pix = page.get_pixmap(dpi=150)
-    pix.pil_save(cover_large)
+    page = doc.load_page(page_number - 1)
+
+    if box is None:
+        pix = page.get_pixmap(dpi=PDF_DPI)
+    else:
+        zoom = min(box[0] / page.rect.width, box[1] / page.rect.height)
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
 
-    create_small_cover_image(cover_large, outdir)
+    return Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
 
 
-def create_thumbnail_from_video(infile, outdir):
+def create_thumbnail_from_pdf(infile, outdir, page_number=1, sizes=COVER_SIZES, formats=DEFAULT_FORMATS):
 
-    thumbnail_filename = f"{outdir}-cover-large.jpg"
+    im = get_pdf_page_image(infile, page_number, get_max_box(sizes))
+    return save_covers(im, outdir, sizes, formats)
 
-    # ffmpeg -ss 00:00:10  -i Fix*mp4 -vframes 1 -q:v 2 output.jpg
 
-    subprocess.run(
+def get_video_frame(infile, offset="00:00:01"):
+    """
+    Extract a single frame from a video. The input can be a local file or
+    a URL, such as a presigned S3 url. Since the seek is done before the
+    input is opened, ffmpeg only reads the byte ranges it needs rather
+    than the whole file. The frame is piped back rather than written to disk.
+    """
+
+    result = subprocess.run(
         [
-            "/usr/local/bin/ffmpeg",
+            FFMPEG_PATH,
+            "-loglevel",
+            "error",
             "-ss",
-            "00:00:01",
+            offset,
             "-i",
             infile,
             "-vframes",
             "1",
-            "-q:v",
-            "2",
-            thumbnail_filename
-        ]
+            "-f",
+            "image2pipe",
+            "-vcodec",
+            "png",
+            "-"
+        ],
+        capture_output=True,
+        check=True
     )
 
-    create_small_cover_image(thumbnail_filename, outdir)
+    return Image.open(io.BytesIO(result.stdout))
 
 
-def create_small_cover_image(cover_large, outdir):
+def create_thumbnail_from_video(infile, outdir, sizes=COVER_SIZES, formats=DEFAULT_FORMATS):
+
+    try:
+        im = get_video_frame(infile)
+    except subprocess.CalledProcessError as err:
+        log.error("Cannot extract video frame; error=%s", err.stderr)
+        return []
+
+    return save_covers(im, outdir, sizes, formats)
+
+
+def create_collection_cover(images, outfile):
     """
-    Resize the large cover jpg to create a small (thumbnail) jpg
+    Compose a collection's cover from up to four images, given as file
+    paths or file objects: a single image fills the cover by itself,
+    otherwise they're tiled two by two on a black background. Each image
+    is only ever shrunk to fit its tile, so small covers are enough.
     """
 
-    size = 128, 128
+    columns = 1 if len(images) == 1 else 2
+    tile_width = COLLECTION_COVER_TILE[0] + 2 * COLLECTION_COVER_BORDER
+    tile_height = COLLECTION_COVER_TILE[1] + 2 * COLLECTION_COVER_BORDER
 
-    try:
-        im = Image.open(cover_large)
-        im.thumbnail(size)
-        im.save(f"{outdir}-cover.jpg", "JPEG")
-    except IOError:
-        print(f"Cannot create small thumbnail for {cover_large}")
+    montage = Image.new("RGB", (columns * tile_width, columns * tile_height), "black")
+
+    for i, image in enumerate(images[:columns * columns]):
+        with Image.open(image) as im:
+            # For animated gifs, this is the first frame
+            im.seek(0)
+            im.draft("RGB", COLLECTION_COVER_TILE)
+            tile = im.convert("RGB")
+        tile.thumbnail(COLLECTION_COVER_TILE, reducing_gap=2.0)
+
+        # Center each image in its tile
+        x = (i % columns) * tile_width + (tile_width - tile.width) // 2
+        y = (i // columns) * tile_height + (tile_height - tile.height) // 2
+        montage.paste(tile, (x, y))
+
+    montage = montage.resize(COLLECTION_COVER_SIZE, Image.LANCZOS)
+    montage.save(outfile, IMAGE_FORMATS["jpg"])
+
+
+def get_cover_upload_args(cover):
+    """
+    Return the S3 upload arguments for a cover image: its dimensions,
+    stored as metadata, and its content type.
+    """
+
+    with Image.open(cover) as im:
+        width, height = im.size
+
+    return {
+        "Metadata": {
+            "image-width": str(width),
+            "image-height": str(height),
+            "cover-image": "Yes"
+        },
+        "ContentType": CONTENT_TYPES[PurePath(cover).suffix[1:]]
+    }
 
 
 def create_bookmark_thumbnail(cover_large, out_file):
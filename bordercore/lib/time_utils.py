@@ -8,6 +8,18 @@ from collections import OrderedDict
 
 import pytz
 
+TIMEZONE = pytz.timezone("US/Eastern")
+
+# Display formats for the dates stored in Elasticsearch, compiled once
+DATE_FORMATS = [
+    (re.compile(r"^\d\d\d\d-\d\d-\d\d$"), "%Y-%m-%d", "%B %d, %Y"),
+    (re.compile(r"^\d\d\d\d-\d\d$"), "%Y-%m", "%B %Y"),
+    (re.compile(r"^\d\d\d\d-\d\d-\d\dT\d\d:\d\d:\d\d"), "%Y-%m-%dT%H:%M:%S", "%B %d, %Y"),
+    (re.compile(r"^\d\d\d\d-\d\d-\d\d \d\d:\d\d:\d\d"), "%Y-%m-%d %H:%M:%S", "%B %d, %Y"),
+]
+YEAR_PATTERN = re.compile(r"^\d\d\d\d$")
+DATE_RANGE_PATTERN = re.compile(r"^\[([-\d]*) TO ([-\d]*)\]$")
+
 
 def cleanup(interval, time_unit):
 
@@ -32,15 +44,45 @@ def get_relative_date(time=False):
     'Yesterday', '3 months ago', 'just now', etc
     """
 
-    now = datetime.datetime.now(pytz.timezone("US/Eastern"))
+    now = datetime.datetime.now(TIMEZONE)
 
     # Try with microseconds, then try without
     try:
         diff = now - datetime.datetime.strptime(time, "%Y-%m-%dT%H:%M:%S.%f%z")
     except ValueError:
         diff = now - datetime.datetime.strptime(time, "%Y-%m-%dT%H:%M:%S%z")
-    second_diff = diff.seconds
-    day_diff = diff.days
+
+    return format_relative_date(diff.days, diff.seconds)
+
+
+def get_relative_dates(epochs, now=None):
+    """
+    Get a list of times, as seconds since the epoch, and return a pretty
+    string for each. "Now" is computed once for the whole list rather than
+    once per time, and no date parsing is needed.
+    """
+
+    if now is None:
+        now = datetime.datetime.now(TIMEZONE)
+    now_epoch = now.timestamp()
+
+    relative_dates = []
+
+    for epoch in epochs:
+        if epoch is None:
+            relative_dates.append("")
+            continue
+        day_diff, second_diff = divmod(int(now_epoch - epoch), 86400)
+        relative_dates.append(format_relative_date(day_diff, second_diff))
+
+    return relative_dates
+
+
+def format_relative_date(day_diff, second_diff):
+    """
+    Return a pretty string for a time difference, given as a number of
+    days plus a number of seconds less than a day.
+    """
 
     if day_diff < 0:
         return ""
@@ -69,6 +111,21 @@ def get_relative_date(time=False):
     return cleanup(day_diff / 365, "year")
 
 
+def get_epoch(date):
+    """
+    Get an ISO 8601 datetime string, as returned by the REST API,
+    and return the number of seconds since the epoch.
+    """
+
+    if not date:
+        return None
+
+    if isinstance(date, str):
+        date = datetime.datetime.fromisoformat(date.replace("Z", "+00:00"))
+
+    return int(date.timestamp())
+
+
 def get_date_from_pattern(pattern):
     """
     The input is expected to be an Elasticsearch date range
@@ -78,22 +135,24 @@ def get_date_from_pattern(pattern):
     if pattern is None:
         return None
 
-    date = pattern.get("gte", None)
+    return get_display_date(pattern.get("gte", None))
+
+
+def get_display_date(date):
+    """
+    Return a date stored in Elasticsearch formatted for display.
+    """
 
     if date is None:
         return None
 
-    if re.compile(r'^\d\d\d\d-\d\d-\d\d$').match(date):
-        return datetime.datetime.strptime(date, '%Y-%m-%d').strftime('%B %d, %Y')
-    if re.compile(r'^\d\d\d\d-\d\d$').match(date):
-        return datetime.datetime.strptime(date, '%Y-%m').strftime('%B %Y')
-    if re.compile(r'^\d\d\d\d$').match(date):
+    for regex, input_format, output_format in DATE_FORMATS:
+        matches = regex.match(date)
+        if matches:
+            return datetime.datetime.strptime(matches.group(0), input_format).strftime(output_format)
+    if YEAR_PATTERN.match(date):
         return date
-    if re.compile(r'^\d\d\d\d-\d\d-\d\dT\d\d:\d\d:\d\d').match(date):
-        return datetime.datetime.strptime(date, '%Y-%m-%dT%H:%M:%S').strftime('%B %d, %Y')
-    if re.compile(r'^\d\d\d\d-\d\d-\d\d \d\d:\d\d:\d\d').match(date):
-        return datetime.datetime.strptime(date, '%Y-%m-%d %H:%M:%S').strftime('%B %d, %Y')
-    matches = re.compile(r'^\[([-\d]*) TO ([-\d]*)\]$').match(date)
+    matches = DATE_RANGE_PATTERN.match(date)
     if matches:
         return f"{matches.group(1)} to {matches.group(2)}"
 
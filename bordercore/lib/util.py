@@ -1,13 +1,26 @@
+import hashlib
 import os
+import re
 import string
 from pathlib import PurePath
 from typing import Any, Dict, Union
-from urllib.parse import urlparse
 
 import requests
 
 ELASTICSEARCH_TIMEOUT = 20
 
+# Matches the hostname of a url, without any port
+DOMAIN_PATTERN = re.compile(r"https?://([^/:?#]+)", re.IGNORECASE)
+
+# Documents are split by doctype into groups, each with its own index.
+#  Doctypes with large fields, such as attachment text, note contents and
+#  embeddings, are kept apart from the many small objects.
+INDEX_GROUP_DOCUMENTS = "documents"
+INDEX_GROUP_OBJECTS = "objects"
+INDEX_GROUPS = (INDEX_GROUP_DOCUMENTS, INDEX_GROUP_OBJECTS)
+
+DOCUMENT_DOCTYPES = ("blob", "book", "document", "note")
+
 
 def get_elasticsearch_connection(host=None, timeout=ELASTICSEARCH_TIMEOUT):
     return _get_elasticsearch_connection(host, timeout)
@@ -32,6 +45,26 @@ def _get_elasticsearch_connection(host=None, timeout=ELASTICSEARCH_TIMEOUT):
     )
 
 
+def get_index_group(doctype):
+    return INDEX_GROUP_DOCUMENTS if doctype in DOCUMENT_DOCTYPES else INDEX_GROUP_OBJECTS
+
+
+def get_index_alias(index, doctype=None, group=None):
+    """
+    Return the alias of the index holding a doctype, or a group of
+    doctypes. Writes and gets by id must go through these, since the
+    index's own alias, used for searches, spans the indexes of every group.
+    """
+    return f"{index}_{group or get_index_group(doctype)}"
+
+
+def get_user_alias(index, user_id):
+    """
+    Return the alias which filters the index down to one user's documents
+    """
+    return f"{index}_user_{user_id}"
+
+
 def get_missing_blob_ids(expected, found):
 
     found_ids = [x["_id"] for x in found["hits"]["hits"]]
@@ -55,6 +88,14 @@ def get_missing_metadata_ids(expected, found):
     return ", ".join(missing)
 
 
+def get_content_hash(text):
+    """
+    Return a hash of the text an embedding was created from, stored
+    alongside it so that unchanged text needn't be embedded again.
+    """
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
 def truncate(string, limit=100):
 
     return string[:limit] + ("..." if len(string) > limit else "")
@@ -163,15 +204,31 @@ def parse_title_from_url(url):
     return (r.url, "No title")
 
 
-def favicon_url(url, size=32):
+def get_domain(url):
+    """
+    Return the domain of a url's hostname, used to name its favicon, or
+    None if it can't be parsed. For three-part hostnames the first part
+    is dropped, eg www.npr.org becomes npr.org.
+    """
 
     if not url:
-        return ""
+        return None
+
+    match = DOMAIN_PATTERN.match(url)
+    if not match:
+        return None
+
+    parts = match.group(1).lower().split(".")
+    if len(parts) == 3:
+        parts = parts[1:]
+    return ".".join(parts)
 
-    t = urlparse(url).netloc
 
-    # We want the domain part of the hostname (eg bordercore.com instead of www.bordercore.com)
-    domain = ".".join(t.split(".")[1:])
+def favicon_url(url, size=32):
+
+    domain = get_domain(url)
+    if not domain:
+        return ""
 
     return f"<img src=\"https://www.bordercore.com/favicons/{domain}.ico\" width=\"{size}\" height=\"{size}\" />"
 
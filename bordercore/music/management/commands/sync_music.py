@@ -15,16 +15,30 @@ Args:
     --title (str): Song title (overrides ID3 tag).
     --sync-album-song (bool): Indicates that the song is part of an album.
     --song-uuid (str): The UUID of the song in the database.
+    --batch (bool): Sync a directory in batch mode (see below).
+    --workers (int): The number of threads used to read ID3 tags in batch mode.
+    --journal (str): The journal file used to resume or roll back a batch sync.
+    --rollback (bool): Undo the moves recorded in the journal.
     --dry-run (bool): Run without making changes.
+
+In batch mode, ID3 tags for every file in the directory are read concurrently,
+all songs are resolved against the database with a few set-based queries, and
+every move is planned up front. The plan and each completed move are recorded
+in a journal, so that an interrupted sync can be resumed by re-running the
+same command, or undone with --rollback.
 """
 
+import json
 import logging
 import os
 import re
+import time
 from argparse import ArgumentParser
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 import boto3
 from botocore.exceptions import ClientError, NoCredentialsError
@@ -78,6 +92,9 @@ class MusicSyncError(Exception):
     """Custom exception for music sync operations."""
 
 
+JOURNAL_FILENAME = ".sync_music_journal.jsonl"
+
+
 class Command(BaseCommand):
     """Django management command to sync music files from S3 to local filesystem.
 
@@ -145,6 +162,26 @@ class Command(BaseCommand):
             "--song-uuid", "-i",
             help="The song UUID",
         )
+        parser.add_argument(
+            "--batch", "-b",
+            help="Sync a directory in batch mode, with a journal to resume or roll back",
+            action="store_true"
+        )
+        parser.add_argument(
+            "--workers", "-w",
+            help="The number of threads used to read ID3 tags in batch mode",
+            type=int,
+            default=8
+        )
+        parser.add_argument(
+            "--journal", "-j",
+            help=f"The batch mode journal file. Defaults to {JOURNAL_FILENAME} in the directory.",
+        )
+        parser.add_argument(
+            "--rollback", "-r",
+            help="Undo the moves recorded in the batch mode journal",
+            action="store_true"
+        )
         parser.add_argument(
             "--dry-run", "-n",
             help="Dry run. Take no action",
@@ -180,6 +217,20 @@ class Command(BaseCommand):
         try:
             if options.get("uuid"):
                 self._download_from_s3(options["uuid"])
+            elif options.get("batch") or options.get("rollback"):
+                directory = options.get("directory") or "."
+                journal_path = options.get("journal") or str(Path(directory) / JOURNAL_FILENAME)
+                if options.get("rollback"):
+                    self._rollback_batch(journal_path)
+                else:
+                    self._sync_directory_batch(
+                        directory,
+                        options.get("artist"),
+                        options.get("album_name"),
+                        options.get("sync_album_song", False),
+                        journal_path,
+                        options.get("workers") or 8
+                    )
             elif options.get("directory"):
                 self._sync_directory(
                     options["directory"],
@@ -255,6 +306,23 @@ class Command(BaseCommand):
         if song_obj is None:
             raise MusicSyncError("No song object found to determine artist directory")
 
+        artist_dir = self._get_artist_path(song_obj, artist)
+        self._ensure_directory_exists(artist_dir)
+        return str(artist_dir)
+
+    def _get_artist_path(self, song_obj: Song, artist: str) -> Path:
+        """Determine the directory for the given artist without creating it.
+
+        Args:
+            song_obj: The matching song, used to detect compilation albums.
+            artist: Name of the artist.
+
+        Returns:
+            Path to the artist directory.
+
+        Raises:
+            MusicSyncError: If the artist name is invalid.
+        """
         # Determine first letter for directory structure
         first_letter = re.sub(r"\W+", "", artist).lower()
         if not first_letter:
@@ -263,12 +331,8 @@ class Command(BaseCommand):
 
         # Handle compilation albums
         if song_obj.album and song_obj.album.compilation:
-            artist_dir = Path(self.music_dir) / "v" / "Various"
-        else:
-            artist_dir = Path(self.music_dir) / first_letter_dir / self._sanitize_filename(artist)
-
-        self._ensure_directory_exists(artist_dir)
-        return str(artist_dir)
+            return Path(self.music_dir) / "v" / "Various"
+        return Path(self.music_dir) / first_letter_dir / self._sanitize_filename(artist)
 
     def _create_album_directory(self, artist_dir: str, album: str) -> None:
         """Create a directory for the album inside the artist's directory.
@@ -667,3 +731,275 @@ class Command(BaseCommand):
 
         self.stdout.write(f"{Fore.GREEN}Song found in database, uuid={song_obj.uuid}{Style.RESET_ALL}")
         return song_qs
+
+    def _sync_directory_batch(
+        self,
+        directory: str,
+        artist: Optional[str],
+        album_name: Optional[str],
+        is_album_song: bool,
+        journal_path: str,
+        workers: int
+    ) -> None:
+        """Sync all MP3 files in a directory in batch mode.
+
+        If the journal contains an unfinished plan, resume it. Otherwise read
+        the ID3 tags for every file concurrently, resolve all songs against
+        the database at once, plan every move, then apply the plan.
+
+        Args:
+            directory: Path to the directory to scan for MP3 files.
+            artist: Optional artist name override for all files.
+            album_name: Optional album name override for all files.
+            is_album_song: Whether to treat all files as album songs.
+            journal_path: Path to the journal file.
+            workers: The number of threads used to read ID3 tags.
+
+        Raises:
+            MusicSyncError: If the directory path is invalid or inaccessible.
+        """
+        plan, done, complete = self._read_journal(journal_path)
+
+        if plan and not complete:
+            self.stdout.write(
+                f"{Fore.YELLOW}Resuming from journal {journal_path}: "
+                f"{len(done)} of {len(plan)} moves already done{Style.RESET_ALL}"
+            )
+            self._apply_plan(plan, done, journal_path)
+            return
+
+        dir_path = Path(directory)
+        if not dir_path.is_dir():
+            raise MusicSyncError(f"{directory} is not a directory")
+
+        mp3_files = [str(x) for x in dir_path.glob("**/*.mp3")]
+        if not mp3_files:
+            self.stdout.write(f"{Fore.YELLOW}No MP3 files found in {directory}{Style.RESET_ALL}")
+            return
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            id3_infos = list(executor.map(self._get_id3_info, mp3_files))
+        self._report_rate("Read ID3 tags for", len(mp3_files), start)
+
+        metadata_list = []
+        for filename, id3_info in zip(mp3_files, id3_infos):
+            try:
+                metadata = self._resolve_metadata(id3_info, artist, None, album_name, is_album_song)
+                metadata_list.append((filename, metadata))
+            except (MusicSyncError, ValueError) as e:
+                self.stdout.write(f"{Fore.RED}Failed to sync {filename}: {e}{Style.RESET_ALL}")
+
+        start = time.perf_counter()
+        songs = self._resolve_songs_in_db([x[1] for x in metadata_list])
+        self._report_rate("Resolved", len(metadata_list), start)
+
+        plan = self._plan_moves(metadata_list, songs, is_album_song)
+
+        if self.dry_run:
+            for move in plan:
+                self.stdout.write(f"{Fore.GREEN}Would move {move['source']} to {move['target']}{Style.RESET_ALL}")
+            return
+
+        with open(journal_path, "w") as journal:
+            for move in plan:
+                journal.write(json.dumps({"op": "plan", **move}) + "\n")
+
+        self._apply_plan(plan, set(), journal_path)
+
+    def _resolve_songs_in_db(self, metadata_list: List[SongMetadata]) -> Dict[Tuple, List[Song]]:
+        """Look up the candidate songs for many files with a single query.
+
+        Args:
+            metadata_list: Song metadata for each file.
+
+        Returns:
+            Dictionary mapping each song key to the list of matching songs.
+        """
+        titles = {x.title for x in metadata_list}
+        artists = {x.artist for x in metadata_list}
+
+        songs = defaultdict(list)
+
+        for song in Song.objects.filter(
+                title__in=titles,
+                artist__name__in=artists
+        ).select_related("artist", "album"):
+            songs[(song.artist.name, song.title)].append(song)
+
+        return songs
+
+    def _match_song(
+        self,
+        metadata: SongMetadata,
+        songs: Dict[Tuple, List[Song]],
+        is_album_song: bool
+    ) -> Song:
+        """Find the single song matching a file's metadata.
+
+        Args:
+            metadata: The file's song metadata.
+            songs: Candidate songs, as returned by _resolve_songs_in_db().
+            is_album_song: Whether to match on album and track number as well.
+
+        Returns:
+            The matching song.
+
+        Raises:
+            MusicSyncError: If no song or multiple songs match.
+        """
+        matches = songs.get((metadata.artist, metadata.title), [])
+
+        if is_album_song and metadata.album_name:
+            matches = [x for x in matches if x.album and x.album.title == metadata.album_name]
+            if len(matches) > 1 and metadata.track_number:
+                matches = [x for x in matches if x.track == int(metadata.track_number)]
+
+        if not matches:
+            raise MusicSyncError(
+                f"Song not found in database: artist='{metadata.artist}', title='{metadata.title}'"
+            )
+        if len(matches) > 1:
+            raise MusicSyncError(
+                f"Multiple songs found in database: artist='{metadata.artist}', title='{metadata.title}'"
+            )
+
+        return matches[0]
+
+    def _plan_moves(
+        self,
+        metadata_list: List[Tuple[str, SongMetadata]],
+        songs: Dict[Tuple, List[Song]],
+        is_album_song: bool
+    ) -> List[Dict[str, str]]:
+        """Plan the move for every file before any are applied.
+
+        Args:
+            metadata_list: Tuples of filename and song metadata.
+            songs: Candidate songs, as returned by _resolve_songs_in_db().
+            is_album_song: Whether to treat all files as album songs.
+
+        Returns:
+            List of moves, each a dictionary with the source and target paths.
+        """
+        plan = []
+        targets = set()
+
+        for filename, metadata in metadata_list:
+            try:
+                song = self._match_song(metadata, songs, is_album_song)
+                artist_dir = self._get_artist_path(song, metadata.artist)
+            except MusicSyncError as e:
+                self.stdout.write(f"{Fore.RED}Failed to sync {filename}: {e}{Style.RESET_ALL}")
+                continue
+
+            target_path = self._get_file_path(str(artist_dir), metadata, is_album_song)
+
+            if target_path in targets or Path(target_path).exists():
+                self.stdout.write(
+                    f"{Fore.RED}File already exists: '{target_path}' Skipping...{Style.RESET_ALL}"
+                )
+                continue
+
+            targets.add(target_path)
+            plan.append({"source": filename, "target": target_path})
+
+        return plan
+
+    def _apply_plan(self, plan: List[Dict[str, str]], done: set, journal_path: str) -> None:
+        """Apply planned moves, recording each one in the journal as it's done.
+
+        Args:
+            plan: List of moves, each a dictionary with the source and target paths.
+            done: The sources of moves which have already been applied.
+            journal_path: Path to the journal file.
+        """
+        start = time.perf_counter()
+        moved = 0
+
+        with open(journal_path, "a") as journal:
+            for move in plan:
+                if move["source"] in done:
+                    continue
+                if not Path(move["source"]).exists() or Path(move["target"]).exists():
+                    self.stdout.write(f"{Fore.RED}Skipping {move['source']}{Style.RESET_ALL}")
+                    continue
+
+                Path(move["target"]).parent.mkdir(parents=True, exist_ok=True)
+                os.rename(move["source"], move["target"])
+                journal.write(json.dumps({"op": "move", **move}) + "\n")
+                journal.flush()
+                moved += 1
+
+                self.stdout.write(f"{Fore.GREEN}Moved song to {move['target']}{Style.RESET_ALL}")
+
+            journal.write(json.dumps({"op": "complete"}) + "\n")
+
+        self._report_rate("Moved", moved, start)
+
+    def _read_journal(self, journal_path: str) -> Tuple[List[Dict[str, str]], Set[str], bool]:
+        """Read the plan and completed moves from a journal.
+
+        Args:
+            journal_path: Path to the journal file.
+
+        Returns:
+            Tuple of the planned moves, the sources of the completed moves,
+            and whether the plan was completed.
+        """
+        plan: List[Dict[str, str]] = []
+        done: Set[str] = set()
+        complete = False
+
+        if not os.path.exists(journal_path):
+            return plan, done, complete
+
+        with open(journal_path) as journal:
+            for line in journal:
+                entry = json.loads(line)
+                if entry["op"] == "plan":
+                    plan.append({"source": entry["source"], "target": entry["target"]})
+                elif entry["op"] == "move":
+                    done.add(entry["source"])
+                elif entry["op"] == "complete":
+                    complete = True
+
+        return plan, done, complete
+
+    def _rollback_batch(self, journal_path: str) -> None:
+        """Undo the moves recorded in a journal, most recent first.
+
+        Args:
+            journal_path: Path to the journal file.
+
+        Raises:
+            MusicSyncError: If the journal doesn't exist.
+        """
+        if not os.path.exists(journal_path):
+            raise MusicSyncError(f"Journal not found: {journal_path}")
+
+        plan, done, _ = self._read_journal(journal_path)
+
+        for move in reversed(plan):
+            if move["source"] not in done:
+                continue
+            self.stdout.write(f"{Fore.GREEN}Moving {move['target']} back to {move['source']}{Style.RESET_ALL}")
+            if not self.dry_run:
+                os.rename(move["target"], move["source"])
+
+        if not self.dry_run:
+            os.remove(journal_path)
+
+    def _report_rate(self, action: str, count: int, start: float) -> None:
+        """Report how many files were processed and how quickly.
+
+        Args:
+            action: Description of what was done to the files.
+            count: The number of files processed.
+            start: The start time, from time.perf_counter().
+        """
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"{action} {count} file{'s' if count != 1 else ''} in {elapsed:.2f}s "
+            f"({count / max(elapsed, 1e-9):.1f} files/sec)"
+        )
@@ -276,8 +276,10 @@ def test_sync_directory_no_files(command_instance, temp_dir):
 
 @patch.object(Command, "_sync_file")
 def test_sync_directory_with_files(mock_sync, command_instance, temp_dir):
-    p1 = Path(temp_dir) / "song1.mp3"; p2 = Path(temp_dir) / "song2.mp3"
-    p1.touch(); p2.touch()
+    p1 = Path(temp_dir) / "song1.mp3"
+    p2 = Path(temp_dir) / "song2.mp3"
+    p1.touch()
+    p2.touch()
     command_instance._sync_directory(str(temp_dir), "Artist", "Album", True)
     assert mock_sync.call_count == 2
 
@@ -304,3 +306,68 @@ def test_handle_exception_handling(mock_download, command_instance, db):
     mock_download.side_effect = Exception("Test error")
     with pytest.raises(CommandError):
         command_instance.handle(uuid="test-uuid")
+
+
+@patch.object(Command, "_get_id3_info")
+def test_sync_directory_batch(mock_get_id3, command_instance, test_song, temp_dir):
+    command_instance.music_dir = str(Path(temp_dir) / "music")
+    mock_get_id3.side_effect = lambda filename: {
+        "artist": ["Test Artist"],
+        "title": ["Test Song" if "song1" in filename else "Unknown Song"],
+        "album": ["Test Album"],
+        "tracknumber": ["1"],
+    }
+
+    p1 = Path(temp_dir) / "song1.mp3"
+    p2 = Path(temp_dir) / "song2.mp3"
+    p1.touch()
+    p2.touch()
+    journal_path = str(Path(temp_dir) / "journal.jsonl")
+
+    with patch.object(Song.objects, "filter", wraps=Song.objects.filter) as mock_filter:
+        command_instance._sync_directory_batch(temp_dir, None, None, True, journal_path, 2)
+        # All songs are resolved with a single query
+        assert mock_filter.call_count == 1
+
+    target = Path(temp_dir) / "music" / "t" / "Test Artist" / "Test Album" / "01 - Test Song.mp3"
+    assert target.exists()
+    assert not p1.exists()
+    # The unknown song is left in place
+    assert p2.exists()
+
+    plan, done, complete = command_instance._read_journal(journal_path)
+    assert plan == [{"source": str(p1), "target": str(target)}]
+    assert done == {str(p1)}
+    assert complete
+
+    command_instance._rollback_batch(journal_path)
+    assert p1.exists()
+    assert not target.exists()
+    assert not Path(journal_path).exists()
+
+
+def test_sync_directory_batch_resume(command_instance, temp_dir):
+    p1 = Path(temp_dir) / "song1.mp3"
+    p2 = Path(temp_dir) / "song2.mp3"
+    p1.touch()
+    p2.touch()
+    t1 = Path(temp_dir) / "out" / "song1.mp3"
+    t2 = Path(temp_dir) / "out" / "song2.mp3"
+    journal_path = Path(temp_dir) / "journal.jsonl"
+
+    # Simulate a sync interrupted after the first move
+    t1.parent.mkdir()
+    p1.rename(t1)
+    journal_path.write_text(
+        "\n".join([
+            f'{{"op": "plan", "source": "{p1}", "target": "{t1}"}}',
+            f'{{"op": "plan", "source": "{p2}", "target": "{t2}"}}',
+            f'{{"op": "move", "source": "{p1}", "target": "{t1}"}}',
+        ]) + "\n"
+    )
+
+    command_instance._sync_directory_batch(temp_dir, None, None, False, str(journal_path), 2)
+
+    assert t1.exists()
+    assert t2.exists()
+    assert not p2.exists()
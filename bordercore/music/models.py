@@ -28,7 +28,7 @@ from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from lib.mixins import SortOrderMixin, TimeStampedModel
-from lib.util import remove_non_ascii_characters
+from lib.util import get_index_alias, remove_non_ascii_characters
 from search.services import delete_document, index_document
 from tag.models import Tag
 
@@ -119,7 +119,7 @@ class Album(TimeStampedModel):
         """
 
         return {
-            "_index": settings.ELASTICSEARCH_INDEX,
+            "_index": get_index_alias(settings.ELASTICSEARCH_INDEX, "album"),
             "_id": self.uuid,
             "_source": {
                 "uuid": self.uuid,
@@ -139,6 +139,8 @@ class Album(TimeStampedModel):
                     "lte": self.created.strftime("%Y-%m-%d %H:%M:%S")
                 },
                 "date_unixtime": self.created.strftime("%s"),
+                "date_display": self.created.strftime("%B %d, %Y"),
+                "last_modified_epoch": int(self.modified.timestamp()),
                 "user_id": self.user.id,
                 **settings.ELASTICSEARCH_EXTRA_FIELDS
             }
@@ -267,7 +269,7 @@ class Song(TimeStampedModel):
         """
 
         doc: dict[str, Any] = {
-            "_index": settings.ELASTICSEARCH_INDEX,
+            "_index": get_index_alias(settings.ELASTICSEARCH_INDEX, "song"),
             "_id": self.uuid,
             "_source": {
                 "uuid": self.uuid,
@@ -286,6 +288,8 @@ class Song(TimeStampedModel):
                     "lte": self.created.strftime("%Y-%m-%d %H:%M:%S")
                 },
                 "date_unixtime": self.created.strftime("%s"),
+                "date_display": self.created.strftime("%B %d, %Y"),
+                "last_modified_epoch": int(self.modified.timestamp()),
                 "user_id": self.user.id,
                 **settings.ELASTICSEARCH_EXTRA_FIELDS
             }
@@ -232,12 +232,14 @@ def search(user: User, artist_name: str) -> List[Dict[str, str]]:
     search_object: Dict[str, Any] = {
         "query": {
             "bool": {
-                "must": [
+                "filter": [
                     {
                         "term": {
                             "user_id": user.id
                         }
-                    },
+                    }
+                ],
+                "must": [
                     {
                         "bool": {
                             "should": [
@@ -7,20 +7,23 @@ notes, todos, and other components in a flexible layout system.
 
 import json
 import random
+import time
 import uuid
-from typing import Any, Dict, List, Union
+from typing import Any, Dict, List, Union, cast
 from uuid import UUID
 
 from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models, transaction
-from django.db.models import Count, JSONField
-from django.db.models.signals import pre_delete
+from django.db.models import JSONField, Q
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 from django.urls import reverse
 from django.utils import timezone
 
-from blob.models import Blob
-from collection.models import Collection
+from blob.models import Blob, RelationSummary
+from collection.models import Collection, CollectionObject
 from lib.mixins import SortOrderMixin, TimeStampedModel
 from quote.models import Quote
 from todo.models import Todo
@@ -54,6 +57,58 @@ class Node(TimeStampedModel):
         """Return string representation of the node."""
         return self.name
 
+    def save(self, *args: Any, **kwargs: Any) -> None:
+        """Save the node and invalidate its cached layout.
+
+        Every layout mutation method saves the node, so this covers them all.
+        """
+        super().save(*args, **kwargs)
+        Node.bump_layout_version(self.uuid)
+
+    @staticmethod
+    def get_layout_version(node_uuid: Union[str, UUID]) -> int:
+        """Get the node's layout version, a counter which changes whenever
+        its layout or any of the components in it change. Include this in
+        the keys of cached layouts so that they're invalidated by changes.
+
+        Args:
+            node_uuid: UUID of the node.
+
+        Returns:
+            The current layout version.
+        """
+        return cast(int, cache.get_or_set(f"node_layout_version_{node_uuid}", time.time_ns, None))
+
+    @staticmethod
+    def bump_layout_version(node_uuid: Union[str, UUID]) -> None:
+        """Change the node's layout version, invalidating its cached layout.
+
+        Args:
+            node_uuid: UUID of the node.
+        """
+        try:
+            cache.incr(f"node_layout_version_{node_uuid}")
+        except ValueError:
+            # The key is missing, so seed a value that won't collide
+            #  with any version used before it was evicted.
+            cache.set(f"node_layout_version_{node_uuid}", time.time_ns(), None)
+
+    @staticmethod
+    def bump_layout_versions_containing(user_id: int, **component: Union[str, UUID]) -> None:
+        """Bump the layout version of every node containing a component.
+
+        Args:
+            user_id: The ID of the user who owns the nodes.
+            **component: Component fields to match, eg uuid or quote_uuid.
+                Matching any one of them is enough.
+        """
+        query = Q()
+        for key, value in component.items():
+            query |= Q(layout__contains=[[{key: str(value)}]])
+
+        for node_uuid in Node.objects.filter(query, user_id=user_id).values_list("uuid", flat=True):
+            Node.bump_layout_version(node_uuid)
+
     @transaction.atomic
     def add_collection(
         self,
@@ -199,64 +254,15 @@ class Node(TimeStampedModel):
         self.save()
 
     def get_layout(self) -> str:
-        """Get the node's layout with populated names as JSON string.
+        """Get the node's layout, hydrated with the data each component displays.
 
         Returns:
-            JSON string representation of the layout with names populated.
+            JSON string representation of the hydrated layout.
         """
-        self.populate_names()
-        return json.dumps(self.layout)
-
-    def populate_names(self) -> None:
-        """Populate collection and note names in the layout.
-
-        Efficiently fetches names for all collections and notes in the layout
-        using bulk queries rather than individual lookups.
-        """
-        if not self.layout:
-            return
+        # Isolate the import to avoid a circular dependency
+        from node.services import get_hydrated_layout
 
-        # Get a list of all uuids for all collections and notes in this node.
-        uuids = [
-            val["uuid"]
-            for sublist in self.layout
-            for val in sublist
-            if "uuid" in val
-            and val.get("type") in ["collection", "note"]
-        ]
-
-        # Populate a lookup dictionary with the collection and note names, uuid => name
-        lookup: Dict[str, Dict[str, str | int | None]] = {}
-
-        collections = Collection.objects.filter(uuid__in=uuids).annotate(
-            item_count=Count("collectionobject")
-        )
-        lookup = {str(c.uuid): {"name": c.name, "count": c.item_count} for c in collections}
-
-        for b in Blob.objects.filter(uuid__in=uuids):
-            lookup[str(b.uuid)] = {
-                "name": b.name
-            }
-
-        # Finally, add the collection and note names to the node's layout object
-        for column in self.layout:
-            for row in column:
-                if row.get("type") in ["collection", "note"]:
-                    row["name"] = lookup[row["uuid"]]["name"]
-                    if "count" in lookup[row["uuid"]]:
-                        row["count"] = lookup[row["uuid"]]["count"]
-
-    def populate_image_info(self) -> None:
-        """Populate image information for image components in the layout."""
-        if not self.layout:
-            return
-
-        for column in self.layout:
-            for row in column:
-                if row.get("type") == "image":
-                    blob = Blob.objects.get(uuid=row["image_uuid"])
-                    row["image_url"] = blob.get_cover_url()
-                    row["image_title"] = blob.name
+        return json.dumps(get_hydrated_layout(self), cls=DjangoJSONEncoder)
 
     def set_note_color(self, note_uuid: str, color: int) -> None:
         """Set the color for a note component in the layout.
@@ -518,3 +524,100 @@ def remove_todo(sender: type, instance: NodeTodo, **kwargs: Any) -> None:
         **kwargs: Additional keyword arguments from the signal.
     """
     instance.handle_delete()
+
+
+@receiver([post_save, post_delete], sender=NodeTodo)
+def node_todo_changed(sender: type, instance: NodeTodo, **kwargs: Any) -> None:
+    """Invalidate a node's cached layout when a todo is added or removed.
+
+    Args:
+        sender: The model class that sent the signal.
+        instance: The NodeTodo instance saved or deleted.
+        **kwargs: Additional keyword arguments from the signal.
+    """
+    Node.bump_layout_version(instance.node.uuid)
+
+
+@receiver(post_save, sender=Todo)
+def todo_changed(sender: type, instance: Todo, **kwargs: Any) -> None:
+    """Invalidate the cached layouts of nodes whose todo list includes a todo.
+
+    Args:
+        sender: The model class that sent the signal.
+        instance: The Todo instance saved.
+        **kwargs: Additional keyword arguments from the signal.
+    """
+    for node_uuid in Node.objects.filter(todos=instance).values_list("uuid", flat=True):
+        Node.bump_layout_version(node_uuid)
+
+
+@receiver([post_save, post_delete], sender=Blob)
+def blob_changed(sender: type, instance: Blob, **kwargs: Any) -> None:
+    """Invalidate the cached layouts of nodes containing a note or image.
+
+    Args:
+        sender: The model class that sent the signal.
+        instance: The Blob instance saved or deleted.
+        **kwargs: Additional keyword arguments from the signal.
+    """
+    Node.bump_layout_versions_containing(instance.user_id, uuid=instance.uuid, image_uuid=instance.uuid)
+
+
+@receiver([post_save, post_delete], sender=Collection)
+def collection_changed(sender: type, instance: Collection, **kwargs: Any) -> None:
+    """Invalidate the cached layouts of nodes containing a collection.
+
+    Args:
+        sender: The model class that sent the signal.
+        instance: The Collection instance saved or deleted.
+        **kwargs: Additional keyword arguments from the signal.
+    """
+    Node.bump_layout_versions_containing(instance.user_id, uuid=instance.uuid)
+
+
+@receiver([post_save, post_delete], sender=CollectionObject)
+def collection_object_changed(sender: type, instance: CollectionObject, **kwargs: Any) -> None:
+    """Invalidate the cached layouts of nodes containing a collection whose
+    objects have changed, since its object count is displayed.
+
+    Args:
+        sender: The model class that sent the signal.
+        instance: The CollectionObject instance saved or deleted.
+        **kwargs: Additional keyword arguments from the signal.
+    """
+    collection = instance.collection
+    if collection is None:
+        return
+    Node.bump_layout_versions_containing(collection.user_id, uuid=collection.uuid)
+
+
+@receiver([post_save, post_delete], sender=Quote)
+def quote_changed(sender: type, instance: Quote, **kwargs: Any) -> None:
+    """Invalidate the cached layouts of nodes displaying a quote.
+
+    Args:
+        sender: The model class that sent the signal.
+        instance: The Quote instance saved or deleted.
+        **kwargs: Additional keyword arguments from the signal.
+    """
+    Node.bump_layout_versions_containing(instance.user_id, quote_uuid=instance.uuid)
+
+
+@receiver([post_save, post_delete], sender=Node)
+def node_changed(sender: type, instance: Node, **kwargs: Any) -> None:
+    """Invalidate the relationship summaries of the objects a node contains.
+
+    Summaries listing the node are included, in case it no longer
+    contains them or has been renamed.
+
+    Args:
+        sender: The model class that sent the signal.
+        instance: The Node instance saved or deleted.
+        **kwargs: Additional keyword arguments from the signal.
+    """
+    rows = [row for column in instance.layout or [] for row in column]
+    RelationSummary.invalidate(
+        uuids=[row["uuid"] for row in rows if row.get("type") == "note" and "uuid" in row],
+        collections=[row["uuid"] for row in rows if row.get("type") == "collection" and "uuid" in row],
+        nodes=[instance.uuid]
+    )
@@ -4,13 +4,24 @@ Node services.
 Provides helpers for querying a user's nodes and maintaining their layout
 structure.
 """
-from typing import Any
+import copy
+import random
+from collections import defaultdict
+from typing import Any, Dict, List
 from uuid import UUID
 
 from django.apps import apps
+from django.core.cache import cache
 from django.db.models import Count
 from django.db.models.query import QuerySet
 
+# Hydrated layouts are invalidated by bumping the node's layout version,
+#  so this just bounds how long unused ones are kept around.
+LAYOUT_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Fields added to layout rows when hydrated, which aren't stored
+HYDRATED_FIELDS = {"name", "count", "image_url", "image_title", "quote", "node_info", "todo_list"}
+
 
 def get_node_list(user: Any) -> QuerySet:
     """Return the user's nodes with useful counts.
@@ -70,3 +81,202 @@ def delete_note_from_nodes(user: Any, note_uuid: UUID | str) -> None:
         if changed:
             node.layout = layout
             node.save()
+
+
+def get_node_info(node: Any) -> Dict[str, Any]:
+    """Return the preview displayed for a node nested inside another.
+
+    Includes image UUIDs, counts, and random selections (when available)
+    for notes and todos.
+
+    Args:
+        node: The node to preview.
+
+    Returns:
+        A dictionary of preview information.
+    """
+
+    preview = node.get_preview()
+
+    try:
+        random_note = random.choice(preview["notes"])
+    except IndexError:
+        random_note = []
+
+    try:
+        random_todo = random.choice(preview["todos"])
+    except IndexError:
+        random_todo = []
+
+    return {
+        "uuid": str(node.uuid),
+        "name": node.name,
+        "images": preview["images"],
+        "note_count": len(preview["notes"]),
+        "random_note": random_note,
+        "random_todo": random_todo,
+        "todo_count": len(preview["todos"]),
+    }
+
+
+def strip_hydrated_fields(layout: List[List[Dict[str, Any]]]) -> List[List[Dict[str, Any]]]:
+    """Remove the fields added by hydration from a layout before it's stored.
+
+    Args:
+        layout: A layout, possibly hydrated, as posted by the client.
+
+    Returns:
+        The layout with only its stored fields.
+    """
+
+    return [
+        [
+            {key: value for key, value in row.items() if key not in HYDRATED_FIELDS}
+            for row in column
+        ]
+        for column in layout
+    ]
+
+
+def hydrate_layout(node: Any) -> List[List[Dict[str, Any]]]:
+    """Add the data each component in a node's layout displays.
+
+    Components of each type are fetched with one query, rather than one
+    query per component or a separate request from the client for each.
+
+    Args:
+        node: The node whose layout to hydrate.
+
+    Returns:
+        A copy of the node's layout, with its components' data added.
+    """
+
+    Blob = apps.get_model("blob", "Blob")
+    Collection = apps.get_model("collection", "Collection")
+    Quote = apps.get_model("quote", "Quote")
+
+    layout = copy.deepcopy(node.layout or [])
+    rows = [row for column in layout for row in column]
+
+    uuids = defaultdict(list)
+    for row in rows:
+        if row.get("type") in ("collection", "note") and "uuid" in row:
+            uuids[row["type"]].append(row["uuid"])
+        elif row.get("type") in ("image", "quote") and f"{row['type']}_uuid" in row:
+            uuids[row["type"]].append(row[f"{row['type']}_uuid"])
+
+    collections = {}
+    if uuids["collection"]:
+        collections = {
+            str(x.uuid): x
+            for x in Collection.objects.filter(uuid__in=uuids["collection"]).annotate(
+                item_count=Count("collectionobject")
+            )
+        }
+
+    blobs = {}
+    if uuids["note"] or uuids["image"]:
+        blobs = {
+            str(x.uuid): x
+            for x in Blob.objects.filter(
+                uuid__in=uuids["note"] + uuids["image"]
+            ).only("uuid", "name", "file")
+        }
+
+    quotes = {}
+    if uuids["quote"]:
+        quotes = {
+            str(x.uuid): x
+            for x in Quote.objects.filter(user=node.user, uuid__in=uuids["quote"])
+        }
+
+    todo_list = None
+
+    for row in rows:
+        component_type = row.get("type")
+        if component_type == "collection" and row.get("uuid") in collections:
+            collection = collections[row["uuid"]]
+            row["name"] = collection.name
+            row["count"] = collection.item_count
+        elif component_type == "note" and row.get("uuid") in blobs:
+            row["name"] = blobs[row["uuid"]].name
+        elif component_type == "image" and row.get("image_uuid") in blobs:
+            blob = blobs[row["image_uuid"]]
+            row["image_url"] = blob.get_cover_url()
+            row["image_title"] = blob.name
+        elif component_type == "quote" and row.get("quote_uuid") in quotes:
+            quote = quotes[row["quote_uuid"]]
+            row["quote"] = {
+                "uuid": str(quote.uuid),
+                "quote": quote.quote,
+                "source": quote.source,
+                "is_favorite": quote.is_favorite,
+            }
+        elif component_type == "todo":
+            if todo_list is None:
+                todo_list = node.get_todo_list()
+            row["todo_list"] = todo_list
+
+    return layout
+
+
+def add_node_info(node: Any, layout: List[List[Dict[str, Any]]]) -> List[List[Dict[str, Any]]]:
+    """Add the preview of each node nested inside a node to its layout.
+
+    Previews include a randomly chosen note and todo, so they're added to
+    the layout after it's read from the cache rather than cached with it.
+
+    Args:
+        node: The node whose layout it is.
+        layout: The node's hydrated layout.
+
+    Returns:
+        The layout, with its nested nodes' previews added.
+    """
+
+    Node = apps.get_model("node", "Node")
+
+    rows = [
+        row
+        for column in layout
+        for row in column
+        if row.get("type") == "node" and "node_uuid" in row
+    ]
+    if not rows:
+        return layout
+
+    nodes = {
+        str(x.uuid): x
+        for x in Node.objects.filter(user=node.user, uuid__in=[row["node_uuid"] for row in rows])
+    }
+    for row in rows:
+        if row["node_uuid"] in nodes:
+            row["node_info"] = get_node_info(nodes[row["node_uuid"]])
+
+    return layout
+
+
+def get_hydrated_layout(node: Any) -> List[List[Dict[str, Any]]]:
+    """Return a node's hydrated layout, from the cache if it's unchanged.
+
+    The cache key includes the node's layout version, which is bumped
+    whenever its layout or any component in it changes. Previews of
+    nested nodes aren't cached.
+
+    Args:
+        node: The node whose layout to return.
+
+    Returns:
+        The node's hydrated layout.
+    """
+
+    Node = apps.get_model("node", "Node")
+
+    key = f"node_layout_{node.uuid}_{Node.get_layout_version(node.uuid)}"
+
+    layout = cache.get(key)
+    if layout is None:
+        layout = hydrate_layout(node)
+        cache.set(key, layout, LAYOUT_CACHE_TIMEOUT)
+
+    return add_node_info(node, layout)
@@ -115,26 +115,6 @@ def test_get_layout(node):
     assert True
 
 
-def test_node_populate_names(node):
-
-    collection_1 = node.add_collection()
-    collection_2 = node.add_collection()
-    collection_3 = node.add_collection()
-
-    node.populate_names()
-
-    names = [
-        val["name"]
-        for sublist in node.layout
-        for val in sublist
-        if "name" in val
-    ]
-
-    assert collection_1.name in names
-    assert collection_2.name in names
-    assert collection_3.name in names
-
-
 def test_node_set_note_color(monkeypatch_blob, node):
 
     note = node.add_note()
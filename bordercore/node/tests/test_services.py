@@ -1,7 +1,10 @@
 import pytest
 
+from collection.models import Collection
 from node.models import Node
-from node.services import delete_note_from_nodes
+from node.services import (delete_note_from_nodes, get_hydrated_layout,
+                           hydrate_layout, strip_hydrated_fields)
+from node.tests.factories import NodeFactory
 
 pytestmark = pytest.mark.django_db
 
@@ -20,3 +23,59 @@ def test_delete_note_from_nodes(monkeypatch_blob, node):
         for val in sublist
         if "uuid" in val
     ]
+
+
+def test_hydrate_layout(node, quote, blob_image_factory):
+
+    quote.user = node.user
+    quote.save()
+    node.add_component("quote", quote)
+    node.add_component("image", blob_image_factory[0])
+    node.add_todo_list()
+
+    layout = hydrate_layout(node)
+
+    rows = {row["type"]: row for column in layout for row in column}
+    assert rows["collection"]["name"] == "New Collection"
+    assert rows["collection"]["count"] == 4
+    assert rows["quote"]["quote"]["quote"] == quote.quote
+    assert rows["image"]["image_title"] == blob_image_factory[0].name
+    assert rows["todo"]["todo_list"] == []
+
+    # The hydrated fields aren't stored
+    assert strip_hydrated_fields(layout) == Node.objects.get(uuid=node.uuid).layout
+
+
+def test_get_hydrated_layout(settings, node):
+
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+
+    collection = Collection.objects.get(uuid=node.layout[0][0]["uuid"])
+    assert get_hydrated_layout(node)[0][0]["name"] == "New Collection"
+
+    # Renaming the collection bumps the node's layout version,
+    #  so its cached layout isn't used
+    collection.name = "Renamed Collection"
+    collection.save()
+    assert get_hydrated_layout(node)[0][0]["name"] == "Renamed Collection"
+
+
+def test_get_hydrated_layout_node_info(settings, node):
+
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+
+    nested_node = NodeFactory(user=node.user)
+    node.add_component("node", nested_node)
+
+    rows = {row["type"]: row for column in get_hydrated_layout(node) for row in column}
+    assert rows["node"]["node_info"]["name"] == nested_node.name
+
+    # Previews of nested nodes, which include a random note and todo,
+    #  aren't cached with the layout
+    Node.objects.filter(uuid=nested_node.uuid).update(name="Renamed Node")
+    rows = {row["type"]: row for column in get_hydrated_layout(node) for row in column}
+    assert rows["node"]["node_info"]["name"] == "Renamed Node"
@@ -9,7 +9,6 @@ images, quotes, collections, and nested nodes).
 from __future__ import annotations
 
 import json
-import random
 from typing import Any, Dict, cast
 
 from django.contrib import messages
@@ -36,7 +35,8 @@ from quote.models import Quote
 from todo.models import Todo
 
 from .models import Node, NodeTodo
-from .services import get_node_list
+from .services import (get_hydrated_layout, get_node_info, get_node_list,
+                       strip_hydrated_fields)
 
 
 @method_decorator(login_required, name="dispatch")
@@ -91,7 +91,8 @@ class NodeDetailView(DetailView):
     def get_context_data(self, **kwargs: Any) -> Dict[str, Any]:
         """Get context data for the node detail view.
 
-        Also populates derived fields on the ``Node`` instance for display.
+        Includes the node's hydrated layout, so that its components needn't
+        be fetched separately.
 
         Args:
             **kwargs: Additional keyword arguments.
@@ -104,8 +105,7 @@ class NodeDetailView(DetailView):
 
         RecentlyViewedBlob.add(self.request.user, node=self.object)
 
-        self.object.populate_names()
-        self.object.populate_image_info()
+        context["layout"] = get_hydrated_layout(self.object)
 
         return context
 
@@ -310,7 +310,7 @@ def change_layout(request: HttpRequest) -> JsonResponse:
     user = cast(User, request.user)
 
     node = Node.objects.get(uuid=node_uuid, user=user)
-    node.layout = json.loads(layout)
+    node.layout = strip_hydrated_fields(json.loads(layout))
     node.save()
 
     response = {"status": "OK"}
@@ -521,8 +521,6 @@ def add_image(request: HttpRequest) -> JsonResponse:
     image = Blob.objects.get(uuid=image_uuid, user=user)
     node.add_component("image", image)
 
-    node.populate_image_info()
-
     response = {"status": "OK", "layout": node.get_layout()}
     return JsonResponse(response)
 
@@ -747,29 +745,10 @@ def node_preview(request: HttpRequest, uuid: str) -> JsonResponse:
     """
     user = cast(User, request.user)
     node = Node.objects.get(user=user, uuid=uuid)
-    preview = node.get_preview()
-
-    try:
-        random_note = random.choice(preview["notes"])
-    except IndexError:
-        random_note = []
-
-    try:
-        random_todo = random.choice(preview["todos"])
-    except IndexError:
-        random_todo = []
 
     response = {
         "status": "OK",
-        "info": {
-            "uuid": uuid,
-            "name": node.name,
-            "images": preview["images"],
-            "note_count": len(preview["notes"]),
-            "random_note": random_note,
-            "random_todo": random_todo,
-            "todo_count": len(preview["todos"]),
-        },
+        "info": get_node_info(node),
     }
     return JsonResponse(response)
 
@@ -0,0 +1,166 @@
+"""
+Prepare Elasticsearch hits for display in search results.
+
+Anything which doesn't depend on the hit itself is worked out once per
+request rather than once per hit: object URLs are built from templates
+resolved by a single reverse() call per view, and the steps needed for
+each doctype are looked up in a table. Markdown rendered for drill
+questions and todo items is cached, since the same few objects tend to
+turn up again and again.
+"""
+
+from functools import lru_cache
+
+import markdown
+
+from django.urls import reverse
+
+from blob.models import Blob
+from lib.time_utils import get_date_from_pattern, get_epoch, get_relative_dates
+
+# Stands in for the uuid when resolving a URL template
+UUID_PLACEHOLDER = "00000000-0000-0000-0000-000000000000"
+
+# The most rendered markdown snippets kept in memory
+MARKDOWN_CACHE_SIZE = 2048
+
+
+def get_creators(matches):
+    """
+    Return all "creator" related fields
+    """
+
+    if "metadata" not in matches:
+        return ""
+
+    creators = [
+        matches["metadata"][x][0]
+        for x
+        in matches["metadata"].keys()
+        if x in ["author", "artist", "photographer"]
+    ]
+
+    return ", ".join(creators)
+
+
+def get_source_display_date(source):
+    """
+    Use the display date stored in Elasticsearch, falling back to
+    formatting the date for documents indexed before it was stored.
+    """
+    if "date_display" in source:
+        return source["date_display"]
+    return get_date_from_pattern(source.get("date", None))
+
+
+@lru_cache(maxsize=MARKDOWN_CACHE_SIZE)
+def render_markdown(text):
+    return markdown.markdown(text)
+
+
+def compile_url(viewname):
+    """
+    Resolve a URL pattern taking a uuid once, returning a function which
+    builds the URL for a given uuid by simple string formatting.
+    """
+
+    prefix, suffix = reverse(viewname, kwargs={"uuid": UUID_PLACEHOLDER}).split(UUID_PLACEHOLDER)
+    return lambda uuid: f"{prefix}{uuid}{suffix}"
+
+
+class LinkBuilder():
+    """
+    Build the link to an object's detail page from its Elasticsearch
+    source. Create one per request, then call it for every hit.
+    """
+
+    def __init__(self):
+        album_url = compile_url("music:album_detail")
+        artist_url = compile_url("music:artist_detail")
+        blob_url = compile_url("blob:detail")
+        drill_url = compile_url("drill:detail")
+        todo_url = compile_url("todo:detail")
+
+        self.builders = {
+            "bookmark": lambda source: source["url"],
+            "song": lambda source: album_url(source["album_uuid"])
+            if "album_uuid" in source
+            else artist_url(source["artist_uuid"]),
+            "album": lambda source: album_url(source["uuid"]),
+            "artist": lambda source: artist_url(source["artist_uuid"]),
+            "blob": lambda source: blob_url(source["uuid"]),
+            "book": lambda source: blob_url(source["uuid"]),
+            "document": lambda source: blob_url(source["uuid"]),
+            "note": lambda source: blob_url(source["uuid"]),
+            "drill": lambda source: drill_url(source["uuid"]),
+            "todo": lambda source: todo_url(source["uuid"]),
+        }
+
+    def __call__(self, doctype, source):
+        builder = self.builders.get(doctype)
+        return builder(source) if builder else ""
+
+
+def add_cover_url(source):
+    source["cover_url"] = Blob.get_cover_url_static(source["uuid"], source["filename"], size="small")
+
+
+def render_question(source):
+    source["question"] = render_markdown(source["question"])
+
+
+def render_name(source):
+    source["name"] = render_markdown(source["name"])
+
+
+# Extra steps needed only for hits of certain doctypes
+DOCTYPE_STEPS = {
+    "blob": (add_cover_url,),
+    "book": (add_cover_url,),
+    "drill": (render_question,),
+    "todo": (render_name,),
+}
+
+
+class SearchResultEnricher():
+    """
+    Prepare the hits of a search for the search results page, in a single
+    pass over them. Create one per request.
+    """
+
+    def __init__(self):
+        self.get_link = LinkBuilder()
+
+    def enrich(self, hits):
+
+        # Documents indexed before the epoch was stored need their
+        #  last modified date parsed
+        relative_dates = get_relative_dates(
+            [
+                match["_source"].get("last_modified_epoch") or get_epoch(match["_source"].get("last_modified"))
+                for match in hits
+            ]
+        )
+
+        for match, relative_date in zip(hits, relative_dates):
+            # Django templates don't support variables with underscores or dots, so
+            #  we need to rename a couple of fields
+            source = match["source"] = match.pop("_source")
+            match["score"] = match.pop("_score")
+
+            doctype = source["doctype"]
+
+            source["creators"] = get_creators(source)
+            source["date"] = get_source_display_date(source)
+            source["last_modified"] = relative_date
+            source["url"] = self.get_link(doctype, source)
+            source.setdefault("tags", [])
+
+            highlight = match.get("highlight")
+            if highlight and "attachment.content" in highlight:
+                highlight["attachment_content"] = highlight.pop("attachment.content")
+
+            for step in DOCTYPE_STEPS.get(doctype, ()):
+                step(source)
+
+        return hits
@@ -0,0 +1,85 @@
+# Measure the keystroke latency of the top-search autocomplete endpoint.
+#  Simulates one or more users typing a search term one character at a
+#  time, which exercises both the Elasticsearch round trip and the
+#  prefix-extension reuse of cached results.
+
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from search.views import search_tags_and_names
+
+
+class Command(BaseCommand):
+    help = "Benchmark the keystroke latency of top-search autocomplete"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--username",
+            help="The user to search as",
+            required=True
+        )
+        parser.add_argument(
+            "--term",
+            action="append",
+            help="A search term to type. Can be specified multiple times.",
+            required=True
+        )
+        parser.add_argument(
+            "--concurrency",
+            help="The number of simulated users typing at once",
+            type=int,
+            default=1
+        )
+        parser.add_argument(
+            "--iterations",
+            help="The number of times each simulated user types each term",
+            type=int,
+            default=5
+        )
+        parser.add_argument(
+            "--clear-cache",
+            action="store_true",
+            help="Clear the cache before each term is typed"
+        )
+
+    def handle(self, *args, username, term, concurrency, iterations, clear_cache, **kwargs):
+
+        user = User.objects.get(username=username)
+        factory = RequestFactory()
+
+        def type_term(search_term):
+            latencies = []
+            for i in range(1, len(search_term) + 1):
+                request = factory.get("/search/tagstitle/", {"term": search_term[:i]})
+                request.user = user
+                start = time.perf_counter()
+                search_tags_and_names(request)
+                latencies.append((time.perf_counter() - start) * 1000)
+            return latencies
+
+        latencies = []
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for _ in range(iterations):
+                for search_term in term:
+                    if clear_cache:
+                        cache.clear()
+                    for result in executor.map(type_term, [search_term] * concurrency):
+                        latencies.extend(result)
+
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+
+        self.stdout.write(f"Keystrokes: {len(latencies)}")
+        self.stdout.write(f"Throughput: {len(latencies) / elapsed:.1f} keystrokes/sec")
+        self.stdout.write(f"Mean:       {statistics.mean(latencies):.1f} ms")
+        self.stdout.write(f"p50:        {latencies[len(latencies) // 2]:.1f} ms")
+        self.stdout.write(f"p95:        {latencies[int(len(latencies) * 0.95)]:.1f} ms")
+        self.stdout.write(f"Max:        {latencies[-1]:.1f} ms")
@@ -0,0 +1,70 @@
+# Compare the cost of formatting dates for search results by parsing
+#  them for every hit against using the values precomputed at index time
+
+import datetime
+import random
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from lib.time_utils import (get_date_from_pattern, get_relative_date,
+                            get_relative_dates)
+
+
+class Command(BaseCommand):
+    help = "Benchmark date formatting for search results"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hits",
+            help="The number of search hits per response",
+            default=1000,
+            type=int
+        )
+        parser.add_argument(
+            "--iterations",
+            help="The number of responses to format",
+            default=20,
+            type=int
+        )
+
+    def handle(self, *args, hits, iterations, **kwargs):
+
+        sources = self.get_sources(hits)
+
+        def parse_per_hit():
+            for source in sources:
+                get_date_from_pattern(source["date"])
+                get_relative_date(source["last_modified"])
+
+        def precomputed():
+            [source["date_display"] for source in sources]
+            get_relative_dates([source["last_modified_epoch"] for source in sources])
+
+        for name, function in [("Parse per hit", parse_per_hit), ("Precomputed", precomputed)]:
+            timings = timeit.repeat(function, number=1, repeat=iterations)
+            mean = sum(timings) / len(timings)
+            self.stdout.write(
+                f"{name}: mean {mean * 1000:.2f}ms, min {min(timings) * 1000:.2f}ms "
+                f"per {hits} hits ({mean / hits * 1e6:.2f}us per hit)"
+            )
+
+    def get_sources(self, count):
+
+        now = datetime.datetime.now(datetime.timezone.utc)
+        date_formats = ["%Y-%m-%d", "%Y-%m", "%Y", "%Y-%m-%d %H:%M:%S"]
+        sources = []
+
+        for _ in range(count):
+            last_modified = now - datetime.timedelta(seconds=random.randrange(86400 * 1000))
+            date = (now - datetime.timedelta(days=random.randrange(10000))).strftime(random.choice(date_formats))
+            sources.append(
+                {
+                    "date": {"gte": date, "lte": date},
+                    "date_display": get_date_from_pattern({"gte": date}),
+                    "last_modified": last_modified.strftime("%Y-%m-%dT%H:%M:%S.%f%z"),
+                    "last_modified_epoch": int(last_modified.timestamp())
+                }
+            )
+
+        return sources
@@ -0,0 +1,113 @@
+# Measure the time spent preparing search hits for display, apart from
+#  the Elasticsearch round trip. Hits are first recorded by running real
+#  searches, then replayed through the enrichment pipeline as often as
+#  needed, so that changes to it can be compared on the same data.
+
+import copy
+import json
+import timeit
+
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.cache import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+
+from search.enrichment import SearchResultEnricher, render_markdown
+from search.views import SearchListView
+
+
+class RecordingSearchListView(SearchListView):
+    """
+    Save a copy of the hits returned by Elasticsearch before they're enriched
+    """
+
+    def filter_results(self, results):
+        self.recorded = copy.deepcopy(results)
+        super().filter_results(results)
+
+
+class Command(BaseCommand):
+    help = "Benchmark the enrichment of search hits by replaying recorded responses"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "responses",
+            help="The file to replay recorded hits from, or to record them to"
+        )
+        parser.add_argument(
+            "--record",
+            action="store_true",
+            help="Record the hits for each term, rather than replaying them"
+        )
+        parser.add_argument(
+            "--username",
+            help="The user to search as, when recording"
+        )
+        parser.add_argument(
+            "--term",
+            action="append",
+            help="A search term to record. Can be specified multiple times."
+        )
+        parser.add_argument(
+            "--iterations",
+            help="The number of times each response is replayed",
+            type=int,
+            default=100
+        )
+
+    def handle(self, *args, responses, record, username, term, iterations, **kwargs):
+
+        if record:
+            if not username or not term:
+                raise CommandError("--username and --term are required when recording")
+            self.record(responses, username, term)
+        else:
+            self.replay(responses, iterations)
+
+    def record(self, filename, username, terms):
+
+        user = User.objects.get(username=username)
+        factory = RequestFactory()
+        recorded = []
+
+        for search_term in terms:
+            request = factory.get("/search/", {"term_search": search_term})
+            request.user = user
+            request.session = SessionStore()
+
+            view = RecordingSearchListView()
+            view.setup(request)
+            view.get_queryset()
+
+            recorded.append({"term": search_term, "hits": getattr(view, "recorded", [])})
+            self.stdout.write(f"Recorded {len(recorded[-1]['hits'])} hits for '{search_term}'")
+
+        with open(filename, "w") as f:
+            json.dump(recorded, f)
+
+    def replay(self, filename, iterations):
+
+        with open(filename) as f:
+            recorded = json.load(f)
+
+        for response in recorded:
+
+            count = len(response["hits"])
+            if not count:
+                continue
+
+            # Enrichment modifies the hits, so each run needs a fresh copy
+            copies = [copy.deepcopy(response["hits"]) for _ in range(iterations * 2)]
+
+            def enrich(cold):
+                if cold:
+                    render_markdown.cache_clear()
+                SearchResultEnricher().enrich(copies.pop())
+
+            for name, cold in [("Cold", True), ("Warm", False)]:
+                timings = timeit.repeat(lambda: enrich(cold), number=1, repeat=iterations)
+                mean = sum(timings) / len(timings)
+                self.stdout.write(
+                    f"'{response['term']}' {name}: mean {mean * 1000:.2f}ms, min {min(timings) * 1000:.2f}ms "
+                    f"per {count} hits ({mean / count * 1e6:.2f}us per hit)"
+                )
@@ -0,0 +1,56 @@
+# Move the Elasticsearch documents into a new index per doctype group, built
+#  from the current mappings, then switch the aliases over to them. Searches
+#  keep working throughout. Run this to create the indexes on a new cluster,
+#  after changing the mappings, and before first deploying code which
+#  writes to the group aliases.
+
+import json
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from lib.index_layout import migrate, update_user_aliases
+from lib.util import get_elasticsearch_connection
+
+MAPPINGS = settings.BASE_DIR / "config" / "elasticsearch" / "mappings.json"
+
+
+class Command(BaseCommand):
+    help = "Reindex Elasticsearch documents into new indexes and swap the aliases"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--index",
+            help="The index name to migrate. Defaults to the configured index.",
+            default=settings.ELASTICSEARCH_INDEX
+        )
+        parser.add_argument(
+            "--keep-old",
+            action="store_true",
+            help="Don't delete the old indexes once searches have moved over"
+        )
+        parser.add_argument(
+            "--aliases-only",
+            action="store_true",
+            help="Only add the filtered alias for each user to the current indexes"
+        )
+
+    def handle(self, *args, index, keep_old, aliases_only, **kwargs):
+
+        es = get_elasticsearch_connection(host=settings.ELASTICSEARCH_ENDPOINT)
+        user_ids = list(User.objects.order_by("id").values_list("id", flat=True))
+
+        if aliases_only:
+            try:
+                update_user_aliases(es, index, user_ids, report=self.stdout.write)
+            except ValueError as e:
+                raise CommandError(str(e))
+            return
+
+        with open(MAPPINGS) as f:
+            mappings = json.load(f)
+
+        new_indexes = migrate(es, index, mappings, user_ids, keep_old=keep_old, report=self.stdout.write)
+
+        self.stdout.write(f"Done. {index} now points at {', '.join(new_indexes.values())}")
@@ -1,15 +1,113 @@
-from elasticsearch import RequestError, helpers
+from elasticsearch import NotFoundError, RequestError, helpers
 
 from django.conf import settings
 from django.contrib import messages
+from django.core.cache import cache
 
+from lib.chat import CHAT_CONTEXT_TOKENS
 from lib.embeddings import len_safe_get_embedding
-from lib.util import get_elasticsearch_connection
+from lib.util import (INDEX_GROUPS, get_content_hash,
+                      get_elasticsearch_connection, get_index_alias)
+
+# The most chunks retrieved for a chatbot prompt
+CHUNK_TOP_K = 8
+
+QUERY_EMBEDDING_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
+
+def get_query_embedding(text):
+    """
+    Return the embedding for a search query. Embeddings are cached, since
+    the same query is often repeated, and creating one means an API call.
+    """
+
+    key = f"query_embedding_{get_content_hash(text)}"
+    embedding = cache.get(key)
+    if embedding is None:
+        embedding = len_safe_get_embedding(text)
+        cache.set(key, embedding, QUERY_EMBEDDING_CACHE_TIMEOUT)
+    return embedding
+
+
+def get_relevant_chunks(user, query, blob_uuid=None, top_k=CHUNK_TOP_K, token_budget=CHAT_CONTEXT_TOKENS):
+    """
+    Return the chunks of the user's notes most relevant to a query, most
+    relevant first, limited to top_k chunks and token_budget tokens in all.
+    If blob_uuid is given, only that blob's chunks are considered.
+
+    Each chunk is a dict with its text and token count, along with the
+    name and uuid of its note and its score.
+    """
+
+    filters = [
+        {"term": {"user_id": user.id}},
+        {"term": {"uuid": str(blob_uuid)}} if blob_uuid else {"term": {"doctype": "note"}},
+    ]
+
+    search_object = {
+        "query": {
+            "bool": {
+                "filter": filters,
+                "must": {
+                    "nested": {
+                        "path": "chunks",
+                        "score_mode": "max",
+                        "query": {
+                            "script_score": {
+                                "query": {"match_all": {}},
+                                "script": {
+                                    "source": "cosineSimilarity(params.query_vector, 'chunks.embeddings_vector') + 1.0",
+                                    "params": {
+                                        "query_vector": get_query_embedding(query)
+                                    }
+                                }
+                            }
+                        },
+                        "inner_hits": {
+                            "size": top_k,
+                            "_source": ["chunks.text", "chunks.tokens"]
+                        }
+                    }
+                }
+            }
+        },
+        "size": top_k,
+        "_source": ["name", "uuid"]
+    }
+
+    es = get_elasticsearch_connection(host=settings.ELASTICSEARCH_ENDPOINT)
+    results = es.search(index=settings.ELASTICSEARCH_INDEX, body=search_object)
+
+    chunks = sorted(
+        (
+            {
+                "text": inner_hit["_source"]["text"],
+                "tokens": inner_hit["_source"]["tokens"],
+                "score": inner_hit["_score"],
+                "name": hit["_source"].get("name"),
+                "uuid": hit["_source"]["uuid"],
+            }
+            for hit in results["hits"]["hits"]
+            for inner_hit in hit["inner_hits"]["chunks"]["hits"]["hits"]
+        ),
+        key=lambda x: x["score"],
+        reverse=True
+    )
+
+    selected = []
+    total_tokens = 0
+    for chunk in chunks[:top_k]:
+        if total_tokens + chunk["tokens"] > token_budget:
+            continue
+        selected.append(chunk)
+        total_tokens += chunk["tokens"]
+
+    return selected
 
 
 def semantic_search(request, search):
 
-    embeddings = len_safe_get_embedding(search)
+    embeddings = get_query_embedding(search)
 
     search_object = {
         "query": {
@@ -26,9 +124,11 @@ def semantic_search(request, search):
                         }
                     }
                 ],
+                # The query only filters, so the score is the similarity
+                "boost_mode": "replace",
                 "query": {
                     "bool": {
-                        "must": [
+                        "filter": [
                             {
                                 "term": {
                                     "user_id": request.user.id
@@ -124,11 +224,20 @@ def _delete_document(doc_id: str) -> None:
     directly outside this module; use `delete_document` instead to preserve
     testability and abstraction.
 
+    Deletes by id need a single index, so each group's index is tried in turn.
+
     Args:
         doc_id: The unique identifier of the document to delete.
 
     Raises:
+        elasticsearch.NotFoundError: If the document isn't in any index.
         elasticsearch.ElasticsearchException: If the deletion operation fails.
     """
     es = get_elasticsearch_connection(host=settings.ELASTICSEARCH_ENDPOINT)
-    es.delete(index=settings.ELASTICSEARCH_INDEX, id=doc_id)
+    for group in INDEX_GROUPS:
+        try:
+            es.delete(index=get_index_alias(settings.ELASTICSEARCH_INDEX, group=group), id=doc_id)
+            return
+        except NotFoundError as e:
+            not_found = e
+    raise not_found
@@ -0,0 +1,64 @@
+import uuid
+
+import pytest
+
+import django
+from django import urls
+
+from search.enrichment import LinkBuilder, SearchResultEnricher
+
+pytestmark = [pytest.mark.django_db]
+
+django.setup()
+
+
+def test_link_builder():
+
+    get_link = LinkBuilder()
+    object_uuid = str(uuid.uuid4())
+
+    assert get_link("blob", {"uuid": object_uuid}) == urls.reverse("blob:detail", kwargs={"uuid": object_uuid})
+    assert get_link("drill", {"uuid": object_uuid}) == urls.reverse("drill:detail", kwargs={"uuid": object_uuid})
+    assert get_link("song", {"artist_uuid": object_uuid}) == urls.reverse("music:artist_detail", kwargs={"uuid": object_uuid})
+    assert get_link("bookmark", {"url": "https://www.bordercore.com"}) == "https://www.bordercore.com"
+    assert get_link("unknown", {"uuid": object_uuid}) == ""
+
+
+def test_search_result_enricher():
+
+    hits = [
+        {
+            "_score": 1.0,
+            "_source": {
+                "doctype": "drill",
+                "question": "What is **bold**?",
+                "uuid": str(uuid.uuid4()),
+                "last_modified": "2025-08-01T17:04:23.788834-04:00"
+            },
+        },
+        {
+            "_score": 0.5,
+            "_source": {
+                "doctype": "book",
+                "filename": "book.pdf",
+                "tags": ["django"],
+                "uuid": str(uuid.uuid4()),
+                "last_modified_epoch": 1754082263,
+                "metadata": {"author": ["Jane Smith"]}
+            },
+            "highlight": {"attachment.content": ["<em>django</em>"]}
+        }
+    ]
+
+    SearchResultEnricher().enrich(hits)
+
+    drill, book = hits
+
+    assert drill["score"] == 1.0
+    assert "<strong>bold</strong>" in drill["source"]["question"]
+    assert drill["source"]["tags"] == []
+
+    assert book["source"]["cover_url"].endswith(f"blobs/{book['source']['uuid']}/cover.jpg")
+    assert book["source"]["creators"] == "Jane Smith"
+    assert book["highlight"]["attachment_content"] == ["<em>django</em>"]
+    assert book["source"]["url"] == urls.reverse("blob:detail", kwargs={"uuid": book["source"]["uuid"]})
@@ -1,3 +1,4 @@
+import copy
 import uuid
 from unittest.mock import MagicMock, Mock, patch
 
@@ -5,10 +6,14 @@ import pytest
 
 import django
 from django import urls
-from django.test import RequestFactory
+from django.conf import settings
+from django.test import RequestFactory, override_settings
 
-from search.views import (SearchTagDetailView, get_doc_types_from_request,
-                          get_doctype, get_name, is_cached, sort_results)
+from search.views import (SEARCH_TRACK_TOTAL_HITS, SearchListView,
+                          SearchTagDetailView, filter_autocomplete_matches,
+                          get_cached_autocomplete_matches,
+                          get_doc_types_from_request, get_doctype, get_name,
+                          is_cached, sort_results)
 
 pytestmark = [pytest.mark.django_db]
 
@@ -21,7 +26,7 @@ def test_notes_list(mock_get_es, auto_login_user):
     _, client = auto_login_user()
 
     mock_es = MagicMock()
-    mock_es.search.return_value = {
+    response = {
         "hits": {
             "total": {"value": 2},
             "hits": [
@@ -49,6 +54,8 @@ def test_notes_list(mock_get_es, auto_login_user):
         },
         "aggregations": {"Doctype Filter": {"buckets": []}}
     }
+    # Results are modified in place, so return a fresh copy for each search
+    mock_es.search.side_effect = lambda *args, **kwargs: copy.deepcopy(response)
     mock_get_es.return_value = mock_es
 
     url = urls.reverse("search:notes")
@@ -59,6 +66,76 @@ def test_notes_list(mock_get_es, auto_login_user):
     assert context["count"] == 2
     assert isinstance(context["paginator"], str)
 
+    search_object = mock_es.search.call_args.kwargs["body"]
+    assert "contents" in search_object["_source"]
+
+    resp = client.get(f"{url}?search=lorem")
+
+    assert resp.status_code == 200
+
+    # Search results only include snippets of the notes' contents
+    search_object = mock_es.search.call_args.kwargs["body"]
+    assert "contents" not in search_object["_source"]
+    assert search_object["highlight"]["fields"]["contents"]["no_match_size"] == settings.SEARCH_SNIPPET_LENGTH
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+@patch("search.views.get_elasticsearch_connection")
+def test_search_pagination(mock_get_es, auto_login_user):
+
+    _, client = auto_login_user()
+
+    hits = [
+        {
+            "_score": 1.0,
+            "_source": {
+                "uuid": str(uuid.uuid4()),
+                "doctype": "note",
+                "last_modified": "2025-08-01T17:04:23.788834-04:00"
+            },
+            "_id": str(uuid.uuid4()),
+            "sort": [1.0, str(uuid.uuid4())]
+        }
+        for _ in range(SearchListView.RESULT_COUNT_PER_PAGE)
+    ]
+    response = {
+        "hits": {
+            "total": {"value": SEARCH_TRACK_TOTAL_HITS, "relation": "gte"},
+            "hits": hits
+        },
+        "aggregations": {"Doctype Filter": {"buckets": [{"key": "note", "doc_count": 1000}]}}
+    }
+
+    mock_es = MagicMock()
+    mock_es.search.side_effect = lambda *args, **kwargs: copy.deepcopy(response)
+    mock_get_es.return_value = mock_es
+
+    url = urls.reverse("search:search")
+    resp = client.get(f"{url}?term_search=lorem")
+
+    assert resp.status_code == 200
+    assert resp.context["count_is_lower_bound"] is True
+
+    search_object = mock_es.search.call_args.kwargs["body"]
+    assert search_object["track_total_hits"] == SEARCH_TRACK_TOTAL_HITS
+    assert "aggs" in search_object
+    assert "search_after" not in search_object
+
+    # The next page starts after the last hit, and reuses the aggregations
+    #  and total computed for the first
+    del response["aggregations"]
+    resp = client.get(f"{url}?term_search=lorem&page=2")
+
+    assert resp.status_code == 200
+    assert resp.context["aggregations"] == [{"doctype": "note", "count": 1000}]
+    assert resp.context["count"] == SEARCH_TRACK_TOTAL_HITS
+
+    search_object = mock_es.search.call_args.kwargs["body"]
+    assert search_object["search_after"] == hits[-1]["sort"]
+    assert search_object["from"] == 0
+    assert search_object["track_total_hits"] is False
+    assert "aggs" not in search_object
+
 
 def test_get_doc_types_from_request():
 
@@ -161,3 +238,193 @@ def test_get_doc_counts():
     assert len(result) == 2
     assert result[0] == ("document", 3)
     assert result[1] == ("blob", 2)
+
+
+@patch("search.views.Tag.get_meta_tags", return_value=["django"])
+@patch("search.views.get_elasticsearch_connection")
+def test_search_tag_detail(mock_get_es, mock_get_meta_tags, auto_login_user):
+
+    _, client = auto_login_user()
+
+    hit = {
+        "_source": {
+            "uuid": str(uuid.uuid4()),
+            "doctype": "bookmark",
+            "name": "Django Tutorial",
+            "url": "https://www.djangoproject.com/start/",
+            "tags": ["python", "django"],
+            "importance": 1,
+            "last_modified": "2025-08-01T17:04:23.788834-04:00"
+        },
+        "fields": {"contents": ["Lorem ipsum"]}
+    }
+
+    mock_es = MagicMock()
+    mock_es.search.return_value = {
+        "hits": {"hits": []},
+        "aggregations": {
+            "Doctype Filter": {
+                "buckets": [
+                    {
+                        "key": "bookmark",
+                        "doc_count": 51,
+                        "First Page": {"hits": {"hits": [hit]}}
+                    }
+                ]
+            },
+            "Tag Filter": {
+                "buckets": [
+                    {"key": "python", "doc_count": 51},
+                    {"key": "django", "doc_count": 3}
+                ]
+            }
+        }
+    }
+    mock_get_es.return_value = mock_es
+
+    url = urls.reverse("search:kb_search_tag_detail", kwargs={"taglist": "python"})
+    resp = client.get(url)
+
+    assert resp.status_code == 200
+    assert mock_es.search.call_count == 1
+    mock_get_meta_tags.assert_called_once()
+
+    context = resp.context
+    assert context["doctype_counts"] == [("bookmark", 51)]
+    assert context["tag_counts"] == [("django", 3)]
+    assert context["meta_tags"] == ["django"]
+
+    result = context["results"]["bookmark"][0]
+    assert result["url_domain"] == "www.djangoproject.com"
+    assert result["contents"] == "Lorem ipsum"
+    assert [x["name"] for x in result["tags"]] == ["django"]
+    assert "cover_url" not in result
+
+    # Subsequent pages of a single doctype are fetched separately
+    mock_es.search.return_value = {"hits": {"hits": [hit]}}
+
+    url = urls.reverse("search:tag_detail_page")
+    resp = client.get(url, {"taglist": "python", "doctype": "bookmark", "page": 2})
+
+    assert resp.status_code == 200
+    assert resp.json()["has_more"] is False
+    assert resp.json()["matches"][0]["name"] == "Django Tutorial"
+
+    search_object = mock_es.search.call_args.kwargs["body"]
+    assert search_object["from"] == 50
+    assert {"term": {"doctype": "bookmark"}} in search_object["query"]["bool"]["filter"]
+
+    # Missing or invalid parameters are rejected
+    resp = client.get(url, {"taglist": "python"})
+    assert resp.status_code == 400
+    resp = client.get(url, {"taglist": "python", "doctype": "bookmark", "page": "two"})
+    assert resp.status_code == 400
+
+
+@patch("search.views.get_tag_aliases", return_value=[])
+@patch("search.views.get_elasticsearch_connection")
+def test_search_tags_and_names(mock_get_es, mock_get_tag_aliases, auto_login_user):
+
+    _, client = auto_login_user()
+
+    mock_es = MagicMock()
+    mock_es.msearch.return_value = {
+        "responses": [
+            {
+                "hits": {
+                    "total": {"value": 1},
+                    "hits": [
+                        {
+                            "_score": 1.0,
+                            "_source": {
+                                "uuid": str(uuid.uuid4()),
+                                "doctype": "note",
+                                "name": "python tips"
+                            }
+                        }
+                    ]
+                }
+            },
+            {
+                "aggregations": {
+                    "Distinct Tags": {
+                        "sum_other_doc_count": 0,
+                        "buckets": [{"key": "python", "doc_count": 3}]
+                    }
+                }
+            }
+        ]
+    }
+    mock_get_es.return_value = mock_es
+
+    url = urls.reverse("search:search_tags_and_names")
+    resp = client.get(f"{url}?term=pyth")
+
+    assert resp.status_code == 200
+
+    # Both searches are sent in a single request
+    assert mock_es.msearch.call_count == 1
+    assert mock_es.search.call_count == 0
+
+    matches = [x for x in resp.json() if "splitter" not in x]
+    assert [x["doctype"] for x in matches] == ["Tag", "Note"]
+
+    # If one search fails, the other's matches are still returned
+    mock_es.msearch.return_value["responses"][1] = {"error": {"type": "search_phase_execution_exception"}, "status": 400}
+    resp = client.get(f"{url}?term=pyt")
+    assert resp.status_code == 200
+    matches = [x for x in resp.json() if "splitter" not in x]
+    assert [x["doctype"] for x in matches] == ["Note"]
+
+    # If both fail, an error is returned
+    mock_es.msearch.return_value["responses"][0] = {"error": {"type": "search_phase_execution_exception"}, "status": 400}
+    resp = client.get(f"{url}?term=py")
+    assert resp.status_code == 500
+
+
+def test_filter_autocomplete_matches():
+
+    cached = {
+        "complete": True,
+        "matches": [
+            ("python", {"name": "python"}),
+            ("pytest", {"name": "pytest"}),
+            ("python tips", {"name": "Python Tips"}),
+        ]
+    }
+
+    assert [x[1]["name"] for x in filter_autocomplete_matches(cached, "pytho")] == ["python", "Python Tips"]
+    assert [x[1]["name"] for x in filter_autocomplete_matches(cached, "tips")] == ["Python Tips"]
+
+
+@patch("search.views.cache")
+def test_get_cached_autocomplete_matches(mock_cache):
+
+    user = Mock(id=1)
+    matches = [("python", {"name": "python"}), ("pytest", {"name": "pytest"})]
+
+    # Results for a shorter prefix are reused if they are complete
+    mock_cache.get_many.return_value = {
+        "autocomplete_1__pyt": {"complete": True, "matches": matches}
+    }
+    assert get_cached_autocomplete_matches(user, [], "pyth") == [matches[0]]
+
+    # ...but not if they were truncated
+    mock_cache.get_many.return_value = {
+        "autocomplete_1__pyt": {"complete": False, "matches": matches}
+    }
+    assert get_cached_autocomplete_matches(user, [], "pyth") is None
+
+    # An exact match is always used
+    mock_cache.get_many.return_value = {
+        "autocomplete_1__pyth": {"complete": False, "matches": matches}
+    }
+    assert get_cached_autocomplete_matches(user, [], "pyth") == matches
+
+    # Terms which Elasticsearch splits into several tokens are never
+    #  narrowed down locally, since it matches them differently
+    mock_cache.get_many.return_value = {
+        "autocomplete_1__pyt": {"complete": True, "matches": matches}
+    }
+    assert get_cached_autocomplete_matches(user, [], "pyt-h") is None
+    assert get_cached_autocomplete_matches(user, [], "pyt h") is None
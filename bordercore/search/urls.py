@@ -10,6 +10,11 @@ urlpatterns = [
         view=views.search_tags_and_names,
         name="search_tags_and_names"
     ),
+    path(
+        route="tagdetail_page/",
+        view=views.get_tag_detail_page,
+        name="tag_detail_page"
+    ),
     re_path(
         route=r"^tagdetail/(?P<taglist>.*)/",
         view=views.SearchTagDetailView.as_view(),
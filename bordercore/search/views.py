@@ -1,17 +1,19 @@
 import datetime
+import hashlib
 import json
+import logging
 import math
 import operator
 import re
 from urllib.parse import unquote, urlparse
 
-import markdown
 from elasticsearch import RequestError
 from rest_framework.decorators import api_view
 
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
 from django.http import JsonResponse
 from django.urls import reverse
 from django.utils.decorators import method_decorator
@@ -19,35 +21,41 @@ from django.views.generic.list import ListView
 
 from blob.models import Blob
 from bookmark.models import Bookmark
-from lib.embeddings import len_safe_get_embedding
-from lib.time_utils import get_date_from_pattern, get_relative_date
 from lib.util import (favicon_url, get_elasticsearch_connection,
                       get_pagination_range, truncate)
 from music.models import Album
 from tag.models import Tag
 from tag.services import get_tag_aliases, get_tag_link
 
+from .enrichment import (LinkBuilder, SearchResultEnricher, get_creators,
+                         get_source_display_date)
 from .models import RecentSearch
+from .services import get_query_embedding
+
+log = logging.getLogger(f"bordercore.{__name__}")
 
 SEARCH_LIMIT = 1000
 
+# How long autocomplete results are cached, in seconds
+AUTOCOMPLETE_CACHE_TIMEOUT = 60
 
-def get_creators(matches):
-    """
-    Return all "creator" related fields
-    """
+# The number of results shown per doctype tab on the tag detail page
+TAG_DETAIL_PAGE_SIZE = 50
 
-    if "metadata" not in matches:
-        return ""
+# The number of characters of note and document contents shown on the tag detail page
+TAG_DETAIL_CONTENTS_LENGTH = 200
 
-    creators = [
-        matches["metadata"][x][0]
-        for x
-        in matches["metadata"].keys()
-        if x in ["author", "artist", "photographer"]
-    ]
+# How long tag detail results are cached, in seconds. Tag changes
+#  invalidate them sooner; this bounds staleness from other edits.
+TAG_DETAIL_CACHE_TIMEOUT = 300
+
+# Search result totals are counted exactly up to this many hits. Beyond
+#  that, the total is shown as a lower bound.
+SEARCH_TRACK_TOTAL_HITS = 1000
 
-    return ", ".join(creators)
+# How long the aggregations, total and page cursors of a search are kept
+#  for its subsequent pages, in seconds. The first page is never cached.
+SEARCH_STATE_CACHE_TIMEOUT = 300
 
 
 @method_decorator(login_required, name="dispatch")
@@ -57,7 +65,7 @@ class SearchListView(ListView):
     RESULT_COUNT_PER_PAGE = 10
     is_notes_search = False
 
-    def get_paginator(self, page, num_results):
+    def get_paginator(self, page, num_results, is_lower_bound=False):
 
         if num_results == 0:
             return {}
@@ -65,6 +73,11 @@ class SearchListView(ListView):
         num_pages = int(math.ceil(num_results / self.RESULT_COUNT_PER_PAGE))
         paginate_by = 2
 
+        # If the total is only a lower bound, there's always another page
+        #  to be had beyond the current one
+        if is_lower_bound:
+            num_pages = max(num_pages, page + 1)
+
         paginator = {
             "page_number": page,
             "num_pages": num_pages,
@@ -91,42 +104,73 @@ class SearchListView(ListView):
             aggregations.append({"doctype": x["key"], "count": x["doc_count"]})
         return aggregations
 
-    def filter_results(self, results, search_term):
-
-        for match in results:
-            # Django templates don't support variables with underscores or dots, so
-            #  we need to rename a couple of fields
-            match["source"] = match.pop("_source")
-            match["score"] = match.pop("_score")
-
-            match["source"]["creators"] = get_creators(match["source"])
-            match["source"]["date"] = get_date_from_pattern(match["source"].get("date", None))
-            match["source"]["last_modified"] = get_relative_date(match["source"]["last_modified"])
-            match["source"]["url"] = get_link(match["source"]["doctype"], match["source"])
-
-            if match["source"]["doctype"] in ["book", "blob"]:
-                match["source"]["cover_url"] = Blob.get_cover_url_static(
-                    match["source"]["uuid"],
-                    match["source"]["filename"],
-                    size="small"
-                )
-
-            match["tags_json"] = json.dumps(match["source"]["tags"]) \
-                if "tags" in match["source"] \
-                   else "[]"
-
-            if "highlight" in match and "attachment.content" in match["highlight"]:
-                match["highlight"]["attachment_content"] = match["highlight"].pop("attachment.content")
+    def filter_results(self, results):
+        SearchResultEnricher().enrich(results)
+
+    def get_search_state_key(self):
+        """
+        Searches are identified by their view and every search arg
+        but the page number.
+        """
+        args = sorted((key, value) for key, value in self.request.GET.items() if key != "page")
+        args_hash = hashlib.sha1(json.dumps(args).encode()).hexdigest()
+        return f"search_state_{self.request.user.id}_{type(self).__name__}_{args_hash}"
+
+    def paginate_search(self, search_object, page):
+        """
+        Set up the search for the requested page. The first page computes
+        the aggregations and a total capped at SEARCH_TRACK_TOTAL_HITS, and
+        these are cached along with the sort values of the last hit of each
+        page seen, for subsequent pages. A page following one already seen
+        is fetched with search_after rather than a from offset, so that
+        paging through large result sets doesn't get slower the deeper
+        it goes. Return the cached state, if any.
+        """
+
+        state = cache.get(self.get_search_state_key()) if page > 1 else None
+
+        # Break ties with the uuid, so that the sort order is stable
+        #  and a page's last hit identifies where the next one begins
+        search_object["sort"] = [search_object["sort"], {"uuid": {"order": "asc"}}]
+
+        if state is None:
+            search_object["track_total_hits"] = SEARCH_TRACK_TOTAL_HITS
+            search_object["from"] = (page - 1) * self.RESULT_COUNT_PER_PAGE
+            return None
+
+        search_object.pop("aggs", None)
+        search_object["track_total_hits"] = False
+
+        if page in state["cursors"]:
+            search_object["search_after"] = state["cursors"][page]
+            search_object["from"] = 0
+        else:
+            search_object["from"] = (page - 1) * self.RESULT_COUNT_PER_PAGE
+
+        return state
+
+    def save_search_state(self, results, state, page):
+        """
+        Restore the cached aggregations and total to the results of a
+        subsequent page, or cache those of the first page, along with the
+        cursor for the page after this one.
+        """
+
+        if state is None:
+            state = {
+                "aggregations": results["aggregations"],
+                "total": results["hits"]["total"],
+                "cursors": {}
+            }
+        else:
+            results["aggregations"] = state["aggregations"]
+            results["hits"]["total"] = state["total"]
 
-            # Highlight matched terms using markdown italicized text when searching
-            if search_term and "contents" in match["source"]:
-                match["source"]["contents"] = match["source"]["contents"].replace(search_term, f"*{search_term}*")
+        hits = results["hits"]["hits"]
+        if len(hits) == self.RESULT_COUNT_PER_PAGE and "sort" in hits[-1]:
+            state["cursors"][page + 1] = hits[-1]["sort"]
 
-            # Display markdown for drill questions and todo items
-            if match["source"]["doctype"] == "drill":
-                match["source"]["question"] = markdown.markdown(match["source"]["question"])
-            if match["source"]["doctype"] == "todo":
-                match["source"]["name"] = markdown.markdown(match["source"]["name"])
+        cache.set(self.get_search_state_key(), state, SEARCH_STATE_CACHE_TIMEOUT)
 
     def get_queryset(self):
 
@@ -149,7 +193,7 @@ class SearchListView(ListView):
         if search_term:
             RecentSearch.add(self.request.user, search_term)
 
-        offset = (int(self.request.GET.get("page", 1)) - 1) * self.RESULT_COUNT_PER_PAGE
+        page = int(self.request.GET.get("page", 1))
 
         search_object = {
             "query": {
@@ -164,7 +208,14 @@ class SearchListView(ListView):
                     ],
                     "query": {
                         "bool": {
+                            # Filters don't affect scoring, so they're
+                            #  cached. Scores come from the other clauses.
                             "must": [
+                                {
+                                    "match_all": {}
+                                }
+                            ],
+                            "filter": [
                                 {
                                     "term": {
                                         "user_id": self.request.user.id
@@ -183,17 +234,8 @@ class SearchListView(ListView):
                     }
                 }
             },
-            "highlight": {
-                "fields": {
-                    "attachment.content": {},
-                    "contents": {},
-                },
-                "number_of_fragments": 1,
-                "fragment_size": 200,
-                "order": "score"
-            },
+            "highlight": get_snippet_highlight(),
             "sort": {sort_field: {"order": "desc"}},
-            "from": offset,
             "size": self.RESULT_COUNT_PER_PAGE,
             "_source": [
                 "album_uuid",
@@ -202,11 +244,13 @@ class SearchListView(ListView):
                 "author",
                 "bordercore_id",
                 "date",
+                "date_display",
                 "date_unixtime",
                 "doctype",
                 "filename",
                 "importance",
                 "last_modified",
+                "last_modified_epoch",
                 "metadata.*",
                 "name",
                 "question",
@@ -251,6 +295,8 @@ class SearchListView(ListView):
                 }
             )
 
+        state = self.paginate_search(search_object, page)
+
         es = get_elasticsearch_connection(host=settings.ELASTICSEARCH_ENDPOINT, timeout=40)
         try:
             results = es.search(index=settings.ELASTICSEARCH_INDEX, body=search_object)
@@ -258,7 +304,9 @@ class SearchListView(ListView):
             messages.add_message(self.request, messages.ERROR, f"Request Error: {e.status_code} {e.info['error']}")
             return []
 
-        self.filter_results(results["hits"]["hits"], search_term)
+        self.save_search_state(results, state, page)
+
+        self.filter_results(results["hits"]["hits"])
 
         return results
 
@@ -274,12 +322,15 @@ class SearchListView(ListView):
         if context["object_list"]:
             context["aggregations"] = self.get_aggregations(context, "Doctype Filter")
 
+            total = context["object_list"]["hits"]["total"]
+            context["count_is_lower_bound"] = total.get("relation") == "gte"
+
             page = int(self.request.GET.get("page", 1))
             context["paginator"] = json.dumps(
-                self.get_paginator(page, context["object_list"]["hits"]["total"]["value"])
+                self.get_paginator(page, total["value"], context["count_is_lower_bound"])
             )
 
-            context["count"] = context["object_list"]["hits"]["total"]["value"]
+            context["count"] = total["value"]
             context["results"] = context["object_list"]["hits"]["hits"]
 
         return context
@@ -294,12 +345,13 @@ class NoteListView(SearchListView):
 
     def refine_search(self, search_object):
 
-        page = int(self.request.GET.get("page", 1))
-        search_object["from"] = (page - 1) * self.RESULT_COUNT_PER_PAGE
-
-        search_object["_source"].append("contents")
+        # Search results show snippets of matching text, and the full
+        #  contents of the selected note are fetched when it's shown.
+        #  Otherwise, the most recent notes are shown in full.
+        if "search" not in self.request.GET:
+            search_object["_source"].append("contents")
 
-        search_object["query"]["function_score"]["query"]["bool"]["must"].append(
+        search_object["query"]["function_score"]["query"]["bool"]["filter"].append(
             {
                 "term": {
                     "doctype": "note"
@@ -309,7 +361,7 @@ class NoteListView(SearchListView):
 
         tagsearch = self.request.GET.get("tagsearch", None)
         if tagsearch:
-            search_object["query"]["function_score"]["query"]["bool"]["must"].append(
+            search_object["query"]["function_score"]["query"]["bool"]["filter"].append(
                 {
                     "term": {
                         "tags.keyword": tagsearch
@@ -326,124 +378,247 @@ class NoteListView(SearchListView):
         if "search" not in self.request.GET:
             context["pinned_notes"] = self.request.user.userprofile.pinned_notes.all().only("file", "name", "uuid").order_by("usernote__sort_order")
 
-        if "results" in context:
-            page = int(self.request.GET.get("page", 1))
+        return context
 
-            context["paginator"] = json.dumps(
-                self.get_paginator(page, context["count"])
-            )
 
-        return context
+def get_snippet_highlight(snippet_length=None):
+    """
+    Return the highlight request for the snippets of matching text shown
+    for notes and documents, so that they're never shipped in full. The
+    unified highlighter uses the offsets indexed with these fields rather
+    than re-analyzing the text. Notes without a match in their contents,
+    such as those matched by name, get a snippet from their beginning.
+    """
 
+    snippet_length = snippet_length or settings.SEARCH_SNIPPET_LENGTH
 
-@method_decorator(login_required, name="dispatch")
-class SearchTagDetailView(ListView):
+    return {
+        "type": "unified",
+        "encoder": "html",
+        "fields": {
+            "attachment.content": {},
+            "contents": {
+                "no_match_size": snippet_length
+            },
+        },
+        "number_of_fragments": 1,
+        "fragment_size": snippet_length,
+        "order": "score"
+    }
 
-    template_name = "search/tag_detail.html"
-    RESULT_COUNT_PER_PAGE = 1000
 
-    def filter_results(self):
-        results = {}
-        for match in self.object_list["hits"]["hits"]:
+def get_tag_detail_search_object(user, taglist):
+    """
+    Return the base Elasticsearch query for objects tagged with every
+    tag in the taglist. Only the fields displayed on the tag detail page
+    are returned, and the contents of notes and documents are truncated
+    on the server rather than shipped in full.
+    """
 
-            result = {
-                "artist": match["_source"].get("artist", ""),
-                "artist_uuid": match["_source"].get("artist_uuid", ""),
-                "question": truncate(match["_source"].get("question", "")),
-                "name": match["_source"].get("name", "No Name"),
-                "title": match["_source"].get("title", "No Title"),
-                "task": match["_source"].get("name", ""),
-                "url": match["_source"].get("url", "") or "",
-                "uuid": match["_source"].get("uuid", ""),
-                "creators": get_creators(match["_source"]),
-                "contents": match["_source"].get("contents", "")[:200],
-                "date": get_date_from_pattern(match["_source"].get("date", None))
+    # Use the keyword field for an exact match. Since results are sorted
+    #  explicitly, use filter context to skip scoring.
+    tag_query = [
+        {
+            "term": {
+                "tags.keyword": x
             }
+        }
+        for x in taglist
+    ]
 
-            if "tags" in match["_source"]:
-                # Only show tags that were not searched for
-                result["tags"] = [
-                    {
-                        "name": tag,
-                        "url": reverse("search:kb_search_tag_detail", args=[tag])
+    tag_query.append(
+        {
+            "term": {
+                "user_id": user.id
+            }
+        }
+    )
+
+    return {
+        "query": {
+            "bool": {
+                "filter": tag_query
+            }
+        },
+        "sort": [
+            {"importance": {"order": "desc"}},
+            {"last_modified": {"order": "desc"}}
+        ],
+        "_source": [
+            "artist",
+            "artist_uuid",
+            "content_type",
+            "date",
+            "date_display",
+            "doctype",
+            "filename",
+            "importance",
+            "metadata",
+            "name",
+            "question",
+            "sha1sum",
+            "tags",
+            "title",
+            "url",
+            "uuid"
+        ],
+        "script_fields": {
+            "contents": {
+                "script": {
+                    "source": "def c = params._source.contents; return c == null ? null : c.substring(0, (int) Math.min(params.length, c.length()));",
+                    "params": {
+                        "length": TAG_DETAIL_CONTENTS_LENGTH
                     }
-                    for tag in match["_source"]["tags"]
-                    if tag not in self.kwargs["taglist"]
-                ]
+                }
+            }
+        }
+    }
+
+
+def get_tag_detail_results(hits, taglist):
+    """
+    Build the per-hit dicts displayed on the tag detail page. Fields
+    that are only displayed for certain doctypes are only computed
+    for those doctypes.
+    """
+
+    get_link = LinkBuilder()
+    tag_urls = {}
+
+    def get_tag_url(tag):
+        if tag not in tag_urls:
+            tag_urls[tag] = reverse("search:kb_search_tag_detail", args=[tag])
+        return tag_urls[tag]
+
+    results = []
+
+    for match in hits:
+
+        source = match["_source"]
+        doctype = source["doctype"]
+
+        result = {
+            "artist": source.get("artist", ""),
+            "artist_uuid": source.get("artist_uuid", ""),
+            "question": truncate(source.get("question", "")),
+            "name": source.get("name", "No Name"),
+            "title": source.get("title", "No Title"),
+            "task": source.get("name", ""),
+            "url": source.get("url", "") or "",
+            "uuid": source.get("uuid", ""),
+            "creators": get_creators(source),
+            "contents": (match.get("fields", {}).get("contents") or [""])[0] or "",
+            "date": get_source_display_date(source),
+            "importance": source.get("importance", 1),
+            "object_url": get_link(get_doctype(match).lower(), source)
+        }
 
-            if "sha1sum" in match["_source"]:
-                result = {
-                    "sha1sum": match["_source"]["sha1sum"],
-                    "filename": match["_source"].get("filename", ""),
-                    "url": Blob.get_s3_key(
-                        match["_source"]["uuid"],
-                        match["_source"].get("filename", "")
-                    ),
-                    "cover_url": Blob.get_cover_url_static(
-                        match["_source"].get("uuid", ""),
-                        match["_source"].get("filename", ""),
-                        size="small"
-                    ),
-                    **result,
+        if "tags" in source:
+            # Only show tags that were not searched for
+            result["tags"] = [
+                {
+                    "name": tag,
+                    "url": get_tag_url(tag)
                 }
+                for tag in source["tags"]
+                if tag not in taglist
+            ]
 
-                if "content_type" in match["_source"]:
-                    result["content_type"] = Blob.get_content_type(match["_source"]["content_type"])
+        if "sha1sum" in source:
+            result = {
+                "sha1sum": source["sha1sum"],
+                "filename": source.get("filename", ""),
+                "url": Blob.get_s3_key(
+                    source["uuid"],
+                    source.get("filename", "")
+                ),
+                "cover_url": Blob.get_cover_url_static(
+                    source.get("uuid", ""),
+                    source.get("filename", ""),
+                    size="small"
+                ),
+                **result,
+            }
 
-            if match["_source"]["doctype"] == "album":
-                result["album_artwork_url"] = f"{settings.IMAGES_URL}album_artwork/{match['_source']['uuid']}"
+            if "content_type" in source:
+                result["content_type"] = Blob.get_content_type(source["content_type"])
 
+        if doctype == "album":
+            result["album_artwork_url"] = f"{settings.IMAGES_URL}album_artwork/{source['uuid']}"
+
+        if doctype == "bookmark":
             result["favicon_url"] = favicon_url(result["url"])
             result["url_domain"] = urlparse(result["url"]).netloc
-            result["object_url"] = get_link(get_doctype(match).lower(), match["_source"])
 
-            results.setdefault(match["_source"]["doctype"], []).append(result)
+        results.append(result)
 
-        return results
+    return results
+
+
+def get_tag_detail_cache_key(user, taglist, *args):
+    """
+    Results are cached per user and taglist. The user's tag version is
+    part of the key, so that any tag change invalidates them. Results
+    aren't cached at all until the objects whose tags changed have had
+    time to be reindexed; see Tag.is_reindexing().
+    """
+    taglist_hash = hashlib.sha1(",".join(sorted(taglist)).encode()).hexdigest()
+    suffix = "_".join(str(x) for x in args)
+    return f"tag_detail_{user.id}_{Tag.get_version(user.id)}_{taglist_hash}_{suffix}"
+
+
+@method_decorator(login_required, name="dispatch")
+class SearchTagDetailView(ListView):
+    """
+    Show all objects tagged with a list of tags, grouped into tabs by
+    doctype. Only the first page of each tab is returned with the page;
+    subsequent pages are loaded on demand by get_tag_detail_page().
+    """
+
+    template_name = "search/tag_detail.html"
+    RESULT_COUNT_PER_PAGE = TAG_DETAIL_PAGE_SIZE
 
     def get_queryset(self):
 
         taglist = self.kwargs.get("taglist", "").split(",")
 
-        es = get_elasticsearch_connection(host=settings.ELASTICSEARCH_ENDPOINT)
+        cache_key = get_tag_detail_cache_key(self.request.user, taglist)
+        tag_detail = cache.get(cache_key)
 
-        # Use the keyword field for an exact match
-        tag_query = [
-            {
-                "term": {
-                    "tags.keyword": x
-                }
-            }
-            for x in taglist
-        ]
+        if tag_detail is None:
+            tag_detail = self.search(taglist)
+            if not Tag.is_reindexing(self.request.user.id):
+                cache.set(cache_key, tag_detail, TAG_DETAIL_CACHE_TIMEOUT)
 
-        tag_query.append(
-            {
-                "term": {
-                    "user_id": self.request.user.id
-                }
-            }
-        )
+        return tag_detail
+
+    def search(self, taglist):
+        """
+        Get the doctype and tag counts along with the first page of each
+        doctype in a single query, using a top_hits sub-aggregation.
+        """
+
+        es = get_elasticsearch_connection(host=settings.ELASTICSEARCH_ENDPOINT)
+
+        hits_object = get_tag_detail_search_object(self.request.user, taglist)
 
         search_object = {
-            "query": {
-                "function_score": {
-                    "field_value_factor": {
-                        "field": "importance",
-                        "missing": 1
-                    },
-                    "query": {
-                        "bool": {
-                            "must": tag_query
-                        }
-                    }
-                }
-            },
+            "query": hits_object["query"],
             "aggs": {
                 "Doctype Filter": {
                     "terms": {
                         "field": "doctype",
                         "size": 10
+                    },
+                    "aggs": {
+                        "First Page": {
+                            "top_hits": {
+                                "size": self.RESULT_COUNT_PER_PAGE,
+                                "sort": hits_object["sort"],
+                                "_source": hits_object["_source"],
+                                "script_fields": hits_object["script_fields"]
+                            }
+                        }
                     }
                 },
                 "Tag Filter": {
@@ -453,59 +628,38 @@ class SearchTagDetailView(ListView):
                     }
                 }
             },
-            "sort": [
-                {"importance": {"order": "desc"}},
-                {"last_modified": {"order": "desc"}}
-            ],
-            "from": 0,
-            "size": self.RESULT_COUNT_PER_PAGE,
-            "_source": [
-                "artist",
-                "artist_uuid",
-                "author",
-                "content_type",
-                "contents",
-                "date",
-                "date_unixtime",
-                "doctype",
-                "filename",
-                "importance",
-                "bordercore_id",
-                "last_modified",
-                "name",
-                "question",
-                "sha1sum",
-                "tags",
-                "title",
-                "url",
-                "uuid"
-            ]
+            "size": 0
         }
 
-        return es.search(index=settings.ELASTICSEARCH_INDEX, body=search_object)
+        results = es.search(index=settings.ELASTICSEARCH_INDEX, body=search_object)
+        aggregations = results["aggregations"]
+
+        return {
+            "results": {
+                bucket["key"]: get_tag_detail_results(bucket["First Page"]["hits"]["hits"], taglist)
+                for bucket in aggregations["Doctype Filter"]["buckets"]
+            },
+            "tag_counts": self.get_doc_counts(taglist, aggregations["Tag Filter"]),
+            "doctype_counts": self.get_doc_counts(taglist, aggregations["Doctype Filter"])
+        }
 
     def get_context_data(self, **kwargs):
 
         context = super().get_context_data(**kwargs)
 
-        context["results"] = self.filter_results()
+        context["results"] = self.object_list["results"]
 
         tag_list = self.kwargs.get("taglist", "").split(",") if "taglist" in self.kwargs else []
 
         # Get a list of tags and their counts, to be displayed
         #  in the "Other tags" dropdown
-        context["tag_counts"] = self.get_doc_counts(
-            tag_list,
-            self.object_list["aggregations"]["Tag Filter"]
-        )
+        context["tag_counts"] = self.object_list["tag_counts"]
 
         # Get a list of doc types and their counts
-        context["doctype_counts"] = self.get_doc_counts(
-            tag_list,
-            self.object_list["aggregations"]["Doctype Filter"]
-        )
+        context["doctype_counts"] = self.object_list["doctype_counts"]
 
-        context["meta_tags"] = [x[0] for x in context["tag_counts"] if x[0] in Tag.get_meta_tags(self.request.user)]
+        meta_tags = set(Tag.get_meta_tags(self.request.user))
+        context["meta_tags"] = [x[0] for x in context["tag_counts"] if x[0] in meta_tags]
         context["doctypes"] = [x[0] for x in context["doctype_counts"]]
         context["search_tag_detail_current_tab"] = self.request.session.get("search_tag_detail_current_tab", "")
         context["tag_list"] = tag_list
@@ -524,18 +678,68 @@ class SearchTagDetailView(ListView):
         return tag_counts_sorted
 
 
+@login_required
+def get_tag_detail_page(request):
+    """
+    Get a subsequent page of results for one doctype tab on the tag detail page
+    """
+
+    taglist = request.GET.get("taglist")
+    doctype = request.GET.get("doctype")
+    if not taglist or not doctype:
+        return JsonResponse({"status": "ERROR", "message": "Missing taglist or doctype"}, status=400)
+    taglist = taglist.split(",")
+
+    try:
+        page_number = int(request.GET.get("page", 2))
+    except ValueError:
+        return JsonResponse({"status": "ERROR", "message": "Page must be a valid integer"}, status=400)
+    if page_number < 1:
+        return JsonResponse({"status": "ERROR", "message": "Page must be a positive integer"}, status=400)
+
+    cache_key = get_tag_detail_cache_key(request.user, taglist, doctype, page_number)
+    results = cache.get(cache_key)
+
+    if results is None:
+
+        es = get_elasticsearch_connection(host=settings.ELASTICSEARCH_ENDPOINT)
+
+        search_object = get_tag_detail_search_object(request.user, taglist)
+        search_object["query"]["bool"]["filter"].append(
+            {
+                "term": {
+                    "doctype": doctype
+                }
+            }
+        )
+        search_object["from"] = (page_number - 1) * TAG_DETAIL_PAGE_SIZE
+        search_object["size"] = TAG_DETAIL_PAGE_SIZE
+        search_object["track_total_hits"] = False
+
+        hits = es.search(index=settings.ELASTICSEARCH_INDEX, body=search_object)["hits"]["hits"]
+        results = get_tag_detail_results(hits, taglist)
+        if not Tag.is_reindexing(request.user.id):
+            cache.set(cache_key, results, TAG_DETAIL_CACHE_TIMEOUT)
+
+    return JsonResponse(
+        {
+            "status": "OK",
+            "matches": results,
+            "has_more": len(results) == TAG_DETAIL_PAGE_SIZE
+        }
+    )
+
+
 @method_decorator(login_required, name="dispatch")
 class SemanticSearchListView(SearchListView):
 
     def refine_search(self, search_object):
 
-        embeddings = len_safe_get_embedding(self.request.GET["semantic_search"])
+        embeddings = get_query_embedding(self.request.GET["semantic_search"])
 
         search_object["sort"] = {"_score": {"order": "desc"}}
 
-        # Remove the function that heavily weighs important blobs
-        search_object["query"]["function_score"]["query"]["bool"]["must"].pop(-1)
-
+        # Replace the function that heavily weighs important blobs
         search_object["query"]["function_score"]["functions"] = [
             {
                 "script_score": {
@@ -592,30 +796,6 @@ def sort_results(matches):
     return response
 
 
-def get_link(doc_type, match):
-    url = ""
-
-    if doc_type == "bookmark":
-        url = match["url"]
-    elif doc_type == "song":
-        if "album_uuid" in match:
-            url = reverse("music:album_detail", kwargs={"uuid": match["album_uuid"]})
-        else:
-            url = reverse("music:artist_detail", kwargs={"uuid": match["artist_uuid"]})
-    elif doc_type == "album":
-        url = reverse("music:album_detail", kwargs={"uuid": match["uuid"]})
-    elif doc_type == "artist":
-        url = reverse("music:artist_detail", kwargs={"uuid": match["artist_uuid"]})
-    elif doc_type in ("blob", "book", "document", "note"):
-        url = reverse("blob:detail", kwargs={"uuid": match["uuid"]})
-    elif doc_type == "drill":
-        url = reverse("drill:detail", kwargs={"uuid": match["uuid"]})
-    elif doc_type == "todo":
-        url = reverse("todo:detail", kwargs={"uuid": match["uuid"]})
-
-    return url
-
-
 def get_name(doc_type, match):
 
     if doc_type == "Song":
@@ -681,6 +861,68 @@ def is_cached():
     return check_cache
 
 
+def get_autocomplete_cache_key(user, doc_types, search_term):
+    return f"autocomplete_{user.id}_{','.join(sorted(doc_types))}_{search_term}"
+
+
+def can_filter_autocomplete_matches(search_term):
+    """
+    Return whether cached matches for a prefix of the search term can be
+    narrowed down locally to exactly what Elasticsearch would return for
+    it. Only a single token of letters and digits qualifies, since the
+    search analyzer splits on anything else and requires every token to
+    match within one field. It must also fit within the ngrams indexed,
+    which are 2 to 10 characters long (see mappings.json).
+    """
+
+    return search_term.isalnum() and 2 <= len(search_term) <= 10
+
+
+def filter_autocomplete_matches(cached, search_term):
+    """
+    Narrow the cached matches for a shorter prefix of the search term
+    down to those that also match the full term.
+    """
+
+    return [
+        (filter_text, match)
+        for filter_text, match in cached["matches"]
+        if search_term in filter_text
+    ]
+
+
+def get_cached_autocomplete_matches(user, doc_types, search_term):
+    """
+    Look for cached autocomplete results for the search term or, failing
+    that, for the longest prefix of it whose cached results are complete.
+    Since results for "pytho" are a subset of those for "pyth", the latter
+    can be filtered locally rather than querying Elasticsearch again.
+    Results for a prefix are only reused for search terms which can be
+    filtered exactly like Elasticsearch does.
+    """
+
+    if can_filter_autocomplete_matches(search_term):
+        prefixes = [search_term[:i] for i in range(len(search_term), 0, -1)]
+    else:
+        prefixes = [search_term]
+    keys = {
+        get_autocomplete_cache_key(user, doc_types, prefix): prefix
+        for prefix in prefixes
+    }
+    cached_results = cache.get_many(keys.keys())
+
+    for key in keys:
+        cached = cached_results.get(key)
+        if cached is None:
+            continue
+        if keys[key] == search_term:
+            return cached["matches"]
+        if cached["complete"]:
+            return filter_autocomplete_matches(cached, search_term)
+
+    return None
+
+
 @login_required
 def search_tags_and_names(request):
     """
@@ -690,23 +932,63 @@ def search_tags_and_names(request):
     search_term = request.GET["term"].lower()
 
     doc_types = get_doc_types_from_request(request)
+    doc_types_key = list(doc_types)
 
-    matches = search_names_es(request.user, search_term, doc_types)
+    matches = get_cached_autocomplete_matches(request.user, doc_types_key, search_term)
+
+    if matches is None:
 
-    # Add tag search results to the list of matches
-    matches.extend(search_tags_es(request.user, search_term, doc_types))
+        # Note: the names search object must be built first, since it
+        #  removes pseudo-doctypes like "image" from doc_types
+        names_search_object = get_names_search_object(request.user, search_term, doc_types)
+        tags_search_object = get_tags_search_object(request.user, search_term, doc_types)
 
-    return JsonResponse(sort_results(matches), safe=False)
+        # Run both searches in a single round trip
+        es = get_elasticsearch_connection(host=settings.ELASTICSEARCH_ENDPOINT)
+        names_results, tags_results = es.msearch(
+            index=settings.ELASTICSEARCH_INDEX,
+            body=[{}, names_search_object, {}, tags_search_object]
+        )["responses"]
+
+        # Each search in a multi search can fail on its own. If only one
+        #  did, return the other's matches, but don't cache them.
+        errors = [x["error"] for x in (names_results, tags_results) if "error" in x]
+        if errors:
+            log.error("Autocomplete search failed for term '%s': %s", search_term, errors)
+            if len(errors) == 2:
+                return JsonResponse({"status": "ERROR", "message": "Search failed"}, status=500)
+
+        names_matches = [] if "error" in names_results else get_names_matches(names_results)
+        tags_matches = [] if "error" in tags_results else \
+            get_tags_matches(request.user, tags_results, search_term, doc_types)
+
+        matches = names_matches + tags_matches
+
+        if not errors:
+            # Results can only be narrowed down for longer search terms if
+            #  neither search was truncated.
+            complete = names_results["hits"]["total"]["value"] <= len(names_results["hits"]["hits"]) \
+                and tags_results["aggregations"]["Distinct Tags"]["sum_other_doc_count"] == 0
+
+            cache.set(
+                get_autocomplete_cache_key(request.user, doc_types_key, search_term),
+                {
+                    "matches": matches,
+                    "complete": complete
+                },
+                AUTOCOMPLETE_CACHE_TIMEOUT
+            )
 
+    return JsonResponse(sort_results([match for _, match in matches]), safe=False)
 
-def search_tags_es(user, search_term, doc_types):
 
-    es = get_elasticsearch_connection(host=settings.ELASTICSEARCH_ENDPOINT)
+def get_tags_search_object(user, search_term, doc_types):
 
     search_object = {
+        # Only the aggregation is used, so nothing needs to be scored
         "query": {
             "bool": {
-                "must": [
+                "filter": [
                     {
                         "term": {
                             "user_id": user.id
@@ -737,55 +1019,51 @@ def search_tags_es(user, search_term, doc_types):
                 }
             }
         },
-        "from": 0, "size": 100,
-        "_source": ["album_id",
-                    "album",
-                    "artist",
-                    "author",
-                    "date",
-                    "date_unixtime",
-                    "doctype",
-                    "filename",
-                    "importance",
-                    "name",
-                    "question",
-                    "sha1sum",
-                    "tags",
-                    "url",
-                    "uuid"]
+        # Only the aggregation is used, so don't return any hits
+        "size": 0,
+        "track_total_hits": False
     }
 
     if len(doc_types) > 1:
-        search_object["query"]["bool"]["must"].append(
+        search_object["query"]["bool"]["filter"].append(
             {
-                "bool": {
-                    "should": [
-                        {
-                            "term": {
-                                "doctype": x
-                            }
-                        }
-                        for x in doc_types
-                    ]
+                "terms": {
+                    "doctype": doc_types
                 }
             }
         )
 
-    results = es.search(index=settings.ELASTICSEARCH_INDEX, body=search_object)
+    return search_object
+
+
+def get_tags_matches(user, results, search_term, doc_types):
+    """
+    Return a list of (filter text, match) tuples for the tags found
+    in a search, plus any matching tag aliases.
+    """
 
     matches = []
     for tag_result in results["aggregations"]["Distinct Tags"]["buckets"]:
         if tag_result["key"].lower().find(search_term.lower()) != -1:
             matches.insert(0,
-                           {
-                               "doctype": "Tag",
-                               "name": tag_result["key"],
-                               "id": tag_result["key"],
-                               "link": get_tag_link(tag_result["key"], doc_types)
-                           }
+                           (
+                               tag_result["key"].lower(),
+                               {
+                                   "doctype": "Tag",
+                                   "name": tag_result["key"],
+                                   "id": tag_result["key"],
+                                   "link": get_tag_link(tag_result["key"], doc_types)
+                               }
+                           )
                            )
 
-    matches.extend(get_tag_aliases(user, search_term))
+    matches.extend(
+        [
+            (x["id"].split(" -> ")[0].lower(), x)
+            for x in get_tag_aliases(user, search_term)
+        ]
+    )
+
     return matches
 
 
@@ -819,6 +1097,14 @@ def search_names_es(user, search_term, doc_types):
 
     es = get_elasticsearch_connection(host=settings.ELASTICSEARCH_ENDPOINT)
 
+    search_object = get_names_search_object(user, search_term, doc_types)
+    results = es.search(index=settings.ELASTICSEARCH_INDEX, body=search_object)
+
+    return [match for _, match in get_names_matches(results)]
+
+
+def get_names_search_object(user, search_term, doc_types):
+
     search_object = {
         "query": {
             "function_score": {
@@ -828,12 +1114,14 @@ def search_names_es(user, search_term, doc_types):
                 },
                 "query": {
                     "bool": {
-                        "must": [
+                        "filter": [
                             {
                                 "term": {
                                     "user_id": user.id
                                 }
-                            },
+                            }
+                        ],
+                        "must": [
                             {
                                 "bool": {
                                     "should": [
@@ -912,7 +1200,7 @@ def search_names_es(user, search_term, doc_types):
             # 'image' isn't an official ES doctype, so treat this
             #  as a search for a content type that matches an image.
             doc_types.remove("image")
-            search_object["query"]["function_score"]["query"]["bool"]["must"].append(
+            search_object["query"]["function_score"]["query"]["bool"]["filter"].append(
                 {
                     "bool": {
                         "should": [
@@ -932,7 +1220,7 @@ def search_names_es(user, search_term, doc_types):
             #  as a search for a content type that matches either
             #  an image or a video
             doc_types.remove("media")
-            search_object["query"]["function_score"]["query"]["bool"]["must"].append(
+            search_object["query"]["function_score"]["query"]["bool"]["filter"].append(
                 {
                     "bool": {
                         "should": [
@@ -955,25 +1243,31 @@ def search_names_es(user, search_term, doc_types):
                 }
             )
 
-        search_object["query"]["function_score"]["query"]["bool"]["must"].append(
-            {
-                "bool": {
-                    "should": [
-                        {
-                            "term": {
-                                "doctype": x
-                            }
-                        }
-                        for x in doc_types
-                    ]
+        # Only filter on doctype if there are any left after removing
+        #  the content type searches above
+        if doc_types:
+            search_object["query"]["function_score"]["query"]["bool"]["filter"].append(
+                {
+                    "terms": {
+                        "doctype": doc_types
+                    }
                 }
-            }
-        )
+            )
+
+    return search_object
+
+
+def get_names_matches(results):
+    """
+    Return a list of (filter text, match) tuples for the hits found
+    in a names search. The filter text is used to narrow down cached
+    results for longer search terms.
+    """
 
-    results = es.search(index=settings.ELASTICSEARCH_INDEX, body=search_object)
     matches = []
 
     cache_checker = is_cached()
+    get_link = LinkBuilder()
 
     for match in results["hits"]["hits"]:
         doc_type_pretty = get_doctype(match)
@@ -988,33 +1282,39 @@ def search_names_es(user, search_term, doc_types):
                 )
             else:
                 date = ""
-            matches.append(
-                {
-                    "name": name,
-                    "date": date,
-                    "doctype": doc_type_pretty,
-                    "note": match["_source"].get("note", ""),
-                    "uuid": match["_source"].get("uuid"),
-                    "id": match["_source"].get("uuid"),
-                    "important": match["_source"].get("importance"),
-                    "url": match["_source"].get("url", None),
-                    "link": get_link(doc_type_pretty.lower(), match["_source"]),
-                    "score": match["_score"]
-                }
+            filter_text = " ".join(
+                [
+                    str(match["_source"][x]).lower()
+                    for x in ("name", "question", "title", "artist")
+                    if match["_source"].get(x)
+                ]
             )
+            result = {
+                "name": name,
+                "date": date,
+                "doctype": doc_type_pretty,
+                "note": match["_source"].get("note", ""),
+                "uuid": match["_source"].get("uuid"),
+                "id": match["_source"].get("uuid"),
+                "important": match["_source"].get("importance"),
+                "url": match["_source"].get("url", None),
+                "link": get_link(doc_type_pretty.lower(), match["_source"]),
+                "score": match["_score"]
+            }
             if doc_type_pretty in ["Blob", "Book", "Document"]:
-                matches[-1]["cover_url"] = Blob.get_cover_url_static(
+                result["cover_url"] = Blob.get_cover_url_static(
                     match["_source"].get("uuid"),
                     match["_source"].get("filename"),
                     size="small"
                 )
-                matches[-1]["type"] = "blob"
+                result["type"] = "blob"
             if doc_type_pretty == "Bookmark":
-                matches[-1]["cover_url"] = Bookmark.thumbnail_url_static(
+                result["cover_url"] = Bookmark.thumbnail_url_static(
                     match["_source"].get("uuid"),
                     match["_source"].get("url"),
                 )
-                matches[-1]["type"] = "bookmark"
+                result["type"] = "bookmark"
+            matches.append((filter_text, result))
 
     return matches
 
@@ -1051,6 +1351,11 @@ def search_music(request):
                 "query": {
                     "bool": {
                         "must": [
+                            {
+                                "match_all": {}
+                            }
+                        ],
+                        "filter": [
                             {
                                 "term": {
                                     "user_id": request.user.id
@@ -1098,7 +1403,9 @@ def search_music(request):
                                     "operator": "and"
                                 }
                             }
-                        },
+                        }
+                    ],
+                    "filter": [
                         {
                             "term": {
                                 "doctype": "song"
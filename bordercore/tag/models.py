@@ -10,8 +10,9 @@ It includes logic for ensuring lowercase names, preventing name collisions, and
 
 from __future__ import annotations
 
+import time
 import uuid
-from typing import TYPE_CHECKING, Any, List, Mapping
+from typing import TYPE_CHECKING, Any, List, Mapping, cast
 
 from django.apps import apps
 from django.contrib.auth.models import User
@@ -21,11 +22,16 @@ from django.db import models
 from django.db.models import Count, Model, Q
 from django.db.models.functions import Lower
 from django.db.models.query import QuerySet
-from django.db.models.signals import pre_delete
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
 from django.dispatch import receiver
 
 from lib.mixins import SortOrderMixin
 
+# Objects are reindexed in Elasticsearch asynchronously after their tags
+#  change, so search results aren't cached for this many seconds afterwards.
+TAG_REINDEX_WINDOW = 60
+
 if TYPE_CHECKING:
     from bookmark.models import Bookmark
     from todo.models import Todo
@@ -126,6 +132,52 @@ class Tag(models.Model):
             cache.set(cache_key, tags)
         return [x.name for x in tags]
 
+    @staticmethod
+    def get_version(user_id: int) -> int:
+        """
+        Get the user's tag version, a counter which changes whenever any of
+        the user's objects are tagged or untagged. Include this in the keys
+        of cached search results so that they're invalidated by tag changes.
+
+        Args:
+            user_id: The ID of the user.
+
+        Returns:
+            The current tag version.
+        """
+        return cast(int, cache.get_or_set(f"tag_version_{user_id}", time.time_ns, None))
+
+    @staticmethod
+    def is_reindexing(user_id: int) -> bool:
+        """
+        Return whether the user's tags changed so recently that the objects
+        involved may not have been reindexed yet. Results fetched now may be
+        stale, so shouldn't be cached, even under the new tag version.
+
+        Args:
+            user_id: The ID of the user.
+
+        Returns:
+            True if the user's tag version was bumped within the reindex window.
+        """
+        return cache.get(f"tag_reindexing_{user_id}") is not None
+
+    @staticmethod
+    def bump_version(user_id: int) -> None:
+        """
+        Change the user's tag version, invalidating any cached search results.
+
+        Args:
+            user_id: The ID of the user.
+        """
+        try:
+            cache.incr(f"tag_version_{user_id}")
+        except ValueError:
+            # The key is missing, so seed a value that won't collide
+            #  with any version used before it was evicted.
+            cache.set(f"tag_version_{user_id}", time.time_ns(), None)
+        cache.set(f"tag_reindexing_{user_id}", True, TAG_REINDEX_WINDOW)
+
 
 class TagTodo(SortOrderMixin):
     """
@@ -195,3 +247,37 @@ class TagAlias(models.Model):
 
     class Meta:
         verbose_name_plural = "Tag Aliases"
+
+
+@receiver(m2m_changed)
+def tags_changed(sender: type[Model], instance: Model, action: str, model: type[Model], **kwargs: Any) -> None:
+    """
+    Signal handler to bump the user's tag version whenever an object's tags change.
+    """
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if isinstance(instance, Tag):
+        Tag.bump_version(instance.user_id)
+    elif model is Tag and hasattr(instance, "user_id"):
+        Tag.bump_version(instance.user_id)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_saved(sender: type[Model], instance: Tag, **kwargs: Any) -> None:
+    """
+    Signal handler to bump the user's tag version whenever a tag is renamed or deleted.
+    """
+    Tag.bump_version(instance.user_id)
+
+
+@receiver(post_save, sender=TagTodo)
+@receiver(post_delete, sender=TagTodo)
+@receiver(post_save, sender=TagBookmark)
+@receiver(post_delete, sender=TagBookmark)
+def tag_relationship_saved(sender: type[Model], instance: TagTodo | TagBookmark, **kwargs: Any) -> None:
+    """
+    Signal handler to bump the user's tag version whenever a todo or
+    bookmark is tagged or untagged.
+    """
+    Tag.bump_version(instance.tag.user_id)
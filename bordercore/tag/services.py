@@ -134,7 +134,7 @@ def search(
     search_object: Dict[str, Any] = {
         "query": {
             "bool": {
-                "must": [
+                "filter": [
                     {
                         "term": {
                             "user_id": user.id
@@ -173,7 +173,7 @@ def search(
     # If a doctype list is passed in, then limit our search to tags attached
     #  to those particular object types, rather than to all tags.
     for doc_type in doc_types:
-        search_object["query"]["bool"]["must"].append(
+        search_object["query"]["bool"]["filter"].append(
             {
                 "term": {
                     "doctype": doc_type
@@ -218,7 +218,7 @@ def find_related_tags(tag_name: str, user: User, doc_type: Optional[str]) -> Lis
     search_object: Dict[str, Any] = {
         "query": {
             "bool": {
-                "must": [
+                "filter": [
                     {
                         "term": {
                             "user_id": user.id
@@ -245,7 +245,7 @@ def find_related_tags(tag_name: str, user: User, doc_type: Optional[str]) -> Lis
     }
 
     if doc_type:
-        search_object["query"]["bool"]["must"].append(
+        search_object["query"]["bool"]["filter"].append(
             {
                 "term": {
                     "doctype": doc_type
@@ -21,6 +21,7 @@ from django.db.models import Count, JSONField, Max
 from django.db.models.signals import m2m_changed
 
 from lib.mixins import TimeStampedModel
+from lib.util import get_index_alias
 from search.services import delete_document, index_document
 from tag.models import Tag, TagTodo
 
@@ -159,7 +160,7 @@ class Todo(TimeStampedModel):
         tags = list(self.tags.values_list('name', flat=True))
 
         return {
-            "_index": settings.ELASTICSEARCH_INDEX,
+            "_index": get_index_alias(settings.ELASTICSEARCH_INDEX, "todo"),
             "_id": self.uuid,
             "_source": {
                 "bordercore_id": self.id,
@@ -173,6 +174,8 @@ class Todo(TimeStampedModel):
                 "doctype": "todo",
                 "date": {"gte": self.created.strftime("%Y-%m-%d %H:%M:%S"), "lte": self.created.strftime("%Y-%m-%d %H:%M:%S")},
                 "date_unixtime": self.created.strftime("%s"),
+                "date_display": self.created.strftime("%B %d, %Y"),
+                "last_modified_epoch": int(self.modified.timestamp()),
                 "user_id": self.user_id,
                 **settings.ELASTICSEARCH_EXTRA_FIELDS
             }
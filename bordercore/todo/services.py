@@ -45,7 +45,7 @@ def search(user: User, todo_name: str) -> List[Dict[str, Any]]:
     search_object = {
         "query": {
             "bool": {
-                "must": [
+                "filter": [
                     {
                         "term": {
                             "user_id": user.id
@@ -55,7 +55,9 @@ def search(user: User, todo_name: str) -> List[Dict[str, Any]]:
                         "term": {
                             "doctype": "todo"
                         }
-                    },
+                    }
+                ],
+                "must": [
                     {
                         "bool": {
                             "should": [
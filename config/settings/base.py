@@ -80,6 +80,10 @@ INDEX_BLOB_TOPIC_ARN = "arn:aws:sns:us-east-1:192218769908:IndexBlob"
 CREATE_COLLECTION_THUMBNAIL_TOPIC_ARN = "arn:aws:sns:us-east-1:192218769908:CreateCollectionThumbnail"
 SNS_TOPIC_ARN = "arn:aws:sns:us-east-1:192218769908:chromda"
 
+# How queued jobs, such as indexing blobs, are run: "aws" publishes them
+#  to SNS or invokes Lambda functions, "inprocess" runs them locally
+JOB_BACKEND = os.environ.get("JOB_BACKEND", "aws")
+
 os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
 
 # Set this to silence S3Boto3Storage warning
@@ -233,6 +237,10 @@ ELASTICSEARCH_INDEX = os.environ.get("ELASTICSEARCH_INDEX", "bordercore")
 
 ELASTICSEARCH_EXTRA_FIELDS = {}
 
+# The length, in characters, of the snippets of matching text
+#  shown for notes and documents in search results
+SEARCH_SNIPPET_LENGTH = int(os.environ.get("SEARCH_SNIPPET_LENGTH", 200))
+
 DJANGO_LOG_DIR = os.environ.get("DJANGO_LOG_DIR", "/var/log/django")
 
 LOGGING = {
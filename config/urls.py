@@ -11,6 +11,8 @@ from api.views import (AlbumViewSet, BlobSha1sumViewSet, BlobViewSet,
                        FeedViewSet, NodeViewSet, QuestionViewSet, QuoteViewSet,
                        SongSourceViewSet, SongViewSet, TagAliasViewSet,
                        TagNameViewSet, TagViewSet, TodoViewSet)
+from blob.views import update_content_type
+from bookmark.views import update_favicon
 from bordercore.api.views import PlaylistItemViewSet, PlaylistViewSet
 from collection.views import get_images
 from homepage.views import handler403, handler404, handler500, robots_txt
@@ -66,6 +68,8 @@ router.register(r"todos", TodoViewSet, "todo")
 urlpatterns += [
     re_path(r"^api/", include(router.urls)),
     path("api/feeds/update_feed_list/<uuid:feed_uuid>/", update_feed_list),
+    path("api/blobs/<uuid:blob_uuid>/content_type/", update_content_type),
+    path("api/favicons/<str:domain>/", update_favicon),
     path("api/collections/images/<uuid:collection_uuid>/", get_images),
     path("api/music/mark_song_as_listened_to/<uuid:song_uuid>/", mark_song_as_listened_to, name="mark_song_as_listened_to"),
     path("api/site/stats", site_stats),